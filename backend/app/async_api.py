@@ -0,0 +1,663 @@
+"""
+API async de Red K (modo opt-in, ASYNC_API=true).
+
+Reimplementa los endpoints de mayor tráfico (feed, DMs, likes, follows y
+sugerencias) con drivers asyncio:
+- PyMongo AsyncMongoClient
+- redis.asyncio
+- Neo4j AsyncDriver
+
+Las rutas y los response_model son los mismos que en app/main.py; cuando el
+modo está activo, main.py registra este router ANTES de sus propias rutas y
+estas versiones son las que atienden los requests. Así un worker no bloquea
+un hilo del threadpool por cada round trip a la base de datos.
+
+Validaciones, filtros y armado de respuestas son los de app/handlers.py,
+compartidos con main.py: acá solo cambian las llamadas de I/O.
+"""
+
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Response, Query
+
+from app import conversations, dm_cache, follow_graph, graph_writer, handlers, realtime, suggestion_sets, timelines, feed_cache, follows, likes, post_cache, ppr, user_cache, user_counters
+from app.connections import (
+    AsyncConnectionManager,
+    connection_manager,
+    get_async_connections,
+)
+from app.pagination import Page, page_next_cursor
+from app.schemas import (
+    PostOut,
+    FeedMode,
+    SuggestionAlgo,
+    SuggestionOut,
+    DMCreate,
+    DMOut,
+    DMConversationSummary,
+    LikeResponse,
+    LikesBatchRequest,
+)
+
+router = APIRouter(tags=["async"])
+
+# Nota: timelines (lectura, rebuild, backfill/prune) y sugerencias (lectura y
+# primer cálculo) son nativos async. Solo la actualización de sugerencias
+# después de un follow corre como tarea en background (threadpool).
+
+
+# --------- Follows ---------
+def _update_suggestions(username: str, target: str, followed: bool):
+    """Sugerencias precalculadas (app/suggestion_sets.py); corre en el threadpool"""
+    try:
+        suggestion_sets.apply_follow(connection_manager, username, target, followed)
+    except Exception as e:
+        print(f"⚠️  No se pudieron actualizar las sugerencias (no crítico): {e}")
+
+
+async def _invalidate_user_cache(conns: AsyncConnectionManager, usernames: List[str]):
+    """Nueva generación de cache para cada usuario (no crítico)"""
+    try:
+        await user_cache.bump_async(conns.redis, usernames)
+    except Exception as e:
+        print(f"⚠️  No se pudo invalidar caché (no crítico): {e}")
+
+
+async def _cache_lookup(conns: AsyncConnectionManager, kind: str, username: str, *parts):
+    """(key, valor) del cache versionado; key None si Redis no está disponible"""
+    try:
+        r = conns.redis
+        key = await user_cache.cache_key_async(r, kind, username, *parts)
+        return key, await user_cache.get_json_async(r, key)
+    except Exception as e:
+        print(f"⚠️ Redis no disponible para cache de {kind}: {e}")
+        return None, None
+
+
+async def _cache_store(conns: AsyncConnectionManager, key: Optional[str], kind: str, value):
+    if key is None:
+        return
+    try:
+        await user_cache.set_json_async(conns.redis, key, kind, value)
+    except Exception as e:
+        print(f"⚠️ No se pudo guardar en cache ({kind}): {e}")
+
+
+async def _follow_ids(conns: AsyncConnectionManager, username: str, target_username: str) -> Tuple[str, str]:
+    docs = conns.mongo_db()["users"].find(handlers.users_query(username, target_username), {"username": 1})
+    return handlers.follow_ids(await docs.to_list(length=None), username, target_username)
+
+
+@router.post("/users/{username}/follow/{target_username}")
+async def follow_user(
+    username: str,
+    target_username: str,
+    background_tasks: BackgroundTasks,
+    conns: AsyncConnectionManager = Depends(get_async_connections),
+):
+    """
+    Crea una relación FOLLOWS entre dos usuarios (versión async).
+    """
+    handlers.check_follow_pair(username, target_username, followed=True)
+
+    db = conns.mongo_db()
+    user_id, target_id = await _follow_ids(conns, username, target_username)
+
+    created = False
+    try:
+        # Mismo lote que los requests sync del worker (app/graph_writer.py)
+        created = bool(await graph_writer.graph_writer.write_async(
+            "follow", handlers.follow_payload(user_id, username, target_id, target_username)
+        ))
+    except graph_writer.GraphWriteTimeout as e:
+        # La relación puede quedar escrita en Neo4j: no duplicarla en MongoDB
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        print(f"⚠️ Neo4j no disponible para follow, usando MongoDB: {e}")
+        edge = handlers.follow_filter(username, target_username)
+        result = await db["follows"].update_one(edge, {"$set": edge}, upsert=True)
+        created = result.upserted_id is not None
+
+    if created:
+        try:
+            await user_counters.record_follow_async(db, username, target_username)
+        except Exception as e:
+            print(f"⚠️  No se pudieron actualizar los contadores (no crítico): {e}")
+
+    try:
+        await follows.record_follow_async(conns.redis, username, target_username)
+    except Exception as e:
+        print(f"⚠️  No se pudo actualizar following en Redis (no crítico): {e}")
+
+    try:
+        await follow_graph.publish_follow_async(conns.redis, username, target_username)
+    except Exception as e:
+        print(f"⚠️  No se pudo publicar el cambio de follow (no crítico): {e}")
+
+    try:
+        await realtime.publish_async(
+            conns.redis, [realtime.user_channel(username)],
+            realtime.follow_event(username, target_username, True),
+        )
+    except Exception as e:
+        print(f"⚠️  No se pudo publicar el evento de follow (no crítico): {e}")
+
+    try:
+        await timelines.backfill_on_follow_async(conns, username, target_username)
+    except Exception as e:
+        print(f"⚠️  No se pudo actualizar el timeline (no crítico): {e}")
+
+    await _invalidate_user_cache(conns, [username])
+
+    background_tasks.add_task(_update_suggestions, username, target_username, True)
+
+    return handlers.follow_message(username, target_username, followed=True)
+
+
+@router.delete("/users/{username}/follow/{target_username}")
+async def unfollow_user(
+    username: str,
+    target_username: str,
+    background_tasks: BackgroundTasks,
+    conns: AsyncConnectionManager = Depends(get_async_connections),
+):
+    """
+    Elimina la relación FOLLOWS entre dos usuarios (versión async).
+    """
+    handlers.check_follow_pair(username, target_username, followed=False)
+
+    db = conns.mongo_db()
+    user_id, target_id = await _follow_ids(conns, username, target_username)
+
+    try:
+        deleted_count = await graph_writer.graph_writer.write_async("unfollow", {
+            "user_id": user_id,
+            "target_id": target_id,
+        })
+
+        if deleted_count == 0:
+            raise handlers.not_following(username, target_username)
+    except HTTPException:
+        raise
+    except graph_writer.GraphWriteTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        print(f"⚠️ Neo4j no disponible para unfollow, usando MongoDB: {e}")
+        result = await db["follows"].delete_one(handlers.follow_filter(username, target_username))
+        if result.deleted_count == 0:
+            raise handlers.not_following(username, target_username)
+
+    try:
+        await user_counters.record_follow_async(db, username, target_username, delta=-1)
+    except Exception as e:
+        print(f"⚠️  No se pudieron actualizar los contadores (no crítico): {e}")
+
+    try:
+        await follows.record_follow_async(conns.redis, username, target_username, followed=False)
+    except Exception as e:
+        print(f"⚠️  No se pudo actualizar following en Redis (no crítico): {e}")
+
+    try:
+        await follow_graph.publish_follow_async(conns.redis, username, target_username, followed=False)
+    except Exception as e:
+        print(f"⚠️  No se pudo publicar el cambio de follow (no crítico): {e}")
+
+    try:
+        await realtime.publish_async(
+            conns.redis, [realtime.user_channel(username)],
+            realtime.follow_event(username, target_username, False),
+        )
+    except Exception as e:
+        print(f"⚠️  No se pudo publicar el evento de follow (no crítico): {e}")
+
+    try:
+        await timelines.prune_on_unfollow_async(conns, username, target_username)
+    except Exception as e:
+        print(f"⚠️  No se pudo actualizar el timeline (no crítico): {e}")
+
+    await _invalidate_user_cache(conns, [username])
+
+    background_tasks.add_task(_update_suggestions, username, target_username, False)
+
+    return handlers.follow_message(username, target_username, followed=False)
+
+
+# --------- Feed ---------
+
+@router.get("/users/{username}/feed", response_model=List[PostOut])
+async def get_user_feed(
+    response: Response,
+    username: str,
+    limit: int = Query(20, ge=1, le=200),
+    mode: FeedMode = FeedMode.all,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    with_likes: bool = False,
+    conns: AsyncConnectionManager = Depends(get_async_connections),
+):
+    """
+    Feed del usuario (versión async, mismas reglas que app.main.get_user_feed).
+    """
+    db = conns.mongo_db()
+    r = conns.redis
+
+    handlers.require(await db["users"].find_one({"username": username}, {"_id": 1}))
+
+    page = handlers.feed_page(before, after, limit)
+    include_self = mode == FeedMode.all
+
+    if page.has_cursor:
+        posts = None
+        path = timelines.FEED_PATH_PULL
+        if r is not None:
+            try:
+                cursor = handlers.timeline_cursor(page, mode)
+                feed = None
+                if cursor is not None:
+                    feed = await timelines.read_feed_ids_before_async(conns, username, limit, include_self, cursor)
+                if feed is not None:
+                    feed_ids, path = feed
+                    posts = await post_cache.get_posts_async(r, db, feed_ids)
+                    next_cursor = page_next_cursor(posts, limit)
+            except Exception as e:
+                print(f"⚠️ Timeline no disponible para {username}, usando consulta directa: {e}")
+        if posts is None:
+            posts, next_cursor = await _pull_feed(conns, username, mode, page)
+            path = timelines.FEED_PATH_PULL
+        handlers.feed_response(response, path, next_cursor)
+        return await _embed_likes(conns, posts, username) if with_likes else posts
+
+    # Ids cacheados del feed + cache de posts (solo primera página)
+    cache_key = None
+    if r is not None:
+        try:
+            cache_key = await feed_cache.feed_cache_key_async(r, username, mode.value)
+            cached_ids = await feed_cache.get_cached_ids_async(r, cache_key, limit)
+            if cached_ids is not None:
+                posts = await post_cache.get_posts_async(r, db, cached_ids)
+                handlers.feed_response(response, timelines.FEED_PATH_CACHE, page_next_cursor(posts, limit))
+                return await _embed_likes(conns, posts, username) if with_likes else posts
+        except Exception:
+            r = None
+
+    depth = handlers.feed_depth(limit)
+    feed_ids = None
+    posts = None
+    path = timelines.FEED_PATH_PULL
+
+    # Modos con follows: timeline materializado + celebridades (pull)
+    if r is not None and handlers.uses_timeline(mode):
+        try:
+            feed = await timelines.read_feed_ids_async(conns, username, depth, include_self)
+            if feed is not None:
+                feed_ids, path = feed
+                posts = await post_cache.get_posts_async(r, db, feed_ids[:limit])
+        except Exception as e:
+            print(f"⚠️ Timeline no disponible para {username}, usando consulta directa: {e}")
+
+    if posts is None:
+        deep_posts, _ = await _pull_feed(conns, username, mode, handlers.feed_page(None, None, depth))
+        feed_ids = [p.id for p in deep_posts]
+        posts = deep_posts[:limit]
+        path = timelines.FEED_PATH_PULL
+        if r is not None:
+            try:
+                await post_cache.cache_posts_async(r, deep_posts)
+            except Exception as e:
+                print(f"⚠️ No se pudieron cachear posts: {e}")
+
+    handlers.feed_response(response, path, page_next_cursor(posts, limit))
+
+    if r is not None and cache_key is not None:
+        try:
+            authors: List[str] = []
+            if handlers.uses_timeline(mode):
+                authors = await follows.get_following_usernames_async(conns, username)
+            await feed_cache.store_feed_async(
+                r, username, cache_key, feed_ids, len(feed_ids) < depth, authors
+            )
+        except Exception as e:
+            print(f"⚠️ No se pudo guardar en cache: {e}")
+
+    return await _embed_likes(conns, posts, username) if with_likes else posts
+
+
+async def _embed_likes(conns: AsyncConnectionManager, posts: List[PostOut], viewer: str) -> List[PostOut]:
+    if not posts:
+        return posts
+    states = await likes.get_like_states_async(conns, [p.id for p in posts], viewer)
+    return likes.embed_like_states(posts, states)
+
+
+async def _pull_feed(
+    conns: AsyncConnectionManager,
+    username: str,
+    mode: FeedMode,
+    page: Page,
+) -> Tuple[List[PostOut], Optional[str]]:
+    """Feed por consulta directa (Neo4j/Mongo), respaldo del timeline y páginas con cursor"""
+    following = []
+    if handlers.uses_timeline(mode):
+        following = await follows.get_following_usernames_async(conns, username)
+    authors = handlers.pull_authors(username, mode, following)
+    if not authors:
+        return [], None
+
+    cursor = (
+        conns.mongo_db()["posts"].find(handlers.pull_query(page, authors))
+        .sort(page.sort)
+        .limit(page.limit)
+    )
+    return handlers.pull_page(page, await cursor.to_list(length=None))
+
+
+# --------- Sugerencias ---------
+
+@router.get("/users/{username}/suggestions", response_model=List[SuggestionOut])
+async def get_suggestions(
+    username: str,
+    response: Response,
+    limit: int = 10,
+    algo: SuggestionAlgo = SuggestionAlgo.mutual,
+    conns: AsyncConnectionManager = Depends(get_async_connections),
+):
+    """
+    Sugerencias "amigos de tus amigos" (versión async).
+    Se leen de los sorted sets precalculados (app/suggestion_sets.py);
+    con `?algo=ppr`, del job de Personalized PageRank (app/ppr.py).
+    """
+    users_col = conns.mongo_db()["users"]
+
+    user_doc = handlers.require(await users_col.find_one({"username": username}, {"_id": 1}))
+
+    suggestions: List[SuggestionOut] = []
+
+    if algo == SuggestionAlgo.ppr:
+        try:
+            ranked, computed_at = await ppr.read_suggestions_async(conns, username, limit)
+            docs = await users_col.find(handlers.ranked_query(ranked), handlers.PPR_FIELDS).to_list(length=None)
+            suggestions = ppr.to_suggestions(ranked, docs)
+            handlers.set_suggestion_headers(response, computed_at)
+        except Exception as e:
+            print(f"⚠️ Sugerencias PPR no disponibles, usando amigos de amigos: {e}")
+
+    if not suggestions:
+        try:
+            ranked, freshness = await suggestion_sets.read_suggestions_async(conns, username, limit)
+            docs = await users_col.find(handlers.ranked_query(ranked), handlers.SUGGESTION_FIELDS).to_list(length=None)
+            suggestions = suggestion_sets.to_suggestions(ranked, docs)
+            handlers.set_suggestion_headers(response, freshness["computed_at"], freshness["updated_at"])
+        except Exception as e:
+            print(f"⚠️ Sugerencias precalculadas no disponibles, consultando Neo4j: {e}")
+            suggestions = await _live_suggestions(conns, str(user_doc["_id"]), limit)
+
+    if not suggestions and follow_graph.follow_graph.ready:
+        ranked = follow_graph.follow_graph.suggest(username, limit)
+        docs = await users_col.find(handlers.ranked_query(ranked), handlers.SUGGESTION_FIELDS).to_list(length=None)
+        suggestions = suggestion_sets.to_suggestions(ranked, docs)
+
+    if not suggestions:
+        # Sin grafo: usuarios que todavía no sigue (set de seguidos en Redis)
+        query = handlers.not_followed_query(username, await follows.get_following_usernames_async(conns, username))
+        suggestions = [handlers.random_suggestion(d) async for d in users_col.find(query).limit(limit)]
+
+    return suggestions
+
+
+async def _live_suggestions(conns: AsyncConnectionManager, user_id: str, limit: int) -> List[SuggestionOut]:
+    """Amigos de amigos con una consulta Cypher por request (respaldo sin Redis)"""
+    try:
+        async with conns.neo4j_driver.session() as session:
+            result = await session.run(handlers.LIVE_SUGGESTIONS_CYPHER, user_id=user_id, limit=limit)
+            return [handlers.live_suggestion(record) async for record in result]
+    except Exception as e:
+        print(f"⚠️ Neo4j no disponible para suggestions: {e}")
+        return []
+
+
+# --------- DMs ---------
+
+@router.post("/dm/send", response_model=DMOut)
+async def send_dm(
+    dm: DMCreate,
+    conns: AsyncConnectionManager = Depends(get_async_connections),
+):
+    """
+    Envía un DM (versión async).
+    """
+    db = conns.mongo_db()
+
+    users = db["users"].find(handlers.users_query(dm.sender_username, dm.receiver_username), {"username": 1})
+    handlers.check_dm_users(
+        await users.to_list(length=None),
+        (dm.sender_username, "Sender no existe"),
+        (dm.receiver_username, "Receiver no existe"),
+    )
+
+    created_at = datetime.utcnow().isoformat()
+    conversation_key = conversations.pair_key(dm.sender_username, dm.receiver_username)
+
+    result = await db["dms"].insert_one(handlers.dm_doc(dm, conversation_key, created_at))
+    message = handlers.dm_out(str(result.inserted_id), dm, created_at)
+
+    # Relación en Neo4j: se encola sin esperar el lote
+    try:
+        await graph_writer.graph_writer.write_async("message", handlers.message_payload(dm, created_at), wait=False)
+    except Exception:
+        # No tiramos error de API si Neo4j falla; el mensaje ya quedó guardado
+        pass
+
+    # Resumen de la conversación de ambos (app/conversations.py)
+    try:
+        await conversations.record_message_async(
+            db, dm.sender_username, dm.receiver_username, conversation_key, dm.content, created_at
+        )
+    except Exception as e:
+        print(f"⚠️  No se pudo actualizar el resumen de conversaciones (no crítico): {e}")
+
+    try:
+        await dm_cache.append_message_async(conns.redis, conversation_key, message.dict())
+    except Exception as e:
+        print(f"⚠️  No se pudo actualizar la conversación cacheada (no crítico): {e}")
+
+    try:
+        await realtime.publish_async(
+            conns.redis, realtime.dm_channels(message.dict()), realtime.dm_event(message.dict())
+        )
+    except Exception as e:
+        print(f"⚠️  No se pudo publicar el evento del DM (no crítico): {e}")
+
+    return message
+
+
+@router.get("/dm/conversations/{username}", response_model=List[DMConversationSummary])
+async def list_conversations(
+    response: Response,
+    username: str,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = None,
+    conns: AsyncConnectionManager = Depends(get_async_connections),
+):
+    """
+    Lista las conversaciones de `username` (versión async).
+    """
+    db = conns.mongo_db()
+
+    user_doc = handlers.require(
+        await db["users"].find_one({"username": username}),
+        f"Usuario {username} no encontrado en conversations endpoint",
+    )
+
+    if not conversations.is_ready(user_doc):
+        await conversations.rebuild_user_async(db, username)
+
+    page = handlers.conversations_page(before, limit)
+    cursor = (
+        db[conversations.CONVERSATIONS_COLLECTION]
+        .find(handlers.conversations_query(page, username))
+        .sort(page.sort)
+        .limit(limit)
+    )
+    docs, next_cursor = page.finish(await cursor.to_list(length=None))
+    handlers.set_next_cursor(response, next_cursor)
+
+    return [conversations.to_summary(d) for d in docs]
+
+
+@router.get("/dm/{username}/{other_username}", response_model=List[DMOut])
+async def get_conversation(
+    response: Response,
+    username: str,
+    other_username: str,
+    limit: int = Query(50, ge=1, le=200),
+    mark_read: bool = True,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    conns: AsyncConnectionManager = Depends(get_async_connections),
+):
+    """
+    Devuelve la conversación entre `username` y `other_username`, del mensaje
+    más nuevo al más viejo (versión async).
+    """
+    db = conns.mongo_db()
+
+    users = db["users"].find(handlers.users_query(username, other_username), {"username": 1})
+    handlers.check_dm_users(
+        await users.to_list(length=None),
+        (username, "Usuario no existe"),
+        (other_username, "Otro usuario no existe"),
+    )
+
+    conversation_key = conversations.pair_key(username, other_username)
+
+    page = Page(before, after, limit, newest_first=True)
+    messages = None
+    r = None
+    if not page.has_cursor:
+        try:
+            r = conns.redis
+            messages = await dm_cache.get_recent_async(r, conversation_key, limit)
+        except Exception as e:
+            print(f"⚠️ Redis no disponible para DMs recientes: {e}")
+            r = None
+
+    if messages is not None:
+        next_cursor = page_next_cursor(messages, limit)
+    else:
+        fetch = max(limit, dm_cache.DM_RECENT_WINDOW) if r is not None else limit
+        cursor = (
+            db["dms"].find(handlers.messages_query(page, conversation_key))
+            .sort(page.sort)
+            .limit(fetch)
+        )
+        docs = await cursor.to_list(length=None)
+        if r is not None and docs:
+            try:
+                await dm_cache.store_recent_async(r, conversation_key, [dm_cache.doc_to_dm(d) for d in docs])
+            except Exception as e:
+                print(f"⚠️ No se pudo cachear la conversación (no crítico): {e}")
+        docs, next_cursor = page.finish(docs[:limit])
+        messages = [dm_cache.doc_to_dm(d) for d in docs]
+
+    handlers.set_next_cursor(response, next_cursor)
+
+    watermarks = await conversations.get_watermarks_async(db, username, other_username)
+    up_to = handlers.read_mark(messages, watermarks, username) if mark_read else None
+    if up_to:
+        now_iso = datetime.utcnow().isoformat()
+        try:
+            await conversations.mark_read_async(db, username, other_username, conversation_key, up_to, now_iso)
+            watermarks[username] = {"last_read_at": up_to, "read_marked_at": now_iso}
+        except Exception as e:
+            print(f"⚠️  No se pudo actualizar la marca de lectura (no crítico): {e}")
+
+    return handlers.conversation_out(messages, watermarks)
+
+
+# --------- Likes ---------
+
+@router.post("/posts/{post_id}/like", response_model=LikeResponse)
+async def like_post(
+    post_id: str,
+    username: str,
+    background_tasks: BackgroundTasks,
+    conns: AsyncConnectionManager = Depends(get_async_connections),
+):
+    """
+    Dar like a un post (versión async). Redis es la fuente principal;
+    MongoDB se actualiza por detrás (app/likes.py).
+    """
+    try:
+        count, liked, changed = await likes.toggle_like_async(conns, post_id, username, like=True)
+    except Exception as e:
+        print(f"⚠️ Redis no disponible para likes, usando MongoDB: {e}")
+        count, liked, changed = await likes.toggle_like_mongo_async(conns, post_id, username, like=True)
+
+    if changed:
+        background_tasks.add_task(_sync_like_graph, conns, post_id, username, True)
+
+    return handlers.like_response(post_id, count, liked)
+
+
+@router.delete("/posts/{post_id}/like")
+async def unlike_post(
+    post_id: str,
+    username: str,
+    background_tasks: BackgroundTasks,
+    conns: AsyncConnectionManager = Depends(get_async_connections),
+):
+    """
+    Quitar like de un post (versión async).
+    """
+    try:
+        count, liked, changed = await likes.toggle_like_async(conns, post_id, username, like=False)
+    except Exception as e:
+        print(f"⚠️ Redis no disponible para unlike, usando MongoDB: {e}")
+        count, liked, changed = await likes.toggle_like_mongo_async(conns, post_id, username, like=False)
+
+    if changed:
+        background_tasks.add_task(_sync_like_graph, conns, post_id, username, False)
+
+    return handlers.like_response(post_id, count, liked)
+
+
+async def _sync_like_graph(conns: AsyncConnectionManager, post_id: str, username: str, liked: bool):
+    """Reflejar el like/unlike en Neo4j (opcional, fuera del request)"""
+    try:
+        user_doc = await conns.mongo_db()["users"].find_one({"username": username}, {"_id": 1})
+        if not user_doc:
+            return
+        await graph_writer.graph_writer.write_async("like" if liked else "unlike", {
+            "user_id": str(user_doc["_id"]),
+            "post_id": post_id,
+        }, wait=False)
+    except Exception as e:
+        print(f"⚠️ Neo4j no disponible para likes: {e}")
+
+
+@router.post("/posts/likes:batch", response_model=List[LikeResponse])
+async def get_posts_likes_batch(
+    request: LikesBatchRequest,
+    conns: AsyncConnectionManager = Depends(get_async_connections),
+):
+    """
+    Likes de varios posts en una sola llamada (versión async).
+    """
+    handlers.check_likes_batch(request)
+
+    states = await likes.get_like_states_async(conns, request.post_ids, request.username)
+    return handlers.likes_batch_response(request, states)
+
+
+@router.get("/posts/{post_id}/likes", response_model=LikeResponse)
+async def get_post_likes(
+    post_id: str,
+    username: str = None,
+    conns: AsyncConnectionManager = Depends(get_async_connections),
+):
+    """
+    Obtener información de likes de un post (versión async, O(1) en Redis).
+    """
+    count, user_liked = await likes.get_like_state_async(conns, post_id, username)
+    return handlers.like_response(post_id, count, user_liked)
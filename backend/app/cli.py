@@ -7,6 +7,9 @@ import json
 
 API_URL = os.getenv("API_URL", "http://127.0.0.1:8001/api")
 
+# Header con el cursor de la página siguiente (ver app/pagination.py)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
 app = typer.Typer(help="CLI para la red social Red K")
 
 
@@ -174,6 +177,32 @@ def list_following(
     typer.echo("-" * 40)
     typer.echo(f"Total: {len(people)} usuarios seguidos")
 
+
+@app.command("user-stats")
+def user_stats(
+    username: str = typer.Argument(..., help="Usuario del que se quieren ver los contadores"),
+):
+    """
+    Muestra followers, seguidos y posts usando GET /users/{username}/stats
+    """
+    try:
+        resp = requests.get(f"{API_URL}/users/{username}/stats")
+    except Exception as e:
+        typer.echo(f"[ERROR] No se pudo conectar a la API: {e}")
+        raise typer.Exit(code=1)
+
+    if resp.status_code != 200:
+        typer.echo(f"[ERROR] La API respondió {resp.status_code}:")
+        typer.echo(resp.text)
+        raise typer.Exit(code=1)
+
+    data = resp.json()
+    typer.echo(f"📊 {username}:")
+    typer.echo(f"  followers   : {data.get('followers_count')}")
+    typer.echo(f"  siguiendo   : {data.get('following_count')}")
+    typer.echo(f"  posts       : {data.get('posts_count')}")
+    typer.echo(f"  reconciliado: {data.get('reconciled_at')}")
+
 @app.command("send-dm")
 def send_dm(
     sender_username: str = typer.Argument(..., help="Usuario que envía el mensaje"),
@@ -212,35 +241,49 @@ def send_dm(
 def read_dm(
     username: str = typer.Argument(..., help="Usuario que lee la conversación"),
     other_username: str = typer.Argument(..., help="Otro usuario de la conversación"),
-    limit: int = typer.Option(50, "--limit", "-l", help="Número máximo de mensajes"),
+    limit: int = typer.Option(50, "--limit", "-l", help="Mensajes por página"),
+    cursor: Optional[str] = typer.Option(None, "--cursor", "-c", help="Cursor devuelto por una lectura anterior"),
+    pages: int = typer.Option(1, "--pages", "-p", help="Páginas a recorrer (0 = todas)"),
 ):
     """
     Lee la conversación entre `username` y `other_username`
-    usando GET /dm/{username}/{other_username}
+    usando GET /dm/{username}/{other_username}: la primera página son los
+    mensajes más nuevos y cada página siguiente trae los anteriores
     """
-    params = {"limit": limit, "mark_read": "true"}
+    messages = []
+    page = 0
+    while True:
+        params = {"limit": limit, "mark_read": "true"}
+        if cursor:
+            params["before"] = cursor
+
+        try:
+            resp = requests.get(
+                f"{API_URL}/dm/{username}/{other_username}",
+                params=params,
+            )
+        except Exception as e:
+            typer.echo(f"[ERROR] No se pudo conectar a la API: {e}")
+            raise typer.Exit(code=1)
+
+        if resp.status_code != 200:
+            typer.echo(f"[ERROR] La API respondió {resp.status_code}:")
+            typer.echo(resp.text)
+            raise typer.Exit(code=1)
+
+        messages.extend(resp.json())
+        cursor = resp.headers.get(NEXT_CURSOR_HEADER)
+        page += 1
+        if not cursor or (pages and page >= pages):
+            break
 
-    try:
-        resp = requests.get(
-            f"{API_URL}/dm/{username}/{other_username}",
-            params=params,
-        )
-    except Exception as e:
-        typer.echo(f"[ERROR] No se pudo conectar a la API: {e}")
-        raise typer.Exit(code=1)
-
-    if resp.status_code != 200:
-        typer.echo(f"[ERROR] La API respondió {resp.status_code}:")
-        typer.echo(resp.text)
-        raise typer.Exit(code=1)
-
-    messages = resp.json()
     if not messages:
         typer.echo(f"No hay mensajes entre {username} y {other_username}.")
         raise typer.Exit()
 
     typer.echo(f"💬 Conversación {username} ↔ {other_username}:")
-    for m in messages:
+    # La API devuelve del más nuevo al más viejo; se muestran en orden cronológico
+    for m in reversed(messages):
         sender = m.get("sender_username")
         receiver = m.get("receiver_username")
         created_at = m.get("created_at")
@@ -261,16 +304,23 @@ def read_dm(
             typer.echo(f"  read_at: {read_at}")
     typer.echo("-" * 60)
     typer.echo(f"Total: {len(messages)} mensajes")
+    if cursor:
+        typer.echo(f"Hay mensajes anteriores: --cursor {cursor}")
 
 @app.command("list-dm-conversations")
 def list_dm_conversations(
     username: str = typer.Argument(..., help="Usuario del que se listan conversaciones"),
+    limit: int = typer.Option(50, "--limit", "-l", help="Conversaciones por página"),
+    cursor: Optional[str] = typer.Option(None, "--cursor", "-c", help="Cursor devuelto por una lectura anterior"),
 ):
     """
     Lista conversaciones (chats) de `username` usando GET /dm/conversations/{username}
     """
+    params = {"limit": limit}
+    if cursor:
+        params["before"] = cursor
     try:
-        resp = requests.get(f"{API_URL}/dm/conversations/{username}")
+        resp = requests.get(f"{API_URL}/dm/conversations/{username}", params=params)
     except Exception as e:
         typer.echo(f"[ERROR] No se pudo conectar a la API: {e}")
         raise typer.Exit(code=1)
@@ -294,17 +344,23 @@ def list_dm_conversations(
         typer.echo(f"unread_count  : {c.get('unread_count')}")
     typer.echo("-" * 60)
     typer.echo(f"Total: {len(convs)} conversaciones")
+    next_cursor = resp.headers.get(NEXT_CURSOR_HEADER)
+    if next_cursor:
+        typer.echo(f"Hay más conversaciones: --cursor {next_cursor}")
 
 @app.command("suggest-users")
 @app.command("get-suggestions")
 def get_suggestions(
     username: str = typer.Argument(..., help="Usuario para el que se quieren sugerencias"),
     limit: int = typer.Option(10, "--limit", "-l", help="Número máximo de sugerencias"),
+    algo: str = typer.Option(
+        "mutual", "--algo", "-a", help="mutual (amigos de amigos) o ppr (Personalized PageRank)"
+    ),
 ):
     """
     Obtiene sugerencias de usuarios a seguir usando GET /users/{username}/suggestions
     """
-    params = {"limit": limit}
+    params = {"limit": limit, "algo": algo}
     try:
         resp = requests.get(f"{API_URL}/users/{username}/suggestions", params=params)
     except Exception as e:
@@ -336,35 +392,53 @@ def get_suggestions(
             typer.echo(f"reason             : {s.get('reason')}")
     typer.echo("-" * 60)
     typer.echo(f"Total: {len(sugs)} sugerencias")
+    computed_at = resp.headers.get("X-Suggestions-Computed-At")
+    updated_at = resp.headers.get("X-Suggestions-Updated-At")
+    if computed_at and updated_at:
+        typer.echo(f"Calculadas: {computed_at} (último follow aplicado: {updated_at})")
+    elif computed_at:
+        typer.echo(f"Calculadas: {computed_at}")
 
 
 @app.command("get-feed")
 def get_feed(
     username: str = typer.Argument(..., help="Usuario del que se quiere ver el feed"),
-    limit: int = typer.Option(20, "--limit", "-l", help="Número máximo de posts"),
+    limit: int = typer.Option(20, "--limit", "-l", help="Posts por página"),
     mode: str = typer.Option(
         "all",
         "--mode",
         "-m",
         help="Modo del feed: all, self, following",
     ),
+    cursor: Optional[str] = typer.Option(None, "--cursor", "-c", help="Cursor devuelto por una lectura anterior"),
+    pages: int = typer.Option(1, "--pages", "-p", help="Páginas a recorrer (0 = todas)"),
 ):
     """
-    Obtiene el feed de un usuario llamando a GET /users/{username}/feed
+    Obtiene el feed de un usuario llamando a GET /users/{username}/feed, página por página
     """
-    params = {"limit": limit, "mode": mode}
-    try:
-        resp = requests.get(f"{API_URL}/users/{username}/feed", params=params)
-    except Exception as e:
-        typer.echo(f"[ERROR] No se pudo conectar a la API: {e}")
-        raise typer.Exit(code=1)
-
-    if resp.status_code != 200:
-        typer.echo(f"[ERROR] La API respondió {resp.status_code}:")
-        typer.echo(resp.text)
-        raise typer.Exit(code=1)
+    posts = []
+    page = 0
+    while True:
+        params = {"limit": limit, "mode": mode}
+        if cursor:
+            params["before"] = cursor
+        try:
+            resp = requests.get(f"{API_URL}/users/{username}/feed", params=params)
+        except Exception as e:
+            typer.echo(f"[ERROR] No se pudo conectar a la API: {e}")
+            raise typer.Exit(code=1)
+
+        if resp.status_code != 200:
+            typer.echo(f"[ERROR] La API respondió {resp.status_code}:")
+            typer.echo(resp.text)
+            raise typer.Exit(code=1)
+
+        posts.extend(resp.json())
+        cursor = resp.headers.get(NEXT_CURSOR_HEADER)
+        page += 1
+        if not cursor or (pages and page >= pages):
+            break
 
-    posts = resp.json()
     if not posts:
         typer.echo(f"No hay posts en el feed de {username} (mode={mode}).")
         raise typer.Exit()
@@ -380,8 +454,219 @@ def get_feed(
         if tags:
             typer.echo(f"tags     : {', '.join(tags)}")
     typer.echo("-" * 60)
+    if cursor:
+        typer.echo(f"Hay más posts: --cursor {cursor}")
     typer.echo(f"Total: {len(posts)} posts")
 
 
+@app.command("rebuild-timelines")
+def rebuild_timelines(
+    username: Optional[str] = typer.Option(
+        None, "--username", "-u", help="Solo este usuario (por defecto: todos)"
+    ),
+):
+    """
+    Reconstruye los timelines materializados usando POST /admin/timelines/rebuild
+    """
+    params = {"username": username} if username else {}
+    try:
+        resp = requests.post(f"{API_URL}/admin/timelines/rebuild", params=params)
+    except Exception as e:
+        typer.echo(f"[ERROR] No se pudo conectar a la API: {e}")
+        raise typer.Exit(code=1)
+
+    if resp.status_code != 200:
+        typer.echo(f"[ERROR] La API respondió {resp.status_code}:")
+        typer.echo(resp.text)
+        raise typer.Exit(code=1)
+
+    data = resp.json()
+    typer.echo("Timelines reconstruidos:")
+    typer.echo(f"  usuarios     : {data.get('users')}")
+    typer.echo(f"  celebridades : {data.get('celebrities')}")
+    typer.echo(f"  entradas     : {data.get('timeline_entries')}")
+
+
+
+@app.command("refresh-suggestions")
+def refresh_suggestions(
+    username: Optional[str] = typer.Option(
+        None, "--username", "-u", help="Solo este usuario (por defecto: todos los activos)"
+    ),
+):
+    """
+    Recalcula las sugerencias precalculadas usando POST /admin/suggestions/refresh
+    """
+    params = {"username": username} if username else {}
+    try:
+        resp = requests.post(f"{API_URL}/admin/suggestions/refresh", params=params)
+    except Exception as e:
+        typer.echo(f"[ERROR] No se pudo conectar a la API: {e}")
+        raise typer.Exit(code=1)
+
+    if resp.status_code != 200:
+        typer.echo(f"[ERROR] La API respondió {resp.status_code}:")
+        typer.echo(resp.text)
+        raise typer.Exit(code=1)
+
+    data = resp.json()
+    typer.echo("Sugerencias recalculadas:")
+    typer.echo(f"  usuarios    : {data.get('users')}")
+    typer.echo(f"  candidatos  : {data.get('candidates')}")
+
+
+
+@app.command("reconcile-counters")
+def reconcile_counters(
+    username: Optional[str] = typer.Option(
+        None, "--username", "-u", help="Solo este usuario (por defecto: todos)"
+    ),
+):
+    """
+    Recalcula los contadores de followers, seguidos y posts usando
+    POST /admin/counters/reconcile
+    """
+    params = {"username": username} if username else {}
+    try:
+        resp = requests.post(f"{API_URL}/admin/counters/reconcile", params=params)
+    except Exception as e:
+        typer.echo(f"[ERROR] No se pudo conectar a la API: {e}")
+        raise typer.Exit(code=1)
+
+    if resp.status_code != 200:
+        typer.echo(f"[ERROR] La API respondió {resp.status_code}:")
+        typer.echo(resp.text)
+        raise typer.Exit(code=1)
+
+    data = resp.json()
+    typer.echo("Contadores reconciliados:")
+    typer.echo(f"  usuarios    : {data.get('users')}")
+    typer.echo(f"  corregidos  : {data.get('fixed')}")
+
+
+@app.command("reconcile-likes")
+def reconcile_likes():
+    """
+    Pasa a Redis los likes escritos solo en MongoDB (Redis caído) usando
+    POST /admin/likes/reconcile
+    """
+    try:
+        resp = requests.post(f"{API_URL}/admin/likes/reconcile")
+    except Exception as e:
+        typer.echo(f"[ERROR] No se pudo conectar a la API: {e}")
+        raise typer.Exit(code=1)
+
+    if resp.status_code != 200:
+        typer.echo(f"[ERROR] La API respondió {resp.status_code}:")
+        typer.echo(resp.text)
+        raise typer.Exit(code=1)
+
+    data = resp.json()
+    typer.echo("Likes del respaldo reconciliados:")
+    typer.echo(f"  posts       : {data.get('posts')}")
+    typer.echo(f"  corregidos  : {data.get('fixed')}")
+    typer.echo(f"  pendientes  : {data.get('deferred')}")
+
+
+@app.command("rebalance-trending")
+def rebalance_trending(
+    shards: Optional[int] = typer.Option(
+        None, "--shards", "-s", help="Número de shards (por defecto TRENDING_SHARDS de la API)"
+    ),
+):
+    """
+    Reparte el trending entre shards usando POST /admin/trending/rebalance
+    """
+    params = {"shards": shards} if shards else {}
+    try:
+        resp = requests.post(f"{API_URL}/admin/trending/rebalance", params=params)
+    except Exception as e:
+        typer.echo(f"[ERROR] No se pudo conectar a la API: {e}")
+        raise typer.Exit(code=1)
+
+    if resp.status_code != 200:
+        typer.echo(f"[ERROR] La API respondió {resp.status_code}:")
+        typer.echo(resp.text)
+        raise typer.Exit(code=1)
+
+    data = resp.json()
+    typer.echo(f"Trending repartido en {data.get('shards')} shards:")
+    typer.echo(f"  keys revisadas    : {data.get('keys_scanned')}")
+    typer.echo(f"  entradas movidas  : {data.get('entries_moved')}")
+    typer.echo(f"  cachés borradas   : {data.get('caches_dropped')}")
+    sizes = data.get("posts_per_shard") or []
+    if sizes:
+        typer.echo(f"  posts por shard   : {sizes} (min {min(sizes)}, max {max(sizes)})")
+
+
+@app.command("bootstrap-schema")
+def bootstrap_schema(
+    force: bool = typer.Option(
+        False, "--force", "-f", help="Reaplicar aunque la versión ya esté al día"
+    ),
+):
+    """
+    Crea índices (MongoDB) y constraints (Neo4j) usando POST /admin/schema/bootstrap
+    """
+    params = {"force": "true"} if force else {}
+    try:
+        resp = requests.post(f"{API_URL}/admin/schema/bootstrap", params=params)
+    except Exception as e:
+        typer.echo(f"[ERROR] No se pudo conectar a la API: {e}")
+        raise typer.Exit(code=1)
+
+    if resp.status_code != 200:
+        typer.echo(f"[ERROR] La API respondió {resp.status_code}:")
+        typer.echo(resp.text)
+        raise typer.Exit(code=1)
+
+    data = resp.json()
+    typer.echo(f"Esquema v{data.get('version')}:")
+    failed = False
+    for backend in ("mongo", "neo4j"):
+        info = data.get(backend) or {}
+        typer.echo(f"  {backend:<6}: {info.get('status')} (v{info.get('version')})")
+        for name in info.get("applied", []):
+            typer.echo(f"    + {name}")
+        for err in info.get("errors", []):
+            failed = True
+            typer.echo(f"    ! {err.get('index') or err.get('constraint') or ''} {err.get('error')}")
+    if failed:
+        raise typer.Exit(code=1)
+
+
+@app.command("check-schema")
+def check_schema():
+    """
+    Revisa los planes de las consultas calientes usando GET /admin/schema/check.
+    Sale con código 1 si alguna sigue recorriendo la colección/etiqueta completa.
+    """
+    try:
+        resp = requests.get(f"{API_URL}/admin/schema/check")
+    except Exception as e:
+        typer.echo(f"[ERROR] No se pudo conectar a la API: {e}")
+        raise typer.Exit(code=1)
+
+    if resp.status_code != 200:
+        typer.echo(f"[ERROR] La API respondió {resp.status_code}:")
+        typer.echo(resp.text)
+        raise typer.Exit(code=1)
+
+    data = resp.json()
+    typer.echo(f"Esquema v{data.get('version')} (aplicado: {data.get('applied_versions')})")
+    for backend in ("mongo", "neo4j"):
+        typer.echo(f"{backend}:")
+        for item in data.get(backend, []):
+            mark = "ok  " if item.get("ok") else "SCAN"
+            detail = item.get("error") or item.get("plan")
+            typer.echo(f"  [{mark}] {item.get('query'):<20} {detail}")
+
+    scans = data.get("scans", [])
+    if scans:
+        typer.echo(f"Consultas sin índice: {', '.join(scans)}")
+        raise typer.Exit(code=1)
+    typer.echo("Todas las consultas usan índice.")
+
+
 if __name__ == "__main__":
     app()
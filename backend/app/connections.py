@@ -0,0 +1,448 @@
+"""
+Connection Manager para Red K
+Mantiene clientes compartidos (pooled) de MongoDB, Redis y Neo4j por proceso.
+
+Cada worker de uvicorn crea su propio ConnectionManager: se abre en el
+lifespan de FastAPI (startup) y se cierra al apagar el proceso (shutdown).
+Los endpoints lo reciben por inyección de dependencias (`Depends(get_connections)`)
+en lugar de construir un cliente nuevo en cada request.
+"""
+
+import os
+import threading
+import logging
+from typing import Optional, Dict, Any
+
+import redis
+import redis.asyncio as aioredis
+from pymongo import MongoClient, AsyncMongoClient, monitoring
+from neo4j import GraphDatabase, AsyncGraphDatabase
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+class _MongoPoolCounter(monitoring.ConnectionPoolListener):
+    """Listener de PyMongo que lleva la cuenta de conexiones del pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.created = 0
+        self.closed = 0
+        self.checked_out = 0
+        self.checkout_failures = 0
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.created += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.closed += 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checked_out += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "open": self.created - self.closed,
+                "in_use": self.checked_out,
+                "created_total": self.created,
+                "checkout_failures": self.checkout_failures,
+            }
+
+
+class ConnectionManager:
+    """
+    Gestor de conexiones compartidas con:
+    - Pool de MongoDB (maxPoolSize / minPoolSize)
+    - Pool bloqueante de Redis (max_connections + timeout de espera)
+    - Driver único de Neo4j (max_connection_pool_size)
+    - Warm-up opcional al arrancar
+    - Estadísticas de los pools para observabilidad
+    """
+
+    def __init__(
+        self,
+        mongo_uri: str,
+        mongo_db_name: str,
+        redis_url: str,
+        neo4j_uri: str,
+        neo4j_user: str,
+        neo4j_password: str,
+        mongo_max_pool_size: int = 50,
+        mongo_min_pool_size: int = 5,
+        mongo_server_selection_timeout_ms: int = 5000,
+        redis_max_connections: int = 50,
+        redis_pool_timeout: int = 5,
+        neo4j_max_pool_size: int = 50,
+        warmup: bool = True,
+        warmup_connections: int = 5,
+    ):
+        self.mongo_uri = mongo_uri
+        self.mongo_db_name = mongo_db_name
+        self.redis_url = redis_url
+        self.neo4j_uri = neo4j_uri
+        self.neo4j_auth = (neo4j_user, neo4j_password)
+
+        self.mongo_max_pool_size = mongo_max_pool_size
+        self.mongo_min_pool_size = mongo_min_pool_size
+        self.mongo_server_selection_timeout_ms = mongo_server_selection_timeout_ms
+        self.redis_max_connections = redis_max_connections
+        self.redis_pool_timeout = redis_pool_timeout
+        self.neo4j_max_pool_size = neo4j_max_pool_size
+        self.warmup_enabled = warmup
+        self.warmup_connections = warmup_connections
+
+        self._lock = threading.Lock()
+        self._started = False
+        self._mongo_client: Optional[MongoClient] = None
+        self._mongo_counter = _MongoPoolCounter()
+        self._redis_pool: Optional[redis.BlockingConnectionPool] = None
+        self._redis_client: Optional[redis.Redis] = None
+        self._neo4j_driver = None
+
+    @classmethod
+    def from_env(cls) -> "ConnectionManager":
+        """Construir el gestor a partir de variables de entorno"""
+        return cls(
+            mongo_uri=os.getenv("MONGO_URI", "mongodb://127.0.0.1:27017/red_k"),
+            mongo_db_name=os.getenv("MONGO_DB_NAME", "red_k"),
+            redis_url=os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0"),
+            neo4j_uri=os.getenv("NEO4J_URI", "bolt://127.0.0.1:7687"),
+            neo4j_user=os.getenv("NEO4J_USER", "neo4j"),
+            neo4j_password=os.getenv("NEO4J_PASSWORD", "password123"),
+            mongo_max_pool_size=_env_int("MONGO_MAX_POOL_SIZE", 50),
+            mongo_min_pool_size=_env_int("MONGO_MIN_POOL_SIZE", 5),
+            mongo_server_selection_timeout_ms=_env_int("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000),
+            redis_max_connections=_env_int("REDIS_MAX_CONNECTIONS", 50),
+            redis_pool_timeout=_env_int("REDIS_POOL_TIMEOUT", 5),
+            neo4j_max_pool_size=_env_int("NEO4J_MAX_POOL_SIZE", 50),
+            warmup=_env_bool("POOL_WARMUP", True),
+            warmup_connections=_env_int("POOL_WARMUP_CONNECTIONS", 5),
+        )
+
+    # ========== CICLO DE VIDA ==========
+
+    def start(self):
+        """
+        Crear los clientes (idempotente).
+
+        Se llama desde el lifespan de FastAPI; si algo accede a un cliente
+        antes (CLI, scripts), se arranca de forma perezosa.
+        """
+        with self._lock:
+            if self._started:
+                return
+
+            self._mongo_client = MongoClient(
+                self.mongo_uri,
+                maxPoolSize=self.mongo_max_pool_size,
+                minPoolSize=self.mongo_min_pool_size,
+                serverSelectionTimeoutMS=self.mongo_server_selection_timeout_ms,
+                event_listeners=[self._mongo_counter],
+            )
+
+            self._redis_pool = redis.BlockingConnectionPool.from_url(
+                self.redis_url,
+                max_connections=self.redis_max_connections,
+                timeout=self.redis_pool_timeout,
+                socket_connect_timeout=self.redis_pool_timeout,
+            )
+            self._redis_client = redis.Redis(connection_pool=self._redis_pool)
+
+            self._neo4j_driver = GraphDatabase.driver(
+                self.neo4j_uri,
+                auth=self.neo4j_auth,
+                max_connection_pool_size=self.neo4j_max_pool_size,
+            )
+
+            self._started = True
+            logger.info(
+                "✓ Pools creados (mongo=%s, redis=%s, neo4j=%s)",
+                self.mongo_max_pool_size,
+                self.redis_max_connections,
+                self.neo4j_max_pool_size,
+            )
+
+        if self.warmup_enabled:
+            self.warmup()
+
+    def warmup(self):
+        """
+        Abrir conexiones por adelantado para que los primeros requests
+        no paguen TCP + handshake + auth. Los fallos no son críticos:
+        el servicio puede arrancar con alguna base caída (modo degradado).
+        """
+        try:
+            self.mongo_client.admin.command("ping")
+        except Exception as e:
+            logger.warning(f"Warm-up de MongoDB falló (no crítico): {e}")
+
+        try:
+            # Sacar N conexiones a la vez obliga al pool a crearlas
+            conns = []
+            for _ in range(min(self.warmup_connections, self.redis_max_connections)):
+                conn = self._redis_pool.get_connection("PING")
+                conns.append(conn)
+            for conn in conns:
+                conn.send_command("PING")
+                conn.read_response()
+            for conn in conns:
+                self._redis_pool.release(conn)
+        except Exception as e:
+            logger.warning(f"Warm-up de Redis falló (no crítico): {e}")
+
+        try:
+            self.neo4j_driver.verify_connectivity()
+        except Exception as e:
+            logger.warning(f"Warm-up de Neo4j falló (no crítico): {e}")
+
+    def close(self):
+        """Cerrar todos los clientes (shutdown del worker)"""
+        with self._lock:
+            if not self._started:
+                return
+            try:
+                self._mongo_client.close()
+            except Exception as e:
+                logger.warning(f"Error al cerrar MongoDB: {e}")
+            try:
+                self._redis_pool.disconnect()
+            except Exception as e:
+                logger.warning(f"Error al cerrar Redis: {e}")
+            try:
+                self._neo4j_driver.close()
+            except Exception as e:
+                logger.warning(f"Error al cerrar Neo4j: {e}")
+
+            self._mongo_client = None
+            self._redis_pool = None
+            self._redis_client = None
+            self._neo4j_driver = None
+            self._mongo_counter = _MongoPoolCounter()
+            self._started = False
+            logger.info("✓ Pools cerrados")
+
+    # ========== CLIENTES ==========
+
+    @property
+    def mongo_client(self) -> MongoClient:
+        if not self._started:
+            self.start()
+        return self._mongo_client
+
+    def mongo_db(self):
+        """Base de datos principal de MongoDB"""
+        return self.mongo_client.get_database(self.mongo_db_name)
+
+    @property
+    def redis(self) -> redis.Redis:
+        if not self._started:
+            self.start()
+        return self._redis_client
+
+    @property
+    def neo4j_driver(self):
+        if not self._started:
+            self.start()
+        return self._neo4j_driver
+
+    # ========== STATS ==========
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Estadísticas de los pools (por proceso)"""
+        stats: Dict[str, Any] = {
+            "pid": os.getpid(),
+            "started": self._started,
+            "mongo": {"max_pool_size": self.mongo_max_pool_size,
+                      "min_pool_size": self.mongo_min_pool_size},
+            "redis": {"max_connections": self.redis_max_connections},
+            "neo4j": {"max_pool_size": self.neo4j_max_pool_size},
+        }
+        if not self._started:
+            return stats
+
+        stats["mongo"].update(self._mongo_counter.snapshot())
+
+        pool = self._redis_pool
+        try:
+            # Atributos internos de redis-py (BlockingConnectionPool)
+            created = len(pool._connections)
+            idle = sum(1 for c in list(pool.pool.queue) if c is not None)
+            stats["redis"].update({
+                "open": created,
+                "idle": idle,
+                "in_use": created - idle,
+            })
+        except Exception as e:
+            stats["redis"]["error"] = str(e)
+
+        return stats
+
+
+class AsyncConnectionManager:
+    """
+    Versión asyncio del gestor (modo ASYNC_API):
+    - AsyncMongoClient de PyMongo
+    - redis.asyncio con pool bloqueante
+    - AsyncDriver de Neo4j
+
+    Reutiliza la configuración de un ConnectionManager para que ambos modos
+    respeten los mismos tamaños de pool. Los clientes pertenecen al event loop
+    en el que se crean, por eso start()/close() se llaman desde el lifespan.
+    """
+
+    def __init__(self, config: ConnectionManager):
+        self.config = config
+        self._started = False
+        self._mongo_client: Optional[AsyncMongoClient] = None
+        self._redis_pool: Optional[aioredis.BlockingConnectionPool] = None
+        self._redis_client: Optional[aioredis.Redis] = None
+        self._neo4j_driver = None
+
+    async def start(self):
+        """Crear los clientes async (idempotente)"""
+        if self._started:
+            return
+        cfg = self.config
+
+        self._mongo_client = AsyncMongoClient(
+            cfg.mongo_uri,
+            maxPoolSize=cfg.mongo_max_pool_size,
+            minPoolSize=cfg.mongo_min_pool_size,
+            serverSelectionTimeoutMS=cfg.mongo_server_selection_timeout_ms,
+        )
+        self._redis_pool = aioredis.BlockingConnectionPool.from_url(
+            cfg.redis_url,
+            max_connections=cfg.redis_max_connections,
+            timeout=cfg.redis_pool_timeout,
+            socket_connect_timeout=cfg.redis_pool_timeout,
+        )
+        self._redis_client = aioredis.Redis(connection_pool=self._redis_pool)
+        self._neo4j_driver = AsyncGraphDatabase.driver(
+            cfg.neo4j_uri,
+            auth=cfg.neo4j_auth,
+            max_connection_pool_size=cfg.neo4j_max_pool_size,
+        )
+        self._started = True
+        logger.info("✓ Pools async creados")
+
+        if cfg.warmup_enabled:
+            await self.warmup()
+
+    async def warmup(self):
+        """Warm-up no crítico, igual que en el gestor síncrono"""
+        try:
+            await self._mongo_client.admin.command("ping")
+        except Exception as e:
+            logger.warning(f"Warm-up async de MongoDB falló (no crítico): {e}")
+        try:
+            await self._redis_client.ping()
+        except Exception as e:
+            logger.warning(f"Warm-up async de Redis falló (no crítico): {e}")
+        try:
+            await self._neo4j_driver.verify_connectivity()
+        except Exception as e:
+            logger.warning(f"Warm-up async de Neo4j falló (no crítico): {e}")
+
+    async def close(self):
+        """Cerrar los clientes async"""
+        if not self._started:
+            return
+        try:
+            await self._mongo_client.close()
+        except Exception as e:
+            logger.warning(f"Error al cerrar MongoDB async: {e}")
+        try:
+            await self._redis_pool.disconnect()
+        except Exception as e:
+            logger.warning(f"Error al cerrar Redis async: {e}")
+        try:
+            await self._neo4j_driver.close()
+        except Exception as e:
+            logger.warning(f"Error al cerrar Neo4j async: {e}")
+        self._mongo_client = None
+        self._redis_pool = None
+        self._redis_client = None
+        self._neo4j_driver = None
+        self._started = False
+        logger.info("✓ Pools async cerrados")
+
+    def mongo_db(self):
+        return self._mongo_client.get_database(self.config.mongo_db_name)
+
+    @property
+    def redis(self) -> aioredis.Redis:
+        return self._redis_client
+
+    @property
+    def neo4j_driver(self):
+        return self._neo4j_driver
+
+    def pool_stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {"started": self._started}
+        if not self._started:
+            return stats
+        pool = self._redis_pool
+        try:
+            # Atributos internos de redis.asyncio (BlockingConnectionPool)
+            idle = len(pool._available_connections)
+            in_use = len(pool._in_use_connections)
+            stats["redis"] = {"open": idle + in_use, "idle": idle, "in_use": in_use}
+        except Exception as e:
+            stats["redis"] = {"error": str(e)}
+        return stats
+
+
+# Instancias por proceso (singleton); el lifespan llama start()/close()
+connection_manager = ConnectionManager.from_env()
+async_connection_manager = AsyncConnectionManager(connection_manager)
+
+
+def get_connections() -> ConnectionManager:
+    """Dependencia de FastAPI que entrega el gestor de conexiones del proceso"""
+    return connection_manager
+
+
+def get_async_connections() -> AsyncConnectionManager:
+    """Dependencia de FastAPI para los endpoints async"""
+    return async_connection_manager
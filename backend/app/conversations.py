@@ -0,0 +1,345 @@
+"""
+Resúmenes de conversaciones de DMs para Red K.
+
+Cada usuario tiene un documento por conversación en `dm_conversations`,
+mantenido de forma incremental:
+
+    {owner, with_username, conversation_key,
+     last_message_content, last_message_at, last_sender_username, unread_count,
+     last_read_at, read_marked_at}
+
+- send_dm: un bulk_write con dos upserts (el del que envía y el del que recibe;
+  solo al receptor se le suma 1 a unread_count)
+- Leer: la marca de lectura (`last_read_at`, el created_at del mensaje más
+  nuevo que `owner` ya vio) avanza con un solo update condicional, y solo si
+  avanza; unread_count baja en los mensajes que quedaron detrás de la marca
+  (nunca se reescribe con un conteo, así no se pierde el $inc de un DM
+  simultáneo). Los mensajes no se tocan
+
+Un mensaje está leído si su created_at es <= la marca de su receptor (o si
+tiene `read: True`, de antes de las marcas); `read_at` es `read_marked_at`,
+cuándo se movió la marca por última vez.
+
+Listar conversaciones es una lectura por el índice (owner, last_message_at, _id)
+con paginación por cursor, en vez de recorrer todos los DMs del usuario.
+
+Los usuarios con DMs anteriores a esta colección se migran solos: la primera
+vez que listan sus conversaciones se arman sus resúmenes desde `dms` y se
+marca `dm_summaries_ready` en su documento de `users`.
+"""
+
+from typing import Dict, List, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+
+from app.schemas import DMConversationSummary
+
+CONVERSATIONS_COLLECTION = "dm_conversations"
+SUMMARIES_READY_FIELD = "dm_summaries_ready"
+
+
+# ========== ESCRITURA INCREMENTAL ==========
+
+def _message_updates(sender: str, receiver: str, conversation_key: str,
+                     content: str, created_at: str) -> List[UpdateOne]:
+    last = {
+        "conversation_key": conversation_key,
+        "last_message_content": content,
+        "last_message_at": created_at,
+        "last_sender_username": sender,
+    }
+    updates = [
+        UpdateOne(
+            {"owner": receiver, "with_username": sender},
+            {"$set": last, "$inc": {"unread_count": 1}},
+            upsert=True,
+        )
+    ]
+    if sender != receiver:
+        updates.append(
+            UpdateOne(
+                {"owner": sender, "with_username": receiver},
+                {"$set": last, "$setOnInsert": {"unread_count": 0}},
+                upsert=True,
+            )
+        )
+    return updates
+
+
+def record_message(db, sender: str, receiver: str, conversation_key: str, content: str, created_at: str):
+    """Actualizar el resumen de los dos participantes tras un DM nuevo"""
+    db[CONVERSATIONS_COLLECTION].bulk_write(
+        _message_updates(sender, receiver, conversation_key, content, created_at), ordered=False
+    )
+
+
+async def record_message_async(db, sender: str, receiver: str, conversation_key: str, content: str, created_at: str):
+    await db[CONVERSATIONS_COLLECTION].bulk_write(
+        _message_updates(sender, receiver, conversation_key, content, created_at), ordered=False
+    )
+
+
+# ========== MARCAS DE LECTURA ==========
+
+def _pair_filter(username: str, other: str) -> Dict:
+    return {"$or": [
+        {"owner": username, "with_username": other},
+        {"owner": other, "with_username": username},
+    ]}
+
+
+def _watermarks(docs: List[Dict]) -> Dict[str, Dict]:
+    return {
+        doc["owner"]: {"last_read_at": doc.get("last_read_at"), "read_marked_at": doc.get("read_marked_at")}
+        for doc in docs
+    }
+
+
+_WATERMARK_FIELDS = {"owner": 1, "last_read_at": 1, "read_marked_at": 1}
+
+
+def get_watermarks(db, username: str, other: str) -> Dict[str, Dict]:
+    """Marca de lectura de cada participante (owner → {last_read_at, read_marked_at})"""
+    return _watermarks(list(db[CONVERSATIONS_COLLECTION].find(_pair_filter(username, other), _WATERMARK_FIELDS)))
+
+
+async def get_watermarks_async(db, username: str, other: str) -> Dict[str, Dict]:
+    cursor = db[CONVERSATIONS_COLLECTION].find(_pair_filter(username, other), _WATERMARK_FIELDS)
+    return _watermarks(await cursor.to_list(length=None))
+
+
+def apply_watermarks(messages: List[Dict], watermarks: Dict[str, Dict]) -> List[Dict]:
+    """Completar `read` / `read_at` de cada mensaje con la marca de su receptor"""
+    for m in messages:
+        if m.get("read"):
+            continue  # leído con el flag de antes de las marcas
+        mark = watermarks.get(m["receiver_username"]) or {}
+        if mark.get("last_read_at") and m["created_at"] <= mark["last_read_at"]:
+            m["read"] = True
+            m["read_at"] = mark.get("read_marked_at")
+    return messages
+
+
+def _advance_filter(owner: str, other: str, up_to: str) -> Dict:
+    return {
+        "owner": owner,
+        "with_username": other,
+        "$or": [{"last_read_at": {"$lt": up_to}}, {"last_read_at": None}],
+    }
+
+
+def _advance_update(up_to: str, now: str) -> Dict:
+    return {"$set": {"last_read_at": up_to, "read_marked_at": now}}
+
+
+def _newly_read_filter(conversation_key: str, owner: str, previous: Optional[str], up_to: str) -> Dict:
+    """Entrantes que pasan a leídos al mover la marca de `previous` a `up_to`"""
+    created_at = {"$lte": up_to}
+    if previous:
+        created_at["$gt"] = previous
+    return {
+        "conversation_key": conversation_key,
+        "receiver_username": owner,
+        "created_at": created_at,
+        "read": {"$ne": True},  # los leídos con el flag viejo nunca sumaron
+    }
+
+
+def _decrement_unread(seen: int) -> List[Dict]:
+    # Relativo y sin bajar de 0: un $inc de un DM simultáneo no se pisa
+    return [{"$set": {"unread_count": {"$max": [0, {"$subtract": [{"$ifNull": ["$unread_count", 0]}, seen]}]}}}]
+
+
+def _insert_mark(conversation_key: str, up_to: str, now: str) -> Dict:
+    # Conversación sin resumen (DMs de antes de la colección): la migración lo completa
+    return {
+        "$max": {"last_read_at": up_to},
+        "$setOnInsert": {"conversation_key": conversation_key, "read_marked_at": now, "unread_count": 0},
+    }
+
+
+def mark_read(db, owner: str, other: str, conversation_key: str, up_to: str, now: str) -> bool:
+    """
+    `owner` vio la conversación hasta `up_to` (created_at de un mensaje).
+
+    La marca se mueve con un solo find_one_and_update condicional (solo hacia
+    adelante) que devuelve la marca anterior; unread_count baja en los
+    entrantes entre las dos marcas, con un update relativo. Dos lecturas
+    simultáneas mueven intervalos disjuntos y un DM que llega en el medio
+    conserva su $inc. Devuelve True si la marca avanzó.
+    """
+    col = db[CONVERSATIONS_COLLECTION]
+    before = col.find_one_and_update(
+        _advance_filter(owner, other, up_to),
+        _advance_update(up_to, now),
+        projection={"last_read_at": 1},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if before is None:
+        # Ya al día (no-op) o sin resumen todavía (se crea)
+        col.update_one(
+            {"owner": owner, "with_username": other},
+            _insert_mark(conversation_key, up_to, now),
+            upsert=True,
+        )
+        return False
+    seen = db["dms"].count_documents(_newly_read_filter(conversation_key, owner, before.get("last_read_at"), up_to))
+    if seen:
+        col.update_one({"_id": before["_id"]}, _decrement_unread(seen))
+    return True
+
+
+async def mark_read_async(db, owner: str, other: str, conversation_key: str, up_to: str, now: str) -> bool:
+    col = db[CONVERSATIONS_COLLECTION]
+    before = await col.find_one_and_update(
+        _advance_filter(owner, other, up_to),
+        _advance_update(up_to, now),
+        projection={"last_read_at": 1},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if before is None:
+        await col.update_one(
+            {"owner": owner, "with_username": other},
+            _insert_mark(conversation_key, up_to, now),
+            upsert=True,
+        )
+        return False
+    seen = await db["dms"].count_documents(
+        _newly_read_filter(conversation_key, owner, before.get("last_read_at"), up_to)
+    )
+    if seen:
+        await col.update_one({"_id": before["_id"]}, _decrement_unread(seen))
+    return True
+
+
+# ========== MIGRACIÓN DESDE `dms` ==========
+
+def _rebuild_pipeline(username: str) -> List[Dict]:
+    incoming = {"$eq": ["$receiver_username", username]}
+    return [
+        {"$match": {"$or": [{"sender_username": username}, {"receiver_username": username}]}},
+        {"$sort": {"created_at": 1, "_id": 1}},
+        {"$group": {
+            "_id": "$conversation_key",
+            "last_message_content": {"$last": "$content"},
+            "last_message_at": {"$last": "$created_at"},
+            "last_sender_username": {"$last": "$sender_username"},
+            # Lecturas de antes de las marcas: el flag `read` de cada mensaje
+            "flag_unread": {"$sum": {"$cond": [{"$and": [incoming, {"$eq": ["$read", False]}]}, 1, 0]}},
+            "flag_read_at": {"$max": {"$cond": [{"$and": [incoming, {"$eq": ["$read", True]}]}, "$created_at", None]}},
+        }},
+    ]
+
+
+def _unread_after_pipeline(username: str, marks: Dict[str, str]) -> List[Dict]:
+    """No leídos por conversación cuando ya hay marca: entrantes después de la marca"""
+    return [
+        {"$match": {
+            "receiver_username": username,
+            "$or": [{"conversation_key": key, "created_at": {"$gt": mark}} for key, mark in marks.items()],
+        }},
+        {"$group": {"_id": "$conversation_key", "unread": {"$sum": 1}}},
+    ]
+
+
+def pair_key(username: str, other: str) -> str:
+    """Clave de la conversación entre dos usuarios (ordenada alfabéticamente)"""
+    u1, u2 = sorted([username, other])
+    return f"{u1}::{u2}"
+
+
+def _other(conversation_key: str, username: str) -> str:
+    u1, _, u2 = conversation_key.partition("::")
+    return u2 if u1 == username else u1
+
+
+def _rebuild_marks(username: str, groups: List[Dict], existing: Dict[str, Optional[str]]) -> Dict[str, str]:
+    """conversation_key → marca de lectura (la guardada o la que dejan los flags, la mayor)"""
+    marks = {}
+    for group in groups:
+        candidates = [m for m in (existing.get(_other(group["_id"], username)), group.get("flag_read_at")) if m]
+        if candidates:
+            marks[group["_id"]] = max(candidates)
+    return marks
+
+
+def _rebuild_writes(username: str, groups: List[Dict], existing: Dict[str, Optional[str]],
+                    marks: Dict[str, str], unread_after: Dict[str, int]) -> List[UpdateOne]:
+    writes = []
+    for group in groups:
+        conversation_key = group["_id"]
+        other = _other(conversation_key, username)
+        # Sin marca guardada los flags alcanzan; con marca, lo entrante después de ella
+        if existing.get(other):
+            unread = unread_after.get(conversation_key, 0)
+        else:
+            unread = group["flag_unread"]
+        update = {"$set": {
+            "conversation_key": conversation_key,
+            "last_message_content": group["last_message_content"],
+            "last_message_at": group["last_message_at"],
+            "last_sender_username": group["last_sender_username"],
+            "unread_count": unread,
+        }}
+        if conversation_key in marks:
+            update["$max"] = {"last_read_at": marks[conversation_key]}
+        writes.append(UpdateOne({"owner": username, "with_username": other}, update, upsert=True))
+    return writes
+
+
+def rebuild_user(db, username: str) -> int:
+    """Rearmar los resúmenes de `username` desde `dms`; devuelve cuántos quedaron"""
+    groups = [g for g in db["dms"].aggregate(_rebuild_pipeline(username)) if g["_id"]]
+    existing = {
+        doc["with_username"]: doc.get("last_read_at")
+        for doc in db[CONVERSATIONS_COLLECTION].find({"owner": username}, {"with_username": 1, "last_read_at": 1})
+    }
+    marks = _rebuild_marks(username, groups, existing)
+    with_mark = {key: mark for key, mark in marks.items() if existing.get(_other(key, username))}
+    unread_after = {}
+    if with_mark:
+        unread_after = {
+            g["_id"]: g["unread"] for g in db["dms"].aggregate(_unread_after_pipeline(username, with_mark))
+        }
+
+    writes = _rebuild_writes(username, groups, existing, marks, unread_after)
+    if writes:
+        db[CONVERSATIONS_COLLECTION].bulk_write(writes, ordered=False)
+    db["users"].update_one({"username": username}, {"$set": {SUMMARIES_READY_FIELD: True}})
+    return len(writes)
+
+
+async def rebuild_user_async(db, username: str) -> int:
+    cursor = await db["dms"].aggregate(_rebuild_pipeline(username))
+    groups = [g for g in await cursor.to_list(length=None) if g["_id"]]
+    existing = {
+        doc["with_username"]: doc.get("last_read_at")
+        async for doc in db[CONVERSATIONS_COLLECTION].find({"owner": username}, {"with_username": 1, "last_read_at": 1})
+    }
+    marks = _rebuild_marks(username, groups, existing)
+    with_mark = {key: mark for key, mark in marks.items() if existing.get(_other(key, username))}
+    unread_after = {}
+    if with_mark:
+        cursor = await db["dms"].aggregate(_unread_after_pipeline(username, with_mark))
+        unread_after = {g["_id"]: g["unread"] for g in await cursor.to_list(length=None)}
+
+    writes = _rebuild_writes(username, groups, existing, marks, unread_after)
+    if writes:
+        await db[CONVERSATIONS_COLLECTION].bulk_write(writes, ordered=False)
+    await db["users"].update_one({"username": username}, {"$set": {SUMMARIES_READY_FIELD: True}})
+    return len(writes)
+
+
+# ========== LECTURA ==========
+
+def to_summary(doc: Dict) -> DMConversationSummary:
+    return DMConversationSummary(
+        with_username=doc["with_username"],
+        last_message_content=doc.get("last_message_content") or "",
+        last_message_at=doc.get("last_message_at") or "",
+        unread_count=max(doc.get("unread_count", 0), 0),
+    )
+
+
+def is_ready(user_doc: Optional[Dict]) -> bool:
+    return bool(user_doc and user_doc.get(SUMMARIES_READY_FIELD))
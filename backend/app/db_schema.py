@@ -0,0 +1,326 @@
+"""
+Índices y constraints de MongoDB y Neo4j para Red K.
+
+Las definiciones viven aquí en vez de crearse a mano desde mongosh / el
+browser de Neo4j. `bootstrap` es idempotente y versionado:
+
+- Cada índice / constraint lleva la versión de esquema en que se agregó
+- La versión aplicada de cada base se guarda en la colección `schema_versions`
+  de MongoDB ({"_id": "mongo" | "neo4j", "version": N, "applied_at": ...})
+- Si la versión guardada ya es SCHEMA_VERSION no se toca nada (arrancar un
+  worker cuesta un find_one); con `force=True` se reaplica todo, lo que es
+  seguro porque create_index e IF NOT EXISTS no hacen nada si ya existen
+
+`check` corre explain() / PROFILE sobre las consultas más frecuentes de la API
+y reporta las que siguen recorriendo la colección o la etiqueta completa.
+
+Se ejecuta al arrancar (SCHEMA_BOOTSTRAP=true), con POST /admin/schema/bootstrap
+o con `cli bootstrap-schema`.
+"""
+
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.connections import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+# Subir cuando se agregue un índice o constraint nuevo (con since=versión nueva)
+SCHEMA_VERSION = 4
+
+SCHEMA_BOOTSTRAP = os.getenv("SCHEMA_BOOTSTRAP", "true").lower() in ("1", "true", "yes")
+
+SCHEMA_VERSIONS_COLLECTION = "schema_versions"
+
+# (colección, nombre, keys, unique, since)
+MONGO_INDEXES: List[Tuple[str, str, List[Tuple[str, int]], bool, int]] = [
+    ("users", "username_unique", [("username", 1)], True, 1),
+    # Feed por autor + paginación por cursor sobre (created_at, _id)
+    ("posts", "author_created_at", [("author_username", 1), ("created_at", -1), ("_id", -1)], False, 1),
+    # Historial de una conversación (paginación por cursor)
+    ("dms", "conversation_created_at", [("conversation_key", 1), ("created_at", 1), ("_id", 1)], False, 1),
+    # Mensajes no leídos de un usuario
+    ("dms", "receiver_read", [("receiver_username", 1), ("read", 1)], False, 1),
+    # Un like por usuario y post; el prefijo post_id atiende los conteos
+    ("likes", "post_username_unique", [("post_id", 1), ("username", 1)], True, 1),
+    # Fallback de follows cuando Neo4j no está disponible
+    ("follows", "follower_following", [("follower", 1), ("following", 1)], False, 1),
+    ("follows", "following", [("following", 1)], False, 1),
+    # Respaldo de trending por ventana sin Redis (app/trending.py)
+    ("likes", "created_at", [("created_at", -1)], False, 2),
+    # Resúmenes de conversaciones (app/conversations.py): lista por último mensaje
+    ("dm_conversations", "owner_with_unique", [("owner", 1), ("with_username", 1)], True, 3),
+    ("dm_conversations", "owner_last_message", [("owner", 1), ("last_message_at", -1), ("_id", -1)], False, 3),
+    # Junto con receiver_read, atiende el $or que arma los resúmenes de un usuario
+    ("dms", "sender", [("sender_username", 1)], False, 3),
+    # Likes escritos con Redis caído, pendientes de pasar a Redis (app/likes.py)
+    ("likes_fallback", "post_username_unique", [("post_id", 1), ("username", 1)], True, 4),
+]
+
+# (nombre, cypher, since)
+NEO4J_CONSTRAINTS: List[Tuple[str, str, int]] = [
+    (
+        "user_id_unique",
+        "CREATE CONSTRAINT user_id_unique IF NOT EXISTS FOR (u:User) REQUIRE u.id IS UNIQUE",
+        1,
+    ),
+    (
+        "user_username_unique",
+        "CREATE CONSTRAINT user_username_unique IF NOT EXISTS FOR (u:User) REQUIRE u.username IS UNIQUE",
+        1,
+    ),
+    (
+        "post_id_unique",
+        "CREATE CONSTRAINT post_id_unique IF NOT EXISTS FOR (p:Post) REQUIRE p.id IS UNIQUE",
+        1,
+    ),
+]
+
+# Consultas calientes que `check` revisa con explain(): (nombre, colección, filtro, sort)
+MONGO_HOT_QUERIES: List[Tuple[str, str, Dict[str, Any], Optional[List[Tuple[str, int]]]]] = [
+    ("users.by_username", "users", {"username": "__schema_check__"}, None),
+    (
+        "posts.feed",
+        "posts",
+        {"author_username": {"$in": ["__schema_check__"]}},
+        [("created_at", -1), ("_id", -1)],
+    ),
+    (
+        "dms.conversation",
+        "dms",
+        {"conversation_key": "__schema_check__::__schema_check__"},
+        [("created_at", 1), ("_id", 1)],
+    ),
+    ("dms.unread", "dms", {"receiver_username": "__schema_check__", "read": False}, None),
+    ("likes.by_user", "likes", {"post_id": "__schema_check__", "username": "__schema_check__"}, None),
+    ("likes.count", "likes", {"post_id": "__schema_check__"}, None),
+    ("follows.following", "follows", {"follower": "__schema_check__"}, None),
+    ("follows.followers", "follows", {"following": "__schema_check__"}, None),
+    ("likes.window", "likes", {"created_at": {"$gte": "9999-01-01T00:00:00"}}, None),
+    (
+        "dm_conversations.list",
+        "dm_conversations",
+        {"owner": "__schema_check__"},
+        [("last_message_at", -1), ("_id", -1)],
+    ),
+]
+
+# Consultas calientes que `check` revisa con PROFILE (solo lectura)
+NEO4J_HOT_QUERIES: List[Tuple[str, str]] = [
+    ("user.by_id", "MATCH (u:User {id: $value}) RETURN u"),
+    ("user.by_username", "MATCH (u:User {username: $value}) RETURN u"),
+    ("post.by_id", "MATCH (p:Post {id: $value}) RETURN p"),
+    (
+        "user.following",
+        "MATCH (u:User {username: $value})-[:FOLLOWS]->(f:User) RETURN f.username",
+    ),
+]
+
+# Operadores de Neo4j que recorren la etiqueta (o el grafo) completa
+_NEO4J_SCAN_OPERATORS = ("AllNodesScan", "NodeByLabelScan")
+
+
+# ========== VERSIONES ==========
+
+def _versions_col(conns: ConnectionManager):
+    return conns.mongo_db()[SCHEMA_VERSIONS_COLLECTION]
+
+
+def get_applied_versions(conns: ConnectionManager) -> Dict[str, int]:
+    """Versión aplicada en cada base (0 si nunca se corrió el bootstrap)"""
+    versions = {"mongo": 0, "neo4j": 0}
+    for doc in _versions_col(conns).find({"_id": {"$in": list(versions)}}):
+        versions[doc["_id"]] = int(doc.get("version", 0))
+    return versions
+
+
+def _record_version(conns: ConnectionManager, backend: str, version: int):
+    _versions_col(conns).update_one(
+        {"_id": backend},
+        {"$set": {"version": version, "applied_at": datetime.utcnow().isoformat()}},
+        upsert=True,
+    )
+
+
+# ========== BOOTSTRAP ==========
+
+def _apply_mongo(conns: ConnectionManager, since: int) -> Tuple[List[str], List[Dict[str, str]]]:
+    db = conns.mongo_db()
+    applied: List[str] = []
+    errors: List[Dict[str, str]] = []
+    for collection, name, keys, unique, added_in in MONGO_INDEXES:
+        if added_in <= since:
+            continue
+        try:
+            db[collection].create_index(keys, name=name, unique=unique)
+            applied.append(f"{collection}.{name}")
+        except Exception as e:
+            # p. ej. duplicados que impiden un índice único: se reporta y se sigue
+            logger.warning(f"No se pudo crear el índice {collection}.{name}: {e}")
+            errors.append({"index": f"{collection}.{name}", "error": str(e)})
+    return applied, errors
+
+
+def _apply_neo4j(conns: ConnectionManager, since: int) -> Tuple[List[str], List[Dict[str, str]]]:
+    applied: List[str] = []
+    errors: List[Dict[str, str]] = []
+    with conns.neo4j_driver.session() as session:
+        for name, cypher, added_in in NEO4J_CONSTRAINTS:
+            if added_in <= since:
+                continue
+            try:
+                session.run(cypher).consume()
+                applied.append(name)
+            except Exception as e:
+                logger.warning(f"No se pudo crear el constraint {name}: {e}")
+                errors.append({"constraint": name, "error": str(e)})
+    return applied, errors
+
+
+def bootstrap(conns: ConnectionManager, force: bool = False) -> Dict[str, Any]:
+    """
+    Crear los índices de MongoDB y los constraints de Neo4j que falten.
+
+    Args:
+        force: reaplicar todas las definiciones aunque la versión guardada
+               ya sea la actual (p. ej. si alguien borró un índice a mano)
+
+    Returns:
+        {"version", "mongo": {...}, "neo4j": {...}} con lo aplicado y los errores
+        de cada base. Una base solo registra la versión si no hubo errores.
+    """
+    versions = get_applied_versions(conns)
+    report: Dict[str, Any] = {"version": SCHEMA_VERSION}
+
+    for backend, apply in (("mongo", _apply_mongo), ("neo4j", _apply_neo4j)):
+        current = 0 if force else versions[backend]
+        if current >= SCHEMA_VERSION:
+            report[backend] = {"status": "up_to_date", "version": current, "applied": [], "errors": []}
+            continue
+        try:
+            applied, errors = apply(conns, current)
+        except Exception as e:
+            logger.warning(f"{backend} no disponible para el bootstrap de esquema: {e}")
+            report[backend] = {
+                "status": "unavailable",
+                "version": versions[backend],
+                "applied": [],
+                "errors": [{"error": str(e)}],
+            }
+            continue
+
+        if errors:
+            report[backend] = {"status": "partial", "version": versions[backend],
+                               "applied": applied, "errors": errors}
+        else:
+            _record_version(conns, backend, SCHEMA_VERSION)
+            report[backend] = {"status": "applied", "version": SCHEMA_VERSION,
+                               "applied": applied, "errors": []}
+
+    return report
+
+
+# ========== CHECK (explain / PROFILE) ==========
+
+def _mongo_plan_stages(plan: Dict[str, Any]) -> Iterable[Dict[str, Any]]:
+    """Recorrer el árbol de un winningPlan (inputStage / inputStages)"""
+    if not isinstance(plan, dict):
+        return
+    yield plan
+    # Mongo 7+ envuelve el plan clásico en queryPlan
+    for child_key in ("queryPlan", "inputStage"):
+        if child_key in plan:
+            yield from _mongo_plan_stages(plan[child_key])
+    for child in plan.get("inputStages", []):
+        yield from _mongo_plan_stages(child)
+
+
+def _check_mongo(conns: ConnectionManager) -> List[Dict[str, Any]]:
+    db = conns.mongo_db()
+    results = []
+    for name, collection, query, sort in MONGO_HOT_QUERIES:
+        cursor = db[collection].find(query).limit(20)
+        if sort:
+            cursor = cursor.sort(sort)
+        try:
+            winning = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+        except Exception as e:
+            results.append({"query": name, "ok": False, "error": str(e)})
+            continue
+
+        stages = list(_mongo_plan_stages(winning))
+        stage_names = [s.get("stage") for s in stages if s.get("stage")]
+        indexes = [s["indexName"] for s in stages if s.get("indexName")]
+        # Sin IXSCAN (COLLSCAN, o un plan de EOF por colección inexistente que
+        # tampoco demuestra que haya índice) se reporta como recorrido completo
+        scans = "COLLSCAN" in stage_names or "IXSCAN" not in stage_names
+        results.append({
+            "query": name,
+            "ok": not scans,
+            "plan": " <- ".join(stage_names),
+            "indexes": indexes,
+        })
+    return results
+
+
+def _neo4j_operators(plan) -> Iterable[str]:
+    if plan is None:
+        return
+    operator = plan.get("operatorType", "") if isinstance(plan, dict) else ""
+    # Neo4j 5 agrega el runtime como sufijo: NodeUniqueIndexSeek@neo4j
+    yield operator.split("@")[0]
+    children = plan.get("children", []) if isinstance(plan, dict) else []
+    for child in children:
+        yield from _neo4j_operators(child)
+
+
+def _check_neo4j(conns: ConnectionManager) -> List[Dict[str, Any]]:
+    results = []
+    with conns.neo4j_driver.session() as session:
+        for name, cypher in NEO4J_HOT_QUERIES:
+            try:
+                summary = session.run(f"PROFILE {cypher}", value="__schema_check__").consume()
+            except Exception as e:
+                results.append({"query": name, "ok": False, "error": str(e)})
+                continue
+            operators = [op for op in _neo4j_operators(summary.profile) if op]
+            scans = [op for op in operators if op in _NEO4J_SCAN_OPERATORS]
+            results.append({
+                "query": name,
+                "ok": not scans,
+                "plan": " <- ".join(operators),
+            })
+    return results
+
+
+def check(conns: ConnectionManager) -> Dict[str, Any]:
+    """
+    Correr explain() / PROFILE sobre las consultas calientes.
+
+    Returns:
+        {"version", "applied_versions", "mongo": [...], "neo4j": [...], "scans": [...]}
+        donde `scans` son los nombres de las consultas que no usan índice.
+    """
+    report: Dict[str, Any] = {"version": SCHEMA_VERSION}
+    try:
+        report["applied_versions"] = get_applied_versions(conns)
+    except Exception as e:
+        report["applied_versions"] = None
+        logger.warning(f"No se pudieron leer las versiones de esquema: {e}")
+
+    for backend, run in (("mongo", _check_mongo), ("neo4j", _check_neo4j)):
+        try:
+            report[backend] = run(conns)
+        except Exception as e:
+            logger.warning(f"{backend} no disponible para revisar planes: {e}")
+            report[backend] = [{"query": "*", "ok": False, "error": str(e)}]
+
+    report["scans"] = [
+        f"{backend}:{item['query']}"
+        for backend in ("mongo", "neo4j")
+        for item in report[backend]
+        if not item["ok"]
+    ]
+    return report
@@ -0,0 +1,126 @@
+"""
+Ventana reciente de cada conversación de DMs para Red K.
+
+Abrir un chat pide la primera página del historial (los mensajes más nuevos).
+Esa página se guarda en Redis como una lista ya serializada:
+
+- {conv:alice::bob}:messages   LIST de DMs en JSON, del más nuevo al más viejo
+
+(la misma key que usa RedisClusterManager; el hash tag {conv:...} deja cada
+conversación en un solo slot).
+
+- Lectura: LRANGE de los primeros `limit` si `limit` <= DM_RECENT_WINDOW
+- Miss: una sola búsqueda por el índice (conversation_key, created_at, _id)
+  hacia atrás, que trae la ventana completa y se guarda
+- send_dm: LPUSHX + LTRIM (si la ventana no está cargada no se crea)
+
+Leer no cambia la ventana: `read` / `read_at` se calculan en cada request con
+las marcas de lectura de app/conversations.py.
+
+Las páginas anteriores (`before`) van siempre a MongoDB. La ventana caduca a
+los DM_RECENT_TTL segundos, lo que acota cualquier desfase (p. ej. un mensaje
+enviado justo mientras otro request recargaba la ventana).
+"""
+
+import json
+import os
+from typing import Dict, List, Optional
+
+DM_RECENT_WINDOW = int(os.getenv("DM_RECENT_WINDOW", "50"))
+DM_RECENT_TTL = int(os.getenv("DM_RECENT_TTL", "300"))
+
+
+def recent_key(conversation_key: str) -> str:
+    return f"{{conv:{conversation_key}}}:messages"
+
+
+def doc_to_dm(doc: Dict) -> Dict:
+    """Documento de `dms` → dict con los campos de DMOut"""
+    return {
+        "id": str(doc.get("_id")),
+        "sender_username": doc.get("sender_username"),
+        "receiver_username": doc.get("receiver_username"),
+        "content": doc.get("content"),
+        "created_at": doc.get("created_at"),
+        "read": doc.get("read", False),
+        "read_at": doc.get("read_at"),
+    }
+
+
+def _decode(items) -> Optional[List[Dict]]:
+    try:
+        return [json.loads(item) for item in items]
+    except Exception:
+        return None
+
+
+# ========== LECTURA ==========
+
+def get_recent(r, conversation_key: str, limit: int) -> Optional[List[Dict]]:
+    """Los `limit` mensajes más nuevos cacheados, o None si la ventana no está cargada"""
+    if limit > DM_RECENT_WINDOW:
+        return None
+    pipe = r.pipeline(transaction=False)
+    pipe.exists(recent_key(conversation_key))
+    pipe.lrange(recent_key(conversation_key), 0, limit - 1)
+    exists, items = pipe.execute()
+    return _decode(items) if exists else None
+
+
+async def get_recent_async(r, conversation_key: str, limit: int) -> Optional[List[Dict]]:
+    if limit > DM_RECENT_WINDOW:
+        return None
+    pipe = r.pipeline(transaction=False)
+    pipe.exists(recent_key(conversation_key))
+    pipe.lrange(recent_key(conversation_key), 0, limit - 1)
+    exists, items = await pipe.execute()
+    return _decode(items) if exists else None
+
+
+# ========== ESCRITURA ==========
+
+def _store_pipeline(pipe, conversation_key: str, messages: List[Dict]):
+    key = recent_key(conversation_key)
+    pipe.delete(key)
+    if messages:
+        pipe.rpush(key, *(json.dumps(m) for m in messages[:DM_RECENT_WINDOW]))
+        pipe.expire(key, DM_RECENT_TTL)
+
+
+def store_recent(r, conversation_key: str, messages: List[Dict]):
+    """
+    Guardar la ventana (mensajes del más nuevo al más viejo). Una conversación
+    vacía no se guarda: LPUSHX no crearía la lista con el primer mensaje.
+    """
+    pipe = r.pipeline(transaction=True)
+    _store_pipeline(pipe, conversation_key, messages)
+    pipe.execute()
+
+
+async def store_recent_async(r, conversation_key: str, messages: List[Dict]):
+    pipe = r.pipeline(transaction=True)
+    _store_pipeline(pipe, conversation_key, messages)
+    await pipe.execute()
+
+
+def _append_pipeline(pipe, conversation_key: str, message: Dict):
+    key = recent_key(conversation_key)
+    pipe.lpushx(key, json.dumps(message))
+    pipe.ltrim(key, 0, DM_RECENT_WINDOW - 1)
+
+
+def append_message(r, conversation_key: str, message: Dict):
+    """Mensaje nuevo al frente de la ventana, solo si ya está cargada"""
+    pipe = r.pipeline(transaction=True)
+    _append_pipeline(pipe, conversation_key, message)
+    pipe.execute()
+
+
+async def append_message_async(r, conversation_key: str, message: Dict):
+    pipe = r.pipeline(transaction=True)
+    _append_pipeline(pipe, conversation_key, message)
+    await pipe.execute()
+
+
+def invalidate(r, conversation_key: str):
+    r.delete(recent_key(conversation_key))
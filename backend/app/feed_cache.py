@@ -0,0 +1,128 @@
+"""
+Cache de feeds con índice de invalidación para Red K.
+
+Cada feed se cachea como una lista ordenada de ids de post, con la
+generación del usuario en la key (ver app/user_cache.py):
+
+- feed:{username}:g{gen}:{mode}   {"ids": [...], "complete": bool}
+
+La lista se llena hasta FEED_CACHE_DEPTH ids, así cualquier `limit` hasta esa
+profundidad sale de la misma entrada (o más allá, si `complete` indica que el
+feed no tiene más posts). Los cuerpos de los posts viven una sola vez en el
+cache de objetos de app/post_cache.py.
+Follow/unfollow invalidan todas las variantes con un INCR de gen:{username}.
+
+Para los posts nuevos se mantiene además:
+
+- feed_dependents:{author}    SET de usuarios cuyo feed cacheado incluye a `author`
+
+Se escribe en el mismo pipeline que guarda la respuesta y recibe el mismo
+TTL, así que nunca vive menos que la última entrada que indexa.
+
+Un post nuevo es un solo EVALSHA: el script sube la generación del autor y la
+de cada dependiente, en un round trip y sin recorrer el keyspace. (El script
+calcula las keys gen:{u} que toca, así que es para el Redis standalone del
+backend; el cluster tiene su propio esquema en app/redis_cluster.py.)
+"""
+
+import json
+import os
+from typing import Iterable, List, Optional
+
+from app import user_cache
+
+# Ids que se guardan por feed cacheado (también lo que se lee al llenarlo)
+FEED_CACHE_DEPTH = int(os.getenv("FEED_CACHE_DEPTH", "100"))
+
+# KEYS[1]: feed_dependents:{author}
+# ARGV[1]: author
+_BUMP_AUTHOR_LUA = """
+redis.call('INCR', 'gen:' .. ARGV[1])
+local dependents = redis.call('SMEMBERS', KEYS[1])
+for _, u in ipairs(dependents) do
+    redis.call('INCR', 'gen:' .. u)
+end
+return #dependents + 1
+"""
+
+
+# ========== KEYS ==========
+
+def feed_dependents_key(author: str) -> str:
+    return f"feed_dependents:{author}"
+
+
+def feed_cache_key(r, username: str, mode: str) -> str:
+    return user_cache.cache_key(r, user_cache.KIND_FEED, username, mode)
+
+
+async def feed_cache_key_async(r, username: str, mode: str) -> str:
+    return await user_cache.cache_key_async(r, user_cache.KIND_FEED, username, mode)
+
+
+# ========== LECTURA / ESCRITURA ==========
+
+def _prefix(entry, limit: int) -> Optional[List[str]]:
+    """Los primeros `limit` ids, o None si la entrada no alcanza"""
+    if not isinstance(entry, dict):
+        return None
+    ids = entry.get("ids") or []
+    if len(ids) >= limit or entry.get("complete"):
+        return ids[:limit]
+    return None
+
+
+def get_cached_ids(r, cache_key: str, limit: int) -> Optional[List[str]]:
+    """Ids cacheados del feed, o None si no hay entrada o no alcanza para `limit`"""
+    return _prefix(user_cache.get_json(r, cache_key), limit)
+
+
+async def get_cached_ids_async(r, cache_key: str, limit: int) -> Optional[List[str]]:
+    return _prefix(await user_cache.get_json_async(r, cache_key), limit)
+
+
+def _store_pipeline(pipe, username: str, cache_key: str, ids: List[str], complete: bool,
+                    authors: Iterable[str]):
+    ttl = user_cache.CACHE_TTLS[user_cache.KIND_FEED]
+    pipe.setex(cache_key, ttl, json.dumps({"ids": ids, "complete": complete}))
+    for author in authors:
+        if author == username:
+            continue
+        pipe.sadd(feed_dependents_key(author), username)
+        pipe.expire(feed_dependents_key(author), ttl)
+
+
+def store_feed(r, username: str, cache_key: str, ids: List[str], complete: bool,
+               authors: Iterable[str]):
+    """
+    Guardar los ids del feed de `username` y registrarlo como dependiente de
+    sus autores.
+
+    Args:
+        ids: ids de post, del más nuevo al más viejo
+        complete: el feed no tiene más posts que estos
+        authors: autores seguidos cuyos posts pueden aparecer en este feed
+    """
+    pipe = r.pipeline(transaction=False)
+    _store_pipeline(pipe, username, cache_key, ids, complete, authors)
+    pipe.execute()
+
+
+async def store_feed_async(r, username: str, cache_key: str, ids: List[str], complete: bool,
+                           authors: Iterable[str]):
+    """Versión async de store_feed (redis.asyncio)"""
+    pipe = r.pipeline(transaction=False)
+    _store_pipeline(pipe, username, cache_key, ids, complete, authors)
+    await pipe.execute()
+
+
+# ========== INVALIDACIÓN ==========
+
+def invalidate_author(r, author: str) -> int:
+    """
+    Un post nuevo de `author`: nueva generación para él y para quienes lo
+    tienen en su feed cacheado. Devuelve cuántos usuarios se invalidaron.
+    """
+    # register_script usa EVALSHA y recarga el script si Redis no lo tiene
+    script = r.register_script(_BUMP_AUTHOR_LUA)
+    return script(keys=[feed_dependents_key(author)], args=[author])
@@ -0,0 +1,405 @@
+"""
+Grafo de follows en memoria (CSR con NumPy) para Red K.
+
+Cada worker guarda una copia compacta del grafo para responder sin Neo4j:
+
+- usernames internados a ids enteros (0..n-1)
+- out_ptr / out_idx   CSR de seguidos: out_idx[out_ptr[u]:out_ptr[u+1]]
+- in_ptr  / in_idx    CSR de followers (el grafo transpuesto)
+
+Con ~8 bytes por arista (int32 en cada sentido) un millón de follows ocupa
+unos 8 MB. Following, followers, conteos y candidatos de 2 saltos con sus
+caminos en común son slices y operaciones vectorizadas (np.unique,
+np.bincount), del orden de microsegundos.
+
+Carga: todas las aristas de Neo4j (o de la colección `follows` de MongoDB).
+Después se mantiene al día con el stream `follows:events`, al que
+follow_user/unfollow_user agregan cada cambio: el hilo FollowGraphSync de
+cada worker lo lee en orden con XREAD. Antes de cargar se anota el último id
+del stream, así los cambios que llegan durante la carga se aplican después
+(agregar o quitar una arista dos veces no cambia nada).
+
+Un CSR no admite inserciones: las filas que cambian se guardan aparte
+(`_out_rows` / `_in_rows`, arrays ordenados) y se leen en lugar de la fila
+base. Cuando hay más de FOLLOW_GRAPH_COMPACT_ROWS filas modificadas se
+vuelve a armar el CSR completo.
+
+Lo usan los fallbacks sin Neo4j: app/follows.py, las sugerencias
+(app/suggestion_sets.py) y GET /users/{username}/following.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.connections import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+FOLLOW_GRAPH = os.getenv("FOLLOW_GRAPH", "true").lower() in ("1", "true", "yes")
+FOLLOW_GRAPH_COMPACT_ROWS = int(os.getenv("FOLLOW_GRAPH_COMPACT_ROWS", "1024"))
+# Recarga completa periódica: corrige cualquier deriva (p. ej. stream recortado)
+FOLLOW_GRAPH_RELOAD_SECONDS = int(os.getenv("FOLLOW_GRAPH_RELOAD_SECONDS", "3600"))
+
+FOLLOW_EVENTS_STREAM = "follows:events"
+FOLLOW_EVENTS_MAXLEN = int(os.getenv("FOLLOW_EVENTS_MAXLEN", "100000"))
+
+MUTUAL_WEIGHT = 3
+FOLLOWERS_WEIGHT = 2
+
+_EMPTY = np.empty(0, dtype=np.int32)
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _csr(src: np.ndarray, dst: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Aristas (src, dst) → (ptr, idx) con cada fila ordenada y sin repetidos"""
+    if len(src):
+        order = np.lexsort((dst, src))
+        src, dst = src[order], dst[order]
+        keep = np.ones(len(src), dtype=bool)
+        keep[1:] = (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])
+        src, dst = src[keep], dst[keep]
+    ptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=ptr[1:])
+    return ptr, dst.astype(np.int32)
+
+
+def _gather(ptr: np.ndarray, idx: np.ndarray, rows: Dict[int, np.ndarray], nodes: np.ndarray) -> np.ndarray:
+    """Concatenación de las filas de `nodes`, sin loop de Python para las filas base"""
+    if not len(nodes):
+        return _EMPTY
+    if rows:
+        overridden = np.fromiter(rows.keys(), dtype=np.int64, count=len(rows))
+        changed = np.isin(nodes, overridden)
+    else:
+        changed = np.zeros(len(nodes), dtype=bool)
+    base = nodes[~changed & (nodes < len(ptr) - 1)]
+    starts = ptr[base]
+    lengths = ptr[base + 1] - starts
+    # Posiciones de todos los rangos [start, start+len) en un solo array
+    offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+    parts = [idx[offsets]]
+    parts.extend(rows[int(node)] for node in nodes[changed])
+    return np.concatenate(parts) if len(parts) > 1 else parts[0]
+
+
+class FollowGraph:
+    """Grafo de follows de un worker. Todas las operaciones toman un lock corto."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids: Dict[str, int] = {}
+        self._names: List[str] = []
+        self._out_ptr = np.zeros(1, dtype=np.int64)
+        self._out_idx = _EMPTY
+        self._in_ptr = np.zeros(1, dtype=np.int64)
+        self._in_idx = _EMPTY
+        self._out_rows: Dict[int, np.ndarray] = {}
+        self._in_rows: Dict[int, np.ndarray] = {}
+        self.ready = False
+        self.loaded_at: Optional[str] = None
+
+    # ---------- Carga ----------
+
+    def load_edges(self, edges: Iterable[Tuple[str, str]]):
+        """Reemplazar el grafo por las aristas (follower, following)"""
+        ids: Dict[str, int] = {}
+        names: List[str] = []
+        src: List[int] = []
+        dst: List[int] = []
+        for follower, following in edges:
+            if not follower or not following or follower == following:
+                continue
+            for name in (follower, following):
+                if name not in ids:
+                    ids[name] = len(names)
+                    names.append(name)
+            src.append(ids[follower])
+            dst.append(ids[following])
+
+        src_arr = np.array(src, dtype=np.int64)
+        dst_arr = np.array(dst, dtype=np.int64)
+        out_ptr, out_idx = _csr(src_arr, dst_arr, len(names))
+        in_ptr, in_idx = _csr(dst_arr, src_arr, len(names))
+
+        with self._lock:
+            self._ids, self._names = ids, names
+            self._out_ptr, self._out_idx = out_ptr, out_idx
+            self._in_ptr, self._in_idx = in_ptr, in_idx
+            self._out_rows, self._in_rows = {}, {}
+            self.ready = True
+            self.loaded_at = datetime.utcnow().isoformat()
+
+    # ---------- Deltas ----------
+
+    def _intern(self, name: str) -> int:
+        node = self._ids.get(name)
+        if node is None:
+            node = self._ids[name] = len(self._names)
+            self._names.append(name)
+        return node
+
+    def _row(self, out: bool, node: int) -> np.ndarray:
+        rows = self._out_rows if out else self._in_rows
+        if node in rows:
+            return rows[node]
+        ptr, idx = (self._out_ptr, self._out_idx) if out else (self._in_ptr, self._in_idx)
+        if node + 1 < len(ptr):
+            return idx[ptr[node]:ptr[node + 1]]
+        return _EMPTY
+
+    def apply(self, follower: str, following: str, followed: bool = True):
+        """Agregar (o quitar) la arista follower→following"""
+        if follower == following:
+            return
+        with self._lock:
+            u, v = self._intern(follower), self._intern(following)
+            change = np.union1d if followed else np.setdiff1d
+            self._out_rows[u] = change(self._row(True, u), [v]).astype(np.int32)
+            self._in_rows[v] = change(self._row(False, v), [u]).astype(np.int32)
+            if len(self._out_rows) + len(self._in_rows) > FOLLOW_GRAPH_COMPACT_ROWS:
+                self._compact()
+
+    def _compact(self):
+        """Volver a armar los CSR incorporando las filas modificadas (con el lock tomado)"""
+        changed = np.fromiter(self._out_rows.keys(), dtype=np.int64, count=len(self._out_rows))
+        base = np.setdiff1d(np.arange(len(self._out_ptr) - 1, dtype=np.int64), changed)
+        lengths = self._out_ptr[base + 1] - self._out_ptr[base]
+        sources = [np.repeat(base, lengths)]
+        targets = [_gather(self._out_ptr, self._out_idx, {}, base)]
+        for node, row in self._out_rows.items():
+            sources.append(np.full(len(row), node, dtype=np.int64))
+            targets.append(row)
+        src = np.concatenate(sources)
+        dst = np.concatenate(targets).astype(np.int64)
+        n = len(self._names)
+        # Las filas de followers se derivan de las de seguidos: cambian juntas
+        self._out_ptr, self._out_idx = _csr(src, dst, n)
+        self._in_ptr, self._in_idx = _csr(dst, src, n)
+        self._out_rows, self._in_rows = {}, {}
+
+    # ---------- Consultas ----------
+
+    def _names_of(self, nodes: np.ndarray) -> List[str]:
+        return [self._names[i] for i in nodes]
+
+    def following(self, username: str) -> List[str]:
+        with self._lock:
+            node = self._ids.get(username)
+            return [] if node is None else self._names_of(self._row(True, node))
+
+    def followers(self, username: str) -> List[str]:
+        with self._lock:
+            node = self._ids.get(username)
+            return [] if node is None else self._names_of(self._row(False, node))
+
+    def _in_degrees(self, nodes: np.ndarray) -> np.ndarray:
+        # Los nodos internados después de armar el CSR no tienen fila base
+        inside = nodes < len(self._in_ptr) - 1
+        base = nodes[inside]
+        degrees = np.zeros(len(nodes), dtype=np.int64)
+        degrees[inside] = self._in_ptr[base + 1] - self._in_ptr[base]
+        for i in np.flatnonzero(np.isin(nodes, list(self._in_rows))):
+            degrees[i] = len(self._in_rows[int(nodes[i])])
+        return degrees
+
+    def follower_counts(self, usernames: List[str]) -> Dict[str, int]:
+        with self._lock:
+            known = [u for u in usernames if u in self._ids]
+            nodes = np.array([self._ids[u] for u in known], dtype=np.int64)
+            degrees = self._in_degrees(nodes) if len(nodes) else []
+            counts = {u: 0 for u in usernames}
+            counts.update(zip(known, (int(d) for d in degrees)))
+            return counts
+
+    def _two_hop(self, node: int, exclude_followed: bool) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        friends = self._row(True, node).astype(np.int64)
+        reached = _gather(self._out_ptr, self._out_idx, self._out_rows, friends)
+        candidates, mutual = np.unique(reached, return_counts=True)
+        keep = candidates != node
+        if exclude_followed:
+            keep &= ~np.isin(candidates, friends)
+        return friends, candidates[keep], mutual[keep]
+
+    def mutual_counts(self, username: str) -> Dict[str, int]:
+        """Candidato → caminos username→x→candidato (incluye a los que ya sigue)"""
+        with self._lock:
+            node = self._ids.get(username)
+            if node is None:
+                return {}
+            _, candidates, mutual = self._two_hop(node, exclude_followed=False)
+            return dict(zip(self._names_of(candidates), (int(m) for m in mutual)))
+
+    def suggest(self, username: str, limit: int) -> List[Dict]:
+        """
+        Amigos de amigos que todavía no sigue, con el score de get_suggestions
+        sin la parte de posts (el grafo no los tiene): mutual*3 + followers*2
+        """
+        with self._lock:
+            node = self._ids.get(username)
+            if node is None:
+                return []
+            _, candidates, mutual = self._two_hop(node, exclude_followed=True)
+            if not len(candidates):
+                return []
+            followers = self._in_degrees(candidates.astype(np.int64))
+            scores = mutual * MUTUAL_WEIGHT + followers * FOLLOWERS_WEIGHT
+            top = np.arange(len(scores))
+            if len(scores) > limit:
+                # Todos los empatados con el k-ésimo, para desempatar por username como Cypher
+                kth = np.partition(scores, len(scores) - limit)[len(scores) - limit]
+                top = np.flatnonzero(scores >= kth)
+            ranked = sorted(top, key=lambda i: (-scores[i], self._names[candidates[i]]))[:limit]
+            return [
+                {
+                    "username": self._names[candidates[i]],
+                    "score": float(scores[i]),
+                    "mutual_connections": int(mutual[i]),
+                    "followers_count": int(followers[i]),
+                    "posts_count": 0,
+                }
+                for i in ranked
+            ]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "loaded_at": self.loaded_at,
+                "users": len(self._names),
+                "edges": int(len(self._out_idx)),
+                "pending_rows": len(self._out_rows) + len(self._in_rows),
+                "bytes": int(
+                    self._out_ptr.nbytes + self._out_idx.nbytes + self._in_ptr.nbytes + self._in_idx.nbytes
+                ),
+            }
+
+
+follow_graph = FollowGraph()
+
+
+# ========== FUENTE Y CAMBIOS ==========
+
+def load_edges(conns: ConnectionManager) -> List[Tuple[str, str]]:
+    """Todas las aristas (follower, following) de Neo4j, o de MongoDB si no responde"""
+    try:
+        with conns.neo4j_driver.session() as session:
+            result = session.run(
+                """
+                MATCH (a:User)-[:FOLLOWS]->(b:User)
+                RETURN a.username AS follower, b.username AS following
+                """
+            )
+            return [(record["follower"], record["following"]) for record in result]
+    except Exception as e:
+        logger.warning(f"Neo4j no disponible para cargar el grafo, usando MongoDB: {e}")
+        return [
+            (doc.get("follower"), doc.get("following"))
+            for doc in conns.mongo_db()["follows"].find({}, {"follower": 1, "following": 1})
+        ]
+
+
+def publish_follow(r, username: str, target: str, followed: bool = True):
+    """Agregar el cambio al stream que leen los grafos de todos los workers"""
+    r.xadd(
+        FOLLOW_EVENTS_STREAM,
+        {"follower": username, "following": target, "op": "follow" if followed else "unfollow"},
+        maxlen=FOLLOW_EVENTS_MAXLEN,
+        approximate=True,
+    )
+
+
+async def publish_follow_async(r, username: str, target: str, followed: bool = True):
+    await r.xadd(
+        FOLLOW_EVENTS_STREAM,
+        {"follower": username, "following": target, "op": "follow" if followed else "unfollow"},
+        maxlen=FOLLOW_EVENTS_MAXLEN,
+        approximate=True,
+    )
+
+
+def _last_event_id(r) -> str:
+    entries = r.xrevrange(FOLLOW_EVENTS_STREAM, count=1)
+    return _decode(entries[0][0]) if entries else "0-0"
+
+
+def apply_events(graph: FollowGraph, entries) -> Optional[str]:
+    """Aplicar entradas de XREAD/XRANGE en orden; devuelve el último id"""
+    last_id = None
+    for entry_id, fields in entries:
+        fields = {_decode(k): _decode(v) for k, v in fields.items()}
+        graph.apply(fields["follower"], fields["following"], fields.get("op") != "unfollow")
+        last_id = _decode(entry_id)
+    return last_id
+
+
+class FollowGraphSync:
+    """
+    Hilo por worker: carga el grafo y después sigue el stream `follows:events`
+    con XREAD bloqueante. Recarga todo cada FOLLOW_GRAPH_RELOAD_SECONDS.
+    """
+
+    def __init__(self, conns: ConnectionManager, graph: FollowGraph = follow_graph):
+        self.conns = conns
+        self.graph = graph
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_id: Optional[str] = None
+        self._loaded_monotonic = 0.0
+        self.events_applied = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="follow-graph-sync", daemon=True)
+        self._thread.start()
+        logger.info("FollowGraphSync iniciado")
+
+    def reload(self):
+        try:
+            last_id = _last_event_id(self.conns.redis)
+        except Exception as e:
+            logger.warning(f"Stream de follows no disponible, solo se verán cambios nuevos: {e}")
+            last_id = "$"
+        edges = load_edges(self.conns)
+        self.graph.load_edges(edges)
+        self._last_id = last_id
+        self._loaded_monotonic = time.monotonic()
+        logger.info(f"Grafo de follows cargado: {self.graph.stats()}")
+
+    def poll(self, block_ms: int = 1000) -> int:
+        """Aplicar los cambios nuevos del stream (bloquea hasta `block_ms`)"""
+        response = self.conns.redis.xread({FOLLOW_EVENTS_STREAM: self._last_id}, count=500, block=block_ms)
+        applied = 0
+        for _, entries in response or []:
+            last_id = apply_events(self.graph, entries)
+            if last_id:
+                self._last_id = last_id
+                applied += len(entries)
+        self.events_applied += applied
+        return applied
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if not self.graph.ready or time.monotonic() - self._loaded_monotonic > FOLLOW_GRAPH_RELOAD_SECONDS:
+                    self.reload()
+                self.poll()
+            except Exception as e:
+                logger.warning(f"No se pudo actualizar el grafo de follows (se reintenta): {e}")
+                self._stop.wait(1)
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self._thread = None
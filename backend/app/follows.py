@@ -0,0 +1,236 @@
+"""
+Consultas del grafo de follows para Red K.
+
+Neo4j es la fuente principal; si no está disponible se usa el grafo en
+memoria del worker (app/follow_graph.py) y, si todavía no cargó, la colección
+`follows` de MongoDB (el mismo fallback que usan follow_user/unfollow_user).
+
+A quién sigue cada usuario se mantiene además en Redis, para que armar un feed
+o filtrar sugerencias sea un SMEMBERS y no una consulta Cypher:
+
+- following_set:{username}          SET de usernames seguidos
+- following_set:{username}:ready    marca de set cargado (un SET vacío no existe)
+
+follow_user/unfollow_user lo actualizan (write-through) y si no está cargado
+se lee de Neo4j/Mongo la primera vez que se pide (lazy load). El lazy load
+hace WATCH del set antes de leer la fuente: si un write-through lo toca en el
+medio, el EXEC falla y no se guarda (la próxima lectura lo vuelve a cargar),
+así un follow simultáneo nunca se pierde al reemplazar el set.
+"""
+
+import logging
+import os
+from typing import List, Optional
+
+from redis.exceptions import WatchError
+
+from app.connections import ConnectionManager
+from app.follow_graph import follow_graph
+
+logger = logging.getLogger(__name__)
+
+# Vida del set cacheado; acota la deriva si algún write-through se perdió
+FOLLOWING_SET_TTL = int(os.getenv("FOLLOWING_SET_TTL", "86400"))
+
+
+def following_set_key(username: str) -> str:
+    return f"following_set:{username}"
+
+
+def following_ready_key(username: str) -> str:
+    return f"following_set:{username}:ready"
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+# ========== FUENTE (Neo4j / MongoDB) ==========
+
+def load_following_usernames(conns: ConnectionManager, username: str) -> List[str]:
+    """Usernames a los que sigue `username`, leídos de Neo4j (o MongoDB)"""
+    following: List[str] = []
+    try:
+        with conns.neo4j_driver.session() as session:
+            result = session.run(
+                """
+                MATCH (u:User {username: $username})-[:FOLLOWS]->(f:User)
+                RETURN DISTINCT f.username AS username
+                """,
+                username=username,
+            )
+            following = [record["username"] for record in result if record["username"]]
+    except Exception as e:
+        if follow_graph.ready:
+            return follow_graph.following(username)
+        logger.warning(f"Neo4j no disponible para following, usando MongoDB: {e}")
+        follows_col = conns.mongo_db()["follows"]
+        following = list(dict.fromkeys(
+            doc["following"]
+            for doc in follows_col.find({"follower": username}, {"following": 1})
+            if doc.get("following")
+        ))
+    return following
+
+
+async def load_following_usernames_async(aconns, username: str) -> List[str]:
+    """Versión async de load_following_usernames (Neo4j AsyncDriver / AsyncMongoClient)"""
+    following: List[str] = []
+    try:
+        async with aconns.neo4j_driver.session() as session:
+            result = await session.run(
+                """
+                MATCH (u:User {username: $username})-[:FOLLOWS]->(f:User)
+                RETURN DISTINCT f.username AS username
+                """,
+                username=username,
+            )
+            async for record in result:
+                if record["username"]:
+                    following.append(record["username"])
+    except Exception as e:
+        if follow_graph.ready:
+            return follow_graph.following(username)
+        logger.warning(f"Neo4j no disponible para following, usando MongoDB: {e}")
+        cursor = aconns.mongo_db()["follows"].find({"follower": username}, {"following": 1})
+        following = list(dict.fromkeys(
+            [doc["following"] async for doc in cursor if doc.get("following")]
+        ))
+    return following
+
+
+# ========== SET CACHEADO EN REDIS ==========
+
+def _store_pipeline(pipe, username: str, following: List[str]):
+    key = following_set_key(username)
+    pipe.delete(key)
+    if following:
+        pipe.sadd(key, *following)
+        pipe.expire(key, FOLLOWING_SET_TTL)
+    pipe.set(following_ready_key(username), 1, ex=FOLLOWING_SET_TTL)
+
+
+def _read_pipeline(pipe, username: str):
+    pipe.exists(following_ready_key(username))
+    pipe.smembers(following_set_key(username))
+
+
+def get_following_usernames(conns: ConnectionManager, username: str) -> List[str]:
+    """
+    Usernames a los que sigue `username` (sin duplicados).
+    Un SMEMBERS si el set está cargado; si no, Neo4j/Mongo y se carga.
+    """
+    r = None
+    try:
+        r = conns.redis
+        pipe = r.pipeline(transaction=False)
+        _read_pipeline(pipe, username)
+        ready, members = pipe.execute()
+        if ready:
+            return sorted(_decode(m) for m in members)
+    except Exception as e:
+        logger.warning(f"Redis no disponible para following de {username}: {e}")
+        r = None
+
+    if r is None:
+        return load_following_usernames(conns, username)
+    following: Optional[List[str]] = None
+    try:
+        with r.pipeline(transaction=True) as pipe:
+            pipe.watch(following_set_key(username))
+            following = load_following_usernames(conns, username)
+            pipe.multi()
+            _store_pipeline(pipe, username, following)
+            pipe.execute()
+    except WatchError:
+        logger.info(f"following de {username} cambió mientras se cargaba; no se cachea")
+    except Exception as e:
+        logger.warning(f"No se pudo cachear following de {username}: {e}")
+    if following is None:
+        following = load_following_usernames(conns, username)
+    return following
+
+
+async def get_following_usernames_async(aconns, username: str) -> List[str]:
+    """Versión async de get_following_usernames"""
+    r = None
+    try:
+        r = aconns.redis
+        pipe = r.pipeline(transaction=False)
+        _read_pipeline(pipe, username)
+        ready, members = await pipe.execute()
+        if ready:
+            return sorted(_decode(m) for m in members)
+    except Exception as e:
+        logger.warning(f"Redis no disponible para following de {username}: {e}")
+        r = None
+
+    if r is None:
+        return await load_following_usernames_async(aconns, username)
+    following: Optional[List[str]] = None
+    try:
+        async with r.pipeline(transaction=True) as pipe:
+            await pipe.watch(following_set_key(username))
+            following = await load_following_usernames_async(aconns, username)
+            pipe.multi()
+            _store_pipeline(pipe, username, following)
+            await pipe.execute()
+    except WatchError:
+        logger.info(f"following de {username} cambió mientras se cargaba; no se cachea")
+    except Exception as e:
+        logger.warning(f"No se pudo cachear following de {username}: {e}")
+    if following is None:
+        following = await load_following_usernames_async(aconns, username)
+    return following
+
+
+def _write_through(pipe, username: str, target: str, followed: bool):
+    key = following_set_key(username)
+    if followed:
+        pipe.sadd(key, target)
+    else:
+        pipe.srem(key, target)
+    # Si el set no estaba cargado esto deja uno parcial sin marca `ready`:
+    # no se lee, y el lazy load lo reemplaza entero
+    pipe.expire(key, FOLLOWING_SET_TTL)
+
+
+def record_follow(r, username: str, target: str, followed: bool = True):
+    """Write-through de follow (followed=True) o unfollow (False)"""
+    pipe = r.pipeline(transaction=False)
+    _write_through(pipe, username, target, followed)
+    pipe.execute()
+
+
+async def record_follow_async(r, username: str, target: str, followed: bool = True):
+    pipe = r.pipeline(transaction=False)
+    _write_through(pipe, username, target, followed)
+    await pipe.execute()
+
+
+# ========== FOLLOWERS ==========
+
+def get_follower_usernames(conns: ConnectionManager, username: str) -> List[str]:
+    """Usernames que siguen a `username` (sin duplicados)"""
+    followers: List[str] = []
+    try:
+        with conns.neo4j_driver.session() as session:
+            result = session.run(
+                """
+                MATCH (f:User)-[:FOLLOWS]->(u:User {username: $username})
+                RETURN DISTINCT f.username AS username
+                """,
+                username=username,
+            )
+            followers = [record["username"] for record in result if record["username"]]
+    except Exception as e:
+        if follow_graph.ready:
+            return follow_graph.followers(username)
+        logger.warning(f"Neo4j no disponible para followers, usando MongoDB: {e}")
+        follows_col = conns.mongo_db()["follows"]
+        followers = list(dict.fromkeys(
+            doc["follower"]
+            for doc in follows_col.find({"following": username}, {"follower": 1})
+            if doc.get("follower")
+        ))
+    return followers
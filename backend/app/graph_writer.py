@@ -0,0 +1,415 @@
+"""
+Escrituras agrupadas en Neo4j para Red K.
+
+Antes cada create_user, follow, post, DM o like abría una sesión y corría un
+MERGE de una sola fila: una ida y vuelta y una transacción por escritura.
+GraphWriter junta las escrituras pendientes de todo el worker y las aplica
+como `UNWIND $rows AS row MERGE ...`, una transacción por tipo de escritura
+y por lote:
+
+- los endpoints llaman a `write(kind, row)`: la fila se encola y el request
+  espera su resultado (micro-batching / group commit). Si follow necesita
+  saber si la relación es nueva o unfollow cuántas borró, cada fila lleva su
+  índice `_i` y el Cypher devuelve `row._i AS i, ... AS result`.
+- la API async (app/async_api.py) usa `write_async`, que espera el mismo
+  Future con `asyncio.wrap_future` sin bloquear el event loop: los requests
+  sync y async de un worker comparten la cola y los lotes.
+- DMs y likes no necesitan respuesta: `write(..., wait=False)` encola y
+  sigue (un error queda en el log, como antes).
+- las herramientas de carga masiva (scripts/bulk_import_graph.py) usan
+  `submit` + `flush` sin hilo, con lotes grandes.
+
+El hilo vacía la cola apenas llega la primera fila, salvo que espere hasta
+GRAPH_WRITER_LINGER_MS a que se junten más; nunca manda más de
+GRAPH_WRITER_BATCH_SIZE filas por transacción. Mientras un lote viaja a Neo4j
+los requests nuevos se acumulan para el siguiente, así que con carga los
+lotes crecen solos y sin carga la latencia es la de hoy.
+
+Orden: las filas se agrupan por tipo respetando el orden de llegada; un
+follow y un unfollow (o like/unlike) en la misma cola se separan en lotes
+sucesivos para que se apliquen en el orden en que llegaron. Filas repetidas
+(mismo follow dos veces en el lote) se escriben una sola vez y las copias
+reciben el resultado "no hubo cambio", igual que dos MERGE seguidos.
+
+Si un lote falla por un dato (no por Neo4j caído) se reintenta fila por fila
+para que el error quede solo en la fila culpable. Si un request se cansa de
+esperar (GRAPH_WRITER_TIMEOUT_MS) y su fila todavía no salió, se cancela: no
+se va a escribir y el endpoint puede usar su fallback. Si ya viaja en un lote
+se lanza GraphWriteTimeout, porque puede quedar escrita igual. Con GRAPH_WRITER=false no
+hay hilo y cada `write` se aplica en el momento (una fila por transacción).
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from neo4j.exceptions import ServiceUnavailable, SessionExpired
+
+from app.connections import ConnectionManager, connection_manager
+
+logger = logging.getLogger(__name__)
+
+GRAPH_WRITER = os.getenv("GRAPH_WRITER", "true").lower() in ("1", "true", "yes")
+GRAPH_WRITER_BATCH_SIZE = int(os.getenv("GRAPH_WRITER_BATCH_SIZE", "500"))
+GRAPH_WRITER_LINGER_MS = int(os.getenv("GRAPH_WRITER_LINGER_MS", "2"))
+GRAPH_WRITER_TIMEOUT_MS = int(os.getenv("GRAPH_WRITER_TIMEOUT_MS", "10000"))
+
+
+class GraphWriteTimeout(Exception):
+    """La fila ya se mandó a Neo4j y no hubo respuesta a tiempo: puede quedar escrita"""
+
+
+class GraphWrite(NamedTuple):
+    cypher: str
+    # Campos que identifican la fila: las repetidas en un lote se escriben una vez
+    key: Tuple[str, ...] = ()
+    # Resultado de una fila sin registro devuelto (o repetida)
+    default: Any = None
+
+
+WRITES: Dict[str, GraphWrite] = {
+    "user": GraphWrite(
+        """
+        UNWIND $rows AS row
+        MERGE (u:User {id: row.id})
+        SET u.username = row.username,
+            u.email = row.email,
+            u.name = row.name,
+            u.bio = row.bio,
+            u.followers_count = coalesce(u.followers_count, 0),
+            u.following_count = coalesce(u.following_count, 0),
+            u.posts_count = coalesce(u.posts_count, 0)
+        """,
+    ),
+    # Los contadores de los nodos suben solo si la relación es nueva
+    "follow": GraphWrite(
+        """
+        UNWIND $rows AS row
+        MERGE (u:User {id: row.user_id})
+        SET u.username = row.username
+        MERGE (t:User {id: row.target_id})
+        SET t.username = row.target_username
+        MERGE (u)-[r:FOLLOWS]->(t)
+        ON CREATE SET r.created_at = row.now,
+                      u.following_count = coalesce(u.following_count, 0) + 1,
+                      t.followers_count = coalesce(t.followers_count, 0) + 1
+        RETURN row._i AS i, r.created_at = row.now AS result
+        """,
+        key=("user_id", "target_id"),
+        default=False,
+    ),
+    "unfollow": GraphWrite(
+        """
+        UNWIND $rows AS row
+        MATCH (u:User {id: row.user_id})-[r:FOLLOWS]->(t:User {id: row.target_id})
+        WITH row, u, t, collect(r) AS rels
+        FOREACH (rel IN rels | DELETE rel)
+        SET u.following_count = CASE WHEN coalesce(u.following_count, 0) > size(rels)
+                                     THEN u.following_count - size(rels) ELSE 0 END,
+            t.followers_count = CASE WHEN coalesce(t.followers_count, 0) > size(rels)
+                                     THEN t.followers_count - size(rels) ELSE 0 END
+        RETURN row._i AS i, size(rels) AS result
+        """,
+        key=("user_id", "target_id"),
+        default=0,
+    ),
+    "post": GraphWrite(
+        """
+        UNWIND $rows AS row
+        MERGE (u:User {id: row.user_id})
+        SET u.username = row.username
+        MERGE (p:Post {id: row.post_id})
+        SET p.content = row.content,
+            p.created_at = row.created_at
+        MERGE (u)-[:POSTED]->(p)
+        ON CREATE SET u.posts_count = coalesce(u.posts_count, 0) + 1
+        """,
+    ),
+    # Con varios DMs del mismo par en el lote queda el más reciente
+    "message": GraphWrite(
+        """
+        UNWIND $rows AS row
+        MERGE (s:User {username: row.sender})
+        MERGE (r:User {username: row.receiver})
+        MERGE (s)-[rel:MESSAGED]->(r)
+        SET rel.last_message_at = CASE
+            WHEN rel.last_message_at > row.created_at THEN rel.last_message_at
+            ELSE row.created_at END
+        """,
+    ),
+    "like": GraphWrite(
+        """
+        UNWIND $rows AS row
+        MERGE (u:User {id: row.user_id})
+        MERGE (p:Post {id: row.post_id})
+        MERGE (u)-[:LIKES]->(p)
+        """,
+        key=("user_id", "post_id"),
+    ),
+    "unlike": GraphWrite(
+        """
+        UNWIND $rows AS row
+        MATCH (u:User {id: row.user_id})-[r:LIKES]->(p:Post {id: row.post_id})
+        DELETE r
+        """,
+        key=("user_id", "post_id"),
+    ),
+}
+
+# Escrituras que se deshacen entre sí: no pueden ir en el mismo lote
+INVERSE = {"follow": "unfollow", "unfollow": "follow", "like": "unlike", "unlike": "like"}
+
+Pending = Tuple[str, Dict, Future]
+
+
+def _segments(items: List[Pending]) -> Iterator[Dict[str, List[Pending]]]:
+    """
+    Agrupar por tipo respetando el orden de llegada: se corta cuando aparece
+    la inversa de algo ya agrupado (follow después de unfollow, etc.).
+    """
+    segment: Dict[str, List[Pending]] = {}
+    for item in items:
+        if INVERSE.get(item[0]) in segment:
+            yield segment
+            segment = {}
+        segment.setdefault(item[0], []).append(item)
+    if segment:
+        yield segment
+
+
+def _run(session, cypher: str, rows: List[Dict]) -> Dict[int, Any]:
+    return {record["i"]: record["result"] for record in session.run(cypher, rows=rows)}
+
+
+class GraphWriter:
+    """
+    Cola de escrituras a Neo4j de un worker. Con `start()` un hilo la vacía
+    en lotes; sin hilo, `flush()` la vacía en el hilo que llama.
+    """
+
+    def __init__(
+        self,
+        conns: ConnectionManager,
+        batch_size: int = GRAPH_WRITER_BATCH_SIZE,
+        linger_ms: int = GRAPH_WRITER_LINGER_MS,
+    ):
+        self.conns = conns
+        self.batch_size = max(batch_size, 1)
+        self.linger_ms = linger_ms
+        self._pending: List[Pending] = []
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread: Optional[threading.Thread] = None
+        self.rows = 0
+        self.batches = 0
+        self.errors = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop = False
+        self._thread = threading.Thread(target=self._loop, name="graph-writer", daemon=True)
+        self._thread.start()
+        logger.info(f"GraphWriter iniciado (lotes de {self.batch_size}, espera {self.linger_ms} ms)")
+
+    def stop(self):
+        """Detener el hilo después de aplicar lo que quede en la cola"""
+        if self._thread is None:
+            return
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        self._thread.join(timeout=GRAPH_WRITER_TIMEOUT_MS / 1000 + 5)
+        self._thread = None
+        self.flush()
+
+    def submit(self, kind: str, row: Dict) -> Future:
+        """
+        Encolar una fila. Sin hilo la cola se aplica al llegar a batch_size;
+        el resto queda para `flush()`.
+        """
+        if kind not in WRITES:
+            raise ValueError(f"Escritura de grafo desconocida: {kind}")
+        future: Future = Future()
+        with self._cond:
+            self._pending.append((kind, row, future))
+            full = len(self._pending) >= self.batch_size
+            if self._thread is not None:
+                if full or len(self._pending) == 1:
+                    self._cond.notify()
+                return future
+        if full:
+            self.flush()
+        return future
+
+    def write(self, kind: str, row: Dict, wait: bool = True):
+        """
+        Escritura desde un endpoint: devuelve el resultado de la fila (follow:
+        si la relación es nueva; unfollow: cuántas borró) o, con wait=False,
+        el Future sin esperar. Los errores de Neo4j se propagan como antes.
+
+        Al vencer el timeout la fila se cancela si sigue en la cola (TimeoutError:
+        no se escribe); si ya salió en un lote se lanza GraphWriteTimeout.
+        """
+        future = self.submit(kind, row)
+        if self._thread is None:
+            self.flush()
+        if not wait:
+            return future
+        try:
+            return future.result(timeout=GRAPH_WRITER_TIMEOUT_MS / 1000)
+        except FutureTimeout:
+            if future.cancel():
+                raise
+            raise GraphWriteTimeout(f"Neo4j no confirmó la escritura {kind} a tiempo")
+
+    async def write_async(self, kind: str, row: Dict, wait: bool = True):
+        """`write` para la API async: mismo resultado y mismos errores"""
+        if self._thread is None:
+            # Sin hilo la escritura se hace en el momento: fuera del event loop
+            return await asyncio.to_thread(self.write, kind, row, wait)
+        future = self.submit(kind, row)
+        if not wait:
+            return future
+        try:
+            # Al vencer, wait_for cancela el Future si la fila sigue en la cola
+            return await asyncio.wait_for(asyncio.wrap_future(future), GRAPH_WRITER_TIMEOUT_MS / 1000)
+        except asyncio.TimeoutError:
+            if future.cancelled():
+                raise
+            raise GraphWriteTimeout(f"Neo4j no confirmó la escritura {kind} a tiempo")
+
+    def flush(self):
+        """Aplicar todo lo pendiente en el hilo que llama"""
+        while True:
+            with self._cond:
+                batch = self._pending[:self.batch_size]
+                del self._pending[:self.batch_size]
+            if not batch:
+                return
+            self._execute(batch)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            pending = len(self._pending)
+            rows, batches, errors = self.rows, self.batches, self.errors
+        return {
+            "running": self.running,
+            "pending": pending,
+            "rows": rows,
+            "batches": batches,
+            "errors": errors,
+            "avg_batch": round(rows / batches, 1) if batches else 0,
+            "batch_size": self.batch_size,
+            "linger_ms": self.linger_ms,
+        }
+
+    # ---------- hilo ----------
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stop:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                # Esperar un poco a que se junten más filas, sin pasar el tamaño de lote
+                deadline = time.monotonic() + self.linger_ms / 1000
+                while len(self._pending) < self.batch_size and not self._stop:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[:self.batch_size]
+                del self._pending[:self.batch_size]
+            self._execute(batch)
+
+    # ---------- escritura ----------
+
+    def _count(self, rows: int = 0, batches: int = 0, errors: int = 0):
+        # flush() corre en el hilo del writer y en los que llaman: bajo el lock
+        with self._cond:
+            self.rows += rows
+            self.batches += batches
+            self.errors += errors
+
+    def _execute(self, batch: List[Pending]):
+        # Las filas canceladas por timeout no se mandan; el resto ya no se puede cancelar
+        batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            with self.conns.neo4j_driver.session() as session:
+                for segment in _segments(batch):
+                    for kind, items in segment.items():
+                        self._write_group(session, kind, items)
+        except Exception as e:
+            # No se pudo abrir la sesión: falla todo lo que no tenga resultado
+            self._fail([future for _, _, future in batch if not future.done()], e)
+
+    def _write_group(self, session, kind: str, items: List[Pending]):
+        write = WRITES[kind]
+        rows: List[Dict] = []
+        futures: Dict[int, Future] = {}
+        first: Dict[Tuple, Future] = {}
+        repeated: List[Tuple[Future, Future]] = []
+        for i, (_, row, future) in enumerate(items):
+            if write.key:
+                key = tuple(row.get(field) for field in write.key)
+                if key in first:
+                    repeated.append((future, first[key]))
+                    continue
+                first[key] = future
+            rows.append({**row, "_i": i})
+            futures[i] = future
+
+        results: Dict[int, Any] = {}
+        try:
+            results = _run(session, write.cypher, rows)
+            self._count(batches=1)
+        except (ServiceUnavailable, SessionExpired) as e:
+            self._fail(list(futures.values()), e)
+        except Exception as e:
+            if len(rows) == 1:
+                self._fail(list(futures.values()), e)
+            else:
+                # Aislar la fila con el dato malo: el resto se escribe igual
+                logger.warning(f"Lote {kind} de {len(rows)} filas falló, reintentando por fila: {e}")
+                for row in rows:
+                    try:
+                        results.update(_run(session, write.cypher, [row]))
+                        self._count(batches=1)
+                    except Exception as row_error:
+                        self._fail([futures[row["_i"]]], row_error)
+
+        written = 0
+        for i, future in futures.items():
+            if not future.done():
+                future.set_result(results.get(i, write.default))
+                written += 1
+        self._count(rows=written)
+        for future, original in repeated:
+            error = original.exception()
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(write.default)
+
+    def _fail(self, futures: List[Future], error: Exception):
+        if not futures:
+            return
+        self._count(errors=len(futures))
+        logger.warning(f"No se pudieron escribir {len(futures)} filas en Neo4j: {error}")
+        for future in futures:
+            future.set_exception(error)
+
+
+graph_writer = GraphWriter(connection_manager)
@@ -0,0 +1,309 @@
+"""
+Lógica de request compartida por las rutas sync (app/main.py) y async
+(app/async_api.py) de Red K.
+
+Acá va todo lo que no es I/O: validaciones, filtros y páginas de MongoDB,
+payloads para el GraphWriter y armado de las respuestas. Cada router hace
+sus propias llamadas a las bases (sync o async) y usa estas funciones para
+el resto, así las dos versiones de un endpoint no pueden divergir.
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException, Response
+
+from app import conversations, feed_cache, likes, suggestion_sets, timelines
+from app.pagination import DIRECTION_BEFORE, NEXT_CURSOR_HEADER, Page
+from app.schemas import (
+    DMCreate,
+    DMOut,
+    FeedMode,
+    LikeResponse,
+    LikesBatchRequest,
+    PostOut,
+    SuggestionOut,
+)
+
+USER_NOT_FOUND = "Usuario no encontrado"
+
+
+def require(doc: Optional[Dict], detail: str = USER_NOT_FOUND) -> Dict:
+    """404 con `detail` si el documento no existe"""
+    if not doc:
+        raise HTTPException(status_code=404, detail=detail)
+    return doc
+
+
+def users_query(*usernames: str) -> Dict:
+    """Filtro de `users` para traer varios usuarios en una sola consulta"""
+    return {"username": {"$in": list(usernames)}}
+
+
+def by_username(docs: Iterable[Dict]) -> Dict[str, Dict]:
+    return {d.get("username"): d for d in docs}
+
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]):
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+
+# ========== FOLLOWS ==========
+
+def check_follow_pair(username: str, target_username: str, followed: bool):
+    if username == target_username:
+        detail = "No puedes seguirte a ti mismo" if followed else "No puedes dejar de seguirte a ti mismo"
+        raise HTTPException(status_code=400, detail=detail)
+
+
+def follow_ids(docs: Iterable[Dict], username: str, target_username: str) -> Tuple[str, str]:
+    """(_id de username, _id de target) a partir de users_query(username, target)"""
+    users = by_username(docs)
+    user_doc = require(users.get(username), "Usuario origen no existe")
+    target_doc = require(users.get(target_username), "Usuario destino no existe")
+    return str(user_doc["_id"]), str(target_doc["_id"])
+
+
+def follow_payload(user_id: str, username: str, target_id: str, target_username: str) -> Dict:
+    """Datos del write "follow" del GraphWriter (app/graph_writer.py)"""
+    return {
+        "user_id": user_id,
+        "username": username,
+        "target_id": target_id,
+        "target_username": target_username,
+        "now": datetime.utcnow().isoformat(),
+    }
+
+
+def follow_filter(username: str, target_username: str) -> Dict:
+    """Documento de `follows` (fallback sin Neo4j)"""
+    return {"follower": username, "following": target_username}
+
+
+def not_following(username: str, target_username: str) -> HTTPException:
+    return HTTPException(status_code=404, detail=f"{username} no sigue a {target_username}")
+
+
+def follow_message(username: str, target_username: str, followed: bool) -> Dict:
+    if followed:
+        return {"message": f"{username} ahora sigue a {target_username}"}
+    return {"message": f"{username} dejó de seguir a {target_username}"}
+
+
+# ========== FEED ==========
+
+def feed_page(before: Optional[str], after: Optional[str], limit: int) -> Page:
+    return Page(before, after, limit, newest_first=True)
+
+
+def uses_timeline(mode: FeedMode) -> bool:
+    """Modos con follows: se leen del timeline materializado"""
+    return mode in (FeedMode.all, FeedMode.following_only)
+
+
+def timeline_cursor(page: Page, mode: FeedMode) -> Optional[Tuple[float, str]]:
+    """(score, post_id) para leer una página `before` del timeline; None si va por Mongo"""
+    if page.direction != DIRECTION_BEFORE or not uses_timeline(mode):
+        return None
+    return timelines.post_score(page.created_at), str(page.doc_id)
+
+
+def feed_depth(limit: int) -> int:
+    """
+    Ids que se leen para la primera página: hasta la profundidad del cache,
+    así la entrada sirve también a limits mayores
+    """
+    return max(limit, min(feed_cache.FEED_CACHE_DEPTH, timelines.TIMELINE_MAX_LEN))
+
+
+def pull_authors(username: str, mode: FeedMode, following: List[str]) -> List[str]:
+    """Autores de la consulta directa según el modo (`following` vacío en mode=self)"""
+    authors: List[str] = []
+    if mode in (FeedMode.all, FeedMode.self_only):
+        authors.append(username)
+    if uses_timeline(mode):
+        authors.extend(u for u in dict.fromkeys(following) if u != username)
+    return authors
+
+
+def pull_query(page: Page, authors: List[str]) -> Dict:
+    return page.query({"author_username": {"$in": authors}})
+
+
+def pull_page(page: Page, docs: List[Dict]) -> Tuple[List[PostOut], Optional[str]]:
+    docs, next_cursor = page.finish(docs)
+    return [timelines.doc_to_post(d) for d in docs], next_cursor
+
+
+def feed_response(response: Response, path: str, next_cursor: Optional[str]):
+    """Métrica del camino + headers X-Feed-Path / X-Next-Cursor"""
+    timelines.feed_metrics.incr(f"feed_path_{path}")
+    response.headers["X-Feed-Path"] = path
+    set_next_cursor(response, next_cursor)
+
+
+# ========== SUGERENCIAS ==========
+
+SUGGESTION_FIELDS = {"username": 1, "name": 1, "bio": 1, "email": 1}
+PPR_FIELDS = {**SUGGESTION_FIELDS, "followers_count": 1, "posts_count": 1}
+
+LIVE_SUGGESTIONS_CYPHER = """
+// u = usuario base
+MATCH (u:User {id: $user_id})-[:FOLLOWS]->(:User)-[:FOLLOWS]->(s:User)
+WHERE s.id <> $user_id
+  AND NOT (u)-[:FOLLOWS]->(s)
+WITH u, s, COUNT(*) AS mutual_connections
+
+// followers y posts de s: contadores del nodo (app/user_counters.py)
+WITH s,
+     mutual_connections,
+     coalesce(s.followers_count, 0) AS followers_count,
+     coalesce(s.posts_count, 0) AS posts_count
+
+// Score compuesto
+RETURN
+    s.username AS username,
+    s.name AS name,
+    s.bio AS bio,
+    s.email AS email,
+    mutual_connections,
+    followers_count,
+    posts_count,
+    (mutual_connections * 3.0
+     + followers_count * 2.0
+     + posts_count * 1.0) AS score
+ORDER BY score DESC, username ASC
+LIMIT $limit
+"""
+
+
+def ranked_query(ranked: List[Dict]) -> Dict:
+    return users_query(*(item["username"] for item in ranked))
+
+
+def set_suggestion_headers(response: Response, computed_at: Optional[str], updated_at: Optional[str] = None):
+    if computed_at:
+        response.headers[suggestion_sets.COMPUTED_AT_HEADER] = computed_at
+        if updated_at:
+            response.headers[suggestion_sets.UPDATED_AT_HEADER] = updated_at
+
+
+def live_suggestion(record) -> SuggestionOut:
+    return SuggestionOut(
+        username=record["username"],
+        name=record.get("name"),
+        bio=record.get("bio"),
+        email=record.get("email"),
+        score=record["score"],
+        reason="Amigos de tus amigos + actividad",
+        mutual_connections=record["mutual_connections"],
+        followers_count=record["followers_count"],
+        posts_count=record["posts_count"],
+    )
+
+
+def not_followed_query(username: str, following: List[str]) -> Dict:
+    """Usuarios que todavía no sigue (último respaldo, sin grafo)"""
+    return {"username": {"$nin": [username, *following]}}
+
+
+def random_suggestion(doc: Dict) -> SuggestionOut:
+    return SuggestionOut(
+        username=doc.get("username"),
+        name=doc.get("name"),
+        bio=doc.get("bio"),
+        email=doc.get("email"),
+        score=1.0,
+        reason="Usuarios aleatorios (sin datos de grafo suficientes)",
+        mutual_connections=0,
+        followers_count=0,
+        posts_count=0,
+    )
+
+
+# ========== DMs ==========
+
+def check_dm_users(docs: Iterable[Dict], *expected: Tuple[str, str]):
+    """404 para el primer (username, detalle) de `expected` que no esté en `docs`"""
+    users = by_username(docs)
+    for username, detail in expected:
+        require(users.get(username), detail)
+
+
+def dm_doc(dm: DMCreate, conversation_key: str, created_at: str) -> Dict:
+    """Documento de `dms` de un mensaje nuevo"""
+    return {
+        "sender_username": dm.sender_username,
+        "receiver_username": dm.receiver_username,
+        "content": dm.content,
+        "created_at": created_at,
+        "read": False,
+        "read_at": None,
+        "conversation_key": conversation_key,
+    }
+
+
+def message_payload(dm: DMCreate, created_at: str) -> Dict:
+    """Datos del write "message" del GraphWriter"""
+    return {"sender": dm.sender_username, "receiver": dm.receiver_username, "created_at": created_at}
+
+
+def dm_out(dm_id: str, dm: DMCreate, created_at: str) -> DMOut:
+    return DMOut(
+        id=dm_id,
+        sender_username=dm.sender_username,
+        receiver_username=dm.receiver_username,
+        content=dm.content,
+        created_at=created_at,
+        read=False,
+        read_at=None,
+    )
+
+
+def conversations_page(before: Optional[str], limit: int) -> Page:
+    return Page(before, None, limit, newest_first=True, time_field="last_message_at")
+
+
+def conversations_query(page: Page, username: str) -> Dict:
+    return page.query({"owner": username})
+
+
+def messages_query(page: Page, conversation_key: str) -> Dict:
+    return page.query({"conversation_key": conversation_key})
+
+
+def read_mark(messages: List[Dict], watermarks: Dict[str, Dict], username: str) -> Optional[str]:
+    """Hasta dónde avanzar la marca de lectura de `username`; None si no avanza"""
+    if not messages:
+        return None
+    up_to = max(m["created_at"] for m in messages)
+    current = (watermarks.get(username) or {}).get("last_read_at")
+    if current and up_to <= current:
+        return None
+    return up_to
+
+
+def conversation_out(messages: List[Dict], watermarks: Dict[str, Dict]) -> List[DMOut]:
+    """read / read_at de cada mensaje salen de la marca de su receptor"""
+    conversations.apply_watermarks(messages, watermarks)
+    return [DMOut(**m) for m in messages]
+
+
+# ========== LIKES ==========
+
+def like_response(post_id: str, likes_count: int, user_liked: bool) -> LikeResponse:
+    return LikeResponse(post_id=post_id, likes_count=likes_count, user_liked=user_liked)
+
+
+def check_likes_batch(request: LikesBatchRequest):
+    if len(request.post_ids) > likes.LIKES_BATCH_MAX:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Máximo {likes.LIKES_BATCH_MAX} posts por request",
+        )
+
+
+def likes_batch_response(request: LikesBatchRequest, states: Dict[str, Tuple[int, bool]]) -> List[LikeResponse]:
+    """Una respuesta por post, en el orden pedido y sin repetidos"""
+    return [like_response(post_id, *states[post_id]) for post_id in dict.fromkeys(request.post_ids)]
@@ -0,0 +1,830 @@
+"""
+Likes con Redis como fuente principal para Red K.
+
+Redis guarda el estado de cada post y responde los likes en O(1):
+
+- post:{post_id}:likes:users   SET de usernames que dieron like
+- post:{post_id}:likes:count   contador (SCARD mantenido a mano, un GET)
+- post:{post_id}:likes:ready   marca de post cargado desde MongoDB
+- {trending:N}:posts           ZSET post_id → likes, en el shard N del post
+- {trending:N}:{5m|1h}:{slot}  buckets de trending por ventana (app/trending.py)
+- likes:events:{p}             STREAM de likes/unlikes pendientes de MongoDB,
+                               partición p = crc32(post_id) % LIKES_PARTITIONS
+- likes:events:{p}:lease       worker que aplica la partición p (con TTL)
+- likes:flushers               ZSET consumer → último heartbeat de cada flusher
+
+Un like/unlike es un solo EVALSHA que cambia el SET, el contador, el ranking y
+agrega el evento al stream de su partición de forma atómica: dos clics
+simultáneos no pueden contar doble. La colección `likes` de MongoDB se
+actualiza por detrás (write-behind): LikeFlusher lee el stream con un consumer
+group, aplica cada lote con un solo bulk_write y recién entonces hace
+XACK + XDEL.
+
+Cada partición la aplica un solo worker a la vez (el dueño de su lease), así
+que los eventos de un mismo post llegan a MongoDB en el orden del stream: un
+like y su unlike no pueden quedar en lotes de workers distintos y aplicarse
+al revés. Los workers vivos se reparten las particiones. El dueño siempre
+reclama primero lo pendiente en el grupo (un lote que falló, o el de un dueño
+anterior que se cayó) y después lee lo nuevo; como las operaciones son
+upserts/deletes por (post_id, username), repetir un lote no cambia el
+resultado. `likes:events` sin partición es el stream de antes: mientras tenga
+entradas lo vacía el dueño de la partición 0 y las demás esperan.
+
+Un post sin la marca `ready` (p. ej. likes anteriores a este esquema) se carga
+desde MongoDB la primera vez que se toca. Las keys no llevan TTL: son el dato,
+no un cache. Si Redis no responde se usa directamente MongoDB, como antes.
+
+Los likes que se escriben en MongoDB con Redis caído quedan anotados en
+`likes_fallback` (post_id, username). Cuando Redis vuelve, `reconcile_fallback`
+(LikeFlusher cada LIKES_RECONCILE_INTERVAL_S, o `POST /admin/likes/reconcile`)
+copia a Redis el estado de MongoDB de esos usuarios en los posts ya cargados,
+salvo que el stream tenga un evento más nuevo del mismo usuario en ese post.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+import zlib
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import DeleteOne, UpdateOne
+
+from app import trending
+from app.connections import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+# Prefijo de los streams por partición (y el stream sin partición de antes)
+LIKES_STREAM = "likes:events"
+LIKES_GROUP = "likes-flusher"
+LIKES_FLUSHERS_KEY = "likes:flushers"
+LIKES_PARTITIONS = int(os.getenv("LIKES_PARTITIONS", "8"))
+
+LIKES_FLUSH_BATCH = int(os.getenv("LIKES_FLUSH_BATCH", "500"))
+LIKES_FLUSH_INTERVAL_MS = int(os.getenv("LIKES_FLUSH_INTERVAL_MS", "1000"))
+# Un worker que no renueva su lease en este tiempo pierde sus particiones
+LIKES_LEASE_MS = int(os.getenv("LIKES_LEASE_MS", "30000"))
+LIKES_FLUSHER = os.getenv("LIKES_FLUSHER", "true").lower() in ("1", "true", "yes")
+# Likes escritos solo en MongoDB (Redis caído) pendientes de pasar a Redis
+LIKES_FALLBACK_COLLECTION = "likes_fallback"
+LIKES_RECONCILE_INTERVAL_S = int(os.getenv("LIKES_RECONCILE_INTERVAL_S", "30"))
+# Con más eventos sin aplicar que esto en el stream se reintenta más tarde
+LIKES_RECONCILE_MAX_STREAM = int(os.getenv("LIKES_RECONCILE_MAX_STREAM", "10000"))
+
+# Máximo de posts por POST /posts/likes:batch
+LIKES_BATCH_MAX = 200
+
+OP_LIKE = "like"
+OP_UNLIKE = "unlike"
+
+# KEYS: users, count, ready, trending, stream, buckets de trending por ventana...
+# ARGV: post_id, username, op, ts, ttl de cada bucket...
+# Devuelve {count, liked, changed}; {-1, 0, 0} si el post no está cargado
+_TOGGLE_LUA = """
+if redis.call('EXISTS', KEYS[3]) == 0 then
+    return {-1, 0, 0}
+end
+local like = ARGV[3] == 'like'
+local changed
+if like then
+    changed = redis.call('SADD', KEYS[1], ARGV[2])
+else
+    changed = redis.call('SREM', KEYS[1], ARGV[2])
+end
+local count
+if changed == 1 then
+    local delta = like and 1 or -1
+    count = redis.call('INCRBY', KEYS[2], delta)
+    redis.call('ZINCRBY', KEYS[4], delta, ARGV[1])
+    for i = 6, #KEYS do
+        redis.call('ZINCRBY', KEYS[i], delta, ARGV[1])
+        redis.call('EXPIRE', KEYS[i], ARGV[i - 1])
+    end
+    redis.call('XADD', KEYS[5], '*', 'post_id', ARGV[1], 'username', ARGV[2],
+               'op', ARGV[3], 'ts', ARGV[4])
+else
+    count = tonumber(redis.call('GET', KEYS[2]) or '0')
+end
+return {count, like and 1 or 0, changed}
+"""
+
+# KEYS: users, count, ready, trending
+# ARGV: post_id, usernames que ya tienen like en MongoDB...
+_LOAD_LUA = """
+if redis.call('EXISTS', KEYS[3]) == 1 then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+for i = 2, #ARGV do
+    redis.call('SADD', KEYS[1], ARGV[i])
+end
+local count = redis.call('SCARD', KEYS[1])
+redis.call('SET', KEYS[2], count)
+redis.call('SET', KEYS[3], 1)
+if count > 0 then
+    redis.call('ZADD', KEYS[4], count, ARGV[1])
+end
+return 1
+"""
+
+# KEYS: users, count, ready, trending, stream de la partición
+# ARGV: post_id, último id del stream ya revisado, pares (username, '1' si tiene like en MongoDB)...
+# Devuelve 1 si corrigió, 0 si el post no está cargado
+_RECONCILE_LUA = """
+if redis.call('EXISTS', KEYS[3]) == 0 then
+    return 0
+end
+-- Un evento en el stream es posterior a lo que dice MongoDB: manda Redis.
+-- Lo anterior a ARGV[2] ya se descartó al armar los pares; aquí solo la cola
+local pending = {}
+for _, entry in ipairs(redis.call('XRANGE', KEYS[5], '(' .. ARGV[2], '+')) do
+    local fields = entry[2]
+    if fields then
+        local post, user
+        for i = 1, #fields, 2 do
+            if fields[i] == 'post_id' then post = fields[i + 1]
+            elseif fields[i] == 'username' then user = fields[i + 1] end
+        end
+        if post == ARGV[1] and user then
+            pending[user] = true
+        end
+    end
+end
+for i = 3, #ARGV, 2 do
+    if not pending[ARGV[i]] then
+        if ARGV[i + 1] == '1' then
+            redis.call('SADD', KEYS[1], ARGV[i])
+        else
+            redis.call('SREM', KEYS[1], ARGV[i])
+        end
+    end
+end
+local count = redis.call('SCARD', KEYS[1])
+redis.call('SET', KEYS[2], count)
+if count > 0 then
+    redis.call('ZADD', KEYS[4], count, ARGV[1])
+else
+    redis.call('ZREM', KEYS[4], ARGV[1])
+end
+return 1
+"""
+
+# KEYS: likes:flushers, leases de las particiones (en el orden de preferencia del worker)
+# ARGV: consumer, ttl del lease (ms), ahora (ms), total de particiones
+# Renueva los leases propios, toma libres hasta su parte y suelta los que sobran.
+# Devuelve las posiciones (0-based, en KEYS[2..]) de los leases que tiene
+_LEASE_LUA = """
+local now = tonumber(ARGV[3])
+redis.call('ZADD', KEYS[1], now, ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - tonumber(ARGV[2]))
+local share = math.ceil(tonumber(ARGV[4]) / math.max(redis.call('ZCARD', KEYS[1]), 1))
+local held, free = {}, {}
+for i = 2, #KEYS do
+    local holder = redis.call('GET', KEYS[i])
+    if holder == ARGV[1] then
+        table.insert(held, i)
+    elseif not holder then
+        table.insert(free, i)
+    end
+end
+local result = {}
+for _, i in ipairs(held) do
+    if #result < share then
+        redis.call('PEXPIRE', KEYS[i], ARGV[2])
+        table.insert(result, i - 2)
+    else
+        redis.call('DEL', KEYS[i])
+    end
+end
+for _, i in ipairs(free) do
+    if #result >= share then
+        break
+    end
+    redis.call('SET', KEYS[i], ARGV[1], 'PX', ARGV[2])
+    table.insert(result, i - 2)
+end
+return result
+"""
+
+# KEYS: likes:flushers, leases; ARGV: consumer
+_RELEASE_LUA = """
+redis.call('ZREM', KEYS[1], ARGV[1])
+for i = 2, #KEYS do
+    if redis.call('GET', KEYS[i]) == ARGV[1] then
+        redis.call('DEL', KEYS[i])
+    end
+end
+return 1
+"""
+
+
+# ========== KEYS ==========
+
+def likes_users_key(post_id: str) -> str:
+    return f"post:{post_id}:likes:users"
+
+
+def likes_count_key(post_id: str) -> str:
+    return f"post:{post_id}:likes:count"
+
+
+def likes_ready_key(post_id: str) -> str:
+    return f"post:{post_id}:likes:ready"
+
+
+def partition_of(post_id: str, partitions: Optional[int] = None) -> int:
+    return zlib.crc32(post_id.encode()) % (partitions or LIKES_PARTITIONS)
+
+
+def likes_stream_key(partition: int) -> str:
+    return f"{LIKES_STREAM}:{partition}"
+
+
+def _lease_key(stream: str) -> str:
+    return f"{stream}:lease"
+
+
+def _toggle_call(post_id: str, username: str, like: bool) -> Tuple[List[str], List]:
+    """KEYS y ARGV de _TOGGLE_LUA, con los buckets de trending actuales"""
+    buckets = trending.current_buckets(post_id)
+    keys = [
+        likes_users_key(post_id),
+        likes_count_key(post_id),
+        likes_ready_key(post_id),
+        trending.all_key(trending.shard_of(post_id)),
+        likes_stream_key(partition_of(post_id)),
+        *(key for key, _ in buckets),
+    ]
+    args = [
+        post_id,
+        username,
+        OP_LIKE if like else OP_UNLIKE,
+        datetime.utcnow().isoformat(),
+        *(ttl for _, ttl in buckets),
+    ]
+    return keys, args
+
+
+def _load_keys(post_id: str) -> List[str]:
+    return [likes_users_key(post_id), likes_count_key(post_id), likes_ready_key(post_id),
+            trending.all_key(trending.shard_of(post_id))]
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+# ========== SYNC ==========
+
+def _load_post(conns: ConnectionManager, r, post_id: str):
+    """Cargar en Redis los likes que el post ya tiene en MongoDB"""
+    usernames = [
+        doc["username"]
+        for doc in conns.mongo_db()["likes"].find({"post_id": post_id}, {"username": 1})
+        if doc.get("username")
+    ]
+    r.register_script(_LOAD_LUA)(keys=_load_keys(post_id), args=[post_id, *usernames])
+
+
+def toggle_like(conns: ConnectionManager, post_id: str, username: str, like: bool) -> Tuple[int, bool, bool]:
+    """
+    Dar (like=True) o quitar (like=False) un like en Redis.
+
+    Returns:
+        (likes_count, user_liked, changed); changed=False si ya estaba en ese estado
+    """
+    r = conns.redis
+    toggle = r.register_script(_TOGGLE_LUA)
+    keys, args = _toggle_call(post_id, username, like)
+
+    count, liked, changed = toggle(keys=keys, args=args)
+    if count == -1:
+        _load_post(conns, r, post_id)
+        count, liked, changed = toggle(keys=keys, args=args)
+    return int(count), bool(liked), bool(changed)
+
+
+def _fallback_mark(post_id: str, username: str) -> Tuple[Dict, Dict]:
+    return (
+        {"post_id": post_id, "username": username},
+        {"$set": {"at": datetime.utcnow().isoformat()}},
+    )
+
+
+def toggle_like_mongo(conns: ConnectionManager, post_id: str, username: str, like: bool) -> Tuple[int, bool, bool]:
+    """Respaldo sin Redis: escribir y contar directamente en MongoDB"""
+    db = conns.mongo_db()
+    db[LIKES_FALLBACK_COLLECTION].update_one(*_fallback_mark(post_id, username), upsert=True)
+    likes_col = db["likes"]
+    if like:
+        result = likes_col.update_one(
+            {"post_id": post_id, "username": username},
+            {"$setOnInsert": {"created_at": datetime.utcnow().isoformat()}},
+            upsert=True,
+        )
+        changed = result.upserted_id is not None
+    else:
+        changed = likes_col.delete_one({"post_id": post_id, "username": username}).deleted_count > 0
+    return likes_col.count_documents({"post_id": post_id}), like, changed
+
+
+def get_like_state(conns: ConnectionManager, post_id: str, username: Optional[str] = None) -> Tuple[int, bool]:
+    """(likes_count, user_liked) en un round trip; carga el post si hace falta"""
+    try:
+        r = conns.redis
+        for _ in range(2):
+            pipe = r.pipeline(transaction=False)
+            pipe.exists(likes_ready_key(post_id))
+            pipe.get(likes_count_key(post_id))
+            if username:
+                pipe.sismember(likes_users_key(post_id), username)
+            results = pipe.execute()
+            if results[0]:
+                return int(results[1] or 0), bool(username and results[2])
+            _load_post(conns, r, post_id)
+    except Exception as e:
+        logger.warning(f"Redis no disponible para likes de {post_id}, usando MongoDB: {e}")
+
+    likes_col = conns.mongo_db()["likes"]
+    count = likes_col.count_documents({"post_id": post_id})
+    user_liked = bool(username) and likes_col.find_one({"post_id": post_id, "username": username}) is not None
+    return count, user_liked
+
+
+def _batch_pipeline(pipe, post_ids: List[str], username: Optional[str]):
+    for post_id in post_ids:
+        pipe.exists(likes_ready_key(post_id))
+        pipe.get(likes_count_key(post_id))
+        if username:
+            pipe.sismember(likes_users_key(post_id), username)
+
+
+def _batch_results(results: List, post_ids: List[str], username: Optional[str]) -> Tuple[Dict[str, Tuple[int, bool]], List[str]]:
+    """Resultados del pipeline → (estados de posts cargados, ids sin cargar)"""
+    step = 3 if username else 2
+    states: Dict[str, Tuple[int, bool]] = {}
+    missing: List[str] = []
+    for i, post_id in enumerate(post_ids):
+        ready, count, *member = results[i * step:(i + 1) * step]
+        if ready:
+            states[post_id] = (int(count or 0), bool(member and member[0]))
+        else:
+            missing.append(post_id)
+    return states, missing
+
+
+def _batch_aggregation(post_ids: List[str], username: Optional[str]) -> List[Dict]:
+    """Un solo $group sobre `likes`: conteo y si `username` está entre los likes"""
+    liked = {"$max": {"$cond": [{"$eq": ["$username", username]}, 1, 0]}} if username else {"$max": 0}
+    return [
+        {"$match": {"post_id": {"$in": post_ids}}},
+        {"$group": {"_id": "$post_id", "count": {"$sum": 1}, "liked": liked}},
+    ]
+
+
+def _liked_ids(missing: List[str], states: Dict[str, Tuple[int, bool]]) -> List[str]:
+    """Posts sin cargar que tienen likes en MongoDB (los demás se cargan vacíos)"""
+    return [post_id for post_id in missing if states[post_id][0] > 0]
+
+
+def _load_calls(missing: List[str], docs: Iterable[Dict]) -> List[Tuple[List[str], List]]:
+    """(keys, args) de un _LOAD_LUA por post, con los usernames de `docs` ({post_id, username})"""
+    usernames: Dict[str, List[str]] = {post_id: [] for post_id in missing}
+    for doc in docs:
+        if doc.get("username") and doc.get("post_id") in usernames:
+            usernames[doc["post_id"]].append(doc["username"])
+    return [(_load_keys(post_id), [post_id, *usernames[post_id]]) for post_id in missing]
+
+
+def _load_posts(conns: ConnectionManager, r, missing: List[str], states: Dict[str, Tuple[int, bool]]):
+    """
+    Cargar en Redis los posts que get_like_states leyó de MongoDB: una
+    consulta `$in` por los likes de los que tienen alguno y un pipeline de
+    _LOAD_LUA (no pisa un post que se cargó mientras tanto)
+    """
+    liked = _liked_ids(missing, states)
+    docs = []
+    if liked:
+        docs = conns.mongo_db()["likes"].find({"post_id": {"$in": liked}}, {"post_id": 1, "username": 1})
+    load = r.register_script(_LOAD_LUA)
+    pipe = r.pipeline(transaction=False)
+    for keys, args in _load_calls(missing, docs):
+        load(keys=keys, args=args, client=pipe)
+    pipe.execute()
+
+
+def get_like_states(conns: ConnectionManager, post_ids: List[str],
+                    username: Optional[str] = None) -> Dict[str, Tuple[int, bool]]:
+    """
+    (likes_count, user_liked) de varios posts: un pipeline de Redis para todos
+    y una sola agregación `$in` en MongoDB para los que no estén cargados.
+    Después se cargan en Redis, así el próximo feed ya no va a MongoDB.
+    """
+    post_ids = list(dict.fromkeys(post_ids))
+    states: Dict[str, Tuple[int, bool]] = {}
+    missing = post_ids
+    r = None
+    try:
+        pipe = conns.redis.pipeline(transaction=False)
+        _batch_pipeline(pipe, post_ids, username)
+        states, missing = _batch_results(pipe.execute(), post_ids, username)
+        r = conns.redis
+    except Exception as e:
+        logger.warning(f"Redis no disponible para likes en lote, usando MongoDB: {e}")
+
+    if missing:
+        for doc in conns.mongo_db()["likes"].aggregate(_batch_aggregation(missing, username)):
+            states[doc["_id"]] = (doc["count"], bool(doc["liked"]))
+        for post_id in missing:
+            states.setdefault(post_id, (0, False))
+        if r is not None:
+            try:
+                _load_posts(conns, r, missing, states)
+            except Exception as e:
+                logger.warning(f"No se pudieron cargar los likes de {len(missing)} posts: {e}")
+    return states
+
+
+# ========== ASYNC (redis.asyncio + AsyncMongoClient) ==========
+
+async def _load_post_async(aconns, r, post_id: str):
+    cursor = aconns.mongo_db()["likes"].find({"post_id": post_id}, {"username": 1})
+    usernames = [doc["username"] async for doc in cursor if doc.get("username")]
+    await r.register_script(_LOAD_LUA)(keys=_load_keys(post_id), args=[post_id, *usernames])
+
+
+async def toggle_like_async(aconns, post_id: str, username: str, like: bool) -> Tuple[int, bool, bool]:
+    """Versión async de toggle_like"""
+    r = aconns.redis
+    toggle = r.register_script(_TOGGLE_LUA)
+    keys, args = _toggle_call(post_id, username, like)
+
+    count, liked, changed = await toggle(keys=keys, args=args)
+    if count == -1:
+        await _load_post_async(aconns, r, post_id)
+        count, liked, changed = await toggle(keys=keys, args=args)
+    return int(count), bool(liked), bool(changed)
+
+
+async def toggle_like_mongo_async(aconns, post_id: str, username: str, like: bool) -> Tuple[int, bool, bool]:
+    db = aconns.mongo_db()
+    await db[LIKES_FALLBACK_COLLECTION].update_one(*_fallback_mark(post_id, username), upsert=True)
+    likes_col = db["likes"]
+    if like:
+        result = await likes_col.update_one(
+            {"post_id": post_id, "username": username},
+            {"$setOnInsert": {"created_at": datetime.utcnow().isoformat()}},
+            upsert=True,
+        )
+        changed = result.upserted_id is not None
+    else:
+        changed = (await likes_col.delete_one({"post_id": post_id, "username": username})).deleted_count > 0
+    return await likes_col.count_documents({"post_id": post_id}), like, changed
+
+
+async def get_like_state_async(aconns, post_id: str, username: Optional[str] = None) -> Tuple[int, bool]:
+    """Versión async de get_like_state"""
+    try:
+        r = aconns.redis
+        for _ in range(2):
+            pipe = r.pipeline(transaction=False)
+            pipe.exists(likes_ready_key(post_id))
+            pipe.get(likes_count_key(post_id))
+            if username:
+                pipe.sismember(likes_users_key(post_id), username)
+            results = await pipe.execute()
+            if results[0]:
+                return int(results[1] or 0), bool(username and results[2])
+            await _load_post_async(aconns, r, post_id)
+    except Exception as e:
+        logger.warning(f"Redis no disponible para likes de {post_id}, usando MongoDB: {e}")
+
+    likes_col = aconns.mongo_db()["likes"]
+    count = await likes_col.count_documents({"post_id": post_id})
+    user_liked = bool(username) and await likes_col.find_one({"post_id": post_id, "username": username}) is not None
+    return count, user_liked
+
+
+async def get_like_states_async(aconns, post_ids: List[str],
+                                username: Optional[str] = None) -> Dict[str, Tuple[int, bool]]:
+    """Versión async de get_like_states"""
+    post_ids = list(dict.fromkeys(post_ids))
+    states: Dict[str, Tuple[int, bool]] = {}
+    missing = post_ids
+    r = None
+    try:
+        pipe = aconns.redis.pipeline(transaction=False)
+        _batch_pipeline(pipe, post_ids, username)
+        states, missing = _batch_results(await pipe.execute(), post_ids, username)
+        r = aconns.redis
+    except Exception as e:
+        logger.warning(f"Redis no disponible para likes en lote, usando MongoDB: {e}")
+
+    if missing:
+        cursor = await aconns.mongo_db()["likes"].aggregate(_batch_aggregation(missing, username))
+        async for doc in cursor:
+            states[doc["_id"]] = (doc["count"], bool(doc["liked"]))
+        for post_id in missing:
+            states.setdefault(post_id, (0, False))
+        if r is not None:
+            try:
+                await _load_posts_async(aconns, r, missing, states)
+            except Exception as e:
+                logger.warning(f"No se pudieron cargar los likes de {len(missing)} posts: {e}")
+    return states
+
+
+async def _load_posts_async(aconns, r, missing: List[str], states: Dict[str, Tuple[int, bool]]):
+    liked = _liked_ids(missing, states)
+    docs = []
+    if liked:
+        cursor = aconns.mongo_db()["likes"].find({"post_id": {"$in": liked}}, {"post_id": 1, "username": 1})
+        docs = await cursor.to_list(length=None)
+    load = r.register_script(_LOAD_LUA)
+    pipe = r.pipeline(transaction=False)
+    for keys, args in _load_calls(missing, docs):
+        await load(keys=keys, args=args, client=pipe)
+    await pipe.execute()
+
+
+def embed_like_states(posts: List, states: Dict[str, Tuple[int, bool]]) -> List:
+    """Copias de los PostOut con likes_count / user_liked (sin tocar los cacheados)"""
+    return [
+        post.model_copy(update={
+            "likes_count": states.get(post.id, (0, False))[0],
+            "user_liked": states.get(post.id, (0, False))[1],
+        })
+        for post in posts
+    ]
+
+
+# ========== WRITE-BEHIND A MONGODB ==========
+
+def _is_nogroup(e: Exception) -> bool:
+    return "NOGROUP" in str(e)
+
+
+def _create_group(r, stream: str):
+    try:
+        r.xgroup_create(stream, LIKES_GROUP, id="0", mkstream=True)
+    except Exception as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def _preferred_partitions(consumer: str) -> List[int]:
+    """Todas las particiones, empezando en una distinta por worker"""
+    start = zlib.crc32(consumer.encode()) % LIKES_PARTITIONS
+    return [(start + i) % LIKES_PARTITIONS for i in range(LIKES_PARTITIONS)]
+
+
+def hold_partitions(r, consumer: str) -> List[int]:
+    """Renovar / tomar los leases de `consumer` (su parte de las particiones)"""
+    order = _preferred_partitions(consumer)
+    keys = [LIKES_FLUSHERS_KEY, *(_lease_key(likes_stream_key(p)) for p in order)]
+    args = [consumer, LIKES_LEASE_MS, int(time.time() * 1000), LIKES_PARTITIONS]
+    return [order[int(i)] for i in r.register_script(_LEASE_LUA)(keys=keys, args=args)]
+
+
+def release_partitions(r, consumer: str):
+    """Soltar los leases de `consumer` para que otro worker siga sin esperar el TTL"""
+    keys = [LIKES_FLUSHERS_KEY, _lease_key(LIKES_STREAM),
+            *(_lease_key(likes_stream_key(p)) for p in range(LIKES_PARTITIONS))]
+    r.register_script(_RELEASE_LUA)(keys=keys, args=[consumer])
+
+
+def _to_operations(entries: List[Tuple]) -> List:
+    """
+    Eventos del stream → operaciones de bulk_write. Para cada (post, usuario)
+    solo cuenta el último evento del lote, así un like/unlike repetido en el
+    mismo lote es una sola operación.
+    """
+    last: Dict[Tuple[str, str], Tuple[str, str]] = {}
+    for _, fields in entries:
+        if not fields:
+            continue  # entrada borrada mientras estaba pendiente
+        data = {_decode(k): _decode(v) for k, v in fields.items()}
+        key = (data.get("post_id"), data.get("username"))
+        if not key[0] or not key[1]:
+            continue
+        last.pop(key, None)  # reinsertar para conservar el orden del último evento
+        last[key] = (data.get("op"), data.get("ts"))
+
+    operations = []
+    for (post_id, username), (op, ts) in last.items():
+        selector = {"post_id": post_id, "username": username}
+        if op == OP_LIKE:
+            operations.append(UpdateOne(selector, {"$setOnInsert": {"created_at": ts}}, upsert=True))
+        else:
+            operations.append(DeleteOne(selector))
+    return operations
+
+
+def _claim_pending(r, stream: str, consumer: str) -> List[Tuple]:
+    """
+    Todo lo pendiente en el grupo, de cualquier consumer: solo el dueño del
+    lease lee la partición, así que es un lote anterior sin confirmar.
+    """
+    try:
+        _, entries, *_ = r.xautoclaim(
+            stream, LIKES_GROUP, consumer, min_idle_time=0, start_id="0-0", count=LIKES_FLUSH_BATCH,
+        )
+    except Exception as e:
+        if not _is_nogroup(e):
+            raise
+        _create_group(r, stream)
+        return []
+    return entries
+
+
+def _read_new(r, streams: List[str], consumer: str, block_ms: Optional[int]) -> List[Tuple[str, List]]:
+    for attempt in range(2):
+        try:
+            response = r.xreadgroup(
+                LIKES_GROUP, consumer, {stream: ">" for stream in streams},
+                count=LIKES_FLUSH_BATCH, block=block_ms,
+            )
+            return [(_decode(stream), entries) for stream, entries in response or []]
+        except Exception as e:
+            if attempt or not _is_nogroup(e):
+                raise
+            # Primer uso (o Redis vacío): crear los grupos y volver a leer
+            for stream in streams:
+                _create_group(r, stream)
+    return []
+
+
+def _apply(conns: ConnectionManager, r, stream: str, entries: List[Tuple]) -> int:
+    operations = _to_operations(entries)
+    if operations:
+        # ordered=True: si algo falla no se hace XACK y el lote se reintenta
+        conns.mongo_db()["likes"].bulk_write(operations, ordered=True)
+
+    ids = [entry_id for entry_id, _ in entries]
+    pipe = r.pipeline(transaction=False)
+    pipe.xack(stream, LIKES_GROUP, *ids)
+    pipe.xdel(stream, *ids)
+    pipe.execute()
+    return len(entries)
+
+
+def flush_once(conns: ConnectionManager, consumer: str, block_ms: Optional[int] = None) -> int:
+    """
+    Aplicar en MongoDB un lote de cada partición que `consumer` tiene tomada.
+    Primero lo pendiente; si no hay, entradas nuevas (bloqueando hasta
+    `block_ms`). Devuelve cuántos eventos se aplicaron.
+    """
+    r = conns.redis
+    partitions = hold_partitions(r, consumer)
+    streams = [likes_stream_key(p) for p in partitions]
+    if r.exists(LIKES_STREAM):
+        # El stream de antes va primero: sus eventos son anteriores a todos
+        if 0 not in partitions:
+            streams = []
+        elif r.xlen(LIKES_STREAM):
+            streams = [LIKES_STREAM]
+        else:
+            r.delete(LIKES_STREAM)
+    if not streams:
+        if block_ms:
+            time.sleep(block_ms / 1000)
+        return 0
+
+    batches = []
+    for stream in streams:
+        entries = _claim_pending(r, stream, consumer)
+        if entries:
+            batches.append((stream, entries))
+    if not batches:
+        batches = _read_new(r, streams, consumer, block_ms)
+    return sum(_apply(conns, r, stream, entries) for stream, entries in batches if entries)
+
+
+# ========== RECONCILIACIÓN DEL RESPALDO ==========
+
+def _pending_events(r, stream: str) -> Optional[Tuple[set, str]]:
+    """
+    (post, usuario) con eventos sin aplicar en `stream` y el último id leído;
+    None si hay más de LIKES_RECONCILE_MAX_STREAM (mejor esperar al flusher).
+    """
+    if r.xlen(stream) > LIKES_RECONCILE_MAX_STREAM:
+        return None
+    pending, last_id = set(), "0-0"
+    while True:
+        entries = r.xrange(stream, min=f"({last_id}", count=LIKES_FLUSH_BATCH)
+        if not entries:
+            return pending, last_id
+        for entry_id, fields in entries:
+            data = {_decode(k): _decode(v) for k, v in (fields or {}).items()}
+            pending.add((data.get("post_id"), data.get("username")))
+            last_id = _decode(entry_id)
+
+
+def _reconcile_post(conns: ConnectionManager, r, post_id: str, usernames: List[str], last_id: str) -> int:
+    liked = {
+        doc["username"]
+        for doc in conns.mongo_db()["likes"].find(
+            {"post_id": post_id, "username": {"$in": usernames}}, {"username": 1}
+        )
+    }
+    args: List = [post_id, last_id]
+    for username in usernames:
+        args += [username, "1" if username in liked else "0"]
+    keys = [*_load_keys(post_id), likes_stream_key(partition_of(post_id))]
+    return int(r.register_script(_RECONCILE_LUA)(keys=keys, args=args))
+
+
+def reconcile_fallback(conns: ConnectionManager, batch: int = LIKES_FLUSH_BATCH) -> Dict[str, int]:
+    """
+    Pasar a Redis los likes que se escribieron solo en MongoDB. Las marcas se
+    borran solo si no cambiaron mientras tanto (otro respaldo del mismo like).
+    """
+    r = conns.redis
+    col = conns.mongo_db()[LIKES_FALLBACK_COLLECTION]
+    posts = fixed = deferred = 0
+    skip: List = []
+    # Cada partición se recorre una vez por corrida, no una vez por post
+    streams: Dict[int, Optional[Tuple[set, str]]] = {}
+    while True:
+        docs = list(col.find({"_id": {"$nin": skip}}, {"post_id": 1, "username": 1, "at": 1}).limit(batch))
+        if not docs:
+            break
+        by_post: Dict[str, List[Dict]] = {}
+        for doc in docs:
+            by_post.setdefault(doc.get("post_id"), []).append(doc)
+        done = []
+        for post_id, marks in by_post.items():
+            usernames = [m["username"] for m in marks if m.get("username")]
+            result = 0
+            if post_id and usernames:
+                partition = partition_of(post_id)
+                if partition not in streams:
+                    streams[partition] = _pending_events(r, likes_stream_key(partition))
+                if streams[partition] is None:
+                    # Stream atrasado: el flusher tiene que ponerse al día primero
+                    deferred += len(marks)
+                    skip += [m["_id"] for m in marks]
+                    continue
+                pending, last_id = streams[partition]
+                usernames = [u for u in usernames if (post_id, u) not in pending]
+                if usernames:
+                    result = _reconcile_post(conns, r, post_id, usernames, last_id)
+            posts += 1
+            fixed += result
+            done += [DeleteOne({"_id": m["_id"], "at": m.get("at")}) for m in marks]
+        if done:
+            col.bulk_write(done, ordered=False)
+    if posts or deferred:
+        logger.info(f"Likes del respaldo reconciliados: {posts} posts ({fixed} cargados), {deferred} pendientes")
+    return {"posts": posts, "fixed": fixed, "deferred": deferred}
+
+
+class LikeFlusher:
+    """
+    Hilo por worker que vacía en MongoDB las particiones de likes:events que
+    tiene tomadas. Los leases reparten las particiones entre los workers, así
+    que cada partición la aplica uno solo y en orden.
+    """
+
+    def __init__(self, conns: ConnectionManager):
+        self.conns = conns
+        self.consumer = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.flushed = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="likes-flusher", daemon=True)
+        self._thread.start()
+        logger.info(f"LikeFlusher iniciado ({self.consumer})")
+
+    def _run(self):
+        next_reconcile = 0.0
+        while not self._stop.is_set():
+            try:
+                self.flushed += flush_once(self.conns, self.consumer, block_ms=LIKES_FLUSH_INTERVAL_MS)
+                if time.monotonic() >= next_reconcile:
+                    next_reconcile = time.monotonic() + LIKES_RECONCILE_INTERVAL_S
+                    reconcile_fallback(self.conns)
+            except Exception as e:
+                logger.warning(f"No se pudieron aplicar likes en MongoDB (se reintenta): {e}")
+                self._stop.wait(LIKES_FLUSH_INTERVAL_MS / 1000)
+
+    def stop(self):
+        """Detener el hilo y aplicar lo que quede en el stream"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=LIKES_FLUSH_INTERVAL_MS / 1000 + 5)
+        self._thread = None
+        try:
+            while flush_once(self.conns, self.consumer):
+                pass
+            release_partitions(self.conns.redis, self.consumer)
+        except Exception as e:
+            logger.warning(f"Quedaron likes sin aplicar en MongoDB (se aplican al reiniciar): {e}")
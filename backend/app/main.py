@@ -1,19 +1,31 @@
 import os
-from typing import Optional, List
+import time
+from contextlib import asynccontextmanager
+from typing import Optional, List, Tuple
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
 from dotenv import load_dotenv
 
-from pymongo import MongoClient
-from bson import ObjectId
-import redis
-from neo4j import GraphDatabase
-
 from datetime import datetime
-import json
-from enum import Enum
+
+from app.schemas import (
+    UserCreate,
+    UserOut,
+    UserStatsOut,
+    PostCreate,
+    PostOut,
+    FeedMode,
+    SuggestionAlgo,
+    SuggestionOut,
+    DMCreate,
+    DMOut,
+    DMConversationSummary,
+    FollowingOut,
+    LikeResponse,
+    LikesBatchRequest,
+    TrendingWindow,
+)
 
 # Importar router de observability (opcional, puede no existir en local)
 try:
@@ -26,7 +38,75 @@ except ImportError as e:
 
 load_dotenv()
 
-app = FastAPI(title="Red K - API")
+# Se importa después de load_dotenv() para que lea la config del .env
+from app.connections import (
+    ConnectionManager,
+    connection_manager,
+    async_connection_manager,
+    get_connections,
+)
+from app import conversations, db_schema, dm_cache, follow_graph, graph_writer, handlers, likes, realtime, suggestion_sets, timelines, trending, trending_snapshot, feed_cache, post_cache, ppr, user_cache, user_counters
+from app.follows import get_following_usernames, load_following_usernames, record_follow
+from app.pagination import Page, page_next_cursor, NEXT_CURSOR_HEADER
+
+# Modo async opt-in: feed, DMs, likes, follows y sugerencias con drivers asyncio
+ASYNC_API = os.getenv("ASYNC_API", "false").lower() in ("1", "true", "yes")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Abre los pools de Mongo/Redis/Neo4j al arrancar el worker
+    y los cierra al apagarlo (un ConnectionManager por proceso).
+    """
+    connection_manager.start()
+    if db_schema.SCHEMA_BOOTSTRAP:
+        # Idempotente: con el esquema al día es un solo find_one
+        try:
+            report = db_schema.bootstrap(connection_manager)
+            for backend in ("mongo", "neo4j"):
+                print(f"🗂️  Esquema {backend}: {report[backend]['status']} (v{report[backend]['version']})")
+        except Exception as e:
+            print(f"⚠️  No se pudo aplicar el esquema (no crítico): {e}")
+    if ASYNC_API:
+        await async_connection_manager.start()
+    like_flusher = None
+    if likes.LIKES_FLUSHER:
+        like_flusher = likes.LikeFlusher(connection_manager)
+        like_flusher.start()
+    trending_refresher = None
+    if trending_snapshot.TRENDING_REFRESHER:
+        trending_refresher = trending_snapshot.TrendingRefresher(connection_manager)
+        trending_refresher.start()
+    suggestion_refresher = None
+    if suggestion_sets.SUGGESTIONS_REFRESHER:
+        suggestion_refresher = suggestion_sets.SuggestionRefresher(connection_manager)
+        suggestion_refresher.start()
+    graph_sync = None
+    if follow_graph.FOLLOW_GRAPH:
+        # Carga en su hilo: el worker arranca sin esperar al grafo
+        graph_sync = follow_graph.FollowGraphSync(connection_manager)
+        graph_sync.start()
+    if graph_writer.GRAPH_WRITER:
+        # Escrituras a Neo4j de los endpoints en lotes (app/graph_writer.py)
+        graph_writer.graph_writer.start()
+    yield
+    graph_writer.graph_writer.stop()
+    if graph_sync is not None:
+        graph_sync.stop()
+    if suggestion_refresher is not None:
+        suggestion_refresher.stop()
+    if trending_refresher is not None:
+        trending_refresher.stop()
+    if like_flusher is not None:
+        like_flusher.stop()
+    await realtime.event_hub.close()
+    if ASYNC_API:
+        await async_connection_manager.close()
+    connection_manager.close()
+
+
+app = FastAPI(title="Red K - API", lifespan=lifespan)
 
 # Configurar CORS
 app.add_middleware(
@@ -35,6 +115,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[
+        NEXT_CURSOR_HEADER,
+        "X-Feed-Path",
+        suggestion_sets.COMPUTED_AT_HEADER,
+        suggestion_sets.UPDATED_AT_HEADER,
+    ],
 )
 
 # Registrar router de observability (ya tiene su propio prefix)
@@ -44,6 +130,17 @@ if OBSERVABILITY_AVAILABLE and observability_router is not None:
 else:
     print("⚠️ Router de observability no disponible - continuando sin él")
 
+# Registrar la API async ANTES de las rutas síncronas de este módulo:
+# FastAPI atiende con la primera ruta que coincide, así que en modo async
+# estas versiones reemplazan a las síncronas con el mismo path.
+if ASYNC_API:
+    from app.async_api import router as async_router
+    app.include_router(async_router)
+    print("✅ API async activada (ASYNC_API=true)")
+
+# Eventos en tiempo real (SSE): siempre async, con o sin ASYNC_API
+app.include_router(realtime.router)
+
 # --------- Config común ---------
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://127.0.0.1:27017/red_k")
 REDIS_URL = os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0")
@@ -52,86 +149,24 @@ NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "password123")
 
 
-# --------- Modelos Pydantic para usuarios ---------
-
-class UserCreate(BaseModel):
-    username: str
-    email: str
-    name: Optional[str] = None
-    bio: Optional[str] = None
-
-
-class UserOut(BaseModel):
-    id: str
-    username: str
-    email: str
-    name: Optional[str] = None
-    bio: Optional[str] = None
-
-class PostCreate(BaseModel):
-    author_username: str
-    content: str
-    tags: Optional[List[str]] = None
-
-
-class PostOut(BaseModel):
-    id: str
-    author_username: str
-    content: str
-    tags: Optional[List[str]] = None
-    created_at: str  # ISO string
-
-class FeedMode(str, Enum):
-    all = "all"          # posts tuyos + de quienes sigues
-    self_only = "self"   # solo tus posts
-    following_only = "following"  # solo posts de quienes sigues
-
-class SuggestionOut(BaseModel):
-    username: str
-    name: Optional[str] = None
-    bio: Optional[str] = None
-    email: Optional[str] = None
-    score: float
-    reason: Optional[str] = None
-    mutual_connections: int = 0
-    followers_count: int = 0
-    posts_count: int = 0
-
-class DMCreate(BaseModel):
-    sender_username: str
-    receiver_username: str
-    content: str
-
-
-class DMOut(BaseModel):
-    id: str
-    sender_username: str
-    receiver_username: str
-    content: str
-    created_at: str  # ISO string
-    read: bool
-    read_at: Optional[str] = None
-
-
-class DMConversationSummary(BaseModel):
-    with_username: str
-    last_message_content: str
-    last_message_at: str  # ISO
-    unread_count: int
+# --------- Modelos Pydantic ---------
+# Viven en app/schemas.py para compartirlos con la API async (app/async_api.py)
 
-# --------- Helpers de DB (simples, por-request) ---------
+# --------- Helpers de DB (clientes compartidos del proceso) ---------
+# Los endpoints reciben el ConnectionManager por Depends(get_connections);
+# estos helpers se mantienen para scripts y código que no pasa por FastAPI.
 
 def get_mongo_db():
-    client = MongoClient(MONGO_URI)
-    return client.get_database("red_k")  # explicitly specify database name
+    return connection_manager.mongo_db()
 
 
 def get_redis_client():
-    return redis.from_url(REDIS_URL)
+    return connection_manager.redis
 
 
 def get_neo4j_driver():
-    return GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    # Driver compartido: NO llamar driver.close() después de usarlo
+    return connection_manager.neo4j_driver
 
 
 # --------- Endpoints básicos ---------
@@ -142,9 +177,9 @@ def root():
 
 
 @app.get("/health")
-def health_check():
+def health_check(conns: ConnectionManager = Depends(get_connections)):
     """
-    Verifica conexión con Mongo, Redis y Neo4j.
+    Verifica conexión con Mongo, Redis y Neo4j usando los pools compartidos.
     Cualquier error se devuelve en texto, sin tumbar el servidor.
     """
     mongo_ok = False
@@ -157,8 +192,7 @@ def health_check():
 
     # ---------- Mongo ----------
     try:
-        client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=2000)
-        client.admin.command("ping")
+        conns.mongo_client.admin.command("ping")
         mongo_ok = True
     except Exception as e:
         mongo_ok = False
@@ -166,8 +200,7 @@ def health_check():
 
     # ---------- Redis ----------
     try:
-        r = redis.from_url(REDIS_URL, socket_connect_timeout=2)
-        r.ping()
+        conns.redis.ping()
         redis_ok = True
     except Exception as e:
         redis_ok = False
@@ -175,10 +208,8 @@ def health_check():
 
     # ---------- Neo4j ----------
     try:
-        driver = get_neo4j_driver()
-        with driver.session() as session:
+        with conns.neo4j_driver.session() as session:
             session.run("RETURN 1 AS n").single()
-        driver.close()
         neo4j_ok = True
     except Exception as e:
         neo4j_ok = False
@@ -197,16 +228,29 @@ def health_check():
     }
 
 
+@app.get("/health/pools")
+def pool_stats(conns: ConnectionManager = Depends(get_connections)):
+    """
+    Estadísticas de los pools de conexiones de este worker
+    (conexiones abiertas, en uso e idle por base de datos).
+    """
+    stats = conns.pool_stats()
+    stats["graph_writer"] = graph_writer.graph_writer.stats()
+    if ASYNC_API:
+        stats["async"] = async_connection_manager.pool_stats()
+    return stats
+
+
 # --------- Endpoints de usuarios ---------
 
 @app.post("/users/", response_model=UserOut)
-def create_user(user: UserCreate):
+def create_user(user: UserCreate, conns: ConnectionManager = Depends(get_connections)):
     """
     Crea un usuario:
     - Inserta documento en MongoDB
     - Crea nodo (:User) en Neo4j con id y username
     """
-    db = get_mongo_db()
+    db = conns.mongo_db()
     users_col = db["users"]
 
     # verificar que no exista username duplicado
@@ -218,31 +262,22 @@ def create_user(user: UserCreate):
         "email": user.email,
         "name": user.name,
         "bio": user.bio,
+        **user_counters.initial_counters(),
     }
 
     # Insertar en Mongo
     result = users_col.insert_one(doc)
     user_id = str(result.inserted_id)
 
-    # Crear nodo en Neo4j
+    # Crear nodo en Neo4j (en el próximo lote de app/graph_writer.py)
     try:
-        driver = get_neo4j_driver()
-        with driver.session() as session:
-            session.run(
-                """
-                MERGE (u:User {id: $id})
-                SET u.username = $username,
-                    u.email = $email,
-                    u.name = $name,
-                    u.bio = $bio
-                """,
-                id=user_id,
-                username=user.username,
-                email=user.email,
-                name=user.name,
-                bio=user.bio,
-            )
-        driver.close()
+        graph_writer.graph_writer.write("user", {
+            "id": user_id,
+            "username": user.username,
+            "email": user.email,
+            "name": user.name,
+            "bio": user.bio,
+        })
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -259,14 +294,27 @@ def create_user(user: UserCreate):
 
 
 @app.get("/users/", response_model=List[UserOut])
-def list_users():
+def list_users(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    conns: ConnectionManager = Depends(get_connections),
+):
     """
-    Lista los usuarios desde MongoDB.
+    Lista los usuarios desde MongoDB, en orden de alta.
+    - Paginación por cursor sobre `_id`: el header X-Next-Cursor trae el
+      cursor para pedir la página siguiente con `after`
     """
-    db = get_mongo_db()
+    db = conns.mongo_db()
     users_col = db["users"]
 
-    docs = list(users_col.find().limit(50))  # límite arbitrario
+    page = Page(before, after, limit, newest_first=False, time_field=None)
+    docs = list(users_col.find(page.query({})).sort(page.sort).limit(limit))
+    docs, next_cursor = page.finish(docs)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
     users: List[UserOut] = []
 
     for d in docs:
@@ -283,12 +331,12 @@ def list_users():
     return users
 
 @app.get("/users/by-username/{username}", response_model=UserOut)
-def get_user_by_username(username: str):
+def get_user_by_username(username: str, conns: ConnectionManager = Depends(get_connections)):
     """
     Obtiene un usuario por username desde MongoDB.
     Lo usamos como helper para la CLI y otros endpoints.
     """
-    db = get_mongo_db()
+    db = conns.mongo_db()
     users_col = db["users"]
 
     doc = users_col.find_one({"username": username})
@@ -303,184 +351,243 @@ def get_user_by_username(username: str):
         bio=doc.get("bio"),
     )
 
+
+@app.get("/users/{username}/stats", response_model=UserStatsOut)
+def get_user_stats(username: str, conns: ConnectionManager = Depends(get_connections)):
+    """
+    Followers, seguidos y posts del usuario.
+    Se leen de los contadores del documento (app/user_counters.py), sin contar
+    relaciones ni posts en cada request.
+    """
+    stats = user_counters.get_stats(conns, username)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    return stats
+
 @app.post("/users/{username}/follow/{target_username}")
-def follow_user(username: str, target_username: str):
+def follow_user(
+    username: str,
+    target_username: str,
+    background_tasks: BackgroundTasks,
+    conns: ConnectionManager = Depends(get_connections),
+):
     """
     Crea una relación FOLLOWS entre dos usuarios:
     (username) -[:FOLLOWS]-> (target_username)
     """
-    if username == target_username:
-        raise HTTPException(status_code=400, detail="No puedes seguirte a ti mismo")
+    handlers.check_follow_pair(username, target_username, followed=True)
 
-    db = get_mongo_db()
-    users_col = db["users"]
+    db = conns.mongo_db()
 
-    # Verificar que ambos existen en Mongo
-    user_doc = users_col.find_one({"username": username})
-    if not user_doc:
-        raise HTTPException(status_code=404, detail="Usuario origen no existe")
-
-    target_doc = users_col.find_one({"username": target_username})
-    if not target_doc:
-        raise HTTPException(status_code=404, detail="Usuario destino no existe")
-
-    user_id = str(user_doc["_id"])
-    target_id = str(target_doc["_id"])
+    # Verificar que ambos existen en Mongo (una sola consulta)
+    user_id, target_id = handlers.follow_ids(
+        db["users"].find(handlers.users_query(username, target_username), {"username": 1}),
+        username, target_username,
+    )
 
     # Crear relación en Neo4j (o MongoDB como fallback)
-    neo4j_success = False
+    created = False
     try:
-        driver = get_neo4j_driver()
-        with driver.session() as session:
-            session.run(
-                """
-                MERGE (u:User {id: $user_id})
-                SET u.username = $user_username
-                MERGE (t:User {id: $target_id})
-                SET t.username = $target_username
-                MERGE (u)-[:FOLLOWS]->(t)
-                """,
-                user_id=user_id,
-                user_username=username,
-                target_id=target_id,
-                target_username=target_username,
-            )
-        driver.close()
-        neo4j_success = True
+        # Los contadores de los nodos suben solo si la relación es nueva
+        created = bool(graph_writer.graph_writer.write(
+            "follow", handlers.follow_payload(user_id, username, target_id, target_username)
+        ))
+    except graph_writer.GraphWriteTimeout as e:
+        # La relación puede quedar escrita en Neo4j: no duplicarla en MongoDB
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         print(f"⚠️ Neo4j no disponible para follow, usando MongoDB: {e}")
         # Fallback: guardar en MongoDB
-        follows_col = db["follows"]
-        follows_col.update_one(
-            {"follower": username, "following": target_username},
-            {"$set": {"follower": username, "following": target_username}},
-            upsert=True
+        edge = handlers.follow_filter(username, target_username)
+        result = db["follows"].update_one(edge, {"$set": edge}, upsert=True)
+        created = result.upserted_id is not None
+
+    # Contadores de los documentos (un follow repetido no suma)
+    if created:
+        try:
+            user_counters.record_follow(db, username, target_username)
+        except Exception as e:
+            print(f"⚠️  No se pudieron actualizar los contadores (no crítico): {e}")
+
+    # Write-through del set de seguidos en Redis
+    try:
+        record_follow(conns.redis, username, target_username)
+    except Exception as e:
+        print(f"⚠️  No se pudo actualizar following en Redis (no crítico): {e}")
+
+    # Grafo en memoria de todos los workers (app/follow_graph.py)
+    try:
+        follow_graph.publish_follow(conns.redis, username, target_username)
+    except Exception as e:
+        print(f"⚠️  No se pudo publicar el cambio de follow (no crítico): {e}")
+
+    # Las conexiones SSE del usuario suman / quitan el canal del autor (app/realtime.py)
+    try:
+        realtime.publish(
+            conns.redis, [realtime.user_channel(username)],
+            realtime.follow_event(username, target_username, True),
         )
+    except Exception as e:
+        print(f"⚠️  No se pudo publicar el evento de follow (no crítico): {e}")
 
-    # Invalidar caché del feed del usuario (después de follow, su feed cambia)
+    # Backfill: traer los posts recientes de target al timeline de username
     try:
-        r = get_redis_client()
-        if r is not None:
-            # Eliminar todas las variantes del feed en caché
-            pattern = f"feed:{username}:*"
-            keys_to_delete = []
-            for key in r.scan_iter(match=pattern):
-                keys_to_delete.append(key)
-            if keys_to_delete:
-                r.delete(*keys_to_delete)
-                print(f"🗑️  Invalidado caché de feed para {username}: {len(keys_to_delete)} keys")
+        timelines.backfill_on_follow(conns, username, target_username)
+    except Exception as e:
+        print(f"⚠️  No se pudo actualizar el timeline (no crítico): {e}")
+
+    # Invalidar caché del usuario (después de follow cambian su feed
+    # y a quién sigue): nueva generación
+    try:
+        user_cache.bump(conns.redis, [username])
     except Exception as e:
         print(f"⚠️  No se pudo invalidar caché (no crítico): {e}")
 
-    return {"message": f"{username} ahora sigue a {target_username}"}
+    # Sugerencias precalculadas de username y de sus followers, después de responder
+    background_tasks.add_task(_update_suggestions, conns, username, target_username, True)
+
+    return handlers.follow_message(username, target_username, followed=True)
 
 
 @app.delete("/users/{username}/follow/{target_username}")
-def unfollow_user(username: str, target_username: str):
+def unfollow_user(
+    username: str,
+    target_username: str,
+    background_tasks: BackgroundTasks,
+    conns: ConnectionManager = Depends(get_connections),
+):
     """
     Elimina la relación FOLLOWS entre dos usuarios:
     (username) -[:FOLLOWS]-> (target_username)
     """
-    if username == target_username:
-        raise HTTPException(status_code=400, detail="No puedes dejar de seguirte a ti mismo")
+    handlers.check_follow_pair(username, target_username, followed=False)
 
-    db = get_mongo_db()
-    users_col = db["users"]
+    db = conns.mongo_db()
 
-    # Verificar que ambos existen en Mongo
-    user_doc = users_col.find_one({"username": username})
-    if not user_doc:
-        raise HTTPException(status_code=404, detail="Usuario origen no existe")
-
-    target_doc = users_col.find_one({"username": target_username})
-    if not target_doc:
-        raise HTTPException(status_code=404, detail="Usuario destino no existe")
-
-    user_id = str(user_doc["_id"])
-    target_id = str(target_doc["_id"])
+    # Verificar que ambos existen en Mongo (una sola consulta)
+    user_id, target_id = handlers.follow_ids(
+        db["users"].find(handlers.users_query(username, target_username), {"username": 1}),
+        username, target_username,
+    )
 
     # Eliminar relación en Neo4j (o MongoDB como fallback)
-    deleted = False
     try:
-        driver = get_neo4j_driver()
-        with driver.session() as session:
-            result = session.run(
-                """
-                MATCH (u:User {id: $user_id})-[r:FOLLOWS]->(t:User {id: $target_id})
-                DELETE r
-                RETURN count(r) as deleted_count
-                """,
-                user_id=user_id,
-                target_id=target_id,
-            )
-            record = result.single()
-            deleted_count = record["deleted_count"] if record else 0
-            
-            if deleted_count == 0:
-                raise HTTPException(
-                    status_code=404, 
-                    detail=f"{username} no sigue a {target_username}"
-                )
-            deleted = True
-        
-        driver.close()
+        deleted_count = graph_writer.graph_writer.write("unfollow", {
+            "user_id": user_id,
+            "target_id": target_id,
+        })
+
+        if deleted_count == 0:
+            raise handlers.not_following(username, target_username)
+
     except HTTPException:
         raise
+    except graph_writer.GraphWriteTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         print(f"⚠️ Neo4j no disponible para unfollow, usando MongoDB: {e}")
         # Fallback: eliminar de MongoDB
-        follows_col = db["follows"]
-        result = follows_col.delete_one({"follower": username, "following": target_username})
+        result = db["follows"].delete_one(handlers.follow_filter(username, target_username))
         if result.deleted_count == 0:
-            raise HTTPException(
-                status_code=404,
-                detail=f"{username} no sigue a {target_username}"
-            )
-        deleted = True
+            raise handlers.not_following(username, target_username)
 
-    # Invalidar caché del feed del usuario (después de unfollow, su feed cambia)
     try:
-        r = get_redis_client()
-        if r is not None:
-            # Eliminar todas las variantes del feed en caché
-            pattern = f"feed:{username}:*"
-            keys_to_delete = []
-            for key in r.scan_iter(match=pattern):
-                keys_to_delete.append(key)
-            if keys_to_delete:
-                r.delete(*keys_to_delete)
-                print(f"🗑️  Invalidado caché de feed para {username}: {len(keys_to_delete)} keys")
+        user_counters.record_follow(db, username, target_username, delta=-1)
+    except Exception as e:
+        print(f"⚠️  No se pudieron actualizar los contadores (no crítico): {e}")
+
+    # Write-through del set de seguidos en Redis
+    try:
+        record_follow(conns.redis, username, target_username, followed=False)
+    except Exception as e:
+        print(f"⚠️  No se pudo actualizar following en Redis (no crítico): {e}")
+
+    # Grafo en memoria de todos los workers (app/follow_graph.py)
+    try:
+        follow_graph.publish_follow(conns.redis, username, target_username, followed=False)
+    except Exception as e:
+        print(f"⚠️  No se pudo publicar el cambio de follow (no crítico): {e}")
+
+    # Las conexiones SSE del usuario suman / quitan el canal del autor (app/realtime.py)
+    try:
+        realtime.publish(
+            conns.redis, [realtime.user_channel(username)],
+            realtime.follow_event(username, target_username, False),
+        )
+    except Exception as e:
+        print(f"⚠️  No se pudo publicar el evento de follow (no crítico): {e}")
+
+    # Quitar los posts de target del timeline de username
+    try:
+        timelines.prune_on_unfollow(conns, username, target_username)
+    except Exception as e:
+        print(f"⚠️  No se pudo actualizar el timeline (no crítico): {e}")
+
+    # Invalidar caché del usuario (después de unfollow, su feed cambia)
+    try:
+        user_cache.bump(conns.redis, [username])
     except Exception as e:
         print(f"⚠️  No se pudo invalidar caché (no crítico): {e}")
 
-    return {"message": f"{username} dejó de seguir a {target_username}"}
+    background_tasks.add_task(_update_suggestions, conns, username, target_username, False)
+
+    return handlers.follow_message(username, target_username, followed=False)
+
+
+def _update_suggestions(conns: ConnectionManager, username: str, target: str, followed: bool):
+    """Tarea en background de follow/unfollow: sumar o restar el camino en las sugerencias"""
+    try:
+        suggestion_sets.apply_follow(conns, username, target, followed)
+    except Exception as e:
+        print(f"⚠️  No se pudieron actualizar las sugerencias (no crítico): {e}")
+
+
+def _cache_lookup(conns: ConnectionManager, kind: str, username: str, *parts):
+    """
+    (key, valor) del cache versionado del usuario (ver app/user_cache.py).
+    key es None si Redis no está disponible: entonces no se intenta guardar.
+    """
+    try:
+        r = conns.redis
+        key = user_cache.cache_key(r, kind, username, *parts)
+        return key, user_cache.get_json(r, key)
+    except Exception as e:
+        print(f"⚠️ Redis no disponible para cache de {kind}: {e}")
+        return None, None
 
 
-class FollowingOut(BaseModel):
-    username: str
-    name: Optional[str] = None
-    bio: Optional[str] = None
-    email: Optional[str] = None
+def _cache_store(conns: ConnectionManager, key: Optional[str], kind: str, value):
+    if key is None:
+        return
+    try:
+        user_cache.set_json(conns.redis, key, kind, value)
+    except Exception as e:
+        print(f"⚠️ No se pudo guardar en cache ({kind}): {e}")
 
 
 @app.get("/users/{username}/following", response_model=List[FollowingOut])
-def list_following(username: str):
+def list_following(username: str, conns: ConnectionManager = Depends(get_connections)):
     """
     Lista a quién sigue el usuario usando Neo4j.
     Se basa en nodos :User y relaciones :FOLLOWS.
+    Cacheado por generación del usuario (follow/unfollow lo invalidan).
     """
-    db = get_mongo_db()
+    db = conns.mongo_db()
     users_col = db["users"]
 
     user_doc = users_col.find_one({"username": username})
     if not user_doc:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
 
+    cache_key, cached = _cache_lookup(conns, user_cache.KIND_FOLLOWING, username)
+    if cached is not None:
+        return cached
+
     user_id = str(user_doc["_id"])
 
     following = []
     try:
-        driver = get_neo4j_driver()
+        driver = conns.neo4j_driver
         with driver.session() as session:
             result = session.run(
                 """
@@ -501,37 +608,42 @@ def list_following(username: str):
                 )
                 for record in result
             ]
-        driver.close()
     except Exception as e:
-        print(f"⚠️ Neo4j no disponible para following, usando MongoDB: {e}")
-        # Fallback: leer de MongoDB
-        follows_col = db["follows"]
-        for doc in follows_col.find({"follower": username}):
-            following_username = doc.get("following")
-            if following_username:
-                # Obtener datos del usuario desde MongoDB
-                following_user = users_col.find_one({"username": following_username})
-                if following_user:
-                    following.append(
-                        FollowingOut(
-                            username=following_user.get("username"),
-                            name=following_user.get("name"),
-                            bio=following_user.get("bio"),
-                            email=following_user.get("email"),
-                        )
-                    )
+        print(f"⚠️ Neo4j no disponible para following, usando el grafo en memoria o MongoDB: {e}")
+        # Fallback: usernames del grafo del worker (o de `follows`) y un solo $in
+        usernames = load_following_usernames(conns, username)
+        docs = {
+            doc["username"]: doc
+            for doc in users_col.find({"username": {"$in": usernames}})
+        }
+        following = [
+            FollowingOut(
+                username=docs[name].get("username"),
+                name=docs[name].get("name"),
+                bio=docs[name].get("bio"),
+                email=docs[name].get("email"),
+            )
+            for name in usernames
+            if name in docs
+        ]
 
+    _cache_store(conns, cache_key, user_cache.KIND_FOLLOWING, following)
     return following
 
 @app.post("/posts/", response_model=PostOut)
-def create_post(post: PostCreate):
+def create_post(
+    post: PostCreate,
+    background_tasks: BackgroundTasks,
+    conns: ConnectionManager = Depends(get_connections),
+):
     """
     Crea un post:
     - Guarda en MongoDB (colección `posts`)
     - Crea nodo (:Post) y relación (:User)-[:POSTED]->(:Post) en Neo4j
+    - Lo empuja a los timelines de los followers (fan-out-on-write, en background)
     - Invalidata el feed cacheado del autor en Redis
     """
-    db = get_mongo_db()
+    db = conns.mongo_db()
     users_col = db["users"]
     posts_col = db["posts"]
 
@@ -555,39 +667,40 @@ def create_post(post: PostCreate):
     result = posts_col.insert_one(doc)
     post_id = str(result.inserted_id)
 
+    try:
+        user_counters.record_post(db, post.author_username)
+    except Exception as e:
+        print(f"⚠️ No se pudo actualizar posts_count (no crítico): {e}")
+
+    # Lista de posts del autor en Redis (síncrono: el autor ve su post al instante)
+    try:
+        timelines.record_author_post(conns, post.author_username, post_id, created_at)
+    except Exception as e:
+        print(f"⚠️ No se pudo registrar el post en Redis (no crítico): {e}")
+
     # Crear nodo Post y relación en Neo4j
     try:
-        driver = get_neo4j_driver()
-        with driver.session() as session:
-            session.run(
-                """
-                MERGE (u:User {id: $user_id})
-                SET u.username = $username
-                MERGE (p:Post {id: $post_id})
-                SET p.content = $content,
-                    p.created_at = $created_at
-                MERGE (u)-[:POSTED]->(p)
-                """,
-                user_id=user_id,
-                username=post.author_username,
-                post_id=post_id,
-                content=post.content,
-                created_at=created_at,
-            )
-        driver.close()
+        graph_writer.graph_writer.write("post", {
+            "user_id": user_id,
+            "username": post.author_username,
+            "post_id": post_id,
+            "content": post.content,
+            "created_at": created_at,
+        })
     except Exception as e:
+        # El post ya existe en Mongo: que igual llegue a los timelines
+        _publish_post(conns, post.author_username, post_id, created_at)
         raise HTTPException(
             status_code=500,
             detail=f"Post creado en Mongo, pero fallo al crear nodo/relacion en Neo4j: {e}",
         )
-    
-    try:
-        r = get_redis_client()
-        r.delete(f"feed:{post.author_username}")
-    except Exception:
-        pass
 
-    return PostOut(
+    # Fan-out a los timelines de los followers, después de responder
+    background_tasks.add_task(
+        _publish_post, conns, post.author_username, post_id, created_at
+    )
+
+    post_out = PostOut(
         id=post_id,
         author_username=post.author_username,
         content=post.content,
@@ -595,643 +708,710 @@ def create_post(post: PostCreate):
         created_at=created_at,
     )
 
+    # El feed propio se invalida ya; el de los followers tras el fan-out.
+    # El post entra al cache de objetos para que los feeds lo hidraten sin Mongo.
+    try:
+        user_cache.bump(conns.redis, [post.author_username])
+        post_cache.cache_posts(conns.redis, [post_out])
+    except Exception:
+        pass
+
+    return post_out
+
+def _publish_post(conns: ConnectionManager, author: str, post_id: str, created_at: str):
+    """
+    Tarea en background de create_post: fan-out a los timelines, invalidar
+    los feeds cacheados que incluyen al autor y avisar a los followers
+    conectados. En ese orden, para que nadie vuelva a cachear un feed sin el
+    post nuevo y el aviso llegue cuando el feed ya lo trae.
+    """
+    timelines.publish_post(conns, author, post_id, created_at)
+    try:
+        feed_cache.invalidate_author(conns.redis, author)
+    except Exception as e:
+        print(f"⚠️  No se pudo invalidar caché de followers de {author} (no crítico): {e}")
+    try:
+        realtime.publish(
+            conns.redis, [realtime.author_channel(author)], realtime.post_event(author, post_id, created_at)
+        )
+    except Exception as e:
+        print(f"⚠️  No se pudo publicar el evento del post (no crítico): {e}")
+
+
+def _pull_feed(
+    conns: ConnectionManager,
+    username: str,
+    mode: FeedMode,
+    page: Page,
+) -> Tuple[List[PostOut], Optional[str]]:
+    """
+    Feed por consulta directa (pull): autores según el modo + `$in` en Mongo,
+    con rango por cursor sobre (created_at, _id).
+    Es el camino de respaldo cuando no se puede usar el timeline de Redis,
+    y el que atiende las páginas `after` y las `before` que pasan el final
+    del timeline.
+    """
+    # Neo4j (o MongoDB como fallback)
+    following = get_following_usernames(conns, username) if handlers.uses_timeline(mode) else []
+    authors = handlers.pull_authors(username, mode, following)
+    if not authors:
+        # no hay nadie de quien traer posts
+        return [], None
+
+    cursor = (
+        conns.mongo_db()["posts"].find(handlers.pull_query(page, authors))
+        .sort(page.sort)
+        .limit(page.limit)
+    )
+    return handlers.pull_page(page, list(cursor))
+
+
 # Endpoint de feed con soporte para diferentes modos
 @app.get("/users/{username}/feed", response_model=List[PostOut])
 def get_user_feed(
+    response: Response,
     username: str,
-    limit: int = 20,
+    limit: int = Query(20, ge=1, le=200),
     mode: FeedMode = FeedMode.all,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    with_likes: bool = False,
+    conns: ConnectionManager = Depends(get_connections),
 ):
     """
     Feed del usuario:
     - mode = all: posts del usuario + de quienes sigue
     - mode = self: solo posts del usuario
     - mode = following: solo posts de quienes sigue
-    - Usa Neo4j para obtener a quién sigue
-    - Usa Mongo para traer posts
-    - Usa Redis para cachear el resultado
+    - Lee los ids del timeline materializado en Redis (fan-out-on-write),
+      mezcla al vuelo los posts de celebridades seguidas (pull) y los
+      hidrata con un solo `$in` a Mongo
+    - El header X-Feed-Path indica el camino usado (cache/push/hybrid/pull)
+    - Paginación por cursor: X-Next-Cursor trae el cursor para pedir la
+      página siguiente con `before` (más viejos); `after` trae lo más nuevo.
+      Las páginas `before` se leen del timeline (ZREVRANGEBYSCORE) mientras
+      el cursor esté dentro de él; después, y con `after`, por rango en
+      Mongo. Las páginas con cursor no se cachean.
+    - with_likes=true: cada post trae likes_count y user_liked (del usuario
+      del feed), leídos en lote igual que POST /posts/likes:batch
+    - Si Redis no está disponible, consulta Neo4j/Mongo directamente
+    - Usa Redis para cachear el resultado: ids del feed + cache de posts
     """
-    db = get_mongo_db()
-    users_col = db["users"]
-    posts_col = db["posts"]
+    db = conns.mongo_db()
 
     # Intentar conectar a Redis (opcional)
     try:
-        r = get_redis_client()
+        r = conns.redis
     except Exception:
         r = None
 
     # Verificar que el usuario exista
-    user_doc = users_col.find_one({"username": username})
-    if not user_doc:
-        raise HTTPException(status_code=404, detail="Usuario no encontrado")
-
-    user_id = str(user_doc["_id"])
+    handlers.require(db["users"].find_one({"username": username}, {"_id": 1}))
 
-    # Cache key depende de username + modo + limit
-    cache_key = f"feed:{username}:{mode.value}:{limit}"
+    page = handlers.feed_page(before, after, limit)
 
-    # Intentar leer de cache
+    if page.has_cursor:
+        posts = None
+        path = timelines.FEED_PATH_PULL
+        # Scroll hacia atrás: del timeline mientras el cursor siga dentro de él
+        if r is not None:
+            try:
+                cursor = handlers.timeline_cursor(page, mode)
+                feed = None
+                if cursor is not None:
+                    feed = timelines.read_feed_ids_before(
+                        conns, username, limit, include_self=(mode == FeedMode.all), before=cursor
+                    )
+                if feed is not None:
+                    feed_ids, path = feed
+                    posts = post_cache.get_posts(r, db, feed_ids)
+                    next_cursor = page_next_cursor(posts, limit)
+            except Exception as e:
+                print(f"⚠️ Timeline no disponible para {username}, usando consulta directa: {e}")
+        if posts is None:
+            posts, next_cursor = _pull_feed(conns, username, mode, page)
+            path = timelines.FEED_PATH_PULL
+        handlers.feed_response(response, path, next_cursor)
+        return _embed_likes(conns, posts, username) if with_likes else posts
+
+    # Intentar leer de cache: ids del feed (generación del usuario + modo,
+    # sirve para cualquier limit) hidratados desde el cache de posts
+    # (solo primera página)
+    cache_key = None
     if r is not None:
         try:
-            cached = r.get(cache_key)
-            if cached:
-                try:
-                    data = json.loads(cached)
-                    return data
-                except Exception:
-                    pass  # si falla parseo, seguimos normal
+            cache_key = feed_cache.feed_cache_key(r, username, mode.value)
+            cached_ids = feed_cache.get_cached_ids(r, cache_key, limit)
+            if cached_ids is not None:
+                posts = post_cache.get_posts(r, db, cached_ids)
+                handlers.feed_response(response, timelines.FEED_PATH_CACHE, page_next_cursor(posts, limit))
+                return _embed_likes(conns, posts, username) if with_likes else posts
         except Exception:
             # Redis no está disponible, continuar sin cache
             r = None
 
-    # Construir lista de autores según el modo
-    authors: List[str] = []
-
-    if mode in (FeedMode.all, FeedMode.self_only):
-        authors.append(username)
-
-    followed_usernames: List[str] = []
+    # Se leen ids hasta la profundidad del cache para que la entrada sirva
+    # también a limits mayores; solo se hidratan los primeros `limit`
+    depth = handlers.feed_depth(limit)
+    feed_ids: Optional[List[str]] = None
+    posts: Optional[List[PostOut]] = None
+    path = timelines.FEED_PATH_PULL
 
-    if mode in (FeedMode.all, FeedMode.following_only):
-        # Obtener a quién sigue desde Neo4j (o MongoDB como fallback)
+    # Modos con follows: leer del timeline materializado (fan-out-on-write)
+    if r is not None and handlers.uses_timeline(mode):
         try:
-            driver = get_neo4j_driver()
-            with driver.session() as session:
-                result = session.run(
-                    """
-                    MATCH (u:User {id: $user_id})-[:FOLLOWS]->(f:User)
-                    RETURN f.username AS username
-                    """,
-                    user_id=user_id,
-                )
-                for record in result:
-                    uname = record["username"]
-                    if uname and uname not in followed_usernames:
-                        followed_usernames.append(uname)
-            driver.close()
+            feed = timelines.read_feed_ids(
+                conns, username, depth, include_self=(mode == FeedMode.all)
+            )
+            if feed is not None:
+                feed_ids, path = feed
+                posts = post_cache.get_posts(r, db, feed_ids[:limit])
         except Exception as e:
-            print(f"⚠️ Neo4j no disponible para feed, usando MongoDB: {e}")
-            # Fallback: leer de MongoDB
-            follows_col = db["follows"]
-            for doc in follows_col.find({"follower": username}):
-                uname = doc.get("following")
-                if uname and uname not in followed_usernames:
-                    followed_usernames.append(uname)
-
-        authors.extend([u for u in followed_usernames if u not in authors])
-
-    if not authors:
-        # no hay nadie de quien traer posts
-        return []
-
-    # Traer posts desde Mongo
-    cursor = (
-        posts_col.find(
-            {"author_username": {"$in": authors}}
-        )
-        .sort("created_at", -1)
-        .limit(limit)
-    )
+            print(f"⚠️ Timeline no disponible para {username}, usando consulta directa: {e}")
+
+    # Fallback (Redis caído, mode=self o limit mayor al timeline): consulta directa
+    if posts is None:
+        deep_posts, _ = _pull_feed(conns, username, mode, handlers.feed_page(None, None, depth))
+        feed_ids = [p.id for p in deep_posts]
+        posts = deep_posts[:limit]
+        path = timelines.FEED_PATH_PULL
+        if r is not None:
+            try:
+                post_cache.cache_posts(r, deep_posts)
+            except Exception as e:
+                print(f"⚠️ No se pudieron cachear posts: {e}")
 
-    posts: List[PostOut] = []
-    for d in cursor:
-        posts.append(
-            PostOut(
-                id=str(d.get("_id")),
-                author_username=d.get("author_username"),
-                content=d.get("content"),
-                tags=d.get("tags") or [],
-                created_at=d.get("created_at"),
-            )
-        )
+    handlers.feed_response(response, path, page_next_cursor(posts, limit))
 
-    # Intentar guardar en cache (best effort)
-    if r is not None:
+    # Intentar guardar en cache (best effort), registrando de qué autores
+    # depende para que un post nuevo de cualquiera de ellos lo invalide
+    if r is not None and cache_key is not None:
         try:
-            r.setex(cache_key, 60, json.dumps([p.dict() for p in posts]))
+            authors: List[str] = []
+            if handlers.uses_timeline(mode):
+                authors = get_following_usernames(conns, username)
+            feed_cache.store_feed(
+                r, username, cache_key, feed_ids, len(feed_ids) < depth, authors
+            )
         except Exception as e:
             print(f"⚠️ No se pudo guardar en cache: {e}")
 
-    return posts
+    return _embed_likes(conns, posts, username) if with_likes else posts
+
+
+def _embed_likes(conns: ConnectionManager, posts: List[PostOut], viewer: str) -> List[PostOut]:
+    """Agregar likes_count / user_liked a los posts del feed (una pasada en lote)"""
+    if not posts:
+        return posts
+    states = likes.get_like_states(conns, [p.id for p in posts], viewer)
+    return likes.embed_like_states(posts, states)
 
 @app.get("/users/{username}/suggestions", response_model=List[SuggestionOut])
-def get_suggestions(username: str, limit: int = 10):
+def get_suggestions(
+    username: str,
+    response: Response,
+    limit: int = 10,
+    algo: SuggestionAlgo = SuggestionAlgo.mutual,
+    conns: ConnectionManager = Depends(get_connections),
+):
     """
-    Sugerencias de usuarios a seguir usando Neo4j:
+    Sugerencias de usuarios a seguir:
     - "Amigos de tus amigos" (2-hop) que aún no sigues
     - Se ordenan por un score que combina:
         * mutual_connections (cuántos amigos en común)
         * followers_count    (cuánta gente los sigue)
         * posts_count        (actividad)
+    - Precalculadas en sorted sets de Redis (app/suggestion_sets.py): la
+      lectura es un ZREVRANGE; follow/unfollow las actualizan en background
+    - X-Suggestions-Computed-At: último cálculo en lote;
+      X-Suggestions-Updated-At: último follow/unfollow aplicado
+    - `?algo=ppr`: Personalized PageRank sobre follows y DMs, precalculado por
+      el job de app/ppr.py (si todavía no corrió para el usuario, amigos de amigos)
     """
-    db = get_mongo_db()
+    db = conns.mongo_db()
     users_col = db["users"]
 
-    user_doc = users_col.find_one({"username": username})
-    if not user_doc:
-        raise HTTPException(status_code=404, detail="Usuario no encontrado")
-
-    user_id = str(user_doc["_id"])
+    user_doc = handlers.require(users_col.find_one({"username": username}, {"_id": 1}))
 
     suggestions: List[SuggestionOut] = []
 
-    try:
-        driver = get_neo4j_driver()
-        with driver.session() as session:
-            # 1) Encontrar "amigos de tus amigos" que aún no sigues
-            result = session.run(
-                """
-                // u = usuario base
-                MATCH (u:User {id: $user_id})-[:FOLLOWS]->(:User)-[:FOLLOWS]->(s:User)
-                WHERE s.id <> $user_id
-                  AND NOT (u)-[:FOLLOWS]->(s)
-                WITH u, s, COUNT(*) AS mutual_connections
-
-                // 2) Contar followers de s
-                OPTIONAL MATCH (s)<-[:FOLLOWS]-(:User)
-                WITH u, s, mutual_connections, COUNT(*) AS followers_count
-
-                // 3) Contar posts de s
-                OPTIONAL MATCH (s)-[:POSTED]->(:Post)
-                WITH s,
-                     mutual_connections,
-                     followers_count,
-                     COUNT(*) AS posts_count
-
-                // 4) Calcular score compuesto
-                RETURN
-                    s.username AS username,
-                    s.name AS name,
-                    s.bio AS bio,
-                    s.email AS email,
-                    mutual_connections,
-                    followers_count,
-                    posts_count,
-                    (mutual_connections * 3.0
-                     + followers_count * 2.0
-                     + posts_count * 1.0) AS score
-                ORDER BY score DESC, username ASC
-                LIMIT $limit
-                """,
-                user_id=user_id,
-                limit=limit,
-            )
+    if algo == SuggestionAlgo.ppr:
+        # Precalculadas por el job de app/ppr.py; sin resultado, amigos de amigos
+        try:
+            ranked, computed_at = ppr.read_suggestions(conns, username, limit)
+            docs = users_col.find(handlers.ranked_query(ranked), handlers.PPR_FIELDS)
+            suggestions = ppr.to_suggestions(ranked, list(docs))
+            handlers.set_suggestion_headers(response, computed_at)
+        except Exception as e:
+            print(f"⚠️ Sugerencias PPR no disponibles, usando amigos de amigos: {e}")
 
-            for record in result:
-                suggestions.append(
-                    SuggestionOut(
-                        username=record["username"],
-                        name=record.get("name"),
-                        bio=record.get("bio"),
-                        email=record.get("email"),
-                        score=record["score"],
-                        reason="Amigos de tus amigos + actividad",
-                        mutual_connections=record["mutual_connections"],
-                        followers_count=record["followers_count"],
-                        posts_count=record["posts_count"],
-                    )
-                )
-        driver.close()
-    except Exception as e:
-        # si Neo4j falla, usar fallback a MongoDB
-        print(f"⚠️ Neo4j no disponible para suggestions: {e}")
-        pass
+    if not suggestions:
+        try:
+            ranked, freshness = suggestion_sets.read_suggestions(conns, username, limit)
+            docs = users_col.find(handlers.ranked_query(ranked), handlers.SUGGESTION_FIELDS)
+            suggestions = suggestion_sets.to_suggestions(ranked, list(docs))
+            handlers.set_suggestion_headers(response, freshness["computed_at"], freshness["updated_at"])
+        except Exception as e:
+            # Sin Redis: la consulta en vivo contra Neo4j
+            print(f"⚠️ Sugerencias precalculadas no disponibles, consultando Neo4j: {e}")
+            suggestions = _live_suggestions(conns, str(user_doc["_id"]), limit)
+
+    if not suggestions and follow_graph.follow_graph.ready:
+        # Sin Redis ni Neo4j: amigos de amigos del grafo en memoria (sin posts_count)
+        ranked = follow_graph.follow_graph.suggest(username, limit)
+        docs = users_col.find(handlers.ranked_query(ranked), handlers.SUGGESTION_FIELDS)
+        suggestions = suggestion_sets.to_suggestions(ranked, list(docs))
 
     if not suggestions:
-        docs = (
-            users_col.find({"username": {"$ne": username}})
-            .limit(limit)
-        )
-        for d in docs:
-            suggestions.append(
-                SuggestionOut(
-                    username=d.get("username"),
-                    name=d.get("name"),
-                    bio=d.get("bio"),
-                    email=d.get("email"),
-                    score=1.0,
-                    reason="Usuarios aleatorios (sin datos de grafo suficientes)",
-                    mutual_connections=0,
-                    followers_count=0,
-                    posts_count=0,
-                )
-            )
+        # Sin grafo: usuarios que todavía no sigue (set de seguidos en Redis)
+        query = handlers.not_followed_query(username, get_following_usernames(conns, username))
+        suggestions = [handlers.random_suggestion(d) for d in users_col.find(query).limit(limit)]
 
     return suggestions
 
+
+def _live_suggestions(conns: ConnectionManager, user_id: str, limit: int) -> List[SuggestionOut]:
+    """Amigos de amigos con una consulta Cypher por request (respaldo sin Redis)"""
+    try:
+        with conns.neo4j_driver.session() as session:
+            result = session.run(handlers.LIVE_SUGGESTIONS_CYPHER, user_id=user_id, limit=limit)
+            return [handlers.live_suggestion(record) for record in result]
+    except Exception as e:
+        print(f"⚠️ Neo4j no disponible para suggestions: {e}")
+        return []
+
 @app.post("/dm/send", response_model=DMOut)
-def send_dm(dm: DMCreate):
+def send_dm(dm: DMCreate, conns: ConnectionManager = Depends(get_connections)):
     """
     Envía un DM:
     - Guarda en Mongo (colección `dms`)
     - Crea/actualiza relación (:User)-[:MESSAGED]->(:User) en Neo4j
     """
-    db = get_mongo_db()
-    users_col = db["users"]
-    dms_col = db["dms"]
-
-    # Verificar que ambos usuarios existan
-    sender_doc = users_col.find_one({"username": dm.sender_username})
-    if not sender_doc:
-        raise HTTPException(status_code=404, detail="Sender no existe")
+    db = conns.mongo_db()
 
-    receiver_doc = users_col.find_one({"username": dm.receiver_username})
-    if not receiver_doc:
-        raise HTTPException(status_code=404, detail="Receiver no existe")
+    # Verificar que ambos usuarios existan (una sola consulta)
+    handlers.check_dm_users(
+        db["users"].find(handlers.users_query(dm.sender_username, dm.receiver_username), {"username": 1}),
+        (dm.sender_username, "Sender no existe"),
+        (dm.receiver_username, "Receiver no existe"),
+    )
 
     created_at = datetime.utcnow().isoformat()
+    conversation_key = conversations.pair_key(dm.sender_username, dm.receiver_username)
 
-    # Clave de conversación (ordenada alfabéticamente)
-    u1, u2 = sorted([dm.sender_username, dm.receiver_username])
-    conversation_key = f"{u1}::{u2}"
-
-    doc = {
-        "sender_username": dm.sender_username,
-        "receiver_username": dm.receiver_username,
-        "content": dm.content,
-        "created_at": created_at,
-        "read": False,
-        "read_at": None,
-        "conversation_key": conversation_key,
-    }
-
-    result = dms_col.insert_one(doc)
-    dm_id = str(result.inserted_id)
+    result = db["dms"].insert_one(handlers.dm_doc(dm, conversation_key, created_at))
+    message = handlers.dm_out(str(result.inserted_id), dm, created_at)
 
-    # Relación en Neo4j
+    # Relación en Neo4j: se encola sin esperar el lote
     try:
-        driver = get_neo4j_driver()
-        with driver.session() as session:
-            session.run(
-                """
-                MERGE (s:User {username: $sender})
-                MERGE (r:User {username: $receiver})
-                MERGE (s)-[rel:MESSAGED]->(r)
-                ON CREATE SET rel.last_message_at = $created_at
-                ON MATCH SET  rel.last_message_at = $created_at
-                """,
-                sender=dm.sender_username,
-                receiver=dm.receiver_username,
-                created_at=created_at,
-            )
-        driver.close()
+        graph_writer.graph_writer.write("message", handlers.message_payload(dm, created_at), wait=False)
     except Exception:
         # No tiramos error de API si Neo4j falla; el mensaje ya quedó guardado
         pass
 
-    return DMOut(
-        id=dm_id,
-        sender_username=dm.sender_username,
-        receiver_username=dm.receiver_username,
-        content=dm.content,
-        created_at=created_at,
-        read=False,
-        read_at=None,
-    )
+    # Resumen de la conversación de ambos (app/conversations.py)
+    try:
+        conversations.record_message(
+            db, dm.sender_username, dm.receiver_username, conversation_key, dm.content, created_at
+        )
+    except Exception as e:
+        print(f"⚠️  No se pudo actualizar el resumen de conversaciones (no crítico): {e}")
 
-@app.get("/dm/{username}/{other_username}", response_model=List[DMOut])
-def get_conversation(
+    # Al frente de la ventana reciente, si está cargada
+    try:
+        dm_cache.append_message(conns.redis, conversation_key, message.dict())
+    except Exception as e:
+        print(f"⚠️  No se pudo actualizar la conversación cacheada (no crítico): {e}")
+
+    # Aviso en tiempo real a los dos (app/realtime.py)
+    try:
+        realtime.publish(conns.redis, realtime.dm_channels(message.dict()), realtime.dm_event(message.dict()))
+    except Exception as e:
+        print(f"⚠️  No se pudo publicar el evento del DM (no crítico): {e}")
+
+    return message
+
+@app.get("/dm/conversations/{username}", response_model=List[DMConversationSummary])
+def list_conversations(
+    response: Response,
     username: str,
-    other_username: str,
-    limit: int = 50,
-    mark_read: bool = True,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = None,
+    conns: ConnectionManager = Depends(get_connections),
 ):
     """
-    Devuelve la conversación entre `username` y `other_username`.
-    - Muestra mensajes en orden cronológico ascendente.
-    - Opcionalmente marca como leídos los mensajes donde receiver = `username`.
+    Lista las conversaciones en las que participa `username`,
+    con:
+    - último mensaje
+    - timestamp del último mensaje
+    - número de mensajes no leídos
+    Sale de `dm_conversations` (app/conversations.py), ordenada por último
+    mensaje: X-Next-Cursor trae el cursor para pedir la página siguiente con `before`.
     """
-    db = get_mongo_db()
-    users_col = db["users"]
-    dms_col = db["dms"]
+    db = conns.mongo_db()
 
-    # Verificar que ambos usuarios existan
-    if not users_col.find_one({"username": username}):
-        raise HTTPException(status_code=404, detail="Usuario no existe")
-
-    if not users_col.find_one({"username": other_username}):
-        raise HTTPException(status_code=404, detail="Otro usuario no existe")
+    user_doc = handlers.require(
+        db["users"].find_one({"username": username}),
+        f"Usuario {username} no encontrado en conversations endpoint",
+    )
 
-    u1, u2 = sorted([username, other_username])
-    conversation_key = f"{u1}::{u2}"
+    # DMs anteriores a los resúmenes: se arman una sola vez desde `dms`
+    if not conversations.is_ready(user_doc):
+        conversations.rebuild_user(db, username)
 
+    page = handlers.conversations_page(before, limit)
     cursor = (
-        dms_col.find({"conversation_key": conversation_key})
-        .sort("created_at", 1)
+        db[conversations.CONVERSATIONS_COLLECTION]
+        .find(handlers.conversations_query(page, username))
+        .sort(page.sort)
         .limit(limit)
     )
+    docs, next_cursor = page.finish(list(cursor))
+    handlers.set_next_cursor(response, next_cursor)
 
-    docs = list(cursor)
-
-    # Marcar como leídos los mensajes entrantes
-    if mark_read and docs:
-        now_iso = datetime.utcnow().isoformat()
-        dms_col.update_many(
-            {
-                "conversation_key": conversation_key,
-                "receiver_username": username,
-                "read": False,
-            },
-            {"$set": {"read": True, "read_at": now_iso}},
-        )
-
-        # Actualizamos en memoria los que corresponda
-        for d in docs:
-            if d.get("receiver_username") == username and not d.get("read"):
-                d["read"] = True
-                d["read_at"] = now_iso
-
-    messages: List[DMOut] = []
-    for d in docs:
-        messages.append(
-            DMOut(
-                id=str(d.get("_id")),
-                sender_username=d.get("sender_username"),
-                receiver_username=d.get("receiver_username"),
-                content=d.get("content"),
-                created_at=d.get("created_at"),
-                read=d.get("read", False),
-                read_at=d.get("read_at"),
-            )
-        )
+    return [conversations.to_summary(d) for d in docs]
 
-    return messages
-
-@app.get("/dm/conversations/{username}", response_model=List[DMConversationSummary])
-def list_conversations(username: str):
+@app.get("/dm/{username}/{other_username}", response_model=List[DMOut])
+def get_conversation(
+    response: Response,
+    username: str,
+    other_username: str,
+    limit: int = Query(50, ge=1, le=200),
+    mark_read: bool = True,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    conns: ConnectionManager = Depends(get_connections),
+):
     """
-    Lista las conversaciones en las que participa `username`,
-    con:
-    - último mensaje
-    - timestamp del último mensaje
-    - número de mensajes no leídos
+    Devuelve la conversación entre `username` y `other_username`.
+    - Muestra los mensajes del más nuevo al más viejo: la primera página son
+      los últimos `limit` mensajes, sin importar el largo del historial.
+    - Paginación por cursor: X-Next-Cursor trae el cursor para pedir los
+      mensajes anteriores con `before`; con `after` se leen los más nuevos.
+    - La primera página sale de la ventana reciente cacheada (app/dm_cache.py).
+    - Opcionalmente avanza la marca de lectura de `username` (app/conversations.py);
+      `read` / `read_at` de cada mensaje se calculan con la marca de su receptor.
     """
-    db = get_mongo_db()
-    users_col = db["users"]
-    dms_col = db["dms"]
+    db = conns.mongo_db()
 
-    user_doc = users_col.find_one({"username": username})
-    if not user_doc:
-        raise HTTPException(status_code=404, detail=f"Usuario {username} no encontrado en conversations endpoint")
-
-    # Traemos todos los mensajes donde participa
-    cursor = dms_col.find(
-        {
-            "$or": [
-                {"sender_username": username},
-                {"receiver_username": username},
-            ]
-        }
+    # Verificar que ambos usuarios existan (una sola consulta)
+    handlers.check_dm_users(
+        db["users"].find(handlers.users_query(username, other_username), {"username": 1}),
+        (username, "Usuario no existe"),
+        (other_username, "Otro usuario no existe"),
     )
 
-    convs: dict[str, DMConversationSummary] = {}
-
-    for d in cursor:
-        sender = d.get("sender_username")
-        receiver = d.get("receiver_username")
-        content = d.get("content")
-        created_at = d.get("created_at")
-        read = d.get("read", False)
-
-        other = receiver if sender == username else sender
-        if other is None:
-            continue
-
-        # Si no existe, inicializamos
-        if other not in convs:
-            convs[other] = DMConversationSummary(
-                with_username=other,
-                last_message_content=content,
-                last_message_at=created_at,
-                unread_count=0,
-            )
-        else:
-            # Si este mensaje es más reciente, actualizamos último
-            if created_at > convs[other].last_message_at:
-                convs[other].last_message_at = created_at
-                convs[other].last_message_content = content
+    conversation_key = conversations.pair_key(username, other_username)
 
-        # Contabilizar no leídos entrantes
-        if receiver == username and not read:
-            convs[other].unread_count += 1
+    page = Page(before, after, limit, newest_first=True)
+    messages = None
+    r = None
+    if not page.has_cursor:
+        try:
+            r = conns.redis
+            messages = dm_cache.get_recent(r, conversation_key, limit)
+        except Exception as e:
+            print(f"⚠️ Redis no disponible para DMs recientes: {e}")
+            r = None
 
-    # Ordenar por último mensaje 
-    summaries = list(convs.values())
-    summaries.sort(key=lambda c: c.last_message_at, reverse=True)
+    if messages is not None:
+        next_cursor = page_next_cursor(messages, limit)
+    else:
+        # Primera página con Redis: se trae la ventana completa para cachearla
+        fetch = max(limit, dm_cache.DM_RECENT_WINDOW) if r is not None else limit
+        docs = list(
+            db["dms"].find(handlers.messages_query(page, conversation_key))
+            .sort(page.sort)
+            .limit(fetch)
+        )
+        if r is not None and docs:
+            try:
+                dm_cache.store_recent(r, conversation_key, [dm_cache.doc_to_dm(d) for d in docs])
+            except Exception as e:
+                print(f"⚠️ No se pudo cachear la conversación (no crítico): {e}")
+        docs, next_cursor = page.finish(docs[:limit])
+        messages = [dm_cache.doc_to_dm(d) for d in docs]
 
-    return summaries
+    handlers.set_next_cursor(response, next_cursor)
 
+    # Marca de lectura de `username`: avanza hasta el mensaje más nuevo de la
+    # página (un update, y solo si avanza; los mensajes no se tocan)
+    watermarks = conversations.get_watermarks(db, username, other_username)
+    up_to = handlers.read_mark(messages, watermarks, username) if mark_read else None
+    if up_to:
+        now_iso = datetime.utcnow().isoformat()
+        try:
+            conversations.mark_read(db, username, other_username, conversation_key, up_to, now_iso)
+            watermarks[username] = {"last_read_at": up_to, "read_marked_at": now_iso}
+        except Exception as e:
+            print(f"⚠️  No se pudo actualizar la marca de lectura (no crítico): {e}")
 
-# ========== ENDPOINTS DE LIKES ==========
+    return handlers.conversation_out(messages, watermarks)
 
-class LikeRequest(BaseModel):
-    username: str
-    post_id: str
 
-class LikeResponse(BaseModel):
-    post_id: str
-    likes_count: int
-    user_liked: bool
+# ========== ENDPOINTS DE LIKES ==========
 
 @app.post("/posts/{post_id}/like", response_model=LikeResponse)
-def like_post(post_id: str, username: str):
+def like_post(
+    post_id: str,
+    username: str,
+    background_tasks: BackgroundTasks,
+    conns: ConnectionManager = Depends(get_connections),
+):
     """
     Dar like a un post
-    
+
     Integración NoSQL:
-    1. Redis: Incrementar contador + agregar a set de usuarios
-    2. Neo4j: Crear relación (User)-[:LIKES]->(Post)
-    3. MongoDB: Actualizar contador (fallback)
-    """
-    db = get_mongo_db()
-    likes_col = db["likes"]
-    
-    # Verificar si ya dio like (primero en MongoDB)
-    existing_like = likes_col.find_one({"post_id": post_id, "username": username})
-    if existing_like:
-        # Ya dio like, contar y retornar
-        count = likes_col.count_documents({"post_id": post_id})
-        return LikeResponse(
-            post_id=post_id,
-            likes_count=count,
-            user_liked=True
-        )
-    
-    # Guardar like en MongoDB
-    likes_col.insert_one({"post_id": post_id, "username": username})
-    new_count = likes_col.count_documents({"post_id": post_id})
-    
-    # Intentar con Redis (opcional)
-    try:
-        redis_client = get_redis_client()
-        likes_count_key = f"post:{post_id}:likes:count"
-        likes_users_key = f"post:{post_id}:likes:users"
-        pipe = redis_client.pipeline()
-        pipe.set(likes_count_key, new_count)
-        pipe.sadd(likes_users_key, username)
-        pipe.zincrby("trending:posts", 1, post_id)
-        pipe.execute()
-    except Exception as e:
-        print(f"⚠️ Redis no disponible para likes: {e}")
-    
-    # Crear relación en Neo4j (opcional)
+    1. Redis: SET de usuarios + contador + trending en un solo script (fuente principal)
+    2. MongoDB: colección `likes` actualizada por detrás (app/likes.py)
+    3. Neo4j: Crear relación (User)-[:LIKES]->(Post) en segundo plano
+    """
     try:
-        driver = get_neo4j_driver()
-        with driver.session() as session:
-            users_col = db["users"]
-            user_doc = users_col.find_one({"username": username})
-            if user_doc:
-                user_id = str(user_doc["_id"])
-                session.run(
-                    """
-                    MERGE (u:User {id: $user_id})
-                    MERGE (p:Post {id: $post_id})
-                    MERGE (u)-[:LIKES]->(p)
-                    """,
-                    user_id=user_id,
-                    post_id=post_id
-                )
-        driver.close()
+        count, liked, changed = likes.toggle_like(conns, post_id, username, like=True)
     except Exception as e:
-        print(f"⚠️ Neo4j no disponible para likes: {e}")
-    
-    return LikeResponse(
-        post_id=post_id,
-        likes_count=new_count,
-        user_liked=True
-    )
+        print(f"⚠️ Redis no disponible para likes, usando MongoDB: {e}")
+        count, liked, changed = likes.toggle_like_mongo(conns, post_id, username, like=True)
+
+    if changed:
+        background_tasks.add_task(_sync_like_graph, conns, post_id, username, True)
+
+    return handlers.like_response(post_id, count, liked)
 
 @app.delete("/posts/{post_id}/like")
-def unlike_post(post_id: str, username: str):
+def unlike_post(
+    post_id: str,
+    username: str,
+    background_tasks: BackgroundTasks,
+    conns: ConnectionManager = Depends(get_connections),
+):
     """
     Quitar like de un post
     """
-    db = get_mongo_db()
-    likes_col = db["likes"]
-    
-    # Verificar si había dado like
-    existing_like = likes_col.find_one({"post_id": post_id, "username": username})
-    if not existing_like:
-        # No había dado like
-        count = likes_col.count_documents({"post_id": post_id})
-        return LikeResponse(
-            post_id=post_id,
-            likes_count=count,
-            user_liked=False
-        )
-    
-    # Eliminar like de MongoDB
-    likes_col.delete_one({"post_id": post_id, "username": username})
-    new_count = likes_col.count_documents({"post_id": post_id})
-    
-    # Intentar con Redis (opcional)
     try:
-        redis_client = get_redis_client()
-        likes_count_key = f"post:{post_id}:likes:count"
-        likes_users_key = f"post:{post_id}:likes:users"
-        pipe = redis_client.pipeline()
-        pipe.set(likes_count_key, new_count)
-        pipe.srem(likes_users_key, username)
-        pipe.zincrby("trending:posts", -1, post_id)
-        pipe.execute()
+        count, liked, changed = likes.toggle_like(conns, post_id, username, like=False)
     except Exception as e:
-        print(f"⚠️ Redis no disponible para unlike: {e}")
-    
-    # Eliminar relación en Neo4j (opcional)
+        print(f"⚠️ Redis no disponible para unlike, usando MongoDB: {e}")
+        count, liked, changed = likes.toggle_like_mongo(conns, post_id, username, like=False)
+
+    if changed:
+        background_tasks.add_task(_sync_like_graph, conns, post_id, username, False)
+
+    return handlers.like_response(post_id, count, liked)
+
+
+def _sync_like_graph(conns: ConnectionManager, post_id: str, username: str, liked: bool):
+    """Reflejar el like/unlike en Neo4j (opcional, fuera del request)"""
     try:
-        driver = get_neo4j_driver()
-        with driver.session() as session:
-            users_col = db["users"]
-            user_doc = users_col.find_one({"username": username})
-            if user_doc:
-                user_id = str(user_doc["_id"])
-                session.run(
-                    """
-                    MATCH (u:User {id: $user_id})-[r:LIKES]->(p:Post {id: $post_id})
-                    DELETE r
-                    """,
-                    user_id=user_id,
-                    post_id=post_id
-                )
-        driver.close()
+        user_doc = conns.mongo_db()["users"].find_one({"username": username}, {"_id": 1})
+        if not user_doc:
+            return
+        graph_writer.graph_writer.write("like" if liked else "unlike", {
+            "user_id": str(user_doc["_id"]),
+            "post_id": post_id,
+        }, wait=False)
     except Exception as e:
-        print(f"⚠️ Neo4j no disponible para unlike: {e}")
-    
-    return LikeResponse(
-        post_id=post_id,
-        likes_count=new_count,
-        user_liked=False
-    )
+        print(f"⚠️ Neo4j no disponible para likes: {e}")
+
+@app.post("/posts/likes:batch", response_model=List[LikeResponse])
+def get_posts_likes_batch(
+    request: LikesBatchRequest,
+    conns: ConnectionManager = Depends(get_connections),
+):
+    """
+    Likes de varios posts en una sola llamada (p. ej. todos los de un feed)
+
+    - Redis: un pipeline con el contador (y SISMEMBER si viene `username`) de cada post
+    - MongoDB: una sola agregación `$in` para los posts que Redis no tenga
+    """
+    handlers.check_likes_batch(request)
+
+    states = likes.get_like_states(conns, request.post_ids, request.username)
+    return handlers.likes_batch_response(request, states)
 
 @app.get("/posts/{post_id}/likes", response_model=LikeResponse)
-def get_post_likes(post_id: str, username: str = None):
+def get_post_likes(
+    post_id: str,
+    username: str = None,
+    conns: ConnectionManager = Depends(get_connections),
+):
     """
-    Obtener información de likes de un post
+    Obtener información de likes de un post (Redis, O(1); MongoDB si no está)
     """
-    db = get_mongo_db()
-    likes_col = db["likes"]
-    
-    # Contar likes desde MongoDB
-    count = likes_col.count_documents({"post_id": post_id})
-    user_liked = False
-    
-    if username:
-        user_liked = likes_col.find_one({"post_id": post_id, "username": username}) is not None
-    
-    return LikeResponse(
-        post_id=post_id,
-        likes_count=count,
-        user_liked=user_liked
-    )
+    count, user_liked = likes.get_like_state(conns, post_id, username)
+
+    return handlers.like_response(post_id, count, user_liked)
 
 @app.get("/trending/posts")
-def get_trending_posts(limit: int = 10):
+def get_trending_posts(
+    limit: int = Query(10, ge=1, le=100),
+    window: TrendingWindow = TrendingWindow.all,
+    decay: bool = True,
+    conns: ConnectionManager = Depends(get_connections),
+):
     """
-    Obtener posts trending (más likeados)
-    
-    Usa MongoDB como fuente principal, agregando likes por post
+    Obtener posts trending (más likeados) en una ventana de tiempo
+
+    - window = 1h / 24h / 7d: unión de los buckets de likes de la ventana
+      (con decay, los likes recientes pesan más); cacheada unos segundos
+    - window = all: ranking histórico ({trending:N}:posts)
+    - Se sirve del snapshot ya hidratado que mantiene TrendingRefresher
+      (un GET de Redis); los likes_count son los del último refresco
+    - Sin Redis: likes de la ventana agregados en MongoDB por created_at
+      (window = all: todos los likes)
     """
+    db = conns.mongo_db()
     try:
-        db = get_mongo_db()
-        posts_col = db["posts"]
-        likes_col = db["likes"]
-        
-        # Agregación para contar likes por post
-        pipeline = [
-            {"$group": {"_id": "$post_id", "likes_count": {"$sum": 1}}},
-            {"$sort": {"likes_count": -1}},
-            {"$limit": limit}
-        ]
-        
-        trending_data = list(likes_col.aggregate(pipeline))
-        
-        if not trending_data:
-            return []
-        
-        result = []
-        for item in trending_data:
-            post_id = item["_id"]
-            likes_count = item["likes_count"]
-            
-            # Buscar post en MongoDB
-            try:
-                post_doc = posts_col.find_one({"_id": ObjectId(post_id)})
-                if post_doc:
-                    result.append({
-                        "id": str(post_doc["_id"]),
-                        "author_username": post_doc.get("author_username"),
-                        "content": post_doc.get("content"),
-                        "tags": post_doc.get("tags", []),
-                        "created_at": post_doc.get("created_at"),
-                        "likes_count": likes_count
-                    })
-            except Exception as e:
-                print(f"Error getting post {post_id}: {e}")
-                continue
-        
-        return result
+        r = conns.redis
+        if limit <= trending_snapshot.TRENDING_SNAPSHOT_SIZE:
+            return trending_snapshot.get_snapshot(conns, window.value, decay)[:limit]
+        ranked = trending.top_posts(r, window.value, limit, decay)
     except Exception as e:
-        print(f"⚠️ Error getting trending posts: {e}")
+        print(f"⚠️ Redis no disponible para trending, usando MongoDB: {e}")
+        r = None
+        ranked = trending.top_posts_mongo(db, window.value, limit)
+
+    if not ranked:
         return []
 
+    post_ids = [post_id for post_id, _ in ranked]
+    posts = post_cache.get_posts(r, db, post_ids)
+    like_states = likes.get_like_states(conns, post_ids)
+    return trending.to_response(ranked, posts, like_states)
+
+
+# ========== MÉTRICAS DEL FEED ==========
+
+@app.get("/feed/metrics")
+def feed_metrics(conns: ConnectionManager = Depends(get_connections)):
+    """
+    Métricas del feed híbrido push/pull de este worker:
+    - feed_path_*: cuántos feeds atendió cada camino (cache/push/hybrid/pull)
+    - fanout_*: posts con fan-out (push) y posts de celebridades (sin fan-out)
+    """
+    celebrities = None
+    try:
+        celebrities = conns.redis.scard(timelines.CELEBRITIES_KEY)
+    except Exception as e:
+        print(f"⚠️ Redis no disponible para métricas del feed: {e}")
+
+    return {
+        "pid": os.getpid(),
+        "celebrity_follower_threshold": timelines.CELEBRITY_FOLLOWER_THRESHOLD,
+        "celebrities": celebrities,
+        "counters": timelines.feed_metrics.snapshot(),
+    }
+
+
+# ========== ADMIN ==========
+
+@app.post("/admin/timelines/rebuild")
+def rebuild_timelines(
+    username: Optional[str] = None,
+    conns: ConnectionManager = Depends(get_connections),
+):
+    """
+    Reconstruye los timelines materializados desde MongoDB/Neo4j.
+    - Con `username`: solo el timeline (y la lista de posts) de ese usuario
+    - Sin `username`: todos los usuarios
+    """
+    if username:
+        if not conns.mongo_db()["users"].find_one({"username": username}):
+            raise HTTPException(status_code=404, detail="Usuario no encontrado")
+        timelines.load_author_posts(conns, username)
+        entries = timelines.rebuild_timeline(conns, username)
+        return {"users": 1, "celebrities": None, "timeline_entries": entries}
+
+    return timelines.rebuild_all_timelines(conns)
+
+
+@app.post("/admin/suggestions/refresh")
+def refresh_suggestions(
+    username: Optional[str] = None,
+    conns: ConnectionManager = Depends(get_connections),
+):
+    """
+    Recalcula las sugerencias precalculadas (app/suggestion_sets.py).
+    - Con `username`: solo ese usuario (queda activo para el lote)
+    - Sin `username`: todos los usuarios activos, como SuggestionRefresher
+    """
+    if username:
+        if not conns.mongo_db()["users"].find_one({"username": username}):
+            raise HTTPException(status_code=404, detail="Usuario no encontrado")
+        try:
+            conns.redis.zadd(suggestion_sets.ACTIVE_KEY, {username: time.time()})
+            return suggestion_sets.refresh_users(conns, [username])
+        except Exception as e:
+            raise HTTPException(status_code=503, detail=f"Redis no disponible: {e}")
+
+    try:
+        return suggestion_sets.refresh_active(conns)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Redis no disponible: {e}")
+
+
+@app.post("/admin/counters/reconcile")
+def reconcile_counters(
+    username: Optional[str] = None,
+    conns: ConnectionManager = Depends(get_connections),
+):
+    """
+    Recalcula followers_count, following_count y posts_count
+    (app/user_counters.py) desde Neo4j/MongoDB y corrige la deriva.
+    - Con `username`: solo ese usuario
+    - Sin `username`: todos los usuarios, por lotes
+    """
+    if username and not conns.mongo_db()["users"].find_one({"username": username}):
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    return user_counters.reconcile(conns, [username] if username else None)
+
+
+@app.post("/admin/likes/reconcile")
+def reconcile_likes(conns: ConnectionManager = Depends(get_connections)):
+    """
+    Pasa a Redis los likes que se escribieron solo en MongoDB mientras Redis
+    no respondía (app/likes.py). También lo hace LikeFlusher cada
+    LIKES_RECONCILE_INTERVAL_S.
+    """
+    try:
+        return likes.reconcile_fallback(conns)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Redis no disponible: {e}")
+
+
+@app.post("/admin/trending/rebalance")
+def rebalance_trending(
+    shards: Optional[int] = Query(None, ge=1, le=1024),
+    conns: ConnectionManager = Depends(get_connections),
+):
+    """
+    Reparte el trending en `shards` shards (por defecto TRENDING_SHARDS).
+    Se corre después de cambiar TRENDING_SHARDS o para migrar el esquema
+    sin shards (trending:posts); hasta entonces las lecturas no ven los
+    posts que siguen en su shard viejo.
+    """
+    try:
+        return trending.rebalance(conns.redis, shards)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Redis no disponible: {e}")
+
+
+@app.post("/admin/schema/bootstrap")
+def bootstrap_schema(
+    force: bool = False,
+    conns: ConnectionManager = Depends(get_connections),
+):
+    """
+    Crea los índices de MongoDB y los constraints de Neo4j (app/db_schema.py).
+    - Sin `force`: solo si la versión aplicada es menor que la actual
+    - Con `force`: reaplica todas las definiciones (idempotente)
+    """
+    return db_schema.bootstrap(conns, force=force)
+
+
+@app.get("/admin/schema/check")
+def check_schema(conns: ConnectionManager = Depends(get_connections)):
+    """
+    Revisa con explain() / PROFILE las consultas más frecuentes y
+    lista en `scans` las que todavía recorren la colección o etiqueta completa.
+    """
+    return db_schema.check(conns)
@@ -0,0 +1,157 @@
+"""
+Paginación por cursor (keyset) para Red K.
+
+Los cursores son opacos para el cliente: base64 urlsafe de
+{"t": created_at, "id": _id} del último elemento de la página. La siguiente
+página se lee con un rango sobre (created_at, _id) en vez de skip/limit, así
+que un índice compuesto que termine en esos campos la atiende sin recorrer
+lo que ya se devolvió, por profunda que sea la página.
+
+- `before`: elementos más viejos que el cursor
+- `after`: elementos más nuevos que el cursor
+- El cursor de la página siguiente viaja en el header X-Next-Cursor (el cuerpo
+  sigue siendo la lista de siempre); solo se envía si la página vino llena.
+"""
+
+import base64
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import HTTPException
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+DIRECTION_BEFORE = "before"
+DIRECTION_AFTER = "after"
+
+
+class InvalidCursor(ValueError):
+    """Cursor mal formado o manipulado por el cliente"""
+
+
+def encode_cursor(created_at: Optional[str], doc_id: Any) -> str:
+    """Cursor opaco para (created_at, _id)"""
+    payload = json.dumps({"t": created_at, "id": str(doc_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[str], ObjectId]:
+    """Inverso de encode_cursor; lanza InvalidCursor si no se puede leer"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        created_at = data.get("t")
+        doc_id = ObjectId(data["id"])
+    except Exception as e:
+        raise InvalidCursor(f"Cursor inválido: {cursor}") from e
+    if created_at is not None and not isinstance(created_at, str):
+        raise InvalidCursor(f"Cursor inválido: {cursor}")
+    return created_at, doc_id
+
+
+def page_next_cursor(items: List[Any], limit: int) -> Optional[str]:
+    """
+    Cursor para seguir después de una página ya armada (p. ej. la primera
+    página del feed, que sale del timeline o del cache y no de un rango).
+    Acepta modelos (PostOut, DMOut) o dicts con `created_at` e `id`.
+    """
+    if not items or len(items) < limit:
+        return None
+    last = items[-1]
+    if isinstance(last, dict):
+        return encode_cursor(last.get("created_at"), last.get("id"))
+    return encode_cursor(last.created_at, last.id)
+
+
+class Page:
+    """
+    Una página por cursor sobre una colección ordenada por (time_field, _id).
+
+    Args:
+        before / after: cursores recibidos (como mucho uno de los dos)
+        limit: tamaño de página
+        newest_first: orden en que se muestra la lista (feed: True, DMs: False)
+        time_field: campo de tiempo; None para ordenar solo por _id
+                    (el ObjectId ya lleva la fecha de creación)
+    """
+
+    def __init__(
+        self,
+        before: Optional[str],
+        after: Optional[str],
+        limit: int,
+        newest_first: bool,
+        time_field: Optional[str] = "created_at",
+    ):
+        if before and after:
+            raise HTTPException(status_code=400, detail="Usa solo uno: before o after")
+
+        self.limit = limit
+        self.newest_first = newest_first
+        self.time_field = time_field
+        self.direction: Optional[str] = None
+        self.created_at: Optional[str] = None
+        self.doc_id: Optional[ObjectId] = None
+
+        cursor = before or after
+        if cursor:
+            try:
+                self.created_at, self.doc_id = decode_cursor(cursor)
+            except InvalidCursor as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            if time_field is not None and self.created_at is None:
+                raise HTTPException(status_code=400, detail=f"Cursor inválido: {cursor}")
+            self.direction = DIRECTION_BEFORE if before else DIRECTION_AFTER
+
+        # Sentido en que se recorre el índice: hacia atrás si pedimos `before`
+        # o si es la primera página de una lista que se muestra newest-first
+        if self.direction is None:
+            self.descending = newest_first
+        else:
+            self.descending = self.direction == DIRECTION_BEFORE
+
+    @property
+    def has_cursor(self) -> bool:
+        return self.direction is not None
+
+    def query(self, base: Dict) -> Dict:
+        """Filtro de Mongo: `base` + rango sobre (time_field, _id) desde el cursor"""
+        if not self.has_cursor:
+            return base
+
+        op = "$lt" if self.descending else "$gt"
+        if self.time_field is None:
+            keyset = {"_id": {op: self.doc_id}}
+        else:
+            keyset = {
+                "$or": [
+                    {self.time_field: {op: self.created_at}},
+                    {self.time_field: self.created_at, "_id": {op: self.doc_id}},
+                ]
+            }
+        if not base:
+            return keyset
+        return {"$and": [base, keyset]}
+
+    @property
+    def sort(self) -> List[Tuple[str, int]]:
+        order = -1 if self.descending else 1
+        if self.time_field is None:
+            return [("_id", order)]
+        return [(self.time_field, order), ("_id", order)]
+
+    def finish(self, docs: List[Dict]) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Recibe los documentos en el orden del índice y devuelve
+        (documentos en orden de presentación, cursor de la página siguiente)
+        """
+        next_cursor = None
+        if docs and len(docs) >= self.limit:
+            last = docs[-1]
+            created_at = last.get(self.time_field) if self.time_field else None
+            next_cursor = encode_cursor(created_at, last["_id"])
+        if self.descending != self.newest_first:
+            docs = list(reversed(docs))
+        return docs, next_cursor
+
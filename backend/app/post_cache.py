@@ -0,0 +1,135 @@
+"""
+Cache de objetos post para Red K.
+
+Cada post se guarda una sola vez en Redis, sin importar en cuántos feeds
+aparezca:
+
+- post:{post_id}    STRING con el PostOut serializado (TTL POST_CACHE_TTL)
+
+Los feeds cacheados solo guardan listas de ids (ver app/feed_cache.py) y se
+hidratan aquí: un MGET para todos los ids y un solo `$in` a MongoDB para los
+que falten, que además se vuelven a cachear en un pipeline.
+"""
+
+import json
+import logging
+import os
+from typing import Dict, Iterable, List
+
+from bson import ObjectId
+
+from app.schemas import PostOut
+from app.timelines import doc_to_post
+
+logger = logging.getLogger(__name__)
+
+# Los posts no se editan, así que pueden vivir bastante en cache
+POST_CACHE_TTL = int(os.getenv("POST_CACHE_TTL", "3600"))
+
+
+def post_key(post_id: str) -> str:
+    return f"post:{post_id}"
+
+
+def _decode_cached(values: List, post_ids: List[str]) -> Dict[str, PostOut]:
+    found: Dict[str, PostOut] = {}
+    for pid, raw in zip(post_ids, values):
+        if not raw:
+            continue
+        try:
+            found[pid] = PostOut(**json.loads(raw))
+        except Exception:
+            pass  # entrada corrupta: se relee de Mongo
+    return found
+
+
+def _ordered(post_ids: List[str], found: Dict[str, PostOut]) -> List[PostOut]:
+    return [found[pid] for pid in post_ids if pid in found]
+
+
+def _valid_oids(post_ids: Iterable[str]) -> List[ObjectId]:
+    return [ObjectId(pid) for pid in post_ids if ObjectId.is_valid(pid)]
+
+
+# ========== SYNC ==========
+
+def cache_posts(r, posts: List[PostOut]):
+    """Guardar posts en el cache de objetos (un pipeline)"""
+    if not posts:
+        return
+    pipe = r.pipeline(transaction=False)
+    for post in posts:
+        pipe.setex(post_key(post.id), POST_CACHE_TTL, json.dumps(post.dict()))
+    pipe.execute()
+
+
+def get_posts(r, db, post_ids: List[str]) -> List[PostOut]:
+    """
+    Hidratar `post_ids` en el mismo orden (los ids inexistentes se omiten).
+
+    Args:
+        r: cliente Redis o None para ir directo a MongoDB
+        db: base de MongoDB para los ids que no estén en cache
+    """
+    if not post_ids:
+        return []
+
+    found: Dict[str, PostOut] = {}
+    if r is not None:
+        try:
+            found = _decode_cached(r.mget([post_key(pid) for pid in post_ids]), post_ids)
+        except Exception as e:
+            logger.warning(f"Cache de posts no disponible, usando MongoDB: {e}")
+            r = None
+
+    missing = [pid for pid in post_ids if pid not in found]
+    if missing:
+        fetched = [doc_to_post(d) for d in db["posts"].find({"_id": {"$in": _valid_oids(missing)}})]
+        for post in fetched:
+            found[post.id] = post
+        if r is not None:
+            try:
+                cache_posts(r, fetched)
+            except Exception as e:
+                logger.warning(f"No se pudieron cachear posts: {e}")
+
+    return _ordered(post_ids, found)
+
+
+# ========== ASYNC (redis.asyncio + AsyncMongoClient) ==========
+
+async def cache_posts_async(r, posts: List[PostOut]):
+    if not posts:
+        return
+    pipe = r.pipeline(transaction=False)
+    for post in posts:
+        pipe.setex(post_key(post.id), POST_CACHE_TTL, json.dumps(post.dict()))
+    await pipe.execute()
+
+
+async def get_posts_async(r, db, post_ids: List[str]) -> List[PostOut]:
+    """Versión async de get_posts"""
+    if not post_ids:
+        return []
+
+    found: Dict[str, PostOut] = {}
+    if r is not None:
+        try:
+            found = _decode_cached(await r.mget([post_key(pid) for pid in post_ids]), post_ids)
+        except Exception as e:
+            logger.warning(f"Cache de posts no disponible, usando MongoDB: {e}")
+            r = None
+
+    missing = [pid for pid in post_ids if pid not in found]
+    if missing:
+        cursor = db["posts"].find({"_id": {"$in": _valid_oids(missing)}})
+        fetched = [doc_to_post(d) async for d in cursor]
+        for post in fetched:
+            found[post.id] = post
+        if r is not None:
+            try:
+                await cache_posts_async(r, fetched)
+            except Exception as e:
+                logger.warning(f"No se pudieron cachear posts: {e}")
+
+    return _ordered(post_ids, found)
@@ -0,0 +1,347 @@
+"""
+Recomendador por Personalized PageRank (PPR) para Red K.
+
+Las sugerencias de app/suggestion_sets.py miran solo a 2 saltos y ordenan
+por `mutual*3 + followers*2 + posts`. Este job calcula, para cada usuario,
+la probabilidad de que un paseo aleatorio que arranca en él (y vuelve a él
+con probabilidad PPR_ALPHA en cada paso) termine en cada otro usuario:
+
+- Grafo: FOLLOWS (peso 1) + MESSAGED (peso PPR_MESSAGE_WEIGHT), de Neo4j o,
+  si no responde, de las colecciones `follows` y `dm_conversations`
+- Matriz de transición dispersa (scipy.sparse CSR), normalizada por fila;
+  los usuarios sin salidas devuelven su masa al origen
+- Iteración de potencias para un bloque de PPR_CHUNK_SIZE usuarios a la vez
+  (una multiplicación matriz dispersa × matriz densa n×bloque por paso)
+- Los bloques se reparten en un pool de procesos (un proceso por core); la
+  matriz se manda una vez a cada proceso, en el initializer
+
+El top PPR_TOP_K de cada usuario (sin él mismo ni quienes ya sigue) se guarda
+junto a las otras sugerencias, en el slot del usuario:
+
+- {user:alice}:suggestions:ppr        ZSET candidato → score PPR
+- {user:alice}:suggestions:ppr_meta   HASH computed_at
+
+y se sirve con GET /users/{username}/suggestions?algo=ppr. Es un job de CPU:
+se corre fuera de la API (cron o a mano), no en un worker:
+
+    python -m app.ppr                 # usuarios activos (suggestions:active)
+    python -m app.ppr --all           # todos los que siguen a alguien
+    python -m app.ppr --username alice --workers 1
+"""
+
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from app import follow_graph, suggestion_sets
+from app.connections import ConnectionManager
+from app.follows import get_following_usernames, get_following_usernames_async
+from app.schemas import SuggestionOut
+
+logger = logging.getLogger(__name__)
+
+PPR_ALPHA = float(os.getenv("PPR_ALPHA", "0.15"))
+PPR_ITERATIONS = int(os.getenv("PPR_ITERATIONS", "20"))
+PPR_CHUNK_SIZE = int(os.getenv("PPR_CHUNK_SIZE", "64"))
+PPR_TOP_K = int(os.getenv("PPR_TOP_K", "50"))
+PPR_MESSAGE_WEIGHT = float(os.getenv("PPR_MESSAGE_WEIGHT", "1.0"))
+PPR_WORKERS = int(os.getenv("PPR_WORKERS", str(os.cpu_count() or 1)))
+
+PPR_REASON = "Personalized PageRank (seguidos y DMs)"
+
+
+def ppr_key(username: str) -> str:
+    return f"{{user:{username}}}:suggestions:ppr"
+
+
+def ppr_meta_key(username: str) -> str:
+    return f"{{user:{username}}}:suggestions:ppr_meta"
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+# ========== GRAFO ==========
+
+def load_message_edges(conns: ConnectionManager) -> List[Tuple[str, str]]:
+    """Aristas (emisor, receptor) de MESSAGED, o de dm_conversations si Neo4j no responde"""
+    try:
+        with conns.neo4j_driver.session() as session:
+            result = session.run(
+                """
+                MATCH (a:User)-[:MESSAGED]->(b:User)
+                RETURN a.username AS sender, b.username AS receiver
+                """
+            )
+            return [(record["sender"], record["receiver"]) for record in result]
+    except Exception as e:
+        logger.warning(f"Neo4j no disponible para MESSAGED, usando dm_conversations: {e}")
+        return [
+            (doc.get("owner"), doc.get("with_username"))
+            for doc in conns.mongo_db()["dm_conversations"].find({}, {"owner": 1, "with_username": 1})
+        ]
+
+
+class Graph:
+    """Matrices del job: se arma una vez y se manda a cada proceso del pool"""
+
+    def __init__(self, names: List[str], transition_t: sparse.csr_matrix,
+                 dangling: np.ndarray, follows: sparse.csr_matrix):
+        self.names = names
+        self.ids = {name: i for i, name in enumerate(names)}
+        self.transition_t = transition_t     # P^T: columna u = distribución de salida de u
+        self.dangling = dangling             # usuarios sin aristas de salida
+        self.follows = follows               # FOLLOWS sin pesos, para excluir a los seguidos
+
+    @property
+    def edges(self) -> int:
+        return int(self.transition_t.nnz)
+
+
+def build_graph(follow_edges: Iterable[Tuple[str, str]],
+                message_edges: Iterable[Tuple[str, str]] = (),
+                message_weight: float = PPR_MESSAGE_WEIGHT) -> Graph:
+    ids: Dict[str, int] = {}
+    names: List[str] = []
+
+    def intern(edges) -> Tuple[np.ndarray, np.ndarray]:
+        src, dst = [], []
+        for a, b in edges:
+            if not a or not b or a == b:
+                continue
+            for name in (a, b):
+                if name not in ids:
+                    ids[name] = len(names)
+                    names.append(name)
+            src.append(ids[a])
+            dst.append(ids[b])
+        return np.array(src, dtype=np.int64), np.array(dst, dtype=np.int64)
+
+    f_src, f_dst = intern(follow_edges)
+    m_src, m_dst = intern(message_edges)
+    n = len(names)
+
+    # Aristas repetidas se colapsan: un follow vale 1 aunque esté duplicado
+    follows = sparse.csr_matrix((np.ones(len(f_src), dtype=np.float32), (f_src, f_dst)), shape=(n, n))
+    follows.data[:] = 1.0
+    messages = sparse.csr_matrix((np.ones(len(m_src), dtype=np.float32), (m_src, m_dst)), shape=(n, n))
+    messages.data[:] = message_weight
+
+    adjacency = (follows + messages).tocsr()
+    out_weight = np.asarray(adjacency.sum(axis=1)).ravel()
+    dangling = out_weight == 0
+    inv = np.divide(1.0, out_weight, out=np.zeros_like(out_weight), where=~dangling)
+    transition = sparse.diags(inv.astype(np.float32)) @ adjacency
+    return Graph(names, transition.T.tocsr(), dangling, follows)
+
+
+def load_graph(conns: ConnectionManager) -> Graph:
+    return build_graph(follow_graph.load_edges(conns), load_message_edges(conns))
+
+
+# ========== PPR ==========
+
+def personalized_pagerank(graph: Graph, seeds: np.ndarray,
+                          alpha: float = PPR_ALPHA, iterations: int = PPR_ITERATIONS) -> np.ndarray:
+    """
+    Matriz n × len(seeds): columna j = PPR con reinicio en seeds[j].
+    x ← (1-α)·Pᵀx + (α + (1-α)·masa en usuarios sin salida)·e_seed
+    """
+    n = len(graph.names)
+    restart = np.zeros((n, len(seeds)), dtype=np.float32)
+    restart[seeds, np.arange(len(seeds))] = 1.0
+    x = restart.copy()
+    for _ in range(iterations):
+        lost = x[graph.dangling].sum(axis=0)
+        x = (1 - alpha) * (graph.transition_t @ x) + restart * (alpha + (1 - alpha) * lost)
+    return x
+
+
+def top_k(graph: Graph, seeds: np.ndarray, scores: np.ndarray, k: int) -> List[Tuple[str, List[Tuple[str, float]]]]:
+    """Top k de cada columna, sin el propio usuario ni a quienes ya sigue"""
+    results = []
+    for j, seed in enumerate(seeds):
+        column = scores[:, j]
+        followed = graph.follows.indices[graph.follows.indptr[seed]:graph.follows.indptr[seed + 1]]
+        column[followed] = 0
+        column[seed] = 0
+        candidates = np.flatnonzero(column > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-column[candidates], k - 1)[:k]]
+        ranked = sorted(candidates, key=lambda i: -column[i])
+        results.append((graph.names[seed], [(graph.names[i], float(column[i])) for i in ranked]))
+    return results
+
+
+# Estado de cada proceso del pool (lo fija el initializer)
+_worker_graph: Optional[Graph] = None
+
+
+def _init_worker(graph: Graph):
+    global _worker_graph
+    _worker_graph = graph
+
+
+def _rank_chunk(args: Tuple[np.ndarray, int]):
+    seeds, k = args
+    return top_k(_worker_graph, seeds, personalized_pagerank(_worker_graph, seeds), k)
+
+
+def rank(graph: Graph, seeds: List[int], k: int = PPR_TOP_K, workers: int = PPR_WORKERS,
+         chunk_size: int = PPR_CHUNK_SIZE) -> Iterator[Tuple[str, List[Tuple[str, float]]]]:
+    """(username, [(candidato, score)]) de cada seed, por bloques"""
+    chunks = [
+        (np.array(seeds[i:i + chunk_size], dtype=np.int64), k)
+        for i in range(0, len(seeds), chunk_size)
+    ]
+    if workers <= 1 or len(chunks) <= 1:
+        _init_worker(graph)
+        for chunk in chunks:
+            yield from _rank_chunk(chunk)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(graph,)) as pool:
+        for results in pool.map(_rank_chunk, chunks):
+            yield from results
+
+
+# ========== REDIS ==========
+
+def store(r, results: List[Tuple[str, List[Tuple[str, float]]]], now: str):
+    """Reemplazar el ZSET PPR de cada usuario (un round trip por lote)"""
+    pipe = r.pipeline(transaction=False)
+    for username, ranked in results:
+        pipe.delete(ppr_key(username))
+        if ranked:
+            pipe.zadd(ppr_key(username), dict(ranked))
+            pipe.expire(ppr_key(username), suggestion_sets.SUGGESTIONS_ACTIVE_SECONDS)
+        pipe.hset(ppr_meta_key(username), "computed_at", now)
+        pipe.expire(ppr_meta_key(username), suggestion_sets.SUGGESTIONS_ACTIVE_SECONDS)
+    pipe.execute()
+
+
+def run(conns: ConnectionManager, usernames: Optional[List[str]] = None,
+        everyone: bool = False, workers: int = PPR_WORKERS) -> Dict:
+    """
+    Calcular y guardar el PPR de `usernames`; sin lista, de los usuarios
+    activos de las sugerencias, o de todos los que siguen a alguien con
+    `everyone`.
+    """
+    started = time.perf_counter()
+    graph = load_graph(conns)
+    r = conns.redis
+    if everyone:
+        seeds = np.flatnonzero(np.diff(graph.follows.indptr) > 0).tolist()
+    else:
+        if usernames is None:
+            usernames = suggestion_sets.active_users(r)
+        seeds = [graph.ids[u] for u in usernames if u in graph.ids]
+    now = datetime.utcnow().isoformat()
+
+    batch: List[Tuple[str, List[Tuple[str, float]]]] = []
+    users = 0
+    for result in rank(graph, seeds, workers=workers):
+        batch.append(result)
+        if len(batch) >= suggestion_sets.SUGGESTIONS_BATCH_SIZE:
+            store(r, batch, now)
+            users += len(batch)
+            batch = []
+    if batch:
+        store(r, batch, now)
+        users += len(batch)
+
+    report = {
+        "users": users,
+        "nodes": len(graph.names),
+        "edges": graph.edges,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+    logger.info(f"PPR calculado: {report}")
+    return report
+
+
+def _pick(entries, excluded: set, limit: int) -> List[Tuple[str, float]]:
+    return [(_decode(m), s) for m, s in entries if _decode(m) not in excluded][:limit]
+
+
+def _details(picked: List[Tuple[str, float]], mutuals: List) -> List[Dict]:
+    return [
+        {"username": member, "score": score, "mutual_connections": int(mutual or 0)}
+        for (member, score), mutual in zip(picked, mutuals)
+    ]
+
+
+def read_suggestions(conns: ConnectionManager, username: str, limit: int) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Top `limit` del ZSET PPR sin los que ya sigue, con los caminos en común
+    del ZSET de sugerencias (si está). Deja al usuario activo para el job.
+    """
+    r = conns.redis
+    r.zadd(suggestion_sets.ACTIVE_KEY, {username: time.time()})
+
+    excluded = set(get_following_usernames(conns, username))
+    entries = r.zrevrange(ppr_key(username), 0, limit + len(excluded) - 1, withscores=True)
+    picked = _pick(entries, excluded, limit)
+
+    results: List[Dict] = []
+    if picked:
+        results = _details(picked, r.zmscore(suggestion_sets.mutual_key(username), [m for m, _ in picked]))
+    computed_at = r.hget(ppr_meta_key(username), "computed_at")
+    return results, _decode(computed_at) if computed_at else None
+
+
+async def read_suggestions_async(aconns, username: str, limit: int) -> Tuple[List[Dict], Optional[str]]:
+    """Versión async de read_suggestions para el modo ASYNC_API (redis.asyncio)"""
+    r = aconns.redis
+    await r.zadd(suggestion_sets.ACTIVE_KEY, {username: time.time()})
+
+    excluded = set(await get_following_usernames_async(aconns, username))
+    entries = await r.zrevrange(ppr_key(username), 0, limit + len(excluded) - 1, withscores=True)
+    picked = _pick(entries, excluded, limit)
+
+    results: List[Dict] = []
+    if picked:
+        results = _details(picked, await r.zmscore(suggestion_sets.mutual_key(username), [m for m, _ in picked]))
+    computed_at = await r.hget(ppr_meta_key(username), "computed_at")
+    return results, _decode(computed_at) if computed_at else None
+
+
+def to_suggestions(ranked: List[Dict], user_docs: List[Dict]) -> List[SuggestionOut]:
+    """Como suggestion_sets.to_suggestions, con followers y posts de los contadores del documento"""
+    by_username = {d.get("username"): d for d in user_docs}
+    items = []
+    for item in ranked:
+        doc = by_username.get(item["username"], {})
+        items.append({
+            **item,
+            "followers_count": int(doc.get("followers_count") or 0),
+            "posts_count": int(doc.get("posts_count") or 0),
+        })
+    return suggestion_sets.to_suggestions(items, user_docs, reason=PPR_REASON)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Job de sugerencias por Personalized PageRank")
+    parser.add_argument("--all", action="store_true", help="Todos los usuarios que siguen a alguien")
+    parser.add_argument("--username", action="append", help="Solo estos usuarios (se puede repetir)")
+    parser.add_argument("--workers", type=int, default=PPR_WORKERS, help="Procesos del pool")
+    opts = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from app.connections import connection_manager
+    connection_manager.start()
+    try:
+        print(run(connection_manager, opts.username, everyone=opts.all, workers=opts.workers))
+    finally:
+        connection_manager.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""
+Canal de eventos en tiempo real (Server-Sent Events) para Red K.
+
+En vez de que el chat y el feed consulten `/dm/...` y `/users/.../feed`
+cada pocos segundos, el navegador abre una sola conexión:
+
+    GET /api/events/{username}        text/event-stream
+
+y recibe avisos chicos cuando hay algo nuevo. El aviso no trae el dato
+completo: el cliente vuelve a pedir la primera página, que sale de Redis
+(ventana reciente de app/dm_cache.py, timeline de app/timelines.py).
+
+Canales de Redis pub/sub:
+
+- events:user:{username}     DMs recibidos y enviados por el usuario, y sus
+                             follows/unfollows (la conexión suma o quita el
+                             canal del autor sin reconectar)
+- events:posts:{author}      posts nuevos del autor (una sola publicación,
+                             la reciben todos los followers conectados)
+
+Un worker abre UNA conexión de Redis para todos sus clientes (EventHub): se
+suscribe a la unión de los canales de sus conexiones, con conteo de
+referencias, y reparte cada mensaje a colas asyncio en memoria. Una conexión
+inactiva es solo una corrutina dormida y una asyncio.Queue; por eso el
+endpoint es `async def` aunque el resto de main.py sea síncrono (un hilo del
+threadpool por conexión abierta no escala a miles).
+
+Los eventos son avisos, no un log: si un cliente no lee, su cola descarta los
+más viejos, y si Redis no responde `publish` no falla el request que escribe.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from typing import Dict, Iterable, List, Optional, Set
+
+import redis.asyncio as aioredis
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+
+from app.connections import connection_manager
+from app.follows import get_following_usernames
+
+logger = logging.getLogger(__name__)
+
+PUSH_HEARTBEAT_SECONDS = float(os.getenv("PUSH_HEARTBEAT_SECONDS", "15"))
+PUSH_QUEUE_SIZE = int(os.getenv("PUSH_QUEUE_SIZE", "100"))
+PUSH_MAX_CONNECTIONS = int(os.getenv("PUSH_MAX_CONNECTIONS", "10000"))
+PUSH_MAX_AUTHORS = int(os.getenv("PUSH_MAX_AUTHORS", "1000"))
+
+# Canal propio del worker: mantiene la conexión de pub/sub suscrita aunque no
+# haya clientes (redis-py no puede leer de una PubSub sin suscripciones)
+HUB_CHANNEL = "events:hub"
+
+
+def user_channel(username: str) -> str:
+    return f"events:user:{username}"
+
+
+def author_channel(author: str) -> str:
+    return f"events:posts:{author}"
+
+
+# ========== EVENTOS ==========
+
+def dm_event(message: Dict) -> Dict:
+    return {
+        "type": "dm",
+        "id": message["id"],
+        "sender_username": message["sender_username"],
+        "receiver_username": message["receiver_username"],
+        "created_at": message["created_at"],
+    }
+
+
+def post_event(author: str, post_id: str, created_at: str) -> Dict:
+    return {"type": "post", "id": post_id, "author_username": author, "created_at": created_at}
+
+
+def follow_event(username: str, author: str, followed: bool) -> Dict:
+    return {"type": "follow", "username": username, "author_username": author, "followed": followed}
+
+
+def dm_channels(message: Dict) -> List[str]:
+    """Un DM avisa al receptor y a las otras pestañas del emisor"""
+    return sorted({user_channel(message["sender_username"]), user_channel(message["receiver_username"])})
+
+
+# ========== PUBLICACIÓN ==========
+
+def publish(r, channels: Iterable[str], event: Dict):
+    """PUBLISH del evento en cada canal, en un solo round trip"""
+    payload = json.dumps(event)
+    pipe = r.pipeline(transaction=False)
+    for channel in channels:
+        pipe.publish(channel, payload)
+    pipe.execute()
+
+
+async def publish_async(r, channels: Iterable[str], event: Dict):
+    payload = json.dumps(event)
+    pipe = r.pipeline(transaction=False)
+    for channel in channels:
+        pipe.publish(channel, payload)
+    await pipe.execute()
+
+
+# ========== HUB POR WORKER ==========
+
+class Subscription:
+    """Cola de eventos de una conexión SSE"""
+
+    def __init__(self, channels: Set[str], size: int):
+        self.channels = channels
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=size)
+        self.dropped = 0
+
+    def deliver(self, payload: str):
+        if self.queue.full():
+            # Cliente lento: se pierde el aviso más viejo, no el último
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(payload)
+
+
+class EventHub:
+    """
+    Una conexión de pub/sub por worker, compartida por todas las conexiones
+    SSE. Se abre con la primera suscripción y se cierra en el lifespan.
+    """
+
+    def __init__(self, redis_url: str, queue_size: int = PUSH_QUEUE_SIZE):
+        self.redis_url = redis_url
+        self.queue_size = queue_size
+        self._redis: Optional[aioredis.Redis] = None
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+        self._channels: Dict[str, Set[Subscription]] = {}
+        self._subscriptions: Set[Subscription] = set()
+        self._lock = asyncio.Lock()
+        self.delivered = 0
+
+    async def _ensure_started(self):
+        if self._reader is not None:
+            return
+        self._redis = aioredis.from_url(self.redis_url)
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(HUB_CHANNEL)
+        self._reader = asyncio.create_task(self._run())
+        logger.info("EventHub conectado a Redis pub/sub")
+
+    async def start(self):
+        """Abrir la conexión de pub/sub (falla si Redis no responde)"""
+        async with self._lock:
+            await self._ensure_started()
+
+    async def _add(self, sub: Subscription, channels: Iterable[str]):
+        """Sumar canales a `sub` (con el lock tomado)"""
+        channels = [c for c in dict.fromkeys(channels) if c not in sub.channels]
+        new = [c for c in channels if c not in self._channels]
+        for channel in channels:
+            self._channels.setdefault(channel, set()).add(sub)
+            sub.channels.add(channel)
+        if new:
+            await self._pubsub.subscribe(*new)
+
+    async def subscribe(self, channels: Iterable[str]) -> Subscription:
+        sub = Subscription(set(), self.queue_size)
+        async with self._lock:
+            await self._ensure_started()
+            self._subscriptions.add(sub)
+            try:
+                await self._add(sub, channels)
+            except BaseException:
+                # Error o cancelación a mitad: no dejar referencias colgadas
+                self.unsubscribe(sub)
+                raise
+        return sub
+
+    async def add_channels(self, sub: Subscription, channels: Iterable[str]):
+        """Sumar canales a una conexión abierta (p. ej. un follow nuevo)"""
+        async with self._lock:
+            if sub in self._subscriptions:
+                await self._add(sub, channels)
+
+    def unsubscribe(self, sub: Subscription):
+        """
+        Síncrono a propósito: se llama desde el `finally` de una respuesta que
+        Starlette está cancelando, donde un `await` no llegaría a ejecutarse.
+        El UNSUBSCRIBE a Redis va en una tarea aparte.
+        """
+        self._subscriptions.discard(sub)
+        self.remove_channels(sub, list(sub.channels))
+
+    def remove_channels(self, sub: Subscription, channels: Iterable[str]):
+        """Quitar canales de una conexión; los que nadie más usa salen de Redis"""
+        gone = []
+        for channel in channels:
+            sub.channels.discard(channel)
+            subs = self._channels.get(channel)
+            if subs is None:
+                continue
+            subs.discard(sub)
+            if not subs:
+                del self._channels[channel]
+                gone.append(channel)
+        if gone and self._pubsub is not None:
+            asyncio.get_running_loop().create_task(self._unsubscribe_channels(gone))
+
+    async def _unsubscribe_channels(self, channels: List[str]):
+        async with self._lock:
+            # Un cliente nuevo pudo volver a pedir alguno mientras tanto
+            gone = [c for c in channels if c not in self._channels]
+            if not gone or self._pubsub is None:
+                return
+            try:
+                await self._pubsub.unsubscribe(*gone)
+            except Exception as e:
+                logger.warning(f"No se pudo desuscribir {len(gone)} canales: {e}")
+
+    def _dispatch(self, channel, payload):
+        if isinstance(channel, bytes):
+            channel = channel.decode()
+        if isinstance(payload, bytes):
+            payload = payload.decode()
+        for sub in self._channels.get(channel, ()):
+            sub.deliver(payload)
+            self.delivered += 1
+
+    async def _run(self):
+        while True:
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+                if message and message.get("type") == "message":
+                    self._dispatch(message["channel"], message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # redis-py vuelve a suscribir los canales al reconectar
+                logger.warning(f"EventHub: error leyendo pub/sub: {e}")
+                await asyncio.sleep(1)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "connections": len(self._subscriptions),
+            "channels": len(self._channels),
+            "delivered": self.delivered,
+        }
+
+    async def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+            try:
+                await self._reader
+            except (asyncio.CancelledError, Exception):
+                pass
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.aclose()
+            except Exception:
+                pass
+        if self._redis is not None:
+            await self._redis.aclose()
+        self._reader = None
+        self._pubsub = None
+        self._redis = None
+        self._channels.clear()
+        self._subscriptions.clear()
+
+
+event_hub = EventHub(connection_manager.redis_url)
+
+
+# ========== ENDPOINT SSE ==========
+
+router = APIRouter(tags=["realtime"])
+
+
+def _sse(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+async def _follow_changed(sub: Subscription, event: Dict):
+    """Follow/unfollow del dueño de la conexión: sumar o quitar el canal del autor"""
+    channel = author_channel(event["author_username"])
+    if not event.get("followed"):
+        event_hub.remove_channels(sub, [channel])
+    elif len(sub.channels) < PUSH_MAX_AUTHORS + 2:
+        # canal propio + el del usuario como autor + hasta PUSH_MAX_AUTHORS seguidos
+        await event_hub.add_channels(sub, [channel])
+
+
+async def _stream(request: Request, username: str, channels: List[str]):
+    """
+    Cuerpo de la respuesta SSE. La suscripción se abre acá adentro y se cierra
+    en el `finally`: si el cliente se va antes de que empiece el cuerpo,
+    Starlette no llega a iterar el generador y no queda nada suscrito.
+    """
+    sub: Optional[Subscription] = None
+    try:
+        try:
+            sub = await event_hub.subscribe(channels)
+        except Exception as e:
+            yield _sse("error", json.dumps({"detail": f"Redis pub/sub no disponible: {e}"}))
+            return
+        # Reintento del EventSource si se corta la conexión
+        yield f"retry: 5000\n{_sse('ready', json.dumps({'channels': len(sub.channels)}))}"
+        while True:
+            try:
+                payload = await asyncio.wait_for(sub.queue.get(), timeout=PUSH_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                # Comentario SSE: mantiene viva la conexión en proxies y balanceadores
+                yield ": ping\n\n"
+                continue
+            event = json.loads(payload)
+            event_type = event.get("type", "message")
+            if event_type == "follow" and event.get("username") == username:
+                await _follow_changed(sub, event)
+            yield _sse(event_type, payload)
+    finally:
+        if sub is not None:
+            event_hub.unsubscribe(sub)
+
+
+@router.get("/events/{username}")
+async def stream_events(username: str, request: Request):
+    """
+    Eventos en tiempo real del usuario (Server-Sent Events):
+    - `dm`: mensaje nuevo enviado o recibido
+    - `post`: post nuevo de alguien a quien sigue (o propio)
+
+    - `follow`: el usuario siguió o dejó de seguir a alguien (la conexión
+      suma o quita los posts de ese autor sin reconectar)
+    """
+    if event_hub.stats()["connections"] >= PUSH_MAX_CONNECTIONS:
+        raise HTTPException(status_code=503, detail="Demasiadas conexiones de eventos en este worker")
+
+    try:
+        following = await run_in_threadpool(get_following_usernames, connection_manager, username)
+    except Exception as e:
+        print(f"⚠️  No se pudieron leer los seguidos de {username} para eventos (no crítico): {e}")
+        following = []
+
+    authors = [username] + [u for u in following if u != username][:PUSH_MAX_AUTHORS]
+    channels = [user_channel(username)] + [author_channel(a) for a in authors]
+    try:
+        await event_hub.start()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Redis pub/sub no disponible: {e}")
+
+    return StreamingResponse(
+        _stream(request, username, channels),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
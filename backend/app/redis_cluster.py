@@ -5,13 +5,116 @@ Maneja conexiones y operaciones con Redis Cluster (3M + 3R)
 
 import os
 import json
+from datetime import datetime
 from typing import Optional, List, Dict, Any
 from redis.cluster import RedisCluster, ClusterNode
 from redis.exceptions import RedisClusterException
 import logging
 
+from app import dm_cache, suggestion_sets, trending
+
 logger = logging.getLogger(__name__)
 
+# Toggle de like: verificar, cambiar el SET y el contador, y mover el score
+# en trending (ranking histórico y buckets actuales) en un script. Solo se usa
+# si trending cae en el mismo slot que el post (Redis sin cluster o un hash tag
+# compartido); si no, Redis Cluster rechaza el script (CROSSSLOT).
+# KEYS: {post:id}:likes:users, {post:id}:likes:count, trending, buckets...
+# ARGV: username, "1" / "0", post_id, TTL de cada bucket...
+_TOGGLE_LIKE_TRENDING_LUA = """
+local like = ARGV[2] == '1'
+local changed
+if like then
+    changed = redis.call('SADD', KEYS[1], ARGV[1])
+else
+    changed = redis.call('SREM', KEYS[1], ARGV[1])
+end
+local count
+if changed == 1 then
+    local delta = like and 1 or -1
+    count = redis.call('INCRBY', KEYS[2], delta)
+    redis.call('ZINCRBY', KEYS[3], delta, ARGV[3])
+    for i = 4, #KEYS do
+        redis.call('ZINCRBY', KEYS[i], delta, ARGV[3])
+        redis.call('EXPIRE', KEYS[i], ARGV[i])
+    end
+else
+    count = tonumber(redis.call('GET', KEYS[2]) or '0')
+end
+return {count, like and 1 or 0, changed}
+"""
+
+# Variante cluster-safe: todo en el slot del post ({post:id}). El delta de trending se
+# anota en el outbox del post ({post:id}:trending:outbox) dentro del mismo
+# script, así que like y delta quedan escritos juntos o no se escribe nada.
+# Devuelve además los eventos pendientes del outbox para aplicarlos en el
+# shard de trending (ver _APPLY_TRENDING_LUA).
+# KEYS: {post:id}:likes:users, {post:id}:likes:count, {post:id}:trending:outbox
+# ARGV: username, "1" / "0", máximo de eventos a devolver
+# Devuelve {count, liked, changed, [[id, [campo, valor]], ...]}
+_TOGGLE_LIKE_OUTBOX_LUA = """
+local like = ARGV[2] == '1'
+local changed
+if like then
+    changed = redis.call('SADD', KEYS[1], ARGV[1])
+else
+    changed = redis.call('SREM', KEYS[1], ARGV[1])
+end
+local count
+if changed == 1 then
+    local delta = like and 1 or -1
+    count = redis.call('INCRBY', KEYS[2], delta)
+    redis.call('XADD', KEYS[3], '*', 'delta', delta)
+else
+    count = tonumber(redis.call('GET', KEYS[2]) or '0')
+end
+return {count, like and 1 or 0, changed, redis.call('XRANGE', KEYS[3], '-', '+', 'COUNT', ARGV[3])}
+"""
+
+# Aplicar eventos del outbox de un post en su shard de trending (un slot).
+# {trending:N}:outbox:applied guarda por post el último id aplicado: un evento
+# con id menor o igual ya se aplicó y se salta, así que aplicar dos veces el
+# mismo outbox (dos clientes, o un cliente que cayó antes del XDEL) no suma doble.
+# KEYS: {trending:N}:posts, {trending:N}:outbox:applied, buckets (R por evento)
+# ARGV: post_id, R, TTL de cada resolución (R valores), pares (id, delta)...
+# Devuelve cuántos eventos aplicó
+_APPLY_TRENDING_LUA = """
+local post, r = ARGV[1], tonumber(ARGV[2])
+local function parse(id)
+    local ms, seq = string.match(id, '(%d+)-(%d+)')
+    return tonumber(ms), tonumber(seq)
+end
+local last = redis.call('HGET', KEYS[2], post)
+local lms, lseq = -1, -1
+if last then
+    lms, lseq = parse(last)
+end
+local applied = 0
+local events = (#ARGV - 2 - r) / 2
+for i = 0, events - 1 do
+    local id = ARGV[3 + r + 2 * i]
+    local delta = tonumber(ARGV[4 + r + 2 * i])
+    local ms, seq = parse(id)
+    if ms > lms or (ms == lms and seq > lseq) then
+        redis.call('ZINCRBY', KEYS[1], delta, post)
+        for j = 1, r do
+            local key = KEYS[2 + i * r + j]
+            redis.call('ZINCRBY', key, delta, post)
+            redis.call('EXPIRE', key, ARGV[2 + j])
+        end
+        lms, lseq, last = ms, seq, id
+        applied = applied + 1
+    end
+end
+if applied > 0 then
+    redis.call('HSET', KEYS[2], post, last)
+end
+return applied
+"""
+
+# Eventos del outbox que se aplican por llamada
+TRENDING_OUTBOX_BATCH = int(os.getenv("TRENDING_OUTBOX_BATCH", "100"))
+
 
 class RedisClusterManager:
     """
@@ -24,6 +127,8 @@ class RedisClusterManager:
     
     def __init__(self):
         self._client: Optional[RedisCluster] = None
+        # Scripts Lua registrados (EVALSHA; se recargan solos si Redis no los tiene)
+        self._scripts: Dict[str, Any] = {}
         self._initialize_client()
     
     def _initialize_client(self):
@@ -64,6 +169,14 @@ class RedisClusterManager:
             logger.error(f"✗ Error al conectar a Redis Cluster: {e}")
             self._client = None
     
+    def _script(self, source: str):
+        """Script registrado una vez por proceso (cache de SHA en el cliente)"""
+        script = self._scripts.get(source)
+        if script is None:
+            script = self._client.register_script(source)
+            self._scripts[source] = script
+        return script
+    
     def get_client(self) -> Optional[RedisCluster]:
         """Obtener cliente de Redis Cluster"""
         return self._client
@@ -78,6 +191,35 @@ class RedisClusterManager:
         except Exception:
             return False
     
+    # ========== GENERACIONES ==========
+    
+    def _generation_key(self, username: str) -> str:
+        # Mismo hash tag que el resto de keys del usuario (mismo slot)
+        return f"{{user:{username}}}:gen"
+    
+    def _get_generation(self, username: str) -> int:
+        value = self._client.get(self._generation_key(username))
+        return int(value) if value else 0
+    
+    def _user_key(self, username: str, *parts: str) -> str:
+        """Key versionada con la generación vigente del usuario"""
+        generation = self._get_generation(username)
+        return ":".join([f"{{user:{username}}}", f"g{generation}", *parts])
+    
+    def invalidate_user(self, username: str):
+        """
+        Invalidar todo lo cacheado del usuario (feeds, sugerencias, ...):
+        un INCR de su generación; las entradas viejas caducan por TTL
+        """
+        if not self._client:
+            return
+        
+        try:
+            self._client.incr(self._generation_key(username))
+            logger.debug(f"Nueva generación de cache para {username}")
+        except Exception as e:
+            logger.warning(f"Error al invalidar cache de {username}: {e}")
+    
     # ========== FEEDS ==========
     
     def get_user_feed(self, username: str, mode: str = "all") -> Optional[List[Dict]]:
@@ -95,7 +237,7 @@ class RedisClusterManager:
             return None
         
         try:
-            key = f"{{user:{username}}}:feed:{mode}"
+            key = self._user_key(username, "feed", mode)
             cached = self._client.get(key)
             if cached:
                 return json.loads(cached)
@@ -118,7 +260,7 @@ class RedisClusterManager:
             return
         
         try:
-            key = f"{{user:{username}}}:feed:{mode}"
+            key = self._user_key(username, "feed", mode)
             self._client.setex(key, ttl, json.dumps(posts))
             logger.debug(f"Feed cacheado para {username} (mode={mode}, ttl={ttl}s)")
         except Exception as e:
@@ -126,26 +268,122 @@ class RedisClusterManager:
     
     def invalidate_user_feed(self, username: str):
         """
-        Invalidar todos los feeds del usuario
+        Invalidar todos los feeds del usuario (y el resto de su cache):
+        un INCR de generación, cueste lo mismo cuantas variantes haya
         
         Args:
             username: Nombre de usuario
         """
+        self.invalidate_user(username)
+    
+    # ========== LIKES ==========
+    
+    def _same_slot(self, *keys: str) -> bool:
+        return len({self._client.keyslot(key) for key in keys}) == 1
+    
+    def toggle_post_like(self, post_id: str, username: str, like: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Dar o quitar like en un solo script: verificar, cambiar el SET y el
+        contador de forma atómica (dos clics simultáneos no cuentan doble)
+        
+        En cluster el shard de trending está en otro slot: el script anota el
+        delta en el outbox del post (mismo slot, misma atomicidad) y después
+        se aplica en el shard con `_apply_trending`. Si el proceso cae en el
+        medio, el delta queda en el outbox y lo aplica el próximo like del
+        post o `drain_trending_outboxes`.
+        
+        Args:
+            post_id: ID del post
+            username: Usuario que da / quita like
+            like: True para dar like, False para quitarlo
+        
+        Returns:
+            {"likes_count", "user_liked", "changed"} o None si Redis no está disponible
+        """
         if not self._client:
-            return
+            return None
         
+        users_key = f"{{post:{post_id}}}:likes:users"
+        count_key = f"{{post:{post_id}}}:likes:count"
+        trending_key = trending.all_key(trending.shard_of(post_id))
+        flag = "1" if like else "0"
         try:
-            keys = [
-                f"{{user:{username}}}:feed:all",
-                f"{{user:{username}}}:feed:following",
-                f"{{user:{username}}}:feed:self",
-            ]
-            self._client.delete(*keys)
-            logger.debug(f"Feeds invalidados para {username}")
+            if self._same_slot(users_key, trending_key):
+                # Un round trip con trending (ranking y buckets) incluido
+                buckets = trending.current_buckets(post_id)
+                count, liked, changed = self._script(_TOGGLE_LIKE_TRENDING_LUA)(
+                    keys=[users_key, count_key, trending_key, *[key for key, _ in buckets]],
+                    args=[username, flag, post_id, *[ttl for _, ttl in buckets]],
+                )
+            else:
+                count, liked, changed, pending = self._script(_TOGGLE_LIKE_OUTBOX_LUA)(
+                    keys=[users_key, count_key, self._outbox_key(post_id)],
+                    args=[username, flag, TRENDING_OUTBOX_BATCH],
+                )
+                if pending:
+                    try:
+                        self._apply_trending(post_id, [
+                            (entry_id, dict(zip(fields[::2], fields[1::2]))) for entry_id, fields in pending
+                        ])
+                    except Exception as e:
+                        # El like ya quedó escrito; el delta sigue en el outbox
+                        logger.warning(f"Error al aplicar trending de {post_id}: {e}")
+            
+            logger.debug(f"Like {'agregado' if like else 'removido'}: post={post_id}, user={username}, count={count}")
+            return {"likes_count": int(count), "user_liked": bool(liked), "changed": bool(changed)}
         except Exception as e:
-            logger.warning(f"Error al invalidar feeds: {e}")
+            logger.error(f"Error al cambiar like: {e}")
+            return None
     
-    # ========== LIKES ==========
+    def _outbox_key(self, post_id: str) -> str:
+        return f"{{post:{post_id}}}:trending:outbox"
+    
+    def _apply_trending(self, post_id: str, entries: List) -> int:
+        """
+        Aplicar eventos del outbox ((id, {"delta": ...})) en el shard de
+        trending del post y borrarlos del outbox. Los buckets son los de la
+        hora del evento (el id del stream), no la de ahora.
+        """
+        shard = trending.shard_of(post_id)
+        keys = [trending.all_key(shard), trending.outbox_applied_key(shard)]
+        ttls: List[int] = []
+        events: List = []
+        for entry_id, fields in entries:
+            delta = fields["delta"]
+            buckets = trending.current_buckets(post_id, int(entry_id.split("-")[0]) / 1000)
+            keys.extend(key for key, _ in buckets)
+            ttls = [ttl for _, ttl in buckets]
+            events.extend([entry_id, delta])
+        applied = self._script(_APPLY_TRENDING_LUA)(
+            keys=keys, args=[post_id, len(ttls), *ttls, *events],
+        )
+        # Si esto falla, los eventos ya aplicados se saltan la próxima vez
+        self._client.xdel(self._outbox_key(post_id), *[entry_id for entry_id, _ in entries])
+        return int(applied)
+    
+    def drain_trending_outboxes(self) -> int:
+        """
+        Aplicar los outbox de trending que quedaron con eventos (un proceso
+        que cayó entre el script del like y `_apply_trending`). Recorre las
+        keys de todos los masters; pensado para correr de vez en cuando.
+        
+        Returns:
+            Eventos aplicados
+        """
+        if not self._client:
+            return 0
+        
+        applied = 0
+        try:
+            for key in self._client.scan_iter(match="{post:*}:trending:outbox", count=1000):
+                post_id = key[len("{post:"):-len("}:trending:outbox")]
+                entries = self._client.xrange(key, count=TRENDING_OUTBOX_BATCH)
+                while entries:
+                    applied += self._apply_trending(post_id, entries)
+                    entries = self._client.xrange(key, count=TRENDING_OUTBOX_BATCH)
+        except Exception as e:
+            logger.warning(f"Error al drenar outbox de trending: {e}")
+        return applied
     
     def increment_post_likes(self, post_id: str, username: str) -> int:
         """
@@ -158,26 +396,10 @@ class RedisClusterManager:
         Returns:
             Nuevo contador de likes, o -1 si ya había dado like
         """
-        if not self._client:
-            return -1
-        
-        try:
-            # Verificar si ya dio like
-            if self._client.sismember(f"{{post:{post_id}}}:likes:users", username):
-                return -1
-            
-            # Pipeline atómico
-            pipe = self._client.pipeline()
-            pipe.incr(f"{{post:{post_id}}}:likes:count")
-            pipe.sadd(f"{{post:{post_id}}}:likes:users", username)
-            pipe.zincrby("trending:posts", 1, post_id)
-            results = pipe.execute()
-            
-            logger.debug(f"Like agregado: post={post_id}, user={username}, count={results[0]}")
-            return results[0]
-        except Exception as e:
-            logger.error(f"Error al incrementar likes: {e}")
+        result = self.toggle_post_like(post_id, username, like=True)
+        if not result or not result["changed"]:
             return -1
+        return result["likes_count"]
     
     def decrement_post_likes(self, post_id: str, username: str) -> int:
         """
@@ -190,26 +412,10 @@ class RedisClusterManager:
         Returns:
             Nuevo contador de likes, o -1 si no había dado like
         """
-        if not self._client:
-            return -1
-        
-        try:
-            # Verificar si había dado like
-            if not self._client.sismember(f"{{post:{post_id}}}:likes:users", username):
-                return -1
-            
-            # Pipeline atómico
-            pipe = self._client.pipeline()
-            pipe.decr(f"{{post:{post_id}}}:likes:count")
-            pipe.srem(f"{{post:{post_id}}}:likes:users", username)
-            pipe.zincrby("trending:posts", -1, post_id)
-            results = pipe.execute()
-            
-            logger.debug(f"Like removido: post={post_id}, user={username}, count={results[0]}")
-            return results[0]
-        except Exception as e:
-            logger.error(f"Error al decrementar likes: {e}")
+        result = self.toggle_post_like(post_id, username, like=False)
+        if not result or not result["changed"]:
             return -1
+        return result["likes_count"]
     
     def get_post_likes_count(self, post_id: str) -> int:
         """Obtener contador de likes de un post"""
@@ -248,24 +454,25 @@ class RedisClusterManager:
     
     # ========== TRENDING ==========
     
-    def get_trending_posts(self, limit: int = 10, timeframe: str = "") -> List[Dict[str, Any]]:
+    def get_trending_posts(self, limit: int = 10, timeframe: str = "", decay: bool = True) -> List[Dict[str, Any]]:
         """
         Obtener posts trending (más likeados)
         
         Args:
             limit: Número de posts a retornar
-            timeframe: "" (global), "1h", "24h"
+            timeframe: "" (global), "1h", "24h", "7d" (ver app/trending.py)
+            decay: en las ventanas, los likes recientes pesan más
         
         Returns:
-            Lista de dicts con post_id y likes
+            Lista de dicts con post_id y likes (score de la ventana)
         """
         if not self._client:
             return []
         
         try:
-            key = f"trending:posts:{timeframe}" if timeframe else "trending:posts"
-            posts = self._client.zrevrange(key, 0, limit - 1, withscores=True)
-            return [{"post_id": post_id, "likes": int(score)} for post_id, score in posts]
+            window = timeframe or trending.WINDOW_ALL
+            posts = trending.top_posts(self._client, window, limit, decay)
+            return [{"post_id": post_id, "likes": round(score, 3)} for post_id, score in posts]
         except Exception as e:
             logger.warning(f"Error al obtener trending posts: {e}")
             return []
@@ -313,32 +520,27 @@ class RedisClusterManager:
     # ========== DMS ==========
     
     def get_conversation(self, user1: str, user2: str) -> Optional[List[Dict]]:
-        """Obtener conversación cacheada entre dos usuarios"""
+        """Obtener la ventana reciente cacheada (del más nuevo al más viejo, ver app/dm_cache.py)"""
         if not self._client:
             return None
         
         try:
             # Ordenar usernames alfabéticamente para consistencia
             users = sorted([user1, user2])
-            key = f"{{conv:{users[0]}::{users[1]}}}:messages"
-            
-            cached = self._client.get(key)
-            if cached:
-                return json.loads(cached)
-            return None
+            return dm_cache.get_recent(self._client, f"{users[0]}::{users[1]}", dm_cache.DM_RECENT_WINDOW)
         except Exception as e:
             logger.warning(f"Error al leer conversación de cache: {e}")
             return None
     
-    def set_conversation(self, user1: str, user2: str, messages: List[Dict], ttl: int = 300):
-        """Cachear conversación entre dos usuarios"""
+    def set_conversation(self, user1: str, user2: str, messages: List[Dict]):
+        """Cachear la ventana reciente (mensajes del más nuevo al más viejo)"""
         if not self._client:
             return
         
         try:
             users = sorted([user1, user2])
-            key = f"{{conv:{users[0]}::{users[1]}}}:messages"
-            self._client.setex(key, ttl, json.dumps(messages))
+            # Todas las operaciones sobre {conv:...}: un solo slot
+            dm_cache.store_recent(self._client, f"{users[0]}::{users[1]}", messages)
             logger.debug(f"Conversación cacheada: {user1} <-> {user2}")
         except Exception as e:
             logger.warning(f"Error al cachear conversación: {e}")
@@ -350,48 +552,49 @@ class RedisClusterManager:
         
         try:
             users = sorted([user1, user2])
-            key = f"{{conv:{users[0]}::{users[1]}}}:messages"
-            self._client.delete(key)
+            dm_cache.invalidate(self._client, f"{users[0]}::{users[1]}")
             logger.debug(f"Conversación invalidada: {user1} <-> {user2}")
         except Exception as e:
             logger.warning(f"Error al invalidar conversación: {e}")
     
     # ========== RECOMENDACIONES ==========
     
-    def get_user_suggestions(self, username: str) -> Optional[List[Dict]]:
-        """Obtener recomendaciones cacheadas para un usuario"""
+    def get_user_suggestions(self, username: str, limit: int = 10) -> Optional[List[Dict]]:
+        """Top de sugerencias precalculadas (ver app/suggestion_sets.py), sin filtrar seguidos"""
         if not self._client:
             return None
         
         try:
-            key = f"{{user:{username}}}:suggestions"
-            cached = self._client.get(key)
-            if cached:
-                return json.loads(cached)
-            return None
+            entries = self._client.zrevrange(suggestion_sets.score_key(username), 0, limit - 1, withscores=True)
+            return [{"username": member, "score": score} for member, score in entries] or None
         except Exception as e:
-            logger.warning(f"Error al leer sugerencias de cache: {e}")
+            logger.warning(f"Error al leer sugerencias: {e}")
             return None
     
-    def set_user_suggestions(self, username: str, suggestions: List[Dict], ttl: int = 600):
-        """Cachear recomendaciones de usuarios"""
+    def set_user_suggestions(self, username: str, suggestions: List[Dict]):
+        """Reemplazar las sugerencias precalculadas de un usuario"""
         if not self._client:
             return
         
         try:
-            key = f"{{user:{username}}}:suggestions"
-            self._client.setex(key, ttl, json.dumps(suggestions))
-            logger.debug(f"Sugerencias cacheadas para {username}")
+            mutuals = {s["username"]: s.get("mutual_connections", 0) for s in suggestions}
+            stats = {s["username"]: (s.get("followers_count", 0), s.get("posts_count", 0)) for s in suggestions}
+            suggestion_sets.store_user(self._client, username, mutuals, stats, datetime.utcnow().isoformat())
+            logger.debug(f"Sugerencias guardadas para {username}")
         except Exception as e:
-            logger.warning(f"Error al cachear sugerencias: {e}")
+            logger.warning(f"Error al guardar sugerencias: {e}")
     
     def invalidate_user_suggestions(self, username: str):
-        """Invalidar cache de recomendaciones"""
+        """Borrar las sugerencias precalculadas (se recalculan en el próximo pedido)"""
         if not self._client:
             return
         
         try:
-            self._client.delete(f"{{user:{username}}}:suggestions")
+            self._client.delete(
+                suggestion_sets.mutual_key(username),
+                suggestion_sets.score_key(username),
+                suggestion_sets.meta_key(username),
+            )
             logger.debug(f"Sugerencias invalidadas para {username}")
         except Exception as e:
             logger.warning(f"Error al invalidar sugerencias: {e}")
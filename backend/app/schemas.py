@@ -0,0 +1,136 @@
+"""
+Modelos Pydantic de la API de Red K.
+
+Compartidos por los endpoints síncronos (app/main.py) y los async (app/async_api.py),
+para que ambos modos respondan exactamente con el mismo esquema.
+"""
+
+from typing import Optional, List
+from enum import Enum
+
+from pydantic import BaseModel
+
+
+# --------- Usuarios ---------
+
+class UserCreate(BaseModel):
+    username: str
+    email: str
+    name: Optional[str] = None
+    bio: Optional[str] = None
+
+
+class UserOut(BaseModel):
+    id: str
+    username: str
+    email: str
+    name: Optional[str] = None
+    bio: Optional[str] = None
+
+
+class UserStatsOut(BaseModel):
+    username: str
+    followers_count: int = 0
+    following_count: int = 0
+    posts_count: int = 0
+    # Última reconciliación contra Neo4j/MongoDB (los contadores se mantienen con $inc)
+    reconciled_at: Optional[str] = None
+
+
+# --------- Posts / Feed ---------
+
+class PostCreate(BaseModel):
+    author_username: str
+    content: str
+    tags: Optional[List[str]] = None
+
+
+class PostOut(BaseModel):
+    id: str
+    author_username: str
+    content: str
+    tags: Optional[List[str]] = None
+    created_at: str  # ISO string
+    # Solo con ?with_likes=true en el feed (estado de likes del lector)
+    likes_count: Optional[int] = None
+    user_liked: Optional[bool] = None
+
+class FeedMode(str, Enum):
+    all = "all"          # posts tuyos + de quienes sigues
+    self_only = "self"   # solo tus posts
+    following_only = "following"  # solo posts de quienes sigues
+
+class TrendingWindow(str, Enum):
+    hour = "1h"
+    day = "24h"
+    week = "7d"
+    all = "all"          # ranking histórico ({trending:N}:posts)
+
+
+# --------- Sugerencias ---------
+
+class SuggestionAlgo(str, Enum):
+    mutual = "mutual"    # amigos de amigos (app/suggestion_sets.py)
+    ppr = "ppr"          # Personalized PageRank (app/ppr.py)
+
+
+class SuggestionOut(BaseModel):
+    username: str
+    name: Optional[str] = None
+    bio: Optional[str] = None
+    email: Optional[str] = None
+    score: float
+    reason: Optional[str] = None
+    mutual_connections: int = 0
+    followers_count: int = 0
+    posts_count: int = 0
+
+
+# --------- DMs ---------
+
+class DMCreate(BaseModel):
+    sender_username: str
+    receiver_username: str
+    content: str
+
+
+class DMOut(BaseModel):
+    id: str
+    sender_username: str
+    receiver_username: str
+    content: str
+    created_at: str  # ISO string
+    read: bool
+    read_at: Optional[str] = None
+
+
+class DMConversationSummary(BaseModel):
+    with_username: str
+    last_message_content: str
+    last_message_at: str  # ISO
+    unread_count: int
+
+
+# --------- Follows ---------
+
+class FollowingOut(BaseModel):
+    username: str
+    name: Optional[str] = None
+    bio: Optional[str] = None
+    email: Optional[str] = None
+
+
+# --------- Likes ---------
+
+class LikeRequest(BaseModel):
+    username: str
+    post_id: str
+
+class LikeResponse(BaseModel):
+    post_id: str
+    likes_count: int
+    user_liked: bool
+
+class LikesBatchRequest(BaseModel):
+    post_ids: List[str]
+    username: Optional[str] = None
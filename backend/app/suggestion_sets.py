@@ -0,0 +1,556 @@
+"""
+Sugerencias de a quién seguir precalculadas en Redis para Red K.
+
+"Amigos de tus amigos" con el mismo score que la consulta Cypher original:
+
+    score = mutual_connections * 3 + followers_count * 2 + posts_count
+
+pero calculado en lote y guardado por usuario, en el slot del usuario:
+
+- {user:alice}:suggestions:mutual   ZSET candidato → caminos alice→x→candidato
+- {user:alice}:suggestions:score    ZSET candidato → score compuesto
+- {user:alice}:suggestions:meta     HASH computed_at (lote) / updated_at (último follow)
+- suggestions:stats                 HASH candidato → "followers:posts" del último lote
+- suggestions:active                ZSET username → último pedido de sugerencias
+                                    (a lo sumo uno por SUGGESTIONS_ACTIVE_TOUCH_SECONDS
+                                    y worker)
+- suggestions:refresh:lock          SET NX: un solo worker recalcula por intervalo
+
+- Lectura: ZREVRANGE del score, salteando a quienes ya sigue (following_set)
+- Lote (SuggestionRefresher): los usuarios activos en los últimos
+  SUGGESTIONS_ACTIVE_SECONDS, de a SUGGESTIONS_BATCH_SIZE por consulta Cypher
+- Follow/unfollow u→t: suma o resta un camino en los candidatos afectados
+    * u gana/pierde un camino hacia cada usuario que sigue t
+    * cada follower de u gana/pierde un camino hacia t
+  (solo en usuarios que ya tienen sugerencias calculadas)
+
+Los candidatos que el usuario ya sigue se guardan igual: si deja de seguir a
+alguien, vuelve a aparecer con sus caminos correctos. followers_count y
+posts_count solo cambian con el lote; `computed_at` dice de cuándo son.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.connections import ConnectionManager
+from app.schemas import SuggestionOut
+from app.follow_graph import follow_graph
+from app.follows import get_following_usernames, get_following_usernames_async, get_follower_usernames
+
+logger = logging.getLogger(__name__)
+
+SUGGESTIONS_ACTIVE_SECONDS = int(os.getenv("SUGGESTIONS_ACTIVE_SECONDS", str(7 * 86400)))
+SUGGESTIONS_BATCH_SIZE = int(os.getenv("SUGGESTIONS_BATCH_SIZE", "200"))
+SUGGESTIONS_REFRESH_INTERVAL = int(os.getenv("SUGGESTIONS_REFRESH_INTERVAL", "900"))
+SUGGESTIONS_REFRESHER = os.getenv("SUGGESTIONS_REFRESHER", "true").lower() in ("1", "true", "yes")
+# Cada cuánto un worker vuelve a marcar activo a un usuario que pide
+# sugerencias (la ventana es de días: no hace falta un ZADD por GET)
+SUGGESTIONS_ACTIVE_TOUCH_SECONDS = int(os.getenv("SUGGESTIONS_ACTIVE_TOUCH_SECONDS", "3600"))
+# Followers de u a los que un follow de u les actualiza las sugerencias;
+# más allá de eso el cambio llega con el lote siguiente
+SUGGESTIONS_FANOUT_LIMIT = int(os.getenv("SUGGESTIONS_FANOUT_LIMIT", "5000"))
+
+MUTUAL_WEIGHT = 3
+FOLLOWERS_WEIGHT = 2
+POSTS_WEIGHT = 1
+
+STATS_KEY = "suggestions:stats"
+ACTIVE_KEY = "suggestions:active"
+REFRESH_LOCK_KEY = "suggestions:refresh:lock"
+
+# Frescura expuesta en GET /users/{username}/suggestions
+COMPUTED_AT_HEADER = "X-Suggestions-Computed-At"
+UPDATED_AT_HEADER = "X-Suggestions-Updated-At"
+
+
+def mutual_key(username: str) -> str:
+    return f"{{user:{username}}}:suggestions:mutual"
+
+
+def score_key(username: str) -> str:
+    return f"{{user:{username}}}:suggestions:score"
+
+
+def meta_key(username: str) -> str:
+    return f"{{user:{username}}}:suggestions:meta"
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def popularity(followers: int, posts: int) -> int:
+    return followers * FOLLOWERS_WEIGHT + posts * POSTS_WEIGHT
+
+
+def _parse_stats(value) -> Tuple[int, int]:
+    if not value:
+        return 0, 0
+    followers, posts = _decode(value).split(":")
+    return int(followers), int(posts)
+
+
+# ========== CÁLCULO EN LOTE ==========
+
+_MUTUALS_CYPHER = """
+UNWIND $usernames AS name
+MATCH (u:User {username: name})-[:FOLLOWS]->(:User)-[:FOLLOWS]->(s:User)
+WHERE s.username <> name
+RETURN name, s.username AS candidate, COUNT(*) AS mutual
+"""
+
+_STATS_CYPHER = """
+UNWIND $usernames AS name
+MATCH (s:User {username: name})
+RETURN name,
+       coalesce(s.followers_count, 0) AS followers_count,
+       coalesce(s.posts_count, 0) AS posts_count
+"""
+
+_STATS_PROJECTION = {"username": 1, "followers_count": 1, "posts_count": 1}
+
+
+def _add_mutual(mutuals: Dict[str, Dict[str, int]], name: str, candidate: Optional[str], mutual: int):
+    if candidate:
+        mutuals[name][candidate] = mutual
+
+
+def _doc_stats(doc: Dict) -> Tuple[int, int]:
+    return int(doc.get("followers_count") or 0), int(doc.get("posts_count") or 0)
+
+
+def load_mutuals(conns: ConnectionManager, usernames: List[str]) -> Dict[str, Dict[str, int]]:
+    """username → {candidato: caminos de 2 saltos}, para todos en una consulta"""
+    mutuals: Dict[str, Dict[str, int]] = {u: {} for u in usernames}
+    try:
+        with conns.neo4j_driver.session() as session:
+            for record in session.run(_MUTUALS_CYPHER, usernames=usernames):
+                _add_mutual(mutuals, record["name"], record["candidate"], record["mutual"])
+    except Exception as e:
+        if follow_graph.ready:
+            return {u: follow_graph.mutual_counts(u) for u in usernames}
+        logger.warning(f"Neo4j no disponible para sugerencias, usando MongoDB: {e}")
+        for doc in conns.mongo_db()["follows"].aggregate(_mutuals_pipeline(usernames)):
+            _add_mutual(mutuals, doc["_id"]["name"], doc["_id"]["candidate"], doc["mutual"])
+    return mutuals
+
+
+async def load_mutuals_async(aconns, usernames: List[str]) -> Dict[str, Dict[str, int]]:
+    """Versión async de load_mutuals (modo ASYNC_API)"""
+    mutuals: Dict[str, Dict[str, int]] = {u: {} for u in usernames}
+    try:
+        async with aconns.neo4j_driver.session() as session:
+            result = await session.run(_MUTUALS_CYPHER, usernames=usernames)
+            async for record in result:
+                _add_mutual(mutuals, record["name"], record["candidate"], record["mutual"])
+    except Exception as e:
+        if follow_graph.ready:
+            return {u: follow_graph.mutual_counts(u) for u in usernames}
+        logger.warning(f"Neo4j no disponible para sugerencias, usando MongoDB: {e}")
+        cursor = await aconns.mongo_db()["follows"].aggregate(_mutuals_pipeline(usernames))
+        async for doc in cursor:
+            _add_mutual(mutuals, doc["_id"]["name"], doc["_id"]["candidate"], doc["mutual"])
+    return mutuals
+
+
+def _mutuals_pipeline(usernames: List[str]) -> List[Dict]:
+    """
+    Caminos de 2 saltos de todo el lote en una sola agregación sobre `follows`
+    (un `$in` y un `$lookup` por el índice de follower), sin duplicados
+    """
+    return [
+        {"$match": {"follower": {"$in": usernames}}},
+        {"$lookup": {"from": "follows", "localField": "following", "foreignField": "follower", "as": "next"}},
+        {"$unwind": "$next"},
+        {"$group": {"_id": {"name": "$follower", "friend": "$following", "candidate": "$next.following"}}},
+        {"$match": {"$expr": {"$ne": ["$_id.candidate", "$_id.name"]}}},
+        {"$group": {"_id": {"name": "$_id.name", "candidate": "$_id.candidate"}, "mutual": {"$sum": 1}}},
+    ]
+
+
+def load_stats(conns: ConnectionManager, candidates: List[str]) -> Dict[str, Tuple[int, int]]:
+    """candidato → (followers_count, posts_count), de los contadores de app/user_counters.py"""
+    stats: Dict[str, Tuple[int, int]] = {c: (0, 0) for c in candidates}
+    if not candidates:
+        return stats
+    try:
+        with conns.neo4j_driver.session() as session:
+            for record in session.run(_STATS_CYPHER, usernames=candidates):
+                stats[record["name"]] = (record["followers_count"], record["posts_count"])
+    except Exception as e:
+        logger.warning(f"Neo4j no disponible para stats de sugerencias, usando MongoDB: {e}")
+        docs = conns.mongo_db()["users"].find({"username": {"$in": candidates}}, _STATS_PROJECTION)
+        stats.update({d["username"]: _doc_stats(d) for d in docs})
+    return stats
+
+
+async def load_stats_async(aconns, candidates: List[str]) -> Dict[str, Tuple[int, int]]:
+    """Versión async de load_stats (modo ASYNC_API)"""
+    stats: Dict[str, Tuple[int, int]] = {c: (0, 0) for c in candidates}
+    if not candidates:
+        return stats
+    try:
+        async with aconns.neo4j_driver.session() as session:
+            result = await session.run(_STATS_CYPHER, usernames=candidates)
+            async for record in result:
+                stats[record["name"]] = (record["followers_count"], record["posts_count"])
+    except Exception as e:
+        logger.warning(f"Neo4j no disponible para stats de sugerencias, usando MongoDB: {e}")
+        docs = aconns.mongo_db()["users"].find({"username": {"$in": candidates}}, _STATS_PROJECTION)
+        stats.update({d["username"]: _doc_stats(d) async for d in docs})
+    return stats
+
+
+def _queue_stats(pipe, stats: Dict[str, Tuple[int, int]]):
+    pipe.hset(STATS_KEY, mapping={c: f"{f}:{p}" for c, (f, p) in stats.items()})
+    pipe.expire(STATS_KEY, SUGGESTIONS_ACTIVE_SECONDS)
+
+
+def _queue_store_user(pipe, username: str, mutuals: Dict[str, int], stats: Dict[str, Tuple[int, int]], now: str):
+    pipe.delete(mutual_key(username), score_key(username))
+    if mutuals:
+        pipe.zadd(mutual_key(username), mutuals)
+        pipe.zadd(score_key(username), {
+            candidate: mutual * MUTUAL_WEIGHT + popularity(*stats.get(candidate, (0, 0)))
+            for candidate, mutual in mutuals.items()
+        })
+        pipe.expire(mutual_key(username), SUGGESTIONS_ACTIVE_SECONDS)
+        pipe.expire(score_key(username), SUGGESTIONS_ACTIVE_SECONDS)
+    pipe.hset(meta_key(username), mapping={"computed_at": now, "updated_at": now})
+    pipe.expire(meta_key(username), SUGGESTIONS_ACTIVE_SECONDS)
+
+
+def store_user(r, username: str, mutuals: Dict[str, int], stats: Dict[str, Tuple[int, int]], now: str):
+    """Reemplazar las sugerencias de un usuario (MULTI: mismo slot)"""
+    pipe = r.pipeline(transaction=True)
+    _queue_store_user(pipe, username, mutuals, stats, now)
+    pipe.execute()
+
+
+def _batches(usernames: List[str]) -> Iterable[List[str]]:
+    for start in range(0, len(usernames), SUGGESTIONS_BATCH_SIZE):
+        yield usernames[start:start + SUGGESTIONS_BATCH_SIZE]
+
+
+def _candidates(mutuals: Dict[str, Dict[str, int]]) -> List[str]:
+    return list(dict.fromkeys(c for per_user in mutuals.values() for c in per_user))
+
+
+def refresh_users(conns: ConnectionManager, usernames: List[str]) -> Dict[str, int]:
+    """Recalcular las sugerencias de `usernames` (de a SUGGESTIONS_BATCH_SIZE)"""
+    r = conns.redis
+    users = candidates = 0
+    for batch in _batches(usernames):
+        mutuals = load_mutuals(conns, batch)
+        stats = load_stats(conns, _candidates(mutuals))
+
+        if stats:
+            pipe = r.pipeline(transaction=False)
+            _queue_stats(pipe, stats)
+            pipe.execute()
+
+        now = datetime.utcnow().isoformat()
+        for username in batch:
+            store_user(r, username, mutuals[username], stats, now)
+            candidates += len(mutuals[username])
+        users += len(batch)
+    return {"users": users, "candidates": candidates}
+
+
+async def refresh_users_async(aconns, usernames: List[str]) -> Dict[str, int]:
+    """Versión async de refresh_users (modo ASYNC_API: el primer pedido de un usuario)"""
+    r = aconns.redis
+    users = candidates = 0
+    for batch in _batches(usernames):
+        mutuals = await load_mutuals_async(aconns, batch)
+        stats = await load_stats_async(aconns, _candidates(mutuals))
+
+        if stats:
+            pipe = r.pipeline(transaction=False)
+            _queue_stats(pipe, stats)
+            await pipe.execute()
+
+        now = datetime.utcnow().isoformat()
+        for username in batch:
+            pipe = r.pipeline(transaction=True)
+            _queue_store_user(pipe, username, mutuals[username], stats, now)
+            await pipe.execute()
+            candidates += len(mutuals[username])
+        users += len(batch)
+    return {"users": users, "candidates": candidates}
+
+
+def active_users(r) -> List[str]:
+    """Usuarios que pidieron sugerencias en la ventana de actividad (y poda del resto)"""
+    cutoff = time.time() - SUGGESTIONS_ACTIVE_SECONDS
+    r.zremrangebyscore(ACTIVE_KEY, "-inf", f"({cutoff}")
+    return [_decode(u) for u in r.zrange(ACTIVE_KEY, 0, -1)]
+
+
+def refresh_active(conns: ConnectionManager) -> Dict[str, int]:
+    return refresh_users(conns, active_users(conns.redis))
+
+
+# ========== ACTUALIZACIÓN POR FOLLOW ==========
+
+# Solo toca usuarios con sugerencias calculadas (meta presente). Un candidato
+# sin caminos sale de los dos ZSET; uno nuevo entra con la popularidad del lote.
+_APPLY_PATHS_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+for i = 2, #ARGV, 3 do
+    local member = ARGV[i]
+    local delta = tonumber(ARGV[i + 1])
+    local mutual = tonumber(redis.call('ZINCRBY', KEYS[2], delta, member))
+    if mutual <= 0 then
+        redis.call('ZREM', KEYS[2], member)
+        redis.call('ZREM', KEYS[3], member)
+    elseif redis.call('ZSCORE', KEYS[3], member) then
+        redis.call('ZINCRBY', KEYS[3], delta * %d, member)
+    else
+        redis.call('ZADD', KEYS[3], mutual * %d + tonumber(ARGV[i + 2]), member)
+    end
+end
+redis.call('HSET', KEYS[1], 'updated_at', ARGV[1])
+return 1
+""" % (MUTUAL_WEIGHT, MUTUAL_WEIGHT)
+
+
+def _stats_for(r, candidates: List[str]) -> Dict[str, int]:
+    if not candidates:
+        return {}
+    values = r.hmget(STATS_KEY, candidates)
+    return {c: popularity(*_parse_stats(v)) for c, v in zip(candidates, values)}
+
+
+def apply_follow(conns: ConnectionManager, username: str, target: str, followed: bool = True) -> Dict[str, int]:
+    """
+    Actualizar las sugerencias afectadas por la arista username→target
+    (creada si `followed`, borrada si no).
+    """
+    r = conns.redis
+    delta = 1 if followed else -1
+    reached = [c for c in get_following_usernames(conns, target) if c != username]
+    followers = [f for f in get_follower_usernames(conns, username) if f != target]
+    followers = followers[:SUGGESTIONS_FANOUT_LIMIT]
+
+    pops = _stats_for(r, reached + [target])
+    now = datetime.utcnow().isoformat()
+    script = r.register_script(_APPLY_PATHS_LUA)
+    pipe = r.pipeline(transaction=False)
+
+    def apply(owner: str, members: Iterable[str]):
+        args = [now]
+        for member in members:
+            args += [member, delta, pops.get(member, 0)]
+        script(keys=[meta_key(owner), mutual_key(owner), score_key(owner)], args=args, client=pipe)
+
+    if reached:
+        apply(username, reached)
+    for follower in followers:
+        apply(follower, [target])
+    updated = sum(pipe.execute()) if (reached or followers) else 0
+    return {"users_updated": updated, "candidates": len(reached), "followers": len(followers)}
+
+
+# ========== LECTURA ==========
+
+_touched: Dict[str, float] = {}
+_touched_lock = threading.Lock()
+_TOUCHED_MAX = 100_000
+
+
+def _should_touch(username: str, now: float) -> bool:
+    """True si este worker no marcó activo a `username` en el último intervalo"""
+    with _touched_lock:
+        last = _touched.get(username)
+        if last is not None and now - last < SUGGESTIONS_ACTIVE_TOUCH_SECONDS:
+            return False
+        if len(_touched) >= _TOUCHED_MAX:
+            _touched.clear()
+        _touched[username] = now
+        return True
+
+
+def _pick(entries: List, excluded: set, picked: List[Tuple[str, float]], limit: int):
+    """Agregar a `picked` los candidatos de `entries` que no están excluidos, hasta `limit`"""
+    for member, score in entries:
+        member = _decode(member)
+        if member not in excluded:
+            picked.append((member, score))
+            if len(picked) == limit:
+                break
+
+
+def _details(picked: List[Tuple[str, float]], mutuals: List, stats: List) -> List[Dict]:
+    results: List[Dict] = []
+    for (member, score), mutual, stat in zip(picked, mutuals, stats):
+        followers, posts = _parse_stats(stat)
+        results.append({
+            "username": member,
+            "score": score,
+            "mutual_connections": int(mutual or 0),
+            "followers_count": followers,
+            "posts_count": posts,
+        })
+    return results
+
+
+def _freshness(meta: Dict) -> Dict[str, Optional[str]]:
+    meta = {_decode(k): _decode(v) for k, v in meta.items()}
+    return {"computed_at": meta.get("computed_at"), "updated_at": meta.get("updated_at")}
+
+
+def read_suggestions(conns: ConnectionManager, username: str, limit: int) -> Tuple[List[Dict], Dict[str, Optional[str]]]:
+    """
+    Top `limit` candidatos que `username` todavía no sigue, con el detalle del
+    score, y las marcas de frescura. Si el usuario no tiene sugerencias
+    calculadas se calculan en el momento (y queda activo para el lote).
+    """
+    r = conns.redis
+    now = time.time()
+    if _should_touch(username, now):
+        r.zadd(ACTIVE_KEY, {username: now})
+
+    meta = r.hgetall(meta_key(username))
+    if not meta:
+        refresh_users(conns, [username])
+        meta = r.hgetall(meta_key(username))
+
+    excluded = set(get_following_usernames(conns, username))
+    excluded.add(username)
+
+    picked: List[Tuple[str, float]] = []
+    chunk = max(limit * 2, 50)
+    start = 0
+    while len(picked) < limit:
+        entries = r.zrevrange(score_key(username), start, start + chunk - 1, withscores=True)
+        if not entries:
+            break
+        _pick(entries, excluded, picked, limit)
+        start += chunk
+
+    results: List[Dict] = []
+    if picked:
+        names = [member for member, _ in picked]
+        pipe = r.pipeline(transaction=False)
+        pipe.zmscore(mutual_key(username), names)
+        pipe.hmget(STATS_KEY, names)
+        results = _details(picked, *pipe.execute())
+
+    return results, _freshness(meta)
+
+
+async def read_suggestions_async(aconns, username: str, limit: int) -> Tuple[List[Dict], Dict[str, Optional[str]]]:
+    """Versión async de read_suggestions para el modo ASYNC_API (redis.asyncio)"""
+    r = aconns.redis
+    now = time.time()
+    if _should_touch(username, now):
+        await r.zadd(ACTIVE_KEY, {username: now})
+
+    meta = await r.hgetall(meta_key(username))
+    if not meta:
+        await refresh_users_async(aconns, [username])
+        meta = await r.hgetall(meta_key(username))
+
+    excluded = set(await get_following_usernames_async(aconns, username))
+    excluded.add(username)
+
+    picked: List[Tuple[str, float]] = []
+    chunk = max(limit * 2, 50)
+    start = 0
+    while len(picked) < limit:
+        entries = await r.zrevrange(score_key(username), start, start + chunk - 1, withscores=True)
+        if not entries:
+            break
+        _pick(entries, excluded, picked, limit)
+        start += chunk
+
+    results: List[Dict] = []
+    if picked:
+        names = [member for member, _ in picked]
+        pipe = r.pipeline(transaction=False)
+        pipe.zmscore(mutual_key(username), names)
+        pipe.hmget(STATS_KEY, names)
+        results = _details(picked, *await pipe.execute())
+
+    return results, _freshness(meta)
+
+
+def to_suggestions(ranked: List[Dict], user_docs: List[Dict],
+                   reason: str = "Amigos de tus amigos + actividad") -> List[SuggestionOut]:
+    """Resultado de read_suggestions + documentos de `users` → SuggestionOut, en orden"""
+    by_username = {d.get("username"): d for d in user_docs}
+    suggestions: List[SuggestionOut] = []
+    for item in ranked:
+        doc = by_username.get(item["username"])
+        if doc is None:
+            # Usuario borrado: sale del ZSET en el próximo lote
+            continue
+        suggestions.append(
+            SuggestionOut(
+                username=item["username"],
+                name=doc.get("name"),
+                bio=doc.get("bio"),
+                email=doc.get("email"),
+                score=item["score"],
+                reason=reason,
+                mutual_connections=item["mutual_connections"],
+                followers_count=item["followers_count"],
+                posts_count=item["posts_count"],
+            )
+        )
+    return suggestions
+
+
+# ========== REFRESCO PERIÓDICO ==========
+
+class SuggestionRefresher:
+    """
+    Hilo por worker que recalcula las sugerencias de los usuarios activos.
+    Como TrendingRefresher: un lock SET NX por intervalo hace que con varios
+    workers el lote lo corra uno solo.
+    """
+
+    def __init__(self, conns: ConnectionManager):
+        self.conns = conns
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.refreshes = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="suggestion-refresher", daemon=True)
+        self._thread.start()
+        logger.info("SuggestionRefresher iniciado")
+
+    def refresh_if_due(self) -> Optional[Dict[str, int]]:
+        """Recalcular si ningún otro worker lo hizo en este intervalo"""
+        r = self.conns.redis
+        if not r.set(REFRESH_LOCK_KEY, os.getpid(), nx=True, ex=SUGGESTIONS_REFRESH_INTERVAL):
+            return None
+        report = refresh_active(self.conns)
+        self.refreshes += 1
+        logger.info(f"Sugerencias recalculadas: {report}")
+        return report
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh_if_due()
+            except Exception as e:
+                logger.warning(f"No se pudieron recalcular sugerencias (se reintenta): {e}")
+            self._stop.wait(SUGGESTIONS_REFRESH_INTERVAL)
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self._thread = None
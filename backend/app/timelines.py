@@ -0,0 +1,769 @@
+"""
+Timelines materializados (fan-out-on-write) en Redis para Red K.
+
+Estructuras:
+- timeline:{username}            ZSET post_id -> timestamp, posts de quienes sigue
+- timeline:{username}:ready      marca de timeline construido (un ZSET vacío no existe en Redis)
+- author_posts:{username}        ZSET con los posts recientes de cada autor
+- author_posts:{username}:ready  marca de lista de autor cargada
+- celebrities                    SET de autores con muchos followers (modo pull)
+- celeb_follows:{username}       SET de celebridades que sigue el usuario
+
+Feed híbrido push/pull:
+- Autores normales: create_post empuja el id del post al timeline de cada
+  follower (push).
+- Celebridades (followers >= CELEBRITY_FOLLOWER_THRESHOLD): no se hace
+  fan-out; sus posts se mezclan al leer desde author_posts:{celebridad} (pull).
+
+Leer el feed es un ZREVRANGE del timeline + las listas de las celebridades
+seguidas + una hidratación en lote (cache de posts y un solo `$in` a MongoDB
+para lo que falte, ver app/post_cache.py), así que la latencia ya no depende
+de a cuántas personas sigue el usuario.
+"""
+
+import os
+import heapq
+import logging
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Dict, Tuple
+
+from app.connections import ConnectionManager
+from app.follows import get_following_usernames, get_following_usernames_async, get_follower_usernames
+from app.schemas import PostOut
+
+logger = logging.getLogger(__name__)
+
+# Tamaño máximo de cada timeline y de cada lista de posts por autor
+TIMELINE_MAX_LEN = int(os.getenv("TIMELINE_MAX_LEN", "800"))
+
+# Followers por script al hacer fan-out (acota el tamaño de cada round trip)
+FANOUT_BATCH_SIZE = int(os.getenv("TIMELINE_FANOUT_BATCH_SIZE", "500"))
+
+# A partir de cuántos followers un autor deja de hacer fan-out (pull al leer).
+# La promoción es permanente hasta un rebuild: evita oscilar en el umbral.
+CELEBRITY_FOLLOWER_THRESHOLD = int(os.getenv("CELEBRITY_FOLLOWER_THRESHOLD", "10000"))
+
+CELEBRITIES_KEY = "celebrities"
+
+# Margen de la segunda consulta de rebuild_timeline: created_at se toma un
+# poco antes de insertar el post
+REBUILD_CATCHUP_SECONDS = 5
+
+# Fan-out a un lote de followers: solo toca timelines ya construidos (con su
+# marca :ready). Un timeline sin marca se arma completo desde MongoDB en la
+# próxima lectura; escribirle ahora dejaría un ZSET huérfano que nadie lee.
+# KEYS: pares (timeline:{follower}, timeline:{follower}:ready)
+# ARGV: post_id, score, TIMELINE_MAX_LEN
+# Devuelve cuántos timelines actualizó
+_FAN_OUT_LUA = """
+local written = 0
+for i = 1, #KEYS, 2 do
+    if redis.call('EXISTS', KEYS[i + 1]) == 1 then
+        redis.call('ZADD', KEYS[i], ARGV[2], ARGV[1])
+        redis.call('ZREMRANGEBYRANK', KEYS[i], 0, -(tonumber(ARGV[3]) + 1))
+        written = written + 1
+    end
+end
+return written
+"""
+
+# Caminos posibles al servir un feed (para métricas y el header X-Feed-Path)
+FEED_PATH_CACHE = "cache"          # respuesta cacheada
+FEED_PATH_PUSH = "push"            # solo timeline materializado
+FEED_PATH_HYBRID = "hybrid"        # timeline + posts de celebridades (pull)
+FEED_PATH_PULL = "pull"            # consulta directa Neo4j/Mongo (fallback)
+
+
+# ========== KEYS ==========
+
+def timeline_key(username: str) -> str:
+    return f"timeline:{username}"
+
+
+def timeline_ready_key(username: str) -> str:
+    return f"timeline:{username}:ready"
+
+
+def author_posts_key(username: str) -> str:
+    return f"author_posts:{username}"
+
+
+def author_posts_ready_key(username: str) -> str:
+    return f"author_posts:{username}:ready"
+
+
+def celeb_follows_key(username: str) -> str:
+    return f"celeb_follows:{username}"
+
+
+def post_score(created_at: str) -> float:
+    """Score del ZSET a partir del created_at ISO (UTC, sin tz) de los posts"""
+    dt = datetime.fromisoformat(created_at)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+# ========== MÉTRICAS (por worker) ==========
+
+class FeedMetrics:
+    """Contadores en memoria de qué camino atendió cada feed y del fan-out"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Counter = Counter()
+
+    def incr(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counts[name] += amount
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+
+feed_metrics = FeedMetrics()
+
+
+# ========== HIDRATACIÓN ==========
+
+def doc_to_post(d: Dict) -> PostOut:
+    return PostOut(
+        id=str(d.get("_id")),
+        author_username=d.get("author_username"),
+        content=d.get("content"),
+        tags=d.get("tags") or [],
+        created_at=d.get("created_at"),
+    )
+
+
+# ========== LISTAS POR AUTOR ==========
+
+def load_author_posts(conns: ConnectionManager, author: str) -> List[Tuple[str, float]]:
+    """
+    Cargar desde MongoDB los posts recientes de `author` a su lista en Redis.
+    Se usa la primera vez (datos previos a los timelines) o tras un rebuild.
+    """
+    docs = (
+        conns.mongo_db()["posts"]
+        .find({"author_username": author}, {"created_at": 1})
+        .sort("created_at", -1)
+        .limit(TIMELINE_MAX_LEN)
+    )
+    entries = [(str(d["_id"]), post_score(d["created_at"])) for d in docs if d.get("created_at")]
+
+    r = conns.redis
+    pipe = r.pipeline()
+    pipe.delete(author_posts_key(author))
+    if entries:
+        pipe.zadd(author_posts_key(author), dict(entries))
+    pipe.set(author_posts_ready_key(author), 1)
+    pipe.execute()
+    return entries
+
+
+async def load_author_posts_async(aconns, author: str) -> List[Tuple[str, float]]:
+    """Versión async de load_author_posts (modo ASYNC_API)"""
+    docs = await (
+        aconns.mongo_db()["posts"]
+        .find({"author_username": author}, {"created_at": 1})
+        .sort("created_at", -1)
+        .limit(TIMELINE_MAX_LEN)
+        .to_list(length=None)
+    )
+    entries = [(str(d["_id"]), post_score(d["created_at"])) for d in docs if d.get("created_at")]
+
+    pipe = aconns.redis.pipeline()
+    pipe.delete(author_posts_key(author))
+    if entries:
+        pipe.zadd(author_posts_key(author), dict(entries))
+    pipe.set(author_posts_ready_key(author), 1)
+    await pipe.execute()
+    return entries
+
+
+def get_author_posts(conns: ConnectionManager, author: str, limit: int) -> List[Tuple[str, float]]:
+    """Posts recientes de `author` como [(post_id, score)], del más nuevo al más viejo"""
+    r = conns.redis
+    pipe = r.pipeline()
+    pipe.exists(author_posts_ready_key(author))
+    pipe.zrevrange(author_posts_key(author), 0, limit - 1, withscores=True)
+    ready, entries = pipe.execute()
+    if not ready:
+        return load_author_posts(conns, author)[:limit]
+    return [(_decode(pid), score) for pid, score in entries]
+
+
+async def get_author_posts_async(aconns, author: str, limit: int) -> List[Tuple[str, float]]:
+    """Versión async de get_author_posts (modo ASYNC_API)"""
+    pipe = aconns.redis.pipeline()
+    pipe.exists(author_posts_ready_key(author))
+    pipe.zrevrange(author_posts_key(author), 0, limit - 1, withscores=True)
+    ready, entries = await pipe.execute()
+    if not ready:
+        return (await load_author_posts_async(aconns, author))[:limit]
+    return [(_decode(pid), score) for pid, score in entries]
+
+
+# ========== ESCRITURA ==========
+
+def record_author_post(conns: ConnectionManager, author: str, post_id: str, created_at: str):
+    """Agregar el post a la lista del autor (síncrono: el autor ve su post al instante)"""
+    r = conns.redis
+    key = author_posts_key(author)
+    if not r.exists(author_posts_ready_key(author)):
+        # load_author_posts ya incluye el post recién insertado en MongoDB
+        load_author_posts(conns, author)
+        return
+    pipe = r.pipeline()
+    pipe.zadd(key, {post_id: post_score(created_at)})
+    pipe.zremrangebyrank(key, 0, -(TIMELINE_MAX_LEN + 1))
+    pipe.execute()
+
+
+def fan_out_post(conns: ConnectionManager, author: str, post_id: str, created_at: str) -> int:
+    """
+    Empujar el post al timeline de cada follower del autor (push).
+    Los timelines quedan acotados a TIMELINE_MAX_LEN. Los timelines que
+    todavía no se construyeron (sin marca :ready) se saltan: la próxima
+    lectura los arma desde MongoDB con el post incluido.
+
+    Si el autor es (o se vuelve) celebridad no hay fan-out: sus posts
+    se leen de author_posts:{author} al armar cada feed (pull).
+
+    Returns:
+        Número de timelines actualizados
+    """
+    r = conns.redis
+    if r.sismember(CELEBRITIES_KEY, author):
+        feed_metrics.incr("fanout_skipped_celebrity")
+        return 0
+
+    followers = get_follower_usernames(conns, author)
+    if len(followers) >= CELEBRITY_FOLLOWER_THRESHOLD:
+        promote_celebrity(conns, author, followers)
+        feed_metrics.incr("fanout_skipped_celebrity")
+        return 0
+
+    score = post_score(created_at)
+    fan_out = r.register_script(_FAN_OUT_LUA)
+    written = 0
+    for i in range(0, len(followers), FANOUT_BATCH_SIZE):
+        keys = []
+        for follower in followers[i:i + FANOUT_BATCH_SIZE]:
+            keys += [timeline_key(follower), timeline_ready_key(follower)]
+        written += int(fan_out(keys=keys, args=[post_id, score, TIMELINE_MAX_LEN]))
+
+    feed_metrics.incr("fanout_push")
+    feed_metrics.incr("fanout_timeline_writes", written)
+    feed_metrics.incr("fanout_skipped_not_ready", len(followers) - written)
+    logger.debug(f"Fan-out de post {post_id} de {author}: {written} de {len(followers)} timelines")
+    return written
+
+
+def promote_celebrity(conns: ConnectionManager, author: str, followers: List[str]):
+    """
+    Marcar a `author` como celebridad y registrarlo en celeb_follows de sus
+    followers actuales (costo O(followers) una sola vez, como un fan-out).
+    """
+    r = conns.redis
+    r.sadd(CELEBRITIES_KEY, author)
+    for i in range(0, len(followers), FANOUT_BATCH_SIZE):
+        pipe = r.pipeline(transaction=False)
+        for follower in followers[i:i + FANOUT_BATCH_SIZE]:
+            pipe.sadd(celeb_follows_key(follower), author)
+        pipe.execute()
+    logger.info(f"{author} promovido a celebridad ({len(followers)} followers)")
+
+
+def publish_post(conns: ConnectionManager, author: str, post_id: str, created_at: str):
+    """Fan-out completo de un post nuevo (se ejecuta como background task)"""
+    try:
+        fan_out_post(conns, author, post_id, created_at)
+    except Exception as e:
+        logger.warning(f"Fan-out de post {post_id} falló (no crítico): {e}")
+
+
+def backfill_on_follow(conns: ConnectionManager, follower: str, author: str):
+    """
+    Copiar los posts recientes de `author` al timeline de `follower`.
+    Si `author` es celebridad solo se registra en celeb_follows (pull al leer).
+    """
+    r = conns.redis
+    if r.sismember(CELEBRITIES_KEY, author):
+        r.sadd(celeb_follows_key(follower), author)
+        return
+    if not r.exists(timeline_ready_key(follower)):
+        # Se construirá completo en la próxima lectura
+        return
+    entries = get_author_posts(conns, author, TIMELINE_MAX_LEN)
+    if not entries:
+        return
+    key = timeline_key(follower)
+    pipe = r.pipeline()
+    pipe.zadd(key, dict(entries))
+    pipe.zremrangebyrank(key, 0, -(TIMELINE_MAX_LEN + 1))
+    pipe.execute()
+
+
+async def backfill_on_follow_async(aconns, follower: str, author: str):
+    """Versión async de backfill_on_follow (modo ASYNC_API)"""
+    r = aconns.redis
+    if await r.sismember(CELEBRITIES_KEY, author):
+        await r.sadd(celeb_follows_key(follower), author)
+        return
+    if not await r.exists(timeline_ready_key(follower)):
+        return
+    entries = await get_author_posts_async(aconns, author, TIMELINE_MAX_LEN)
+    if not entries:
+        return
+    key = timeline_key(follower)
+    pipe = r.pipeline()
+    pipe.zadd(key, dict(entries))
+    pipe.zremrangebyrank(key, 0, -(TIMELINE_MAX_LEN + 1))
+    await pipe.execute()
+
+
+def prune_on_unfollow(conns: ConnectionManager, follower: str, author: str):
+    """
+    Quitar los posts de `author` del timeline de `follower`.
+
+    Un post de `author` solo puede seguir en el timeline si está entre sus
+    TIMELINE_MAX_LEN posts más recientes, que es justo lo que guarda su lista.
+    """
+    r = conns.redis
+    r.srem(celeb_follows_key(follower), author)
+    if not r.exists(timeline_ready_key(follower)):
+        return
+    entries = get_author_posts(conns, author, TIMELINE_MAX_LEN)
+    if entries:
+        r.zrem(timeline_key(follower), *[pid for pid, _ in entries])
+
+
+async def prune_on_unfollow_async(aconns, follower: str, author: str):
+    """Versión async de prune_on_unfollow (modo ASYNC_API)"""
+    r = aconns.redis
+    await r.srem(celeb_follows_key(follower), author)
+    if not await r.exists(timeline_ready_key(follower)):
+        return
+    entries = await get_author_posts_async(aconns, author, TIMELINE_MAX_LEN)
+    if entries:
+        await r.zrem(timeline_key(follower), *[pid for pid, _ in entries])
+
+
+def _timeline_query(authors: List[str], since: Optional[str]) -> Dict:
+    query: Dict = {"author_username": {"$in": authors}}
+    if since:
+        query["created_at"] = {"$gte": since}
+    return query
+
+
+def _entries(docs) -> Dict[str, float]:
+    return {str(d["_id"]): post_score(d["created_at"]) for d in docs if d.get("created_at")}
+
+
+def _timeline_entries(conns: ConnectionManager, authors: List[str], since: Optional[str] = None) -> Dict[str, float]:
+    """Los TIMELINE_MAX_LEN posts más nuevos de `authors` (desde `since`, si se pasa)"""
+    docs = (
+        conns.mongo_db()["posts"]
+        .find(_timeline_query(authors, since), {"created_at": 1})
+        .sort("created_at", -1)
+        .limit(TIMELINE_MAX_LEN)
+    )
+    return _entries(docs)
+
+
+async def _timeline_entries_async(aconns, authors: List[str], since: Optional[str] = None) -> Dict[str, float]:
+    docs = await (
+        aconns.mongo_db()["posts"]
+        .find(_timeline_query(authors, since), {"created_at": 1})
+        .sort("created_at", -1)
+        .limit(TIMELINE_MAX_LEN)
+        .to_list(length=None)
+    )
+    return _entries(docs)
+
+
+def _rebuild_started() -> str:
+    return (datetime.utcnow() - timedelta(seconds=REBUILD_CATCHUP_SECONDS)).isoformat()
+
+
+def _split_following(following: List[str], celebrities) -> Tuple[List[str], List[str]]:
+    """(autores con push, celebridades seguidas)"""
+    celebrities = {_decode(c) for c in celebrities}
+    return [u for u in following if u not in celebrities], [u for u in following if u in celebrities]
+
+
+def _queue_rebuild(pipe, username: str, entries: Dict[str, float], celebs_followed: List[str]):
+    key = timeline_key(username)
+    pipe.delete(key)
+    if entries:
+        pipe.zadd(key, entries)
+    pipe.delete(celeb_follows_key(username))
+    if celebs_followed:
+        pipe.sadd(celeb_follows_key(username), *celebs_followed)
+    pipe.set(timeline_ready_key(username), 1)
+
+
+def _queue_catchup(pipe, username: str, recent: Dict[str, float]):
+    key = timeline_key(username)
+    pipe.zadd(key, recent)
+    pipe.zremrangebyrank(key, 0, -(TIMELINE_MAX_LEN + 1))
+
+
+def rebuild_timeline(conns: ConnectionManager, username: str) -> int:
+    """
+    Reconstruir el timeline de `username` desde MongoDB (pull completo, una vez).
+
+    Un post creado entre la consulta y la escritura no está en la foto, y su
+    fan-out o se saltó (timeline todavía sin marca) o lo borra el DELETE. Por
+    eso, ya con la marca puesta, se vuelven a leer los posts creados desde que
+    empezó el rebuild; de ahí en adelante llegan por fan-out.
+
+    Returns:
+        Número de posts en el timeline
+    """
+    r = conns.redis
+    started = _rebuild_started()
+    pushed_authors, celebs_followed = _split_following(
+        get_following_usernames(conns, username), r.smembers(CELEBRITIES_KEY)
+    )
+
+    entries: Dict[str, float] = {}
+    if pushed_authors:
+        entries = _timeline_entries(conns, pushed_authors)
+
+    pipe = r.pipeline()
+    _queue_rebuild(pipe, username, entries, celebs_followed)
+    pipe.execute()
+
+    if pushed_authors:
+        recent = _timeline_entries(conns, pushed_authors, since=started)
+        if recent:
+            pipe = r.pipeline()
+            _queue_catchup(pipe, username, recent)
+            pipe.execute()
+            entries.update(recent)
+    return min(len(entries), TIMELINE_MAX_LEN)
+
+
+async def rebuild_timeline_async(aconns, username: str) -> int:
+    """Versión async de rebuild_timeline (modo ASYNC_API)"""
+    r = aconns.redis
+    started = _rebuild_started()
+    pushed_authors, celebs_followed = _split_following(
+        await get_following_usernames_async(aconns, username), await r.smembers(CELEBRITIES_KEY)
+    )
+
+    entries: Dict[str, float] = {}
+    if pushed_authors:
+        entries = await _timeline_entries_async(aconns, pushed_authors)
+
+    pipe = r.pipeline()
+    _queue_rebuild(pipe, username, entries, celebs_followed)
+    await pipe.execute()
+
+    if pushed_authors:
+        recent = await _timeline_entries_async(aconns, pushed_authors, since=started)
+        if recent:
+            pipe = r.pipeline()
+            _queue_catchup(pipe, username, recent)
+            await pipe.execute()
+            entries.update(recent)
+    return min(len(entries), TIMELINE_MAX_LEN)
+
+
+def rebuild_all_timelines(conns: ConnectionManager) -> Dict[str, int]:
+    """
+    Reconstruir las listas de autor, el conjunto de celebridades (con el
+    umbral actual, así también se degradan autores que bajaron) y los
+    timelines de todos los usuarios.
+    """
+    users = [d["username"] for d in conns.mongo_db()["users"].find({}, {"username": 1}) if d.get("username")]
+    celebrities = []
+    for username in users:
+        load_author_posts(conns, username)
+        if len(get_follower_usernames(conns, username)) >= CELEBRITY_FOLLOWER_THRESHOLD:
+            celebrities.append(username)
+
+    r = conns.redis
+    pipe = r.pipeline()
+    pipe.delete(CELEBRITIES_KEY)
+    if celebrities:
+        pipe.sadd(CELEBRITIES_KEY, *celebrities)
+    pipe.execute()
+
+    posts_total = 0
+    for username in users:
+        posts_total += rebuild_timeline(conns, username)
+    return {"users": len(users), "celebrities": len(celebrities), "timeline_entries": posts_total}
+
+
+# ========== LECTURA ==========
+
+def _feed_authors(username: str, celebs, include_self: bool) -> List[str]:
+    """Autores que se mezclan al leer: celebridades seguidas (y el propio usuario)"""
+    authors = sorted(_decode(c) for c in celebs)
+    if include_self:
+        authors.append(username)
+    return authors
+
+
+def _feed_path(celebs) -> str:
+    return FEED_PATH_HYBRID if celebs else FEED_PATH_PUSH
+
+
+def read_feed_ids(
+    conns: ConnectionManager,
+    username: str,
+    limit: int,
+    include_self: bool,
+) -> Optional[Tuple[List[str], str]]:
+    """
+    Ids del feed de `username`, del más nuevo al más viejo.
+
+    Args:
+        include_self: mezclar también los posts propios (mode=all)
+
+    Returns:
+        (post_ids, camino) con camino FEED_PATH_PUSH o FEED_PATH_HYBRID,
+        o None si el timeline no puede atender la petición
+        (por ejemplo, `limit` mayor que lo que guarda el timeline)
+    """
+    if limit > TIMELINE_MAX_LEN:
+        return None
+
+    r = conns.redis
+    pipe = r.pipeline()
+    pipe.exists(timeline_ready_key(username))
+    pipe.zrevrange(timeline_key(username), 0, limit - 1, withscores=True)
+    pipe.smembers(celeb_follows_key(username))
+    ready, entries, celebs = pipe.execute()
+
+    if not ready:
+        rebuild_timeline(conns, username)
+        pipe = r.pipeline()
+        pipe.zrevrange(timeline_key(username), 0, limit - 1, withscores=True)
+        pipe.smembers(celeb_follows_key(username))
+        entries, celebs = pipe.execute()
+
+    sources = [[(_decode(pid), score) for pid, score in entries]]
+    for author in _feed_authors(username, celebs, include_self):
+        sources.append(get_author_posts(conns, author, limit))
+
+    return merge_ids(sources, limit), _feed_path(celebs)
+
+
+async def read_feed_ids_async(
+    aconns,
+    username: str,
+    limit: int,
+    include_self: bool,
+) -> Optional[Tuple[List[str], str]]:
+    """
+    Versión async de read_feed_ids para el modo ASYNC_API. Las listas de
+    autor se leen en un solo pipeline.
+    """
+    if limit > TIMELINE_MAX_LEN:
+        return None
+
+    r = aconns.redis
+    pipe = r.pipeline()
+    pipe.exists(timeline_ready_key(username))
+    pipe.zrevrange(timeline_key(username), 0, limit - 1, withscores=True)
+    pipe.smembers(celeb_follows_key(username))
+    ready, entries, celebs = await pipe.execute()
+
+    if not ready:
+        await rebuild_timeline_async(aconns, username)
+        pipe = r.pipeline()
+        pipe.zrevrange(timeline_key(username), 0, limit - 1, withscores=True)
+        pipe.smembers(celeb_follows_key(username))
+        entries, celebs = await pipe.execute()
+
+    authors = _feed_authors(username, celebs, include_self)
+    sources = [[(_decode(pid), score) for pid, score in entries]]
+    if authors:
+        pipe = r.pipeline()
+        for author in authors:
+            pipe.exists(author_posts_ready_key(author))
+            pipe.zrevrange(author_posts_key(author), 0, limit - 1, withscores=True)
+        results = await pipe.execute()
+        for i, author in enumerate(authors):
+            author_ready, author_entries = results[2 * i:2 * i + 2]
+            if author_ready:
+                sources.append([(_decode(pid), score) for pid, score in author_entries])
+            else:
+                sources.append((await load_author_posts_async(aconns, author))[:limit])
+
+    return merge_ids(sources, limit), _feed_path(celebs)
+
+
+# ========== PÁGINAS CON CURSOR ==========
+#
+# Una página `before` = (score, post_id) se lee del timeline con
+# ZREVRANGEBYSCORE (score -inf, más los empates en `score` con id menor: el
+# orden es (created_at, _id) desc, igual que en MongoDB). Solo cuando el
+# cursor pasa el final de lo que guarda Redis hace falta la consulta directa.
+
+def _queue_below(pipe, key: str, before: Tuple[float, str], limit: int):
+    """Encolar en `pipe` las entradas de `key` más viejas que el cursor (2 comandos)"""
+    score = before[0]
+    pipe.zrevrangebyscore(key, f"({score!r}", "-inf", start=0, num=limit, withscores=True)
+    pipe.zrangebyscore(key, score, score, withscores=True)
+
+
+def _below(older, ties, before: Tuple[float, str], limit: int) -> List[Tuple[str, float]]:
+    """Resultado de _queue_below como [(post_id, score)] desc, hasta `limit`"""
+    tied = sorted(
+        ((pid, score) for pid, score in ((_decode(p), s) for p, s in ties) if pid < before[1]),
+        reverse=True,
+    )
+    return (tied + [(_decode(pid), score) for pid, score in older])[:limit]
+
+
+def _queue_author_below(pipe, author: str, before: Tuple[float, str], limit: int):
+    pipe.exists(author_posts_ready_key(author))
+    _queue_below(pipe, author_posts_key(author), before, limit)
+    pipe.zcard(author_posts_key(author))
+
+
+def _author_below(ready, older, ties, size, before, limit) -> Optional[List[Tuple[str, float]]]:
+    """
+    Página de una lista de autor, o None si la lista está recortada a
+    TIMELINE_MAX_LEN y el cursor ya pasó su final
+    """
+    entries = _below(older, ties, before, limit)
+    if len(entries) < limit and size >= TIMELINE_MAX_LEN:
+        return None
+    return entries
+
+
+def read_feed_ids_before(
+    conns: ConnectionManager,
+    username: str,
+    limit: int,
+    include_self: bool,
+    before: Tuple[float, str],
+) -> Optional[Tuple[List[str], str]]:
+    """
+    Página del feed más vieja que el cursor `before` = (score, post_id),
+    desde el timeline materializado y las listas de autor.
+
+    Returns:
+        (post_ids, camino), o None si el timeline no tiene una página completa
+        debajo del cursor: lo que sigue puede haberse recortado
+        (TIMELINE_MAX_LEN, o entradas quitadas por un unfollow) y lo lee la
+        consulta directa
+    """
+    if limit > TIMELINE_MAX_LEN:
+        return None
+
+    r = conns.redis
+    pipe = r.pipeline()
+    pipe.exists(timeline_ready_key(username))
+    pipe.smembers(celeb_follows_key(username))
+    _queue_below(pipe, timeline_key(username), before, limit)
+    ready, celebs, older, ties = pipe.execute()
+
+    if not ready:
+        rebuild_timeline(conns, username)
+        pipe = r.pipeline()
+        pipe.smembers(celeb_follows_key(username))
+        _queue_below(pipe, timeline_key(username), before, limit)
+        celebs, older, ties = pipe.execute()
+
+    entries = _below(older, ties, before, limit)
+    if len(entries) < limit:
+        return None
+
+    sources = [entries]
+    for author in _feed_authors(username, celebs, include_self):
+        pipe = r.pipeline()
+        _queue_author_below(pipe, author, before, limit)
+        results = pipe.execute()
+        if not results[0]:
+            load_author_posts(conns, author)
+            pipe = r.pipeline()
+            _queue_author_below(pipe, author, before, limit)
+            results = pipe.execute()
+        author_entries = _author_below(*results, before, limit)
+        if author_entries is None:
+            return None
+        sources.append(author_entries)
+
+    return merge_ids(sources, limit), _feed_path(celebs)
+
+
+async def read_feed_ids_before_async(
+    aconns,
+    username: str,
+    limit: int,
+    include_self: bool,
+    before: Tuple[float, str],
+) -> Optional[Tuple[List[str], str]]:
+    """Versión async de read_feed_ids_before (modo ASYNC_API)"""
+    if limit > TIMELINE_MAX_LEN:
+        return None
+
+    r = aconns.redis
+    pipe = r.pipeline()
+    pipe.exists(timeline_ready_key(username))
+    pipe.smembers(celeb_follows_key(username))
+    _queue_below(pipe, timeline_key(username), before, limit)
+    ready, celebs, older, ties = await pipe.execute()
+
+    if not ready:
+        await rebuild_timeline_async(aconns, username)
+        pipe = r.pipeline()
+        pipe.smembers(celeb_follows_key(username))
+        _queue_below(pipe, timeline_key(username), before, limit)
+        celebs, older, ties = await pipe.execute()
+
+    entries = _below(older, ties, before, limit)
+    if len(entries) < limit:
+        return None
+
+    authors = _feed_authors(username, celebs, include_self)
+    sources = [entries]
+    if authors:
+        pipe = r.pipeline()
+        for author in authors:
+            _queue_author_below(pipe, author, before, limit)
+        results = await pipe.execute()
+        for i, author in enumerate(authors):
+            author_results = results[4 * i:4 * i + 4]
+            if not author_results[0]:
+                await load_author_posts_async(aconns, author)
+                pipe = r.pipeline()
+                _queue_author_below(pipe, author, before, limit)
+                author_results = await pipe.execute()
+            author_entries = _author_below(*author_results, before, limit)
+            if author_entries is None:
+                return None
+            sources.append(author_entries)
+
+    return merge_ids(sources, limit), _feed_path(celebs)
+
+
+def merge_ids(sources: List[List[Tuple[str, float]]], limit: int) -> List[str]:
+    """
+    Mezclar listas [(post_id, score)] ya ordenadas desc, sin duplicados.
+    Los empates de score van por post_id desc, como el ZSET y el cursor.
+    """
+    merged: List[str] = []
+    seen = set()
+    for pid, _ in heapq.merge(*sources, key=lambda e: (e[1], e[0]), reverse=True):
+        if pid in seen:
+            continue
+        seen.add(pid)
+        merged.append(pid)
+        if len(merged) >= limit:
+            break
+    return merged
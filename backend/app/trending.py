@@ -0,0 +1,328 @@
+"""
+Trending por ventana de tiempo (1h / 24h / 7d) para Red K.
+
+Cada like/unlike suma (o resta) 1 al post en el bucket de tiempo actual, con
+dos resoluciones:
+
+- {trending:N}:5m:{slot}    ZSET post_id → likes netos en esos 5 minutos
+- {trending:N}:1h:{slot}    ZSET post_id → likes netos en esa hora
+- {trending:N}:posts        ZSET post_id → likes totales (ranking histórico)
+
+(`slot` = epoch // ancho del bucket). Cada bucket caduca solo cuando ya no
+entra en ninguna ventana que lo use, así que no hay limpieza que correr.
+
+Todo el trending está repartido en TRENDING_SHARDS shards: el shard de un post
+es crc32(post_id) % TRENDING_SHARDS y `N` es el número de shard. Cada shard
+tiene su propio hash tag {trending:N}, así que en Redis Cluster los shards
+caen en slots (y masters) distintos y ningún master recibe todas las
+escrituras de likes. Dentro de un shard todas las keys comparten slot, y el
+ZUNIONSTORE de una ventana es válido en Redis Cluster.
+
+El ranking de una ventana es, en cada shard, un ZUNIONSTORE de sus buckets,
+con pesos 0.5 ** (edad / vida media) si se pide decaimiento (un like de hace
+poco pesa más que uno del principio de la ventana):
+
+- 1h  → 12 buckets de 5m
+- 24h → 24 buckets de 1h
+- 7d  → 168 buckets de 1h
+
+El resultado se guarda en {trending:N}:window:{ventana}:{decay|flat} por
+TRENDING_CACHE_SECONDS, así que un pico de requests hace un solo ZUNIONSTORE
+por shard. Una lectura pide el top-K a cada shard en un pipeline y los mezcla
+con un heap (cada lista ya viene ordenada).
+
+Ninguna consulta recorre la colección `likes` completa: `all` sale de los
+ZSET {trending:N}:posts y, sin Redis, las ventanas se agregan en MongoDB solo
+sobre los likes con created_at dentro de la ventana (índice de app/db_schema.py).
+
+Si cambia TRENDING_SHARDS (o hay datos del esquema sin shards: trending:posts,
+{trending}:5m:...), `rebalance` mueve cada post a su shard nuevo.
+"""
+import heapq
+import os
+import re
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Ranking histórico del esquema sin shards (solo lo lee `rebalance`)
+LEGACY_ALL_KEY = "trending:posts"
+
+WINDOW_ALL = "all"
+
+# Ancho de cada resolución en segundos
+RESOLUTIONS: Dict[str, int] = {"5m": 300, "1h": 3600}
+
+# Ventana → (duración en segundos, resolución de sus buckets)
+WINDOWS: Dict[str, Tuple[int, str]] = {
+    "1h": (3600, "5m"),
+    "24h": (86400, "1h"),
+    "7d": (7 * 86400, "1h"),
+}
+
+TRENDING_CACHE_SECONDS = int(os.getenv("TRENDING_CACHE_SECONDS", "5"))
+# Vida media del decaimiento como fracción de la ventana (0.25 → 6h en 24h)
+TRENDING_HALF_LIFE_FRACTION = float(os.getenv("TRENDING_HALF_LIFE_FRACTION", "0.25"))
+# Shards del trending; conviene varios por master (16 para un cluster de 3)
+TRENDING_SHARDS = int(os.getenv("TRENDING_SHARDS", "16"))
+
+
+# ========== KEYS ==========
+
+def shard_of(post_id: str, shards: Optional[int] = None) -> int:
+    return zlib.crc32(post_id.encode()) % (shards or TRENDING_SHARDS)
+
+
+def _tag(shard: int) -> str:
+    return f"{{trending:{shard}}}"
+
+
+def all_key(shard: int) -> str:
+    return f"{_tag(shard)}:posts"
+
+
+def outbox_applied_key(shard: int) -> str:
+    """HASH post_id → último evento del outbox aplicado (ver app/redis_cluster.py)"""
+    return f"{_tag(shard)}:outbox:applied"
+
+
+def bucket_key(resolution: str, slot: int, shard: int) -> str:
+    return f"{_tag(shard)}:{resolution}:{slot}"
+
+
+def leaderboard_key(window: str, decay: bool, shard: int) -> str:
+    return f"{_tag(shard)}:window:{window}:{'decay' if decay else 'flat'}"
+
+
+def _bucket_ttl(resolution: str) -> int:
+    """Lo que vive un bucket: la ventana más larga que lo usa + un bucket de margen"""
+    longest = max(seconds for seconds, res in WINDOWS.values() if res == resolution)
+    return longest + RESOLUTIONS[resolution]
+
+
+def current_buckets(post_id: str, now: Optional[float] = None) -> List[Tuple[str, int]]:
+    """(key, ttl) del bucket actual de cada resolución, en el shard del post"""
+    now = time.time() if now is None else now
+    shard = shard_of(post_id)
+    return [
+        (bucket_key(resolution, int(now // width), shard), _bucket_ttl(resolution))
+        for resolution, width in RESOLUTIONS.items()
+    ]
+
+
+def window_weights(window: str, decay: bool, shard: int, now: Optional[float] = None) -> Dict[str, float]:
+    """Buckets de la ventana en un shard (el actual incluido) → peso para el ZUNIONSTORE"""
+    now = time.time() if now is None else now
+    seconds, resolution = WINDOWS[window]
+    width = RESOLUTIONS[resolution]
+    current = int(now // width)
+    half_life = seconds * TRENDING_HALF_LIFE_FRACTION
+
+    weights = {}
+    for age in range(seconds // width):
+        weight = 0.5 ** (age * width / half_life) if decay else 1.0
+        weights[bucket_key(resolution, current - age, shard)] = weight
+    return weights
+
+
+# ========== ESCRITURA ==========
+
+def record(pipe, post_id: str, delta: int, now: Optional[float] = None):
+    """
+    Sumar `delta` al post en el ranking histórico y en los buckets actuales
+    (en un pipeline ya abierto). Todas las keys son del shard del post: en
+    Redis Cluster el pipeline va a un solo nodo.
+    """
+    pipe.zincrby(all_key(shard_of(post_id)), delta, post_id)
+    for key, ttl in current_buckets(post_id, now):
+        pipe.zincrby(key, delta, post_id)
+        pipe.expire(key, ttl)
+
+
+# ========== LECTURA ==========
+
+def _decode_scores(entries: List[Tuple]) -> List[Tuple[str, float]]:
+    return [
+        (post_id.decode() if isinstance(post_id, bytes) else post_id, float(score))
+        for post_id, score in entries
+    ]
+
+
+def _merge_top(per_shard: Iterable[List[Tuple[str, float]]], limit: int) -> List[Tuple[str, float]]:
+    """Mezclar los top-K de cada shard (ya ordenados de mayor a menor) con un heap"""
+    merged = heapq.merge(*per_shard, key=lambda entry: -entry[1])
+    return [entry for _, entry in zip(range(limit), merged)]
+
+
+def top_posts(r, window: str, limit: int, decay: bool = True, shards: Optional[int] = None) -> List[Tuple[str, float]]:
+    """
+    (post_id, score) de los `limit` posts con más likes en la ventana.
+    Los scores <= 0 (posts con más unlikes que likes en la ventana) no entran.
+
+    Pide el top-`limit` a cada shard (un pipeline; en Redis Cluster, uno por
+    nodo) y se queda con el top-`limit` global.
+    """
+    shard_ids = range(shards or TRENDING_SHARDS)
+    if window == WINDOW_ALL:
+        keys = [all_key(shard) for shard in shard_ids]
+        pipe = r.pipeline(transaction=False)
+    else:
+        keys = [leaderboard_key(window, decay, shard) for shard in shard_ids]
+        pipe = r.pipeline(transaction=False)
+        for key in keys:
+            pipe.exists(key)
+        missing = [shard for shard, exists in zip(shard_ids, pipe.execute()) if not exists]
+
+        now = time.time()
+        pipe = r.pipeline(transaction=False)
+        for shard in missing:
+            key = leaderboard_key(window, decay, shard)
+            pipe.zunionstore(key, window_weights(window, decay, shard, now))
+            pipe.expire(key, TRENDING_CACHE_SECONDS)
+
+    for key in keys:
+        pipe.zrevrangebyscore(key, "+inf", "(0", start=0, num=limit, withscores=True)
+    results = pipe.execute()[-len(keys):]
+    return _merge_top((_decode_scores(entries) for entries in results), limit)
+
+
+def _window_since(window: str) -> str:
+    seconds, _ = WINDOWS[window]
+    return (datetime.utcnow() - timedelta(seconds=seconds)).isoformat()
+
+
+def _mongo_pipeline(window: str, limit: int) -> List[Dict]:
+    stages: List[Dict] = []
+    if window != WINDOW_ALL:
+        stages.append({"$match": {"created_at": {"$gte": _window_since(window)}}})
+    return stages + [
+        {"$group": {"_id": "$post_id", "likes_count": {"$sum": 1}}},
+        {"$sort": {"likes_count": -1}},
+        {"$limit": limit},
+    ]
+
+
+def top_posts_mongo(db, window: str, limit: int) -> List[Tuple[str, float]]:
+    """
+    Respaldo sin Redis: likes actuales con created_at dentro de la ventana
+    (sin decaimiento). Para `all`, todos los likes, como antes de Redis.
+    """
+    return [(doc["_id"], float(doc["likes_count"])) for doc in db["likes"].aggregate(_mongo_pipeline(window, limit))]
+
+
+def to_response(ranked: List[Tuple[str, float]], posts: List, like_states: Dict[str, Tuple[int, bool]]) -> List[Dict]:
+    """Ranking + posts hidratados → lista del endpoint (los posts borrados se omiten)"""
+    by_id = {post.id: post for post in posts}
+    result = []
+    for post_id, score in ranked:
+        post = by_id.get(post_id)
+        if post is None:
+            continue
+        result.append({
+            "id": post.id,
+            "author_username": post.author_username,
+            "content": post.content,
+            "tags": post.tags or [],
+            "created_at": post.created_at,
+            "likes_count": like_states.get(post_id, (0, False))[0],
+            "score": round(score, 3),
+        })
+    return result
+
+
+# ========== REBALANCEO ==========
+
+# {trending}:... (sin shards) o {trending:N}:... → (shard o None, tipo, slot de tiempo)
+_KEY_RE = re.compile(r"^\{trending(?::(\d+))?\}:(posts|5m|1h|window)(?::(\d+))?")
+
+
+def _parse_key(key: str) -> Optional[Tuple[Optional[int], str, Optional[int]]]:
+    if key == LEGACY_ALL_KEY:
+        return None, "posts", None
+    match = _KEY_RE.match(key)
+    if not match:
+        return None
+    shard, kind, slot = match.groups()
+    return (int(shard) if shard is not None else None), kind, (int(slot) if slot is not None else None)
+
+
+def _target_key(kind: str, slot: Optional[int], shard: int) -> str:
+    return all_key(shard) if kind == "posts" else bucket_key(kind, slot, shard)
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _scan_keys(r) -> List[str]:
+    keys = {_decode(key) for key in r.scan_iter(match="{trending*}:*", count=1000)}
+    if r.exists(LEGACY_ALL_KEY):
+        keys.add(LEGACY_ALL_KEY)
+    return sorted(keys)
+
+
+def rebalance(r, shards: Optional[int] = None, batch: int = 500) -> Dict:
+    """
+    Mover cada post al shard que le toca con `shards` shards (por defecto
+    TRENDING_SHARDS): ranking histórico y buckets, desde cualquier número de
+    shards anterior y desde el esquema sin shards. Los rankings de ventana
+    cacheados se borran (se rearman en la próxima lectura).
+
+    Cada entrada se mueve restando en el origen exactamente el score leído y
+    sumándolo en el destino, así que un like que llegue al origen mientras
+    tanto no se pierde: queda ahí y lo mueve la siguiente corrida.
+    """
+    shards = shards or TRENDING_SHARDS
+    report = {"shards": shards, "keys_scanned": 0, "entries_moved": 0, "caches_dropped": 0}
+
+    for key in _scan_keys(r):
+        parsed = _parse_key(key)
+        if parsed is None:
+            continue  # snapshots de app/trending_snapshot.py y otras keys ajenas
+        source_shard, kind, slot = parsed
+        report["keys_scanned"] += 1
+
+        if kind == "window":
+            r.delete(key)
+            report["caches_dropped"] += 1
+            continue
+
+        ttl = r.ttl(key) if kind != "posts" else -1
+        pending: List[Tuple[str, float]] = []
+        for member, score in r.zscan_iter(key, count=batch):
+            post_id = _decode(member)
+            shard = shard_of(post_id, shards)
+            if shard == source_shard:
+                continue
+            pending.append((post_id, float(score)))
+            if len(pending) >= batch:
+                report["entries_moved"] += _move(r, key, pending, kind, slot, shards, ttl)
+                pending = []
+        if pending:
+            report["entries_moved"] += _move(r, key, pending, kind, slot, shards, ttl)
+
+    # Posts por shard en el ranking histórico: muestra si el reparto quedó parejo
+    pipe = r.pipeline(transaction=False)
+    for shard in range(shards):
+        pipe.zcard(all_key(shard))
+    report["posts_per_shard"] = pipe.execute()
+    return report
+
+
+def _move(r, source: str, entries: List[Tuple[str, float]], kind: str, slot: Optional[int],
+          shards: int, ttl: int) -> int:
+    pipe = r.pipeline(transaction=False)
+    targets = set()
+    for post_id, score in entries:
+        target = _target_key(kind, slot, shard_of(post_id, shards))
+        targets.add(target)
+        pipe.zincrby(target, score, post_id)
+        pipe.zincrby(source, -score, post_id)
+    for target in targets:
+        if ttl > 0:
+            pipe.expire(target, ttl)
+    # Lo que quedó en 0 se movió entero
+    pipe.zremrangebyscore(source, 0, 0)
+    pipe.execute()
+    return len(entries)
@@ -0,0 +1,150 @@
+"""
+Snapshots materializados de trending para Red K.
+
+Un hilo por worker (TrendingRefresher) rearma cada TRENDING_SNAPSHOT_INTERVAL
+segundos el top-K de cada ventana de app/trending.py, lo hidrata con un solo
+`$in` (cache de posts) y una sola lectura de likes en lote, y lo guarda ya
+serializado:
+
+- {trending}:snapshot:{ventana}:{decay|flat}   JSON listo para responder
+- {trending}:snapshot:lock                      SET NX: un solo worker refresca por intervalo
+
+GET /trending/posts pasa a ser un GET de Redis. Si el snapshot no existe
+(arranque en frío, refresher apagado) el request lo arma y lo guarda.
+Los snapshots caducan tras varios intervalos sin refresco, así un refresher
+caído no deja un trending congelado para siempre.
+"""
+
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from app import likes, post_cache, trending
+from app.connections import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+# Posts por snapshot: el `limit` máximo que acepta /trending/posts
+TRENDING_SNAPSHOT_SIZE = int(os.getenv("TRENDING_SNAPSHOT_SIZE", "100"))
+TRENDING_SNAPSHOT_INTERVAL = int(os.getenv("TRENDING_SNAPSHOT_INTERVAL", "10"))
+TRENDING_REFRESHER = os.getenv("TRENDING_REFRESHER", "true").lower() in ("1", "true", "yes")
+
+SNAPSHOT_LOCK_KEY = "{trending}:snapshot:lock"
+
+
+def snapshot_key(window: str, decay: bool) -> str:
+    if window == trending.WINDOW_ALL:
+        return f"{{trending}}:snapshot:{window}"
+    return f"{{trending}}:snapshot:{window}:{'decay' if decay else 'flat'}"
+
+
+def _snapshot_ttl() -> int:
+    return TRENDING_SNAPSHOT_INTERVAL * 6
+
+
+def _variants() -> List[Tuple[str, bool]]:
+    """Todas las combinaciones (ventana, decay) que se sirven"""
+    variants = [(window, decay) for window in trending.WINDOWS for decay in (True, False)]
+    variants.append((trending.WINDOW_ALL, False))
+    return variants
+
+
+# ========== ARMADO ==========
+
+def build_snapshots(conns: ConnectionManager, variants: List[Tuple[str, bool]]) -> Dict[str, List[Dict]]:
+    """
+    Armar los snapshots de `variants`: un ZREVRANGE por ventana y, para todos
+    juntos, un solo `$in` de posts y una sola lectura de likes en lote.
+    """
+    r = conns.redis
+    rankings = {
+        snapshot_key(window, decay): trending.top_posts(r, window, TRENDING_SNAPSHOT_SIZE, decay)
+        for window, decay in variants
+    }
+
+    post_ids = list(dict.fromkeys(post_id for ranked in rankings.values() for post_id, _ in ranked))
+    posts = post_cache.get_posts(r, conns.mongo_db(), post_ids)
+    like_states = likes.get_like_states(conns, post_ids) if post_ids else {}
+
+    return {key: trending.to_response(ranked, posts, like_states) for key, ranked in rankings.items()}
+
+
+def store_snapshots(r, snapshots: Dict[str, List[Dict]]):
+    pipe = r.pipeline(transaction=False)
+    for key, items in snapshots.items():
+        pipe.setex(key, _snapshot_ttl(), json.dumps(items))
+    pipe.execute()
+
+
+def refresh_snapshots(conns: ConnectionManager) -> int:
+    """Rearmar y guardar todos los snapshots; devuelve cuántos se guardaron"""
+    snapshots = build_snapshots(conns, _variants())
+    store_snapshots(conns.redis, snapshots)
+    return len(snapshots)
+
+
+# ========== LECTURA ==========
+
+def get_snapshot(conns: ConnectionManager, window: str, decay: bool) -> List[Dict]:
+    """Snapshot listo para responder; si no existe se arma (y guarda) ahora"""
+    r = conns.redis
+    key = snapshot_key(window, decay)
+    cached = r.get(key)
+    if cached:
+        try:
+            return json.loads(cached)
+        except Exception:
+            pass  # snapshot corrupto: se rearma
+
+    snapshots = build_snapshots(conns, [(window, decay)])
+    store_snapshots(r, snapshots)
+    return snapshots[key]
+
+
+# ========== REFRESCO EN SEGUNDO PLANO ==========
+
+class TrendingRefresher:
+    """
+    Hilo por worker que refresca los snapshots. Antes de cada refresco toma
+    un lock con SET NX que dura un intervalo: con varios workers, refresca
+    solo el primero que llega y el resto espera al intervalo siguiente.
+    """
+
+    def __init__(self, conns: ConnectionManager):
+        self.conns = conns
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.refreshes = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="trending-refresher", daemon=True)
+        self._thread.start()
+        logger.info("TrendingRefresher iniciado")
+
+    def refresh_if_due(self) -> bool:
+        """Refrescar si ningún otro worker lo hizo en este intervalo"""
+        r = self.conns.redis
+        if not r.set(SNAPSHOT_LOCK_KEY, os.getpid(), nx=True, ex=TRENDING_SNAPSHOT_INTERVAL):
+            return False
+        refresh_snapshots(self.conns)
+        self.refreshes += 1
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh_if_due()
+            except Exception as e:
+                logger.warning(f"No se pudo refrescar trending (se reintenta): {e}")
+            self._stop.wait(TRENDING_SNAPSHOT_INTERVAL)
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self._thread = None
@@ -0,0 +1,111 @@
+"""
+Cache versionado por usuario (generation counters) para Red K.
+
+Cada artefacto cacheado de un usuario lleva en la key la generación actual
+del usuario:
+
+    {tipo}:{username}:g{gen}[:{variante}]
+    p. ej. feed:alice:g7:all:20, following:alice:g7
+
+- gen:{username}   contador de generación (sin TTL)
+
+Invalidar todo lo cacheado de un usuario es un solo INCR de gen:{username},
+cueste lo mismo haya una variante cacheada o cien: las entradas de la
+generación anterior ya no se leen y caducan solas por su TTL.
+"""
+
+import json
+from typing import Any, Iterable, Optional
+
+KIND_FEED = "feed"
+KIND_FOLLOWING = "following"
+
+# TTL en segundos por tipo de artefacto
+CACHE_TTLS = {
+    KIND_FEED: 60,
+    KIND_FOLLOWING: 300,
+}
+
+
+# ========== KEYS ==========
+
+def generation_key(username: str) -> str:
+    return f"gen:{username}"
+
+
+def versioned_key(kind: str, username: str, generation: int, *parts: Any) -> str:
+    return ":".join([kind, username, f"g{generation}", *(str(p) for p in parts)])
+
+
+# ========== SYNC ==========
+
+def get_generation(r, username: str) -> int:
+    value = r.get(generation_key(username))
+    return int(value) if value else 0
+
+
+def cache_key(r, kind: str, username: str, *parts: Any) -> str:
+    """Key de la generación vigente para este artefacto del usuario"""
+    return versioned_key(kind, username, get_generation(r, username), *parts)
+
+
+def get_json(r, key: str) -> Optional[Any]:
+    """Valor cacheado o None (también si el JSON no se puede leer)"""
+    cached = r.get(key)
+    if not cached:
+        return None
+    try:
+        return json.loads(cached)
+    except Exception:
+        return None
+
+
+def dump(value: Any) -> str:
+    """Serializar listas de modelos Pydantic (o dicts) para el cache"""
+    if isinstance(value, list):
+        value = [v.dict() if hasattr(v, "dict") else v for v in value]
+    return json.dumps(value)
+
+
+def set_json(r, key: str, kind: str, value: Any):
+    r.setex(key, CACHE_TTLS[kind], dump(value))
+
+
+def bump(r, usernames: Iterable[str]):
+    """Invalidar todo lo cacheado de cada usuario (un INCR por usuario, en un pipeline)"""
+    pipe = r.pipeline(transaction=False)
+    for username in usernames:
+        pipe.incr(generation_key(username))
+    pipe.execute()
+
+
+# ========== ASYNC (redis.asyncio) ==========
+
+async def get_generation_async(r, username: str) -> int:
+    value = await r.get(generation_key(username))
+    return int(value) if value else 0
+
+
+async def cache_key_async(r, kind: str, username: str, *parts: Any) -> str:
+    return versioned_key(kind, username, await get_generation_async(r, username), *parts)
+
+
+async def get_json_async(r, key: str) -> Optional[Any]:
+    cached = await r.get(key)
+    if not cached:
+        return None
+    try:
+        return json.loads(cached)
+    except Exception:
+        return None
+
+
+async def set_json_async(r, key: str, kind: str, value: Any):
+    await r.setex(key, CACHE_TTLS[kind], dump(value))
+
+
+async def bump_async(r, usernames: Iterable[str]):
+    pipe = r.pipeline(transaction=False)
+    for username in usernames:
+        pipe.incr(generation_key(username))
+    await pipe.execute()
@@ -0,0 +1,216 @@
+"""
+Contadores desnormalizados de usuarios para Red K.
+
+En vez de contar relaciones en cada consulta, el nodo `:User` de Neo4j y el
+documento de `users` en MongoDB guardan:
+
+- followers_count   cuántos lo siguen
+- following_count   a cuántos sigue
+- posts_count       cuántos posts publicó
+- counters_at       (solo Mongo) última reconciliación del documento
+
+Se mantienen con incrementos atómicos en cada escritura:
+
+- follow_user:   en Neo4j `ON CREATE SET` del MERGE de la relación (un follow
+                 repetido no suma); en Mongo `$inc` de los dos documentos
+- unfollow_user: resta las relaciones borradas, sin bajar de 0
+- create_post:   suma 1 al autor en los dos lados
+
+Si una escritura se pierde (Neo4j caído en un follow, un error entre Mongo y
+Neo4j) los contadores derivan: `reconcile` los recalcula desde las fuentes
+(relaciones FOLLOWS de Neo4j o la colección `follows`, y la colección
+`posts`) y corrige los que no coinciden. Un documento sin `counters_at`
+(usuario anterior a los contadores) se reconcilia la primera vez que se
+piden sus stats.
+"""
+
+import logging
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from app.connections import ConnectionManager
+from app.schemas import UserStatsOut
+
+logger = logging.getLogger(__name__)
+
+COUNTERS_RECONCILE_BATCH = int(os.getenv("COUNTERS_RECONCILE_BATCH", "500"))
+
+FOLLOWERS_FIELD = "followers_count"
+FOLLOWING_FIELD = "following_count"
+POSTS_FIELD = "posts_count"
+RECONCILED_FIELD = "counters_at"
+COUNTER_FIELDS = (FOLLOWERS_FIELD, FOLLOWING_FIELD, POSTS_FIELD)
+
+
+def initial_counters() -> Dict:
+    """Campos de un usuario nuevo: en cero y ya reconciliado"""
+    counters: Dict = {field: 0 for field in COUNTER_FIELDS}
+    counters[RECONCILED_FIELD] = datetime.utcnow().isoformat()
+    return counters
+
+
+# ========== INCREMENTOS (MongoDB) ==========
+
+def _inc(username: str, field: str, delta: int) -> Tuple[Dict, Dict]:
+    query: Dict = {"username": username}
+    if delta < 0:
+        # Nunca por debajo de 0; un campo que no existe queda para la reconciliación
+        query[field] = {"$gte": -delta}
+    return query, {"$inc": {field: delta}}
+
+
+def _follow_ops(username: str, target: str, delta: int) -> List[UpdateOne]:
+    return [
+        UpdateOne(*_inc(username, FOLLOWING_FIELD, delta)),
+        UpdateOne(*_inc(target, FOLLOWERS_FIELD, delta)),
+    ]
+
+
+def record_follow(db, username: str, target: str, delta: int = 1):
+    """following_count de username y followers_count de target (delta=-1 en unfollow)"""
+    db["users"].bulk_write(_follow_ops(username, target, delta), ordered=False)
+
+
+async def record_follow_async(db, username: str, target: str, delta: int = 1):
+    await db["users"].bulk_write(_follow_ops(username, target, delta), ordered=False)
+
+
+def record_post(db, username: str, delta: int = 1):
+    db["users"].update_one(*_inc(username, POSTS_FIELD, delta))
+
+
+# ========== LECTURA ==========
+
+def stats_from_doc(doc: Dict) -> UserStatsOut:
+    return UserStatsOut(
+        username=doc["username"],
+        followers_count=max(int(doc.get(FOLLOWERS_FIELD) or 0), 0),
+        following_count=max(int(doc.get(FOLLOWING_FIELD) or 0), 0),
+        posts_count=max(int(doc.get(POSTS_FIELD) or 0), 0),
+        reconciled_at=doc.get(RECONCILED_FIELD),
+    )
+
+
+def get_stats(conns: ConnectionManager, username: str) -> Optional[UserStatsOut]:
+    """Stats desde el documento del usuario (None si no existe)"""
+    users_col = conns.mongo_db()["users"]
+    projection = {"username": 1, RECONCILED_FIELD: 1, **{field: 1 for field in COUNTER_FIELDS}}
+    doc = users_col.find_one({"username": username}, projection)
+    if doc is None:
+        return None
+    if not doc.get(RECONCILED_FIELD):
+        reconcile(conns, [username])
+        doc = users_col.find_one({"username": username}, projection)
+    return stats_from_doc(doc)
+
+
+# ========== RECONCILIACIÓN ==========
+
+def _count_follows(conns: ConnectionManager, usernames: List[str]) -> Dict[str, Dict[str, int]]:
+    """username → {followers_count, following_count} contados en la fuente"""
+    counts = {u: {FOLLOWERS_FIELD: 0, FOLLOWING_FIELD: 0} for u in usernames}
+    try:
+        with conns.neo4j_driver.session() as session:
+            result = session.run(
+                """
+                UNWIND $usernames AS name
+                MATCH (u:User {username: name})
+                RETURN name,
+                       size([(u)<-[:FOLLOWS]-(:User) | 1]) AS followers_count,
+                       size([(u)-[:FOLLOWS]->(:User) | 1]) AS following_count
+                """,
+                usernames=usernames,
+            )
+            for record in result:
+                counts[record["name"]] = {
+                    FOLLOWERS_FIELD: record["followers_count"],
+                    FOLLOWING_FIELD: record["following_count"],
+                }
+    except Exception as e:
+        logger.warning(f"Neo4j no disponible para reconciliar follows, usando MongoDB: {e}")
+        follows_col = conns.mongo_db()["follows"]
+        for field, key, other in ((FOLLOWERS_FIELD, "$following", "following"),
+                                  (FOLLOWING_FIELD, "$follower", "follower")):
+            for d in follows_col.aggregate([
+                {"$match": {other: {"$in": usernames}}},
+                {"$group": {"_id": key, "n": {"$sum": 1}}},
+            ]):
+                counts[d["_id"]][field] = d["n"]
+    return counts
+
+
+def _count_posts(conns: ConnectionManager, usernames: List[str]) -> Dict[str, int]:
+    posts = {u: 0 for u in usernames}
+    for d in conns.mongo_db()["posts"].aggregate([
+        {"$match": {"author_username": {"$in": usernames}}},
+        {"$group": {"_id": "$author_username", "n": {"$sum": 1}}},
+    ]):
+        posts[d["_id"]] = d["n"]
+    return posts
+
+
+def _reconcile_batch(conns: ConnectionManager, docs: List[Dict], now: str) -> int:
+    usernames = [d["username"] for d in docs]
+    follows = _count_follows(conns, usernames)
+    posts = _count_posts(conns, usernames)
+    expected = {u: {**follows[u], POSTS_FIELD: posts[u]} for u in usernames}
+
+    fixed = 0
+    writes = []
+    for doc in docs:
+        counters = expected[doc["username"]]
+        if any(doc.get(field) != value for field, value in counters.items()):
+            fixed += 1
+        writes.append(UpdateOne(
+            {"_id": doc["_id"]},
+            {"$set": {**counters, RECONCILED_FIELD: now}},
+        ))
+    conns.mongo_db()["users"].bulk_write(writes, ordered=False)
+
+    try:
+        with conns.neo4j_driver.session() as session:
+            session.run(
+                """
+                UNWIND $rows AS row
+                MATCH (u:User {username: row.username})
+                SET u.followers_count = row.followers_count,
+                    u.following_count = row.following_count,
+                    u.posts_count = row.posts_count
+                """,
+                rows=[{"username": u, **counters} for u, counters in expected.items()],
+            )
+    except Exception as e:
+        logger.warning(f"No se pudieron reconciliar los contadores en Neo4j: {e}")
+    return fixed
+
+
+def reconcile(conns: ConnectionManager, usernames: Optional[Iterable[str]] = None) -> Dict[str, int]:
+    """
+    Recalcular los contadores de `usernames` (o de todos los usuarios) de a
+    COUNTERS_RECONCILE_BATCH. Devuelve cuántos usuarios se revisaron y en
+    cuántos el documento de Mongo no coincidía.
+    """
+    users_col = conns.mongo_db()["users"]
+    query = {} if usernames is None else {"username": {"$in": list(usernames)}}
+    projection = {"username": 1, **{field: 1 for field in COUNTER_FIELDS}}
+    now = datetime.utcnow().isoformat()
+
+    users = fixed = 0
+    batch: List[Dict] = []
+    for doc in users_col.find(query, projection):
+        if not doc.get("username"):
+            continue
+        batch.append(doc)
+        if len(batch) >= COUNTERS_RECONCILE_BATCH:
+            fixed += _reconcile_batch(conns, batch, now)
+            users += len(batch)
+            batch = []
+    if batch:
+        fixed += _reconcile_batch(conns, batch, now)
+        users += len(batch)
+
+    logger.info(f"Contadores reconciliados: {users} usuarios, {fixed} corregidos")
+    return {"users": users, "fixed": fixed}
@@ -15,7 +15,9 @@ de modo que los endpoints queden como:
 from fastapi import FastAPI
 from app.main import app as api_app  # esta es la app que definiste en main.py
 
-app = FastAPI(title="Red K - API Wrapper")
+# Starlette no propaga el lifespan a las apps montadas: lo reutilizamos aquí
+# para que los pools de conexiones se abran/cierren con el wrapper.
+app = FastAPI(title="Red K - API Wrapper", lifespan=api_app.router.lifespan_context)
 
 # Montar la app original en /api
 app.mount("/api", api_app)
@@ -32,10 +34,11 @@ def root():
 # Opcional: seguir exponiendo /health en la raíz (además de /api/health)
 # Reutilizamos la función health_check que ya definiste en main.py
 from app.main import health_check as inner_health_check
+from app.connections import connection_manager
 
 @app.get("/health")
 def health():
     """
     Proxy al /health original de app.main (que ahora vive en /api/health).
     """
-    return inner_health_check()
+    return inner_health_check(connection_manager)
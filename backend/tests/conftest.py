@@ -0,0 +1,60 @@
+"""
+Fixtures compartidas de los tests del backend.
+
+Sin servicios externos: Redis es fakeredis (los scripts Lua corren con
+lupa), MongoDB es mongomock y Neo4j, donde hace falta, un driver falso.
+Dependencias de desarrollo en requirements-dev.txt.
+
+    cd backend && python -m pytest -q
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class DeadNeo4j:
+    """Driver de Neo4j caído: cada sesión falla, como con el servidor apagado"""
+
+    def session(self, *args, **kwargs):
+        from neo4j.exceptions import ServiceUnavailable
+        raise ServiceUnavailable("Neo4j caído (test)")
+
+
+def _patch_mongomock_bulk(mongomock):
+    # PyMongo >= 4.11 pasa `sort` a los UpdateOne de bulk_write y mongomock
+    # todavía no lo acepta (ningún bulk_write del backend ordena)
+    builder = mongomock.collection.BulkOperationBuilder
+    if getattr(builder.add_update, "_drops_sort", False):
+        return
+    add_update = builder.add_update
+
+    def add_update_without_sort(self, *args, sort=None, **kwargs):
+        return add_update(self, *args, **kwargs)
+
+    add_update_without_sort._drops_sort = True
+    builder.add_update = add_update_without_sort
+
+
+@pytest.fixture
+def redis_client():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    return fakeredis.FakeRedis()
+
+
+@pytest.fixture
+def mongo_db():
+    mongomock = pytest.importorskip("mongomock")
+    _patch_mongomock_bulk(mongomock)
+    return mongomock.MongoClient()["redk_test"]
+
+
+@pytest.fixture
+def conns(redis_client, mongo_db):
+    """Lo que los módulos usan de ConnectionManager: redis, mongo_db() y neo4j_driver"""
+    return SimpleNamespace(redis=redis_client, mongo_db=lambda: mongo_db, neo4j_driver=DeadNeo4j())
@@ -0,0 +1,100 @@
+"""Resúmenes de DMs: no leídos incrementales y marcas de lectura que solo avanzan"""
+
+import pytest
+
+from app import conversations
+from app.conversations import CONVERSATIONS_COLLECTION
+
+KEY = "ana::beto"
+
+
+@pytest.fixture
+def send(mongo_db):
+    """Un DM como lo guarda send_dm: el mensaje en `dms` y los dos resúmenes"""
+    def send(sender, receiver, created_at, content="hola"):
+        mongo_db["dms"].insert_one({
+            "conversation_key": KEY, "sender_username": sender, "receiver_username": receiver,
+            "content": content, "created_at": created_at, "read": False,
+        })
+        conversations.record_message(mongo_db, sender, receiver, KEY, content, created_at)
+    return send
+
+
+def summary(mongo_db, owner, other):
+    return mongo_db[CONVERSATIONS_COLLECTION].find_one({"owner": owner, "with_username": other})
+
+
+def test_record_message_counts_unread_for_the_receiver_only(mongo_db, send):
+    send("ana", "beto", "t1")
+    send("ana", "beto", "t2", content="¿estás?")
+    send("beto", "ana", "t3")
+
+    beto = summary(mongo_db, "beto", "ana")
+    ana = summary(mongo_db, "ana", "beto")
+    assert beto["unread_count"] == 2
+    assert ana["unread_count"] == 1
+    assert beto["last_message_at"] == ana["last_message_at"] == "t3"
+    assert beto["last_sender_username"] == "beto"
+
+
+def test_mark_read_only_moves_forward(mongo_db, send):
+    for t in ("t1", "t2", "t3"):
+        send("ana", "beto", t)
+
+    assert conversations.mark_read(mongo_db, "beto", "ana", KEY, "t2", "r1") is True
+    assert summary(mongo_db, "beto", "ana")["unread_count"] == 1
+    # Una lectura vieja que llega tarde no retrocede la marca ni el contador
+    assert conversations.mark_read(mongo_db, "beto", "ana", KEY, "t1", "r2") is False
+    assert conversations.mark_read(mongo_db, "beto", "ana", KEY, "t2", "r2") is False
+
+    beto = summary(mongo_db, "beto", "ana")
+    assert (beto["last_read_at"], beto["read_marked_at"], beto["unread_count"]) == ("t2", "r1", 1)
+
+    assert conversations.mark_read(mongo_db, "beto", "ana", KEY, "t3", "r3") is True
+    assert summary(mongo_db, "beto", "ana")["unread_count"] == 0
+
+
+def test_mark_read_keeps_a_concurrent_increment(mongo_db, send):
+    send("ana", "beto", "t1")
+    send("ana", "beto", "t2")
+    # El DM de t3 llegó mientras beto leía hasta t2: solo sumó su $inc
+    send("ana", "beto", "t3")
+
+    conversations.mark_read(mongo_db, "beto", "ana", KEY, "t2", "r1")
+
+    assert summary(mongo_db, "beto", "ana")["unread_count"] == 1
+
+
+def test_mark_read_ignores_messages_already_read_by_flag(mongo_db, send):
+    send("ana", "beto", "t1")
+    send("ana", "beto", "t2")
+    mongo_db["dms"].update_one({"created_at": "t1"}, {"$set": {"read": True}})
+    mongo_db[CONVERSATIONS_COLLECTION].update_one({"owner": "beto"}, {"$set": {"unread_count": 1}})
+
+    conversations.mark_read(mongo_db, "beto", "ana", KEY, "t2", "r1")
+
+    assert summary(mongo_db, "beto", "ana")["unread_count"] == 0
+
+
+def test_mark_read_without_summary_creates_the_mark(mongo_db):
+    assert conversations.mark_read(mongo_db, "beto", "ana", KEY, "t5", "r1") is False
+
+    beto = summary(mongo_db, "beto", "ana")
+    assert (beto["last_read_at"], beto["unread_count"], beto["conversation_key"]) == ("t5", 0, KEY)
+
+
+def test_apply_watermarks(mongo_db, send):
+    send("ana", "beto", "t1")
+    send("beto", "ana", "t2")
+    send("ana", "beto", "t3")
+    conversations.mark_read(mongo_db, "beto", "ana", KEY, "t1", "r1")
+
+    watermarks = conversations.get_watermarks(mongo_db, "ana", "beto")
+    messages = list(mongo_db["dms"].find({"conversation_key": KEY}, {"_id": 0}).sort("created_at", 1))
+    conversations.apply_watermarks(messages, watermarks)
+
+    assert [(m["created_at"], m["read"], m.get("read_at")) for m in messages] == [
+        ("t1", True, "r1"),
+        ("t2", False, None),  # ana todavía no leyó
+        ("t3", False, None),
+    ]
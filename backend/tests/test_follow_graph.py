@@ -0,0 +1,104 @@
+"""Grafo de follows en CSR: carga, deltas antes y después de compactar, consultas de 2 saltos"""
+
+import random
+
+import pytest
+
+from app import follow_graph
+from app.follow_graph import FollowGraph, apply_events
+
+EDGES = [
+    ("ana", "beto"), ("ana", "caro"),
+    ("beto", "dani"), ("beto", "eli"),
+    ("caro", "dani"), ("caro", "ana"),
+    ("dani", "eli"), ("eli", "beto"),
+]
+
+
+@pytest.fixture
+def graph():
+    g = FollowGraph()
+    g.load_edges(EDGES)
+    return g
+
+
+def edges_of(g, users):
+    return {(u, v) for u in users for v in g.following(u)}
+
+
+def test_load_edges(graph):
+    assert graph.following("ana") == ["beto", "caro"]
+    assert sorted(graph.followers("dani")) == ["beto", "caro"]
+    assert graph.following("nadie") == [] and graph.followers("nadie") == []
+    assert graph.stats()["edges"] == len(EDGES)
+
+
+def test_load_edges_drops_self_follows_and_repeats():
+    g = FollowGraph()
+    g.load_edges([("ana", "beto"), ("ana", "beto"), ("ana", "ana"), ("beto", None)])
+
+    assert g.following("ana") == ["beto"]
+    assert g.stats()["edges"] == 1
+
+
+def test_apply_follow_and_unfollow(graph):
+    graph.apply("dani", "ana")
+    graph.apply("ana", "beto", followed=False)
+    graph.apply("fede", "ana")  # usuario nuevo, sin fila en el CSR
+
+    assert graph.following("ana") == ["caro"]
+    assert sorted(graph.followers("ana")) == ["caro", "dani", "fede"]
+    assert graph.followers("beto") == ["eli"]
+    assert graph.follower_counts(["ana", "fede", "nadie"]) == {"ana": 3, "fede": 0, "nadie": 0}
+    assert graph.stats()["pending_rows"] > 0
+
+
+def test_compaction_keeps_the_same_answers(graph, monkeypatch):
+    monkeypatch.setattr(follow_graph, "FOLLOW_GRAPH_COMPACT_ROWS", 4)
+    rng = random.Random(7)
+    users = ["ana", "beto", "caro", "dani", "eli", "fede", "gabi"]
+    expected = set(EDGES)
+    compactions = 0
+    for _ in range(200):
+        u, v = rng.sample(users, 2)
+        followed = rng.random() < 0.6
+        graph.apply(u, v, followed)
+        (expected.add if followed else expected.discard)((u, v))
+        compactions += graph.stats()["pending_rows"] == 0
+
+        assert edges_of(graph, users) == expected
+    assert compactions > 0
+    for user in users:
+        assert sorted(graph.followers(user)) == sorted(a for a, b in expected if b == user)
+    assert graph.stats()["edges"] == len(expected)
+
+
+def test_mutual_counts_and_suggest(graph):
+    # ana → beto → {dani, eli}; ana → caro → {dani, ana}
+    assert graph.mutual_counts("ana") == {"dani": 2, "eli": 1}
+
+    suggestions = graph.suggest("ana", 5)
+    assert [s["username"] for s in suggestions] == ["dani", "eli"]
+    dani = suggestions[0]
+    assert (dani["mutual_connections"], dani["followers_count"]) == (2, 2)
+    assert dani["score"] == 2 * follow_graph.MUTUAL_WEIGHT + 2 * follow_graph.FOLLOWERS_WEIGHT
+    assert graph.suggest("nadie", 5) == []
+
+
+def test_suggest_sees_pending_deltas_and_excludes_followed(graph):
+    graph.apply("ana", "dani")
+    graph.apply("dani", "fede")
+
+    assert [s["username"] for s in graph.suggest("ana", 5)] == ["eli", "fede"]
+    assert [s["username"] for s in graph.suggest("ana", 1)] == ["eli"]
+
+
+def test_apply_events_from_the_stream(graph):
+    entries = [
+        (b"1-0", {b"follower": b"eli", b"following": b"ana", b"op": b"follow"}),
+        (b"2-0", {b"follower": b"ana", b"following": b"caro", b"op": b"unfollow"}),
+    ]
+
+    assert apply_events(graph, entries) == "2-0"
+    assert graph.following("ana") == ["beto"]
+    assert sorted(graph.followers("ana")) == ["caro", "eli"]
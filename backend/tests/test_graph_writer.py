@@ -0,0 +1,198 @@
+"""GraphWriter: lotes UNWIND por tipo, orden con inversas, filas repetidas, reintento y timeouts"""
+
+import asyncio
+import threading
+from concurrent.futures import TimeoutError as FutureTimeout
+from types import SimpleNamespace
+
+import pytest
+from neo4j.exceptions import ServiceUnavailable
+
+from app import graph_writer
+from app.graph_writer import GraphWriter, GraphWriteTimeout, WRITES
+
+
+class FakeNeo4j:
+    """
+    Driver que anota cada (kind, filas) y devuelve `result` por fila como el
+    Cypher real (`row._i AS i`). `fail` decide qué error lanzar para un lote.
+    """
+
+    def __init__(self, fail=None, gate=None):
+        self.calls = []
+        self.fail = fail
+        self.gate = gate
+        self.started = threading.Event()
+
+    def session(self, *args, **kwargs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, cypher, rows):
+        kind = next(k for k, w in WRITES.items() if w.cypher == cypher)
+        self.calls.append((kind, [dict(row) for row in rows]))
+        self.started.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        error = self.fail(kind, rows) if self.fail else None
+        if error is not None:
+            raise error
+        if "RETURN" not in cypher:
+            return []
+        return [{"i": row["_i"], "result": True if kind == "follow" else 1} for row in rows]
+
+
+def follow(user, target):
+    return {"user_id": user, "username": user, "target_id": target, "target_username": target, "now": "t"}
+
+
+def unfollow(user, target):
+    return {"user_id": user, "target_id": target}
+
+
+def make_writer(driver, **kwargs):
+    return GraphWriter(SimpleNamespace(neo4j_driver=driver), **kwargs)
+
+
+def test_flush_writes_one_unwind_per_kind():
+    driver = FakeNeo4j()
+    writer = make_writer(driver, batch_size=100)
+    futures = [writer.submit("follow", follow("a", t)) for t in ("b", "c", "d")]
+    futures.append(writer.submit("user", {"id": "a", "username": "a", "email": None, "name": None, "bio": None}))
+    writer.flush()
+
+    assert [(kind, len(rows)) for kind, rows in driver.calls] == [("follow", 3), ("user", 1)]
+    assert [f.result() for f in futures] == [True, True, True, None]
+    assert writer.stats()["batches"] == 2
+    assert writer.stats()["rows"] == 4
+
+
+def test_batches_never_exceed_batch_size():
+    driver = FakeNeo4j()
+    writer = make_writer(driver, batch_size=2)
+    for target in "bcdef":
+        writer.submit("follow", follow("a", target))
+    writer.flush()
+
+    assert [len(rows) for _, rows in driver.calls] == [2, 2, 1]
+
+
+def test_inverse_writes_keep_arrival_order():
+    driver = FakeNeo4j()
+    writer = make_writer(driver, batch_size=100)
+    writer.submit("follow", follow("a", "b"))
+    writer.submit("unfollow", unfollow("a", "b"))
+    writer.submit("follow", follow("a", "b"))
+    writer.flush()
+
+    assert [kind for kind, _ in driver.calls] == ["follow", "unfollow", "follow"]
+
+
+def test_repeated_rows_are_written_once():
+    driver = FakeNeo4j()
+    writer = make_writer(driver, batch_size=100)
+    first = writer.submit("follow", follow("a", "b"))
+    copy = writer.submit("follow", follow("a", "b"))
+    writer.flush()
+
+    assert len(driver.calls[0][1]) == 1
+    # Como dos MERGE seguidos: solo el primero crea la relación
+    assert first.result() is True
+    assert copy.result() is WRITES["follow"].default
+
+
+def test_failed_batch_is_retried_row_by_row():
+    def fail(kind, rows):
+        if any(row["target_id"] == "bad" for row in rows):
+            return ValueError("dato inválido")
+
+    driver = FakeNeo4j(fail=fail)
+    writer = make_writer(driver, batch_size=100)
+    good = writer.submit("follow", follow("a", "b"))
+    bad = writer.submit("follow", follow("a", "bad"))
+    other = writer.submit("follow", follow("a", "c"))
+    writer.flush()
+
+    assert [len(rows) for _, rows in driver.calls] == [3, 1, 1, 1]
+    assert good.result() is True and other.result() is True
+    with pytest.raises(ValueError):
+        bad.result()
+    assert writer.stats()["errors"] == 1
+
+
+def test_service_unavailable_fails_the_batch_without_retry():
+    driver = FakeNeo4j(fail=lambda kind, rows: ServiceUnavailable("caído"))
+    writer = make_writer(driver, batch_size=100)
+    futures = [writer.submit("follow", follow("a", t)) for t in "bc"]
+    writer.flush()
+
+    assert len(driver.calls) == 1
+    for future in futures:
+        with pytest.raises(ServiceUnavailable):
+            future.result()
+
+
+def test_write_without_thread_applies_immediately():
+    driver = FakeNeo4j()
+    writer = make_writer(driver)
+
+    assert writer.write("unfollow", unfollow("a", "b")) == 1
+    assert len(driver.calls) == 1
+
+
+def test_timeout_cancels_a_row_still_in_the_queue(monkeypatch):
+    monkeypatch.setattr(graph_writer, "GRAPH_WRITER_TIMEOUT_MS", 100)
+    gate = threading.Event()
+    driver = FakeNeo4j(gate=gate)
+    writer = make_writer(driver, batch_size=1, linger_ms=0)
+    writer.start()
+    try:
+        in_flight = writer.submit("follow", follow("a", "b"))
+        assert driver.started.wait(5)
+        # El hilo está bloqueado con el primer lote: esta fila no salió
+        with pytest.raises(FutureTimeout):
+            writer.write("follow", follow("a", "c"))
+        gate.set()
+        assert in_flight.result(timeout=5) is True
+    finally:
+        gate.set()
+        writer.stop()
+
+    assert [rows[0]["target_id"] for _, rows in driver.calls] == ["b"]
+
+
+def test_timeout_of_a_row_in_flight_raises_graph_write_timeout(monkeypatch):
+    monkeypatch.setattr(graph_writer, "GRAPH_WRITER_TIMEOUT_MS", 100)
+    gate = threading.Event()
+    writer = make_writer(FakeNeo4j(gate=gate), linger_ms=0)
+    writer.start()
+    try:
+        # La fila ya viaja a Neo4j: puede quedar escrita, no hay fallback
+        with pytest.raises(GraphWriteTimeout):
+            writer.write("follow", follow("a", "b"))
+    finally:
+        gate.set()
+        writer.stop()
+
+
+def test_write_async_shares_the_queue():
+    driver = FakeNeo4j()
+    writer = make_writer(driver, linger_ms=0)
+    writer.start()
+    try:
+        result = asyncio.run(writer.write_async("unfollow", unfollow("a", "b")))
+    finally:
+        writer.stop()
+
+    assert result == 1
+    assert driver.calls == [("unfollow", [{**unfollow("a", "b"), "_i": 0}])]
+
+
+def test_unknown_kind_is_rejected():
+    with pytest.raises(ValueError):
+        make_writer(FakeNeo4j()).submit("retweet", {})
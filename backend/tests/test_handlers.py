@@ -0,0 +1,53 @@
+"""Lógica de request compartida por main.py y async_api.py (sin I/O)"""
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from app import handlers, timelines
+from app.pagination import encode_cursor
+from app.schemas import FeedMode
+
+
+def test_follow_ids_from_one_query():
+    ana, beto = ObjectId(), ObjectId()
+    docs = [{"_id": beto, "username": "beto"}, {"_id": ana, "username": "ana"}]
+
+    assert handlers.follow_ids(docs, "ana", "beto") == (str(ana), str(beto))
+
+    with pytest.raises(HTTPException) as missing:
+        handlers.follow_ids(docs[:1], "ana", "beto")
+    assert (missing.value.status_code, missing.value.detail) == (404, "Usuario origen no existe")
+
+    with pytest.raises(HTTPException) as self_follow:
+        handlers.check_follow_pair("ana", "ana", followed=False)
+    assert self_follow.value.detail == "No puedes dejar de seguirte a ti mismo"
+
+
+def test_pull_authors_by_mode():
+    following = ["beto", "ana", "caro", "beto"]
+
+    assert handlers.pull_authors("ana", FeedMode.all, following) == ["ana", "beto", "caro"]
+    assert handlers.pull_authors("ana", FeedMode.following_only, following) == ["beto", "caro"]
+    assert handlers.pull_authors("ana", FeedMode.self_only, []) == ["ana"]
+
+
+def test_timeline_cursor_only_for_before_pages_with_follows():
+    post_id = ObjectId()
+    cursor = encode_cursor("2024-05-01T10:00:00", post_id)
+
+    before = handlers.feed_page(cursor, None, 20)
+    assert handlers.timeline_cursor(before, FeedMode.all) == (
+        timelines.post_score("2024-05-01T10:00:00"), str(post_id)
+    )
+    assert handlers.timeline_cursor(before, FeedMode.self_only) is None
+    assert handlers.timeline_cursor(handlers.feed_page(None, cursor, 20), FeedMode.all) is None
+
+
+def test_read_mark_only_moves_forward():
+    messages = [{"created_at": "t1"}, {"created_at": "t3"}, {"created_at": "t2"}]
+
+    assert handlers.read_mark(messages, {}, "ana") == "t3"
+    assert handlers.read_mark(messages, {"ana": {"last_read_at": "t2"}}, "ana") == "t3"
+    assert handlers.read_mark(messages, {"ana": {"last_read_at": "t3"}}, "ana") is None
+    assert handlers.read_mark([], {}, "ana") is None
@@ -0,0 +1,78 @@
+"""Estados de like en lote: un pipeline de Redis y una agregación $in para lo no cargado, que queda cargado"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from app import likes
+
+
+class BrokenRedis:
+    def pipeline(self, *args, **kwargs):
+        raise ConnectionError("Redis caído (test)")
+
+
+@pytest.fixture
+def feed(conns, mongo_db):
+    """p1 cargado en Redis con un like sin volcar; p2 y p3 solo en MongoDB"""
+    mongo_db["likes"].insert_many([
+        {"post_id": "p1", "username": "ana"},
+        {"post_id": "p2", "username": "ana"},
+        {"post_id": "p2", "username": "beto"},
+        {"post_id": "p3", "username": "caro"},
+    ])
+    likes.toggle_like(conns, "p1", "beto", True)
+    return ["p1", "p2", "p3", "p4"]
+
+
+def test_loaded_posts_come_from_redis_in_one_pipeline(conns, feed, monkeypatch):
+    pipelines = []
+    pipeline = conns.redis.pipeline
+    monkeypatch.setattr(conns.redis, "pipeline", lambda **kw: pipelines.append(kw) or pipeline(**kw))
+
+    states = likes.get_like_states(conns, feed, "beto")
+
+    # Lectura + carga de los posts que faltaban (p2 y p4)
+    assert len(pipelines) == 2
+    # p1 incluye el like de beto que todavía está solo en Redis
+    assert states == {"p1": (2, True), "p2": (2, True), "p3": (1, False), "p4": (0, False)}
+
+
+def test_missing_posts_are_loaded_after_the_aggregation(conns, feed, redis_client, monkeypatch):
+    likes.get_like_states(conns, feed, "ana")
+
+    assert redis_client.smembers(likes.likes_users_key("p2")) == {b"ana", b"beto"}
+    assert redis_client.get(likes.likes_count_key("p4")) == b"0"
+    assert all(redis_client.exists(likes.likes_ready_key(p)) for p in feed)
+
+    # La segunda lectura sale toda de Redis
+    monkeypatch.setattr(conns, "mongo_db", None)
+    pipelines = []
+    pipeline = conns.redis.pipeline
+    monkeypatch.setattr(conns.redis, "pipeline", lambda **kw: pipelines.append(kw) or pipeline(**kw))
+    assert likes.get_like_states(conns, feed, "ana") == {
+        "p1": (2, True), "p2": (2, True), "p3": (1, False), "p4": (0, False)
+    }
+    assert len(pipelines) == 1
+
+
+def test_without_username_and_with_repeated_ids(conns, feed):
+    states = likes.get_like_states(conns, ["p2", "p1", "p2"])
+
+    assert states == {"p2": (2, False), "p1": (2, False)}
+
+
+def test_broken_redis_falls_back_to_one_mongo_aggregation(conns, feed):
+    broken = SimpleNamespace(redis=BrokenRedis(), mongo_db=conns.mongo_db)
+
+    states = likes.get_like_states(broken, feed, "ana")
+
+    # Sin Redis, p1 es lo que ya llegó a MongoDB
+    assert states == {"p1": (1, True), "p2": (2, True), "p3": (1, False), "p4": (0, False)}
+
+
+def test_matches_single_post_reads(conns, feed):
+    states = likes.get_like_states(conns, feed, "ana")
+
+    for post_id in feed:
+        assert states[post_id] == likes.get_like_state(conns, post_id, "ana")
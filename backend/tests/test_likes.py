@@ -0,0 +1,139 @@
+"""Likes en Redis: toggle Lua atómico, write-behind por stream y reconciliación del respaldo"""
+
+from app import likes, trending
+
+
+def trending_score(r, post_id):
+    return r.zscore(trending.all_key(trending.shard_of(post_id)), post_id)
+
+
+def stream_of(post_id):
+    return likes.likes_stream_key(likes.partition_of(post_id))
+
+
+def mongo_likers(mongo_db, post_id):
+    return sorted(d["username"] for d in mongo_db["likes"].find({"post_id": post_id}))
+
+
+def test_toggle_counts_once_per_user(conns, redis_client):
+    assert likes.toggle_like(conns, "p1", "ana", True) == (1, True, True)
+    # Segundo clic: sin cambio, el contador no sube
+    assert likes.toggle_like(conns, "p1", "ana", True) == (1, True, False)
+    assert likes.toggle_like(conns, "p1", "beto", True) == (2, True, True)
+    assert likes.toggle_like(conns, "p1", "ana", False) == (1, False, True)
+    assert likes.toggle_like(conns, "p1", "ana", False) == (1, False, False)
+
+    assert trending_score(redis_client, "p1") == 1
+    # Un evento por cambio real, ninguno por los clics repetidos
+    events = redis_client.xrange(stream_of("p1"))
+    assert [fields[b"op"] for _, fields in events] == [b"like", b"like", b"unlike"]
+
+
+def test_first_touch_loads_existing_likes_from_mongo(conns, mongo_db):
+    mongo_db["likes"].insert_many([{"post_id": "p1", "username": u} for u in ("ana", "beto")])
+
+    assert likes.toggle_like(conns, "p1", "caro", True) == (3, True, True)
+    assert likes.toggle_like(conns, "p1", "ana", True) == (3, True, False)
+    assert likes.get_like_state(conns, "p1", "beto") == (3, True)
+
+
+def test_flush_applies_last_event_per_user_and_acks(conns, redis_client, mongo_db):
+    likes.toggle_like(conns, "p1", "ana", True)
+    likes.toggle_like(conns, "p1", "beto", True)
+    likes.toggle_like(conns, "p1", "ana", False)
+    likes.toggle_like(conns, "p1", "ana", True)
+
+    assert likes.flush_once(conns, "test") == 4
+    assert mongo_likers(mongo_db, "p1") == ["ana", "beto"]
+    # XACK + XDEL: no queda nada pendiente ni en el stream
+    assert redis_client.xlen(stream_of("p1")) == 0
+    assert redis_client.xpending(stream_of("p1"), likes.LIKES_GROUP)["pending"] == 0
+    assert likes.flush_once(conns, "test") == 0
+
+
+def test_new_owner_applies_a_dead_flusher_batch_before_newer_events(conns, redis_client, mongo_db):
+    stream = stream_of("p1")
+    likes.toggle_like(conns, "p1", "ana", True)
+    likes.hold_partitions(redis_client, "caido")
+    # El flusher caído leyó el like y murió antes del XACK; su lease venció
+    likes._read_new(redis_client, [stream], "caido", None)
+    likes.release_partitions(redis_client, "caido")
+    likes.toggle_like(conns, "p1", "ana", False)
+
+    # Primero el lote pendiente (like), después lo nuevo (unlike)
+    assert likes.flush_once(conns, "test") == 1
+    assert mongo_likers(mongo_db, "p1") == ["ana"]
+    assert likes.flush_once(conns, "test") == 1
+    assert mongo_likers(mongo_db, "p1") == []
+
+
+def test_a_partition_is_flushed_only_by_its_owner(conns, redis_client, mongo_db, monkeypatch):
+    monkeypatch.setattr(likes, "LIKES_PARTITIONS", 1)
+    likes.toggle_like(conns, "p1", "ana", True)
+
+    assert likes.hold_partitions(redis_client, "w1") == [0]
+    assert likes.flush_once(conns, "w2") == 0
+    assert mongo_likers(mongo_db, "p1") == []
+    assert likes.flush_once(conns, "w1") == 1
+
+
+def test_workers_split_the_partitions(redis_client, monkeypatch):
+    monkeypatch.setattr(likes, "LIKES_PARTITIONS", 4)
+
+    assert len(likes.hold_partitions(redis_client, "w1")) == 4
+    # w2 llegó: w1 se queda con su mitad y suelta el resto
+    assert likes.hold_partitions(redis_client, "w2") == []
+    first = likes.hold_partitions(redis_client, "w1")
+    second = likes.hold_partitions(redis_client, "w2")
+    assert len(first) == len(second) == 2
+    assert sorted(first + second) == [0, 1, 2, 3]
+
+
+def test_legacy_stream_is_drained_first(conns, redis_client, mongo_db, monkeypatch):
+    monkeypatch.setattr(likes, "LIKES_PARTITIONS", 1)
+    redis_client.xadd(likes.LIKES_STREAM, {"post_id": "p1", "username": "ana", "op": "like", "ts": "t0"})
+    likes.toggle_like(conns, "p1", "beto", True)
+
+    assert likes.flush_once(conns, "test") == 1
+    assert mongo_likers(mongo_db, "p1") == ["ana"]
+    assert likes.flush_once(conns, "test") == 1
+    assert mongo_likers(mongo_db, "p1") == ["ana", "beto"]
+    assert not redis_client.exists(likes.LIKES_STREAM)
+
+
+def test_flush_replay_is_idempotent(conns, mongo_db):
+    likes.toggle_like(conns, "p1", "ana", True)
+    entries = conns.redis.xrange(stream_of("p1"))
+    operations = likes._to_operations(entries)
+    mongo_db["likes"].bulk_write(operations)
+    mongo_db["likes"].bulk_write(operations)
+
+    assert mongo_likers(mongo_db, "p1") == ["ana"]
+
+
+def test_reconcile_copies_fallback_likes_into_redis(conns, redis_client, mongo_db):
+    likes.toggle_like(conns, "p1", "ana", True)
+    likes.flush_once(conns, "test")
+    # Redis caído: el like de beto y el unlike de ana van solo a MongoDB
+    likes.toggle_like_mongo(conns, "p1", "beto", True)
+    likes.toggle_like_mongo(conns, "p1", "ana", False)
+
+    result = likes.reconcile_fallback(conns)
+
+    assert result == {"posts": 1, "fixed": 1, "deferred": 0}
+    assert likes.get_like_state(conns, "p1", "beto") == (1, True)
+    assert likes.get_like_state(conns, "p1", "ana") == (1, False)
+    assert trending_score(redis_client, "p1") == 1
+    assert mongo_db[likes.LIKES_FALLBACK_COLLECTION].count_documents({}) == 0
+
+
+def test_reconcile_keeps_newer_redis_events(conns, mongo_db):
+    likes.toggle_like(conns, "p1", "beto", True)
+    likes.toggle_like_mongo(conns, "p1", "ana", True)
+    # Redis volvió: eventos de ana en el stream (sin aplicar), posteriores al respaldo
+    likes.toggle_like(conns, "p1", "ana", True)
+    likes.toggle_like(conns, "p1", "ana", False)
+
+    likes.reconcile_fallback(conns)
+
+    assert likes.get_like_state(conns, "p1", "ana") == (1, False)
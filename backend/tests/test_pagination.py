@@ -0,0 +1,115 @@
+"""Cursores keyset: ida y vuelta, errores 400 y recorrido sin huecos ni repetidos"""
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from app.pagination import InvalidCursor, Page, decode_cursor, encode_cursor, page_next_cursor
+
+
+@pytest.fixture
+def posts(mongo_db):
+    # Varios posts por segundo: los empates en created_at los desempata _id
+    col = mongo_db["posts"]
+    col.insert_many([
+        {"n": i, "author_username": "ana" if i % 2 else "beto", "created_at": f"2026-01-01T00:00:{i // 3:02d}"}
+        for i in range(20)
+    ])
+    return col
+
+
+def fetch(col, page, base=None):
+    docs = list(col.find(page.query(base or {})).sort(page.sort).limit(page.limit))
+    return page.finish(docs)
+
+
+def walk(col, limit, newest_first, base=None, **kwargs):
+    """Lee todas las páginas siguiendo `before` (feed) o `after` (DMs)"""
+    seen, cursor = [], None
+    direction = "before" if newest_first else "after"
+    while True:
+        cursors = {"before": None, "after": None, direction: cursor}
+        page = Page(limit=limit, newest_first=newest_first, **cursors, **kwargs)
+        docs, cursor = fetch(col, page, base)
+        seen += [d["n"] for d in docs]
+        if cursor is None:
+            return seen
+
+
+def test_cursor_round_trip():
+    doc_id = ObjectId()
+    cursor = encode_cursor("2026-01-01T00:00:00", doc_id)
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == ("2026-01-01T00:00:00", doc_id)
+    assert decode_cursor(encode_cursor(None, doc_id)) == (None, doc_id)
+
+
+@pytest.mark.parametrize("cursor", ["no-es-base64!", encode_cursor("t", "no-es-objectid"), "e30"])
+def test_invalid_cursor(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+    with pytest.raises(HTTPException) as exc:
+        Page(before=cursor, after=None, limit=5, newest_first=True)
+    assert exc.value.status_code == 400
+
+
+def test_before_and_after_together_is_rejected():
+    cursor = encode_cursor("t", ObjectId())
+    with pytest.raises(HTTPException) as exc:
+        Page(before=cursor, after=cursor, limit=5, newest_first=True)
+    assert exc.value.status_code == 400
+
+
+def test_cursor_without_time_is_rejected_when_sorting_by_time():
+    cursor = encode_cursor(None, ObjectId())
+    with pytest.raises(HTTPException):
+        Page(before=cursor, after=None, limit=5, newest_first=True)
+    assert Page(before=cursor, after=None, limit=5, newest_first=True, time_field=None).has_cursor
+
+
+@pytest.mark.parametrize("limit", [1, 3, 7, 20])
+def test_walk_newest_first_with_ties(posts, limit):
+    assert walk(posts, limit, newest_first=True) == list(range(19, -1, -1))
+
+
+@pytest.mark.parametrize("limit", [1, 4, 6])
+def test_walk_oldest_first_with_ties(posts, limit):
+    assert walk(posts, limit, newest_first=False) == list(range(20))
+
+
+def test_walk_with_base_filter_and_id_only_order(posts):
+    base = {"author_username": "ana"}
+
+    assert walk(posts, 3, newest_first=True, base=base) == list(range(19, 0, -2))
+    assert walk(posts, 4, newest_first=True, time_field=None) == list(range(19, -1, -1))
+
+
+def test_after_cursor_shows_newer_items_newest_first(posts):
+    # after=<cursor del n=15>: los inmediatamente más nuevos, mostrados newest-first
+    docs, _ = fetch(posts, Page(before=None, after=None, limit=5, newest_first=True))
+    cursor = encode_cursor(docs[-1]["created_at"], docs[-1]["_id"])
+    newer, next_cursor = fetch(posts, Page(before=None, after=cursor, limit=2, newest_first=True))
+
+    assert [d["n"] for d in newer] == [17, 16]
+    assert next_cursor is not None
+    assert decode_cursor(next_cursor)[1] == newer[0]["_id"]
+
+
+def test_short_page_has_no_next_cursor(posts):
+    _, cursor = fetch(posts, Page(before=None, after=None, limit=25, newest_first=True))
+    assert cursor is None
+
+
+def test_page_next_cursor_accepts_dicts_and_models():
+    class Item:
+        def __init__(self, created_at, id):
+            self.created_at, self.id = created_at, id
+
+    doc_id = ObjectId()
+    items = [{"created_at": "t1", "id": str(ObjectId())}, {"created_at": "t2", "id": str(doc_id)}]
+
+    assert decode_cursor(page_next_cursor(items, 2)) == ("t2", doc_id)
+    assert decode_cursor(page_next_cursor([Item("t3", str(doc_id))], 1)) == ("t3", doc_id)
+    assert page_next_cursor(items, 3) is None
+    assert page_next_cursor([], 3) is None
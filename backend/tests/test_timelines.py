@@ -0,0 +1,139 @@
+"""Timelines materializados: rebuild sin perder posts nuevos y páginas `before` desde Redis"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from app import timelines
+
+
+def ago(seconds=0):
+    return (datetime.utcnow() - timedelta(seconds=seconds)).isoformat()
+
+
+@pytest.fixture
+def following(monkeypatch):
+    monkeypatch.setattr(timelines, "get_following_usernames", lambda conns, username: ["beto"])
+
+
+def timeline(r, username):
+    return [timelines._decode(pid) for pid in r.zrevrange(timelines.timeline_key(username), 0, -1)]
+
+
+def post_during_rebuild(monkeypatch, mongo_db, then=None):
+    """Crear un post de beto justo después de la primera consulta del rebuild"""
+    created = {}
+    query = timelines._timeline_entries
+
+    def first_query_then_post(conns, authors, since=None):
+        entries = query(conns, authors, since)
+        if not created:
+            doc = {"author_username": "beto", "content": "nuevo", "created_at": ago()}
+            created["id"] = str(mongo_db["posts"].insert_one(doc).inserted_id)
+            if then:
+                then(created["id"], doc)
+        return entries
+
+    monkeypatch.setattr(timelines, "_timeline_entries", first_query_then_post)
+    return created
+
+
+def test_rebuild_builds_from_mongo(conns, redis_client, mongo_db, following):
+    old = mongo_db["posts"].insert_one({"author_username": "beto", "created_at": ago(60)}).inserted_id
+    mongo_db["posts"].insert_one({"author_username": "caro", "created_at": ago(30)})
+
+    assert timelines.rebuild_timeline(conns, "ana") == 1
+    assert timeline(redis_client, "ana") == [str(old)]
+    assert redis_client.exists(timelines.timeline_ready_key("ana"))
+
+
+def test_post_created_before_the_first_build_is_not_lost(conns, redis_client, mongo_db, following, monkeypatch):
+    old = mongo_db["posts"].insert_one({"author_username": "beto", "created_at": ago(60)}).inserted_id
+    # El fan-out de este post se salta: el timeline todavía no tiene marca
+    created = post_during_rebuild(monkeypatch, mongo_db)
+
+    assert timelines.rebuild_timeline(conns, "ana") == 2
+    assert timeline(redis_client, "ana") == [created["id"], str(old)]
+
+
+def test_admin_rebuild_keeps_a_post_fanned_out_meanwhile(conns, redis_client, mongo_db, following, monkeypatch):
+    timelines.rebuild_timeline(conns, "ana")
+
+    def fan_out(post_id, doc):
+        # Llegó por fan-out al timeline (ya construido) antes del DELETE del rebuild
+        redis_client.zadd(timelines.timeline_key("ana"), {post_id: timelines.post_score(doc["created_at"])})
+
+    created = post_during_rebuild(monkeypatch, mongo_db, then=fan_out)
+    timelines.rebuild_timeline(conns, "ana")
+
+    assert timeline(redis_client, "ana") == [created["id"]]
+
+
+def post(mongo_db, author, created_at):
+    return str(mongo_db["posts"].insert_one({"author_username": author, "created_at": created_at}).inserted_id)
+
+
+def pull_order(mongo_db, authors):
+    docs = mongo_db["posts"].find({"author_username": {"$in": authors}}).sort([("created_at", -1), ("_id", -1)])
+    return [str(d["_id"]) for d in docs]
+
+
+def scroll(conns, mongo_db, username, limit, include_self=False):
+    """Primera página + páginas `before` hasta que el timeline pida la consulta directa"""
+    ids, _ = timelines.read_feed_ids(conns, username, limit, include_self)
+    pages = [ids]
+    while True:
+        created_at = mongo_db["posts"].find_one({"_id": ObjectId(pages[-1][-1])})["created_at"]
+        page = timelines.read_feed_ids_before(
+            conns, username, limit, include_self, (timelines.post_score(created_at), pages[-1][-1])
+        )
+        if page is None:
+            return pages
+        pages.append(page[0])
+
+
+def test_before_pages_follow_the_pull_order(conns, mongo_db, following):
+    tie = ago(100)
+    for seconds in (10, 20, 30, 40):
+        post(mongo_db, "beto", ago(seconds))
+    for _ in range(3):
+        post(mongo_db, "beto", tie)
+
+    pages = scroll(conns, mongo_db, "ana", 2)
+
+    # 7 posts: tres páginas llenas; la cuarta (corta) ya es de la consulta directa
+    assert len(pages) == 3
+    assert sum(pages, []) == pull_order(mongo_db, ["beto"])[:6]
+
+
+def test_before_pages_merge_celebrities_and_own_posts(conns, redis_client, mongo_db, monkeypatch):
+    monkeypatch.setattr(timelines, "get_following_usernames", lambda conns, username: ["beto", "caro"])
+    redis_client.sadd(timelines.CELEBRITIES_KEY, "caro")
+    for i in range(12):
+        post(mongo_db, ["beto", "caro", "ana"][i % 3], ago(10 * i + 1))
+
+    pages = scroll(conns, mongo_db, "ana", 2, include_self=True)
+
+    # Se sale del timeline cuando a beto (push) le quedan menos de 2 posts
+    assert len(pages) == 4
+    assert sum(pages, []) == pull_order(mongo_db, ["ana", "beto", "caro"])[:8]
+
+
+def test_cursor_past_a_trimmed_author_list_goes_to_pull(conns, redis_client, mongo_db, monkeypatch):
+    monkeypatch.setattr(timelines, "TIMELINE_MAX_LEN", 3)
+    monkeypatch.setattr(timelines, "get_following_usernames", lambda conns, username: ["beto", "caro"])
+    redis_client.sadd(timelines.CELEBRITIES_KEY, "caro")
+    for i in range(6):
+        post(mongo_db, "beto", ago(i + 1))
+        post(mongo_db, "caro", ago(i + 1.5))
+    timelines.read_feed_ids(conns, "ana", 2, False)
+    newest = pull_order(mongo_db, ["beto", "caro"])
+
+    def before(post_id):
+        created_at = mongo_db["posts"].find_one({"_id": ObjectId(post_id)})["created_at"]
+        return timelines.post_score(created_at), post_id
+
+    assert timelines.read_feed_ids_before(conns, "ana", 2, False, before(newest[1]))[0] == newest[2:4]
+    # El timeline y la lista de caro solo guardan 3 posts: lo que sigue lo lee Mongo
+    assert timelines.read_feed_ids_before(conns, "ana", 2, False, before(newest[3])) is None
@@ -0,0 +1,30 @@
+"""Trending sin Redis: agregación de `likes` en MongoDB por ventana"""
+
+from datetime import datetime, timedelta
+
+from app import trending
+
+
+def ago(**delta):
+    return (datetime.utcnow() - timedelta(**delta)).isoformat()
+
+
+def like(mongo_db, post_id, username, created_at):
+    mongo_db["likes"].insert_one({"post_id": post_id, "username": username, "created_at": created_at})
+
+
+def test_all_window_falls_back_to_every_like(mongo_db):
+    for user in ("ana", "beto", "caro"):
+        like(mongo_db, "viejo", user, ago(days=30))
+    like(mongo_db, "nuevo", "ana", ago(minutes=5))
+
+    assert trending.top_posts_mongo(mongo_db, trending.WINDOW_ALL, 10) == [("viejo", 3.0), ("nuevo", 1.0)]
+    assert trending.top_posts_mongo(mongo_db, trending.WINDOW_ALL, 1) == [("viejo", 3.0)]
+
+
+def test_time_window_only_counts_recent_likes(mongo_db):
+    for user in ("ana", "beto", "caro"):
+        like(mongo_db, "viejo", user, ago(days=30))
+    like(mongo_db, "nuevo", "ana", ago(minutes=5))
+
+    assert trending.top_posts_mongo(mongo_db, "24h", 10) == [("nuevo", 1.0)]
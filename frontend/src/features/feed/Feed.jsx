@@ -7,6 +7,7 @@ import { useDispatch, useSelector } from "react-redux";
 import { fetchFeed, setMode, clearFeed, clearError } from "./feedSlice";
 import PostCard from "../posts/PostCard";
 import Loader from "../../components/Loader";
+import { subscribeEvents } from "../../services/events";
 import { FiGrid, FiUsers, FiUser, FiAlertCircle } from "react-icons/fi";
 
 const Feed = () => {
@@ -32,6 +33,14 @@ const Feed = () => {
     }
   }, [dispatch, currentUser, mode, posts.length]);
 
+  // Post nuevo de alguien que sigo (o propio): recargar la primera página
+  useEffect(() => {
+    if (!currentUser?.username) return undefined;
+    return subscribeEvents(currentUser.username, "post", () => {
+      dispatch(fetchFeed({ username: currentUser.username, mode }));
+    });
+  }, [dispatch, currentUser, mode]);
+
   const handleModeChange = (newMode) => {
     dispatch(clearFeed());
     dispatch(setMode(newMode));
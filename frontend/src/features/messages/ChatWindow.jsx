@@ -7,6 +7,7 @@ import { useDispatch, useSelector } from 'react-redux';
 import { formatDistanceToNow } from 'date-fns';
 import { es } from 'date-fns/locale';
 import { sendMessage, fetchConversation } from './messagesSlice';
+import { subscribeEvents } from '../../services/events';
 
 const ChatWindow = ({ otherUsername }) => {
   const dispatch = useDispatch();
@@ -25,6 +26,22 @@ const ChatWindow = ({ otherUsername }) => {
     }
   }, [dispatch, currentUser, otherUsername]);
 
+  // Mensajes nuevos por push (SSE) en vez de consultar cada pocos segundos
+  useEffect(() => {
+    if (!currentUser || !otherUsername) return undefined;
+    return subscribeEvents(currentUser.username, 'dm', (event) => {
+      const other = event.sender_username === currentUser.username
+        ? event.receiver_username
+        : event.sender_username;
+      if (other === otherUsername) {
+        dispatch(fetchConversation({
+          username: currentUser.username,
+          otherUsername
+        }));
+      }
+    });
+  }, [dispatch, currentUser, otherUsername]);
+
   useEffect(() => {
     // Scroll to bottom when messages change
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
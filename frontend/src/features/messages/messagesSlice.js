@@ -46,11 +46,11 @@ export const fetchConversations = createAsyncThunk(
  * Backend: GET /dm/{username}/{other}
  * 
  * Flujo:
- * 1. Redis: GET {conv:alice::bob}:messages
+ * 1. Redis: LRANGE {conv:alice::bob}:messages (ventana reciente)
  * 2. Si cache miss:
- *    a. MongoDB: Query messages
- *    b. Redis: SETEX {conv:alice::bob}:messages 300 [messages_json]
- * 3. Retornar
+ *    a. MongoDB: últimos mensajes por índice (del más nuevo al más viejo)
+ *    b. Redis: RPUSH {conv:alice::bob}:messages (TTL 300s)
+ * 3. Retornar (el chat los muestra en orden cronológico)
  */
 export const fetchConversation = createAsyncThunk(
   'messages/fetchConversation',
@@ -72,7 +72,7 @@ export const fetchConversation = createAsyncThunk(
  * Flujo:
  * 1. MongoDB: Insert message
  * 2. Neo4j: MERGE (u)-[:MESSAGED]->(other)
- * 3. Redis: DELETE {conv:alice::bob}:messages (invalidar)
+ * 3. Redis: LPUSHX {conv:alice::bob}:messages (si la ventana está cargada)
  */
 export const sendMessage = createAsyncThunk(
   'messages/sendMessage',
@@ -104,7 +104,8 @@ const messagesSlice = createSlice({
       })
       .addCase(fetchConversation.fulfilled, (state, action) => {
         state.loading = false;
-        state.messages = action.payload;
+        // La API devuelve del más nuevo al más viejo
+        state.messages = [...action.payload].reverse();
       })
       .addCase(sendMessage.fulfilled, (state, action) => {
         state.messages.push(action.payload);
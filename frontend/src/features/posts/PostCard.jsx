@@ -13,7 +13,7 @@ import { postsAPI } from '../../services/api';
 
 const PostCard = ({ post }) => {
   const { currentUser } = useSelector((state) => state.auth);
-  const [liked, setLiked] = useState(false);
+  const [liked, setLiked] = useState(post.user_liked || false);
   const [likesCount, setLikesCount] = useState(post.likes_count || 0);
   const [loading, setLoading] = useState(false);
   
@@ -21,10 +21,11 @@ const PostCard = ({ post }) => {
     ? formatDistanceToNow(new Date(post.created_at), { addSuffix: true, locale: es })
     : '';
 
-  // Cargar estado de like al montar
+  // Cargar estado de like al montar (salvo que el feed ya lo haya traído)
   useEffect(() => {
     const fetchLikeStatus = async () => {
       if (!currentUser || !post.id) return;
+      if (post.user_liked !== undefined && post.user_liked !== null) return;
       
       try {
         const response = await postsAPI.getPostLikes(post.id, currentUser.username);
@@ -36,7 +37,7 @@ const PostCard = ({ post }) => {
     };
     
     fetchLikeStatus();
-  }, [post.id, currentUser]);
+  }, [post.id, post.user_liked, currentUser]);
 
   const handleLike = async () => {
     if (!currentUser || !post.id || loading) return;
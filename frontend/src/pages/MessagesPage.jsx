@@ -14,6 +14,7 @@ import ConversationList from '../features/messages/ConversationList';
 import ChatWindow from '../features/messages/ChatWindow';
 import { fetchConversations, setCurrentConversation } from '../features/messages/messagesSlice';
 import { usersAPI } from '../services/api';
+import { subscribeEvents } from '../services/events';
 
 const MessagesPage = () => {
   const dispatch = useDispatch();
@@ -31,6 +32,14 @@ const MessagesPage = () => {
     }
   }, [dispatch, currentUser]);
 
+  // Un DM nuevo (enviado o recibido) reordena la lista y cambia los no leídos
+  useEffect(() => {
+    if (!currentUser?.username) return undefined;
+    return subscribeEvents(currentUser.username, 'dm', () => {
+      dispatch(fetchConversations(currentUser.username));
+    });
+  }, [dispatch, currentUser]);
+
   const handleSelectConversation = (username) => {
     setSelectedUser(username);
     dispatch(setCurrentConversation(username));
@@ -18,7 +18,7 @@ const TrendingPage = () => {
     const fetchTrending = async () => {
       setLoading(true);
       try {
-        const response = await postsAPI.getTrendingPosts(10);
+        const response = await postsAPI.getTrendingPosts(10, "24h");
         setPosts(response.data);
         console.log('📈 Trending posts loaded:', response.data.length);
       } catch (error) {
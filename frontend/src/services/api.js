@@ -6,7 +6,7 @@
 import axios from "axios";
 
 // Usar variable de entorno con fallback
-const API_BASE_URL =
+export const API_BASE_URL =
   process.env.REACT_APP_BACKEND_URL ||
   "https://socialfastapi.preview.emergentagent.com";
 
@@ -83,8 +83,9 @@ export const postsAPI = {
   createPost: (postData) => api.post("/api/posts/", postData),
 
   // Obtener feed: GET /api/users/{username}/feed
+  // with_likes: cada post trae likes_count y user_liked (evita un request por post)
   getFeed: (username, mode = "all", limit = 20) =>
-    api.get(`/api/users/${username}/feed`, { params: { mode, limit } }),
+    api.get(`/api/users/${username}/feed`, { params: { mode, limit, with_likes: true } }),
 
   // Like/Unlike post
   likePost: (postId, username) =>
@@ -96,16 +97,24 @@ export const postsAPI = {
   getPostLikes: (postId, username = null) =>
     api.get(`/api/posts/${postId}/likes`, { params: { username } }),
 
+  // Likes de varios posts en un solo request
+  getPostsLikesBatch: (postIds, username = null) =>
+    api.post("/api/posts/likes:batch", { post_ids: postIds, username }),
+
   // Trending posts
-  getTrendingPosts: (limit = 10) =>
-    api.get("/api/trending/posts", { params: { limit } }),
+  // window: "1h" | "24h" | "7d" | "all"
+  getTrendingPosts: (limit = 10, window = "all") =>
+    api.get("/api/trending/posts", { params: { limit, window } }),
 };
 
 // ========== DMS API ==========
 export const dmsAPI = {
   sendDM: (dmData) => api.post("/api/dm/send", dmData),
-  getConversation: (username, otherUsername, limit = 50) =>
-    api.get(`/api/dm/${username}/${otherUsername}`, { params: { limit } }),
+  // Del más nuevo al más viejo; `before` (X-Next-Cursor) trae los anteriores
+  getConversation: (username, otherUsername, limit = 50, before = null) =>
+    api.get(`/api/dm/${username}/${otherUsername}`, {
+      params: before ? { limit, before } : { limit },
+    }),
   listConversations: (username) => api.get(`/api/dm/conversations/${username}`),
 };
 
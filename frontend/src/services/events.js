@@ -0,0 +1,55 @@
+/**
+ * Eventos en tiempo real (Server-Sent Events)
+ *
+ * Backend: GET /api/events/{username}
+ *
+ * Una sola conexión EventSource por usuario, compartida por todas las vistas
+ * (chat, lista de conversaciones, feed). El servidor manda avisos chicos:
+ * - "dm":   { id, sender_username, receiver_username, created_at }
+ * - "post": { id, author_username, created_at }
+ * y cada vista vuelve a pedir su primera página (sale de Redis).
+ * EventSource reconecta solo si se corta la conexión.
+ */
+
+import { API_BASE_URL } from "./api";
+
+let source = null;
+let sourceUser = null;
+const listeners = { dm: new Set(), post: new Set() };
+
+const open = (username) => {
+  if (source && sourceUser === username) return;
+  if (source) source.close();
+
+  source = new EventSource(`${API_BASE_URL}/api/events/${username}`);
+  sourceUser = username;
+
+  Object.keys(listeners).forEach((type) => {
+    source.addEventListener(type, (e) => {
+      const event = JSON.parse(e.data);
+      listeners[type].forEach((handler) => handler(event));
+    });
+  });
+};
+
+const closeIfIdle = () => {
+  const active = Object.values(listeners).some((set) => set.size > 0);
+  if (!active && source) {
+    source.close();
+    source = null;
+    sourceUser = null;
+  }
+};
+
+/**
+ * Suscribirse a un tipo de evento ("dm" | "post").
+ * Devuelve la función para desuscribirse (para el cleanup de useEffect).
+ */
+export const subscribeEvents = (username, type, handler) => {
+  open(username);
+  listeners[type].add(handler);
+  return () => {
+    listeners[type].delete(handler);
+    closeIfIdle();
+  };
+};
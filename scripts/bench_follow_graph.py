@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Benchmark del grafo de follows en memoria (app/follow_graph.py)
+
+Dos partes:
+
+- Sintético: arma un grafo de `--users` usuarios que siguen a `--degree`
+  usuarios cada uno (destinos con sesgo tipo Zipf: pocos muy seguidos) y mide
+  carga, memoria y latencia p50/p99 en µs de following, followers,
+  follower_counts, mutual_counts (2 saltos) y suggest.
+- Neo4j (si se pasa --neo4j-uri): carga el grafo real con la misma consulta
+  que FollowGraphSync y compara, para `--samples` usuarios, la consulta Cypher
+  de get_suggestions con FollowGraph.suggest (mismo orden salvo posts_count).
+
+Uso (requiere numpy):
+    python scripts/bench_follow_graph.py
+    python scripts/bench_follow_graph.py --users 200000 --degree 50
+    python scripts/bench_follow_graph.py --neo4j-uri bolt://localhost:7687 --neo4j-password password123
+
+Solo lee; no escribe en ninguna base.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+from app.follow_graph import FollowGraph  # noqa: E402
+
+# La consulta de get_suggestions, por username en vez de id
+SUGGESTIONS_CYPHER = """
+MATCH (u:User {username: $username})-[:FOLLOWS]->(:User)-[:FOLLOWS]->(s:User)
+WHERE s.username <> $username
+  AND NOT (u)-[:FOLLOWS]->(s)
+WITH u, s, COUNT(*) AS mutual_connections
+WITH s, mutual_connections,
+     coalesce(s.followers_count, 0) AS followers_count,
+     coalesce(s.posts_count, 0) AS posts_count
+RETURN s.username AS username,
+       (mutual_connections * 3.0 + followers_count * 2.0 + posts_count * 1.0) AS score
+ORDER BY score DESC, username ASC
+LIMIT $limit
+"""
+
+
+def user_name(i: int) -> str:
+    return f"user{i}"
+
+
+def synthetic_edges(users: int, degree: int, seed: int):
+    rng = np.random.default_rng(seed)
+    src = np.repeat(np.arange(users), degree)
+    # Zipf acotado: los ids bajos concentran followers
+    dst = (rng.zipf(1.3, size=len(src)) - 1) % users
+    names = [user_name(i) for i in range(users)]
+    return [(names[s], names[d]) for s, d in zip(src.tolist(), dst.tolist())]
+
+
+def timed(fn, args_list):
+    """Latencias en µs de fn(*args) para cada args"""
+    latencies = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    latencies.sort()
+    return statistics.median(latencies), latencies[max(int(len(latencies) * 0.99) - 1, 0)]
+
+
+def print_row(name, p50, p99, unit="µs"):
+    print(f"{name:>18} {p50:>10.1f}{unit} {p99:>10.1f}{unit}")
+
+
+def bench_synthetic(opts):
+    print(f"Sintético: {opts.users} usuarios x {opts.degree} follows")
+    edges = synthetic_edges(opts.users, opts.degree, opts.seed)
+    graph = FollowGraph()
+    start = time.perf_counter()
+    graph.load_edges(edges)
+    load_s = time.perf_counter() - start
+    stats = graph.stats()
+    print(f"carga {load_s:.2f}s, {stats['edges']} aristas, {stats['bytes'] / 1e6:.1f} MB")
+
+    rng = random.Random(opts.seed)
+    sample = [user_name(rng.randrange(opts.users)) for _ in range(opts.rounds)]
+    batches = [[user_name(rng.randrange(opts.users)) for _ in range(opts.limit)] for _ in range(opts.rounds)]
+    print(f"{'operación':>18} {'p50':>12} {'p99':>12}")
+    print_row("following", *timed(graph.following, [(u,) for u in sample]))
+    print_row("followers", *timed(graph.followers, [(u,) for u in sample]))
+    print_row("follower_counts", *timed(graph.follower_counts, [(b,) for b in batches]))
+    print_row("mutual_counts", *timed(graph.mutual_counts, [(u,) for u in sample]))
+    print_row("suggest", *timed(graph.suggest, [(u, opts.limit) for u in sample]))
+
+    # Deltas: follows nuevos sobre el CSR (filas modificadas + compactación)
+    deltas = [(user_name(rng.randrange(opts.users)), user_name(rng.randrange(opts.users))) for _ in range(opts.rounds)]
+    print_row("apply (follow)", *timed(graph.apply, deltas))
+
+
+def bench_neo4j(opts):
+    from neo4j import GraphDatabase
+
+    driver = GraphDatabase.driver(opts.neo4j_uri, auth=(opts.neo4j_user, opts.neo4j_password))
+    with driver.session() as session:
+        start = time.perf_counter()
+        edges = [
+            (record["follower"], record["following"])
+            for record in session.run(
+                "MATCH (a:User)-[:FOLLOWS]->(b:User) RETURN a.username AS follower, b.username AS following"
+            )
+        ]
+        read_s = time.perf_counter() - start
+
+        graph = FollowGraph()
+        start = time.perf_counter()
+        graph.load_edges(edges)
+        build_s = time.perf_counter() - start
+        print(f"\nNeo4j: {len(edges)} follows leídos en {read_s:.2f}s, CSR armado en {build_s:.2f}s")
+
+        followers = sorted({follower for follower, _ in edges if follower})
+        if not followers:
+            print("Sin follows en Neo4j: nada que comparar")
+            driver.close()
+            return
+        rng = random.Random(opts.seed)
+        sample = [rng.choice(followers) for _ in range(opts.samples)]
+
+        cypher_ms, graph_us, same_top = [], [], 0
+        for username in sample:
+            start = time.perf_counter()
+            cypher = [r["username"] for r in session.run(SUGGESTIONS_CYPHER, username=username, limit=opts.limit)]
+            cypher_ms.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            ranked = [item["username"] for item in graph.suggest(username, opts.limit)]
+            graph_us.append((time.perf_counter() - start) * 1e6)
+            same_top += set(cypher) == set(ranked)
+    driver.close()
+
+    cypher_ms.sort()
+    graph_us.sort()
+    p99 = max(int(len(sample) * 0.99) - 1, 0)
+    print(f"{'sugerencias':>18} {'p50':>12} {'p99':>12}")
+    print_row("Cypher", statistics.median(cypher_ms), cypher_ms[p99], unit="ms")
+    print_row("FollowGraph", statistics.median(graph_us), graph_us[p99])
+    # Difieren solo si posts_count cambia el top (el grafo no tiene posts)
+    print(f"mismo top-{opts.limit}: {same_top}/{len(sample)} usuarios")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del grafo de follows en memoria")
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--degree", type=int, default=30, help="Follows por usuario")
+    parser.add_argument("--rounds", type=int, default=2000, help="Consultas por operación")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--neo4j-uri", default=None, help="Comparar contra la consulta Cypher")
+    parser.add_argument("--neo4j-user", default=os.getenv("NEO4J_USER", "neo4j"))
+    parser.add_argument("--neo4j-password", default=os.getenv("NEO4J_PASSWORD", "password123"))
+    parser.add_argument("--samples", type=int, default=200, help="Usuarios para la comparación con Neo4j")
+    opts = parser.parse_args()
+
+    bench_synthetic(opts)
+    if opts.neo4j_uri:
+        bench_neo4j(opts)
+
+
+if __name__ == "__main__":
+    main()
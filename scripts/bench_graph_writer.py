@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Benchmark de escrituras a Neo4j: una por llamada vs lotes UNWIND (app/graph_writer.py)
+
+Escribe la misma carga sintética (`--users` nodos :User, `--follows` follows
+por usuario y `--posts` posts por usuario) de varias formas y reporta
+filas/s:
+
+- per-call   una sesión y una transacción por fila (lo que hacían los
+             endpoints antes de GraphWriter)
+- bulk       GraphWriter sin hilo con lotes de `--batch-size` (herramientas
+             de carga masiva)
+
+Y con `--threads` hilos que simulan requests concurrentes (cada uno espera
+su escritura, como un endpoint), follows con latencia p50/p99:
+
+- requests per-call   cada hilo escribe su fila directo
+- requests batched    los hilos comparten un GraphWriter con hilo
+                      (micro-batching)
+
+Uso (requiere un Neo4j de pruebas):
+    python scripts/bench_graph_writer.py --neo4j-uri bolt://localhost:7687
+    python scripts/bench_graph_writer.py --users 20000 --follows 20 --batch-size 2000 --threads 64
+
+Crea nodos con id `bench_gw:*` y los borra al terminar (salvo --keep).
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+from app.graph_writer import GraphWriter  # noqa: E402
+
+PREFIX = "bench_gw:"
+
+
+def workload(phase: str, opts, rng: random.Random):
+    """Filas (kind, row) de una fase; ids distintos por fase para que todo sea nuevo"""
+    def uid(i):
+        return f"{PREFIX}{phase}:u{i}"
+
+    now = datetime.utcnow().isoformat()
+    rows = [("user", {"id": uid(i), "username": f"bench_gw_{phase}_{i}", "email": None, "name": None, "bio": None})
+            for i in range(opts.users)]
+    for i in range(opts.users):
+        for j in range(opts.posts):
+            rows.append(("post", {
+                "user_id": uid(i), "username": f"bench_gw_{phase}_{i}",
+                "post_id": f"{PREFIX}{phase}:p{i}:{j}", "content": "bench", "created_at": now,
+            }))
+    return rows, follow_rows(phase, opts, rng)
+
+
+def follow_rows(phase: str, opts, rng: random.Random):
+    now = datetime.utcnow().isoformat()
+    rows = []
+    for i in range(opts.users):
+        for s in rng.sample(range(opts.users - 1), min(opts.follows, opts.users - 1)):
+            target = s + (s >= i)
+            rows.append(("follow", {
+                "user_id": f"{PREFIX}{phase}:u{i}", "username": f"bench_gw_{phase}_{i}",
+                "target_id": f"{PREFIX}{phase}:u{target}", "target_username": f"bench_gw_{phase}_{target}",
+                "now": now,
+            }))
+    return rows
+
+
+def run_inline(conns, rows, batch_size: int) -> float:
+    writer = GraphWriter(conns, batch_size=batch_size)
+    start = time.perf_counter()
+    for kind, row in rows:
+        writer.submit(kind, row)
+    writer.flush()
+    elapsed = time.perf_counter() - start
+    if writer.errors:
+        print(f"  ⚠️ {writer.errors} filas con error")
+    return elapsed
+
+
+def run_requests(writer, rows, threads: int):
+    """`threads` hilos escriben rows de a una y esperan cada resultado"""
+    latencies = []
+    lock = threading.Lock()
+    chunks = [rows[i::threads] for i in range(threads)]
+
+    def worker(chunk):
+        local = []
+        for kind, row in chunk:
+            start = time.perf_counter()
+            writer.write(kind, row)
+            local.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(local)
+
+    start = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return elapsed, statistics.median(latencies), latencies[max(int(len(latencies) * 0.99) - 1, 0)]
+
+
+def cleanup(driver):
+    with driver.session() as session:
+        for label in ("Post", "User"):
+            while session.run(
+                f"MATCH (n:{label}) WHERE n.id STARTS WITH $prefix "
+                "WITH n LIMIT 10000 DETACH DELETE n RETURN count(*) AS n",
+                prefix=PREFIX,
+            ).single()["n"]:
+                pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de escrituras a Neo4j por llamada vs en lotes")
+    parser.add_argument("--neo4j-uri", default=os.getenv("NEO4J_URI", "bolt://127.0.0.1:7687"))
+    parser.add_argument("--neo4j-user", default=os.getenv("NEO4J_USER", "neo4j"))
+    parser.add_argument("--neo4j-password", default=os.getenv("NEO4J_PASSWORD", "password123"))
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--follows", type=int, default=10, help="Follows por usuario")
+    parser.add_argument("--posts", type=int, default=2, help="Posts por usuario")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--threads", type=int, default=32, help="Requests concurrentes")
+    parser.add_argument("--linger-ms", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--keep", action="store_true", help="No borrar los nodos bench_gw:*")
+    opts = parser.parse_args()
+
+    from neo4j import GraphDatabase
+
+    driver = GraphDatabase.driver(
+        opts.neo4j_uri, auth=(opts.neo4j_user, opts.neo4j_password),
+        max_connection_pool_size=max(opts.threads, 10),
+    )
+    conns = SimpleNamespace(neo4j_driver=driver)
+    rng = random.Random(opts.seed)
+    try:
+        cleanup(driver)
+        print(f"{'modo':>20} {'filas':>9} {'segundos':>9} {'filas/s':>9} {'p50':>9} {'p99':>9}")
+        for phase, batch_size in (("percall", 1), ("bulk", opts.batch_size)):
+            nodes, follows = workload(phase, opts, rng)
+            rows = nodes + follows
+            elapsed = run_inline(conns, rows, batch_size)
+            print(f"{phase:>20} {len(rows):>9} {elapsed:>9.2f} {len(rows) / elapsed:>9.0f}")
+
+        # Requests concurrentes: los usuarios ya existen, se miden los follows
+        for phase in ("requests per-call", "requests batched"):
+            tag = phase.split()[1]
+            nodes, follows = workload(tag, opts, rng)
+            run_inline(conns, nodes, opts.batch_size)
+            if tag == "batched":
+                writer = GraphWriter(conns, batch_size=opts.batch_size, linger_ms=opts.linger_ms)
+                writer.start()
+            else:
+                # Sin hilo y de a una fila: una transacción por request
+                writer = GraphWriter(conns, batch_size=1)
+            elapsed, p50, p99 = run_requests(writer, follows, opts.threads)
+            writer.stop()
+            print(
+                f"{phase:>20} {len(follows):>9} {elapsed:>9.2f} {len(follows) / elapsed:>9.0f} "
+                f"{p50:>7.1f}ms {p99:>7.1f}ms"
+            )
+            if tag == "batched":
+                stats = writer.stats()
+                print(f"{'':>20} {stats['batches']} lotes, {stats['avg_batch']} filas por lote")
+    finally:
+        if not opts.keep:
+            cleanup(driver)
+        driver.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark del job de Personalized PageRank (app/ppr.py)
+
+Para cada tamaño de grafo en `--sizes` arma un grafo sintético (cada usuario
+sigue a `--degree` usuarios con sesgo tipo Zipf, y manda DMs a
+`--messages` usuarios al azar) y mide:
+
+- armado de las matrices dispersas
+- tiempo de PPR + top-K para `--seeds` usuarios con cada cantidad de
+  procesos de `--workers`, y usuarios por segundo
+
+El costo por bloque es PPR_ITERATIONS multiplicaciones de una matriz de
+`aristas` no-ceros por una densa de n × PPR_CHUNK_SIZE: crece con el número
+de aristas y el de usuarios, y se reparte casi lineal entre procesos.
+
+Uso (requiere numpy y scipy):
+    python scripts/bench_ppr.py
+    python scripts/bench_ppr.py --sizes 10000 100000 500000 --degree 30 --workers 1 4 8
+
+No toca ninguna base.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+from app import ppr  # noqa: E402
+
+
+def synthetic_edges(users: int, degree: int, messages: int, seed: int):
+    rng = np.random.default_rng(seed)
+    names = [f"user{i}" for i in range(users)]
+    src = np.repeat(np.arange(users), degree)
+    dst = (rng.zipf(1.3, size=len(src)) - 1) % users
+    follows = [(names[s], names[d]) for s, d in zip(src.tolist(), dst.tolist())]
+    m_src = np.repeat(np.arange(users), messages)
+    m_dst = rng.integers(0, users, size=len(m_src))
+    dms = [(names[s], names[d]) for s, d in zip(m_src.tolist(), m_dst.tolist())]
+    return follows, dms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del recomendador PPR")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 200000], help="Usuarios del grafo")
+    parser.add_argument("--degree", type=int, default=20, help="Follows por usuario")
+    parser.add_argument("--messages", type=int, default=2, help="Usuarios con DMs por usuario")
+    parser.add_argument("--seeds", type=int, default=512, help="Usuarios a los que se les calcula PPR")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--seed", type=int, default=7)
+    opts = parser.parse_args()
+
+    print(f"PPR: alpha={ppr.PPR_ALPHA}, {ppr.PPR_ITERATIONS} iteraciones, "
+          f"bloques de {ppr.PPR_CHUNK_SIZE}, top {ppr.PPR_TOP_K}")
+    print(f"{'usuarios':>9} {'aristas':>10} {'armado':>8} {'procesos':>9} {'PPR':>9} {'usuarios/s':>11}")
+    for size in opts.sizes:
+        follows, dms = synthetic_edges(size, opts.degree, opts.messages, opts.seed)
+        start = time.perf_counter()
+        graph = ppr.build_graph(follows, dms)
+        build_s = time.perf_counter() - start
+
+        rng = np.random.default_rng(opts.seed)
+        seeds = rng.choice(len(graph.names), size=min(opts.seeds, len(graph.names)), replace=False).tolist()
+        for workers in opts.workers:
+            start = time.perf_counter()
+            results = list(ppr.rank(graph, seeds, workers=workers))
+            elapsed = time.perf_counter() - start
+            print(
+                f"{len(graph.names):>9} {graph.edges:>10} {build_s:>7.2f}s {workers:>9} "
+                f"{elapsed:>8.2f}s {len(results) / elapsed:>11.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
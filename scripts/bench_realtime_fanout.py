@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Benchmark de fan-out: polling vs push (SSE sobre Redis pub/sub)
+
+Levanta `--clients` usuarios que esperan DMs de un mismo emisor y mide dos
+fases de `--seconds` cada una contra una API corriendo:
+
+- poll: cada cliente pide GET /dm/{user}/{sender} cada `--interval` segundos
+        (lo que hacía el chat antes)
+- push: cada cliente mantiene abierto GET /events/{user} y solo pide la
+        conversación cuando llega un aviso `dm`
+
+En ambas el emisor manda `--rate` DMs por segundo a clientes al azar.
+Para cada fase reporta requests HTTP/s, operaciones de MongoDB/s (opcounters
+de serverStatus, si se pasa --mongo-uri) y la latencia desde el envío hasta
+que el cliente ve el mensaje.
+
+Con polling la carga crece con clientes / intervalo aunque nadie escriba;
+con push crece con los mensajes enviados.
+
+Uso (requiere httpx):
+    python scripts/bench_realtime_fanout.py --api http://localhost:8000/api
+    python scripts/bench_realtime_fanout.py --clients 2000 --interval 5 --rate 20 \\
+        --mongo-uri mongodb://localhost:27017
+
+Crea usuarios bench_rt_* (se reutilizan entre corridas).
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+import httpx
+
+SENDER = "bench_rt_sender"
+
+
+def client_name(i: int) -> str:
+    return f"bench_rt_{i}"
+
+
+class Phase:
+    def __init__(self):
+        self.requests = 0
+        self.sent = {}          # dm id -> instante de envío
+        self.seen = {}          # dm id -> latencia en segundos
+
+    def saw(self, dm_id: str):
+        sent_at = self.sent.get(dm_id)
+        if sent_at is not None and dm_id not in self.seen:
+            self.seen[dm_id] = time.perf_counter() - sent_at
+
+
+def mongo_ops(mongo_uri):
+    if not mongo_uri:
+        return None
+    from pymongo import MongoClient
+    counters = MongoClient(mongo_uri).admin.command("serverStatus")["opcounters"]
+    return counters["query"] + counters["getmore"] + counters["command"]
+
+
+async def setup_users(http: httpx.AsyncClient, clients: int):
+    names = [SENDER] + [client_name(i) for i in range(clients)]
+    sem = asyncio.Semaphore(50)
+
+    async def create(name):
+        async with sem:
+            # 400 si ya existe: se reutiliza
+            await http.post("/users/", json={"username": name, "email": f"{name}@bench.local"})
+
+    await asyncio.gather(*(create(n) for n in names))
+
+
+async def sender(http: httpx.AsyncClient, phase: Phase, clients: int, rate: float, seconds: float):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        target = client_name(random.randrange(clients))
+        sent_at = time.perf_counter()
+        resp = await http.post(
+            "/dm/send",
+            json={"sender_username": SENDER, "receiver_username": target, "content": "bench"},
+        )
+        if resp.status_code == 200:
+            phase.sent[resp.json()["id"]] = sent_at
+        await asyncio.sleep(1 / rate)
+
+
+async def fetch_conversation(http: httpx.AsyncClient, phase: Phase, name: str):
+    # Sin marcar leído: el benchmark no debe escribir en cada lectura
+    resp = await http.get(f"/dm/{name}/{SENDER}", params={"limit": 20, "mark_read": False})
+    phase.requests += 1
+    if resp.status_code == 200:
+        for message in resp.json():
+            phase.saw(message["id"])
+
+
+async def poller(http, phase: Phase, name: str, interval: float, stop: asyncio.Event):
+    await asyncio.sleep(random.uniform(0, interval))
+    while not stop.is_set():
+        await fetch_conversation(http, phase, name)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def listener(http, phase: Phase, name: str, stop: asyncio.Event, ready: asyncio.Event, counter: list):
+    async with http.stream("GET", f"/events/{name}", timeout=None) as resp:
+        phase.requests += 1
+        event_type = None
+        async for line in resp.aiter_lines():
+            if line.startswith("event:"):
+                event_type = line.split(":", 1)[1].strip()
+            elif line.startswith("data:"):
+                if event_type == "ready":
+                    counter[0] += 1
+                    if counter[0] == counter[1]:
+                        ready.set()
+                elif event_type == "dm":
+                    event = json.loads(line.split(":", 1)[1])
+                    phase.saw(event["id"])
+                    # Lo que hace el chat al recibir el aviso
+                    await fetch_conversation(http, phase, name)
+            if stop.is_set():
+                break
+
+
+async def run_phase(mode: str, opts) -> dict:
+    phase = Phase()
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=opts.api, limits=limits, timeout=30) as http:
+        stop = asyncio.Event()
+        if mode == "poll":
+            tasks = [
+                asyncio.create_task(poller(http, phase, client_name(i), opts.interval, stop))
+                for i in range(opts.clients)
+            ]
+        else:
+            ready = asyncio.Event()
+            counter = [0, opts.clients]
+            tasks = [
+                asyncio.create_task(listener(http, phase, client_name(i), stop, ready, counter))
+                for i in range(opts.clients)
+            ]
+            await asyncio.wait_for(ready.wait(), timeout=60)
+
+        ops_before = mongo_ops(opts.mongo_uri)
+        requests_before = phase.requests
+        start = time.perf_counter()
+        await sender(http, phase, opts.clients, opts.rate, opts.seconds)
+        # Margen para que el último mensaje llegue por cualquiera de los dos caminos
+        await asyncio.sleep(opts.interval if mode == "poll" else 1)
+        elapsed = time.perf_counter() - start
+        ops_after = mongo_ops(opts.mongo_uri)
+
+        stop.set()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    latencies = sorted(phase.seen.values())
+    return {
+        "mode": mode,
+        "req_per_sec": (phase.requests - requests_before) / elapsed,
+        "mongo_ops_per_sec": (ops_after - ops_before) / elapsed if ops_before is not None else None,
+        "delivered": f"{len(phase.seen)}/{len(phase.sent)}",
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0,
+        "p99_ms": latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000 if latencies else 0,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark de fan-out: polling vs SSE")
+    parser.add_argument("--api", default="http://localhost:8000/api")
+    parser.add_argument("--clients", type=int, default=1000, help="Conexiones/usuarios simulados")
+    parser.add_argument("--interval", type=float, default=5, help="Segundos entre polls")
+    parser.add_argument("--rate", type=float, default=10, help="DMs por segundo")
+    parser.add_argument("--seconds", type=float, default=30, help="Duración de cada fase")
+    parser.add_argument("--mongo-uri", default=None, help="Para medir opcounters de MongoDB")
+    parser.add_argument("--modes", nargs="+", default=["poll", "push"], choices=["poll", "push"])
+    opts = parser.parse_args()
+
+    async with httpx.AsyncClient(base_url=opts.api, timeout=30) as http:
+        await setup_users(http, opts.clients)
+
+    print(f"{opts.clients} clientes, poll cada {opts.interval}s, {opts.rate} DMs/s, {opts.seconds}s por fase")
+    print(f"{'modo':>5} {'req/s':>9} {'mongo ops/s':>12} {'entregados':>11} {'p50':>9} {'p99':>9}")
+    for mode in opts.modes:
+        result = await run_phase(mode, opts)
+        mongo = f"{result['mongo_ops_per_sec']:.0f}" if result["mongo_ops_per_sec"] is not None else "-"
+        print(
+            f"{result['mode']:>5} {result['req_per_sec']:>9.1f} {mongo:>12} {result['delivered']:>11} "
+            f"{result['p50_ms']:>7.0f}ms {result['p99_ms']:>7.0f}ms"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
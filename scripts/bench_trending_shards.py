@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Benchmark del trending con shards contra el Redis Cluster (3M + 3R)
+
+Mide, para distintos valores de TRENDING_SHARDS:
+- Escrituras: ZINCRBY por segundo desde varios procesos a la vez
+- Reparto: qué fracción de las escrituras recibe cada master
+- Lectura: latencia del top-K (un ZREVRANGE por shard + mezcla con heap)
+
+Con 1 shard todas las escrituras caen en un master; con más shards que
+masters se reparten y el throughput crece hasta usar los 3.
+
+Uso:
+    python scripts/bench_trending_shards.py
+    python scripts/bench_trending_shards.py --shards 1 3 16 --procs 8 --seconds 10
+
+Escribe en keys propias ({bench:trending:N}:posts) y las borra al terminar.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+from multiprocessing import Pool
+
+from redis.cluster import RedisCluster, ClusterNode
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+from app import trending  # noqa: E402
+
+
+def bench_key(shard: int) -> str:
+    return f"{{bench:trending:{shard}}}:posts"
+
+
+def connect() -> RedisCluster:
+    nodes = os.getenv("REDIS_CLUSTER_NODES", "localhost:7000,localhost:7001,localhost:7002")
+    startup_nodes = [ClusterNode(host, int(port)) for host, port in (n.split(":") for n in nodes.split(","))]
+    return RedisCluster(startup_nodes=startup_nodes, decode_responses=True)
+
+
+def writer(args):
+    """Un proceso: ZINCRBY en pipelines de `batch` hasta que pase `seconds`"""
+    shards, seconds, posts, batch, seed = args
+    client = connect()
+    rng = random.Random(seed)
+    post_ids = [f"post{i}" for i in range(posts)]
+    ops = 0
+    per_key = Counter()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pipe = client.pipeline()
+        for _ in range(batch):
+            post_id = rng.choice(post_ids)
+            key = bench_key(trending.shard_of(post_id, shards))
+            pipe.zincrby(key, 1, post_id)
+            per_key[key] += 1
+        pipe.execute()
+        ops += batch
+    client.close()
+    return ops, per_key
+
+
+def read_latencies(client: RedisCluster, shards: int, limit: int, rounds: int):
+    latencies = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        pipe = client.pipeline()
+        for shard in range(shards):
+            pipe.zrevrange(bench_key(shard), 0, limit - 1, withscores=True)
+        per_shard = [[(member, float(score)) for member, score in entries] for entries in pipe.execute()]
+        trending._merge_top(per_shard, limit)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+def run(client: RedisCluster, shards: int, opts) -> dict:
+    client.delete(*[bench_key(shard) for shard in range(shards)])
+
+    jobs = [(shards, opts.seconds, opts.posts, opts.batch, seed) for seed in range(opts.procs)]
+    start = time.perf_counter()
+    with Pool(opts.procs) as pool:
+        results = pool.map(writer, jobs)
+    elapsed = time.perf_counter() - start
+
+    total_ops = sum(ops for ops, _ in results)
+    per_master = Counter()
+    for _, per_key in results:
+        for key, count in per_key.items():
+            node = client.get_node_from_key(key)
+            per_master[f"{node.host}:{node.port}"] += count
+
+    p50, p99 = read_latencies(client, shards, opts.limit, opts.reads)
+    client.delete(*[bench_key(shard) for shard in range(shards)])
+    return {
+        "shards": shards,
+        "masters": len(per_master),
+        "ops_per_sec": total_ops / elapsed,
+        "max_master_share": max(per_master.values()) / total_ops if total_ops else 0,
+        "read_p50_ms": p50,
+        "read_p99_ms": p99,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de trending con shards en Redis Cluster")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 3, 16])
+    parser.add_argument("--procs", type=int, default=8, help="Procesos escritores")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--posts", type=int, default=10000, help="Posts distintos")
+    parser.add_argument("--batch", type=int, default=50, help="ZINCRBY por pipeline")
+    parser.add_argument("--limit", type=int, default=10, help="Top-K de la lectura")
+    parser.add_argument("--reads", type=int, default=500, help="Lecturas para medir latencia")
+    opts = parser.parse_args()
+
+    client = connect()
+    print(f"{'shards':>6} {'masters':>7} {'ops/s':>10} {'max master':>10} {'read p50':>9} {'read p99':>9}")
+    baseline = None
+    for shards in opts.shards:
+        result = run(client, shards, opts)
+        baseline = baseline or result["ops_per_sec"]
+        print(
+            f"{result['shards']:>6} {result['masters']:>7} {result['ops_per_sec']:>10.0f} "
+            f"{result['max_master_share']:>9.0%} {result['read_p50_ms']:>7.2f}ms {result['read_p99_ms']:>7.2f}ms"
+            f"   x{result['ops_per_sec'] / baseline:.2f}"
+        )
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
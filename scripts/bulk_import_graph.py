@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Carga masiva de MongoDB a Neo4j con GraphWriter (app/graph_writer.py)
+
+Recorre las colecciones de MongoDB y escribe el grafo en lotes
+`UNWIND $rows AS row MERGE ...` de `--batch-size` filas:
+
+- users    nodos (:User)
+- posts    nodos (:Post) y (:User)-[:POSTED]->(:Post)
+- follows  (:User)-[:FOLLOWS]->(:User) de la colección `follows` (los
+           follows que se guardaron ahí con Neo4j caído)
+- messages (:User)-[:MESSAGED]->(:User) con el último DM de cada par
+- likes    (:User)-[:LIKES]->(:Post)
+
+Son los mismos MERGE que usan los endpoints, así que se puede repetir: lo que
+ya está en Neo4j no se duplica ni suma otra vez a los contadores.
+
+Uso:
+    python scripts/bulk_import_graph.py
+    python scripts/bulk_import_graph.py --only follows messages --batch-size 2000
+
+Al final imprime filas, segundos y filas/s por tipo.
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+from app.connections import connection_manager  # noqa: E402
+from app.graph_writer import GraphWriter  # noqa: E402
+
+KINDS = ["users", "posts", "follows", "messages", "likes"]
+
+
+def user_rows(db, ids):
+    for doc in db["users"].find({}, {"username": 1, "email": 1, "name": 1, "bio": 1}):
+        if doc.get("username"):
+            yield {
+                "id": str(doc["_id"]),
+                "username": doc["username"],
+                "email": doc.get("email"),
+                "name": doc.get("name"),
+                "bio": doc.get("bio"),
+            }
+
+
+def post_rows(db, ids):
+    for doc in db["posts"].find({}, {"author_username": 1, "author_id": 1, "content": 1, "created_at": 1}):
+        user_id = doc.get("author_id") or ids.get(doc.get("author_username"))
+        if user_id:
+            yield {
+                "user_id": user_id,
+                "username": doc.get("author_username"),
+                "post_id": str(doc["_id"]),
+                "content": doc.get("content"),
+                "created_at": doc.get("created_at"),
+            }
+
+
+def follow_rows(db, ids):
+    now = datetime.utcnow().isoformat()
+    for doc in db["follows"].find({}, {"follower": 1, "following": 1}):
+        follower, following = doc.get("follower"), doc.get("following")
+        if follower in ids and following in ids:
+            yield {
+                "user_id": ids[follower],
+                "username": follower,
+                "target_id": ids[following],
+                "target_username": following,
+                "now": now,
+            }
+
+
+def message_rows(db, ids):
+    pipeline = [
+        {"$group": {
+            "_id": {"sender": "$sender_username", "receiver": "$receiver_username"},
+            "created_at": {"$max": "$created_at"},
+        }},
+    ]
+    for doc in db["dms"].aggregate(pipeline, allowDiskUse=True):
+        if doc["_id"].get("sender") and doc["_id"].get("receiver"):
+            yield {**doc["_id"], "created_at": doc["created_at"]}
+
+
+def like_rows(db, ids):
+    for doc in db["likes"].find({}, {"post_id": 1, "username": 1}):
+        if doc.get("username") in ids and doc.get("post_id"):
+            yield {"user_id": ids[doc["username"]], "post_id": doc["post_id"]}
+
+
+SOURCES = {
+    "users": ("user", user_rows),
+    "posts": ("post", post_rows),
+    "follows": ("follow", follow_rows),
+    "messages": ("message", message_rows),
+    "likes": ("like", like_rows),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga masiva de MongoDB a Neo4j")
+    parser.add_argument("--only", nargs="+", choices=KINDS, default=KINDS, help="Qué cargar")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Filas por UNWIND")
+    opts = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    connection_manager.start()
+    try:
+        db = connection_manager.mongo_db()
+        ids = {
+            doc["username"]: str(doc["_id"])
+            for doc in db["users"].find({}, {"username": 1})
+            if doc.get("username")
+        }
+        writer = GraphWriter(connection_manager, batch_size=opts.batch_size)
+        print(f"{'tipo':>9} {'filas':>9} {'errores':>8} {'segundos':>9} {'filas/s':>9}")
+        for name in KINDS:
+            if name not in opts.only:
+                continue
+            kind, rows = SOURCES[name]
+            errors = writer.errors
+            start = time.perf_counter()
+            count = 0
+            for row in rows(db, ids):
+                writer.submit(kind, row)
+                count += 1
+            writer.flush()
+            elapsed = time.perf_counter() - start
+            print(
+                f"{name:>9} {count:>9} {writer.errors - errors:>8} "
+                f"{elapsed:>9.2f} {count / elapsed if elapsed else 0:>9.0f}"
+            )
+    finally:
+        connection_manager.close()
+
+
+if __name__ == "__main__":
+    main()